@@ -0,0 +1,54 @@
+"""agregar_tabla_trabajos
+
+Revision ID: 7c2e5a9d4f10
+Revises: 39df3de8b2c0
+Create Date: 2026-10-17 10:00:00.000000
+
+Esta migración:
+1. Crea la tabla trabajos (cola persistente de trabajos en segundo plano)
+2. Agrega el índice (estado, ejecutar_en) usado por el worker para reclamar trabajos
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2e5a9d4f10'
+down_revision: Union[str, None] = '39df3de8b2c0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'trabajos',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('tipo', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=True),
+        sa.Column('estado', sa.String(length=20), nullable=False, server_default='pendiente'),
+        sa.Column('intentos', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_intentos', sa.Integer(), nullable=False, server_default='5'),
+        sa.Column('ejecutar_en', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('iniciado_en', sa.DateTime(), nullable=True),
+        sa.Column('finalizado_en', sa.DateTime(), nullable=True),
+        sa.Column('ultimo_error', sa.Text(), nullable=True),
+        sa.Column('fecha_creacion', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.CheckConstraint(
+            "estado IN ('pendiente', 'ejecutando', 'completado', 'fallido')",
+            name='check_estado_trabajo_valido'
+        ),
+    )
+
+    # Índice para reclamar trabajos vencidos (WHERE estado = 'pendiente' AND ejecutar_en <= now())
+    op.create_index(
+        'ix_trabajos_estado_ejecutar_en',
+        'trabajos',
+        ['estado', 'ejecutar_en'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_trabajos_estado_ejecutar_en', table_name='trabajos')
+    op.drop_table('trabajos')
@@ -0,0 +1,62 @@
+"""agregar_ingestas_factura
+
+Revision ID: a7d3e9b2c5f1
+Revises: f2c6a8d1b4e9
+Create Date: 2026-10-17 15:00:00.000000
+
+Esta migración crea la tabla ingestas_factura, usada por el pipeline asíncrono
+de facturas por imagen (modules/logistica/ingesta_facturas.py):
+- sha256 único: la misma imagen nunca se procesa dos veces con OCR
+- whatsapp_media_id único: absorbe los reintentos del webhook de WhatsApp
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3e9b2c5f1'
+down_revision: Union[str, None] = 'f2c6a8d1b4e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'ingestas_factura',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('origen', sa.String(length=20), nullable=False),
+        sa.Column('tipo', sa.String(length=20), nullable=False, server_default='proveedor'),
+        sa.Column('estado', sa.String(length=20), nullable=False, server_default='pendiente'),
+        sa.Column('etapa', sa.String(length=20), nullable=False, server_default='descarga'),
+        sa.Column('sha256', sa.String(length=64), nullable=True),
+        sa.Column('whatsapp_media_id', sa.String(length=100), nullable=True),
+        sa.Column('remitente_telefono', sa.String(length=50), nullable=True),
+        sa.Column('remitente_nombre', sa.String(length=200), nullable=True),
+        sa.Column('ruta_imagen', sa.String(length=500), nullable=True),
+        sa.Column('texto_ocr', sa.Text(), nullable=True),
+        sa.Column('datos_ocr', sa.JSON(), nullable=True),
+        sa.Column('factura_id', sa.Integer(), sa.ForeignKey('facturas.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('duplicada_de_id', sa.Integer(), sa.ForeignKey('ingestas_factura.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('fecha_creacion', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('fecha_actualizacion', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('finalizado_en', sa.DateTime(), nullable=True),
+        sa.UniqueConstraint('sha256', name='uq_ingestas_factura_sha256'),
+        sa.UniqueConstraint('whatsapp_media_id', name='uq_ingestas_factura_whatsapp_media_id'),
+        sa.CheckConstraint(
+            "estado IN ('pendiente', 'procesando', 'completada', 'duplicada', 'fallida')",
+            name='check_estado_ingesta_valido'
+        ),
+    )
+    op.create_index(
+        'ix_ingestas_factura_estado_actualizacion',
+        'ingestas_factura',
+        ['estado', 'fecha_actualizacion'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ingestas_factura_estado_actualizacion', table_name='ingestas_factura')
+    op.drop_table('ingestas_factura')
@@ -0,0 +1,30 @@
+"""agregar_densidad_items
+
+Revision ID: b3e8f1a5d7c2
+Revises: a7d3e9b2c5f1
+Create Date: 2026-10-17 16:00:00.000000
+
+Esta migración agrega items.densidad (kg por litro). Cuando está definida,
+conversor_unidades convierte entre unidades de peso y de volumen para ese item
+(recetas en ml de un item comprado en kg, facturas en litros, etc.).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e8f1a5d7c2'
+down_revision: Union[str, None] = 'a7d3e9b2c5f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('items', sa.Column('densidad', sa.Numeric(precision=10, scale=4), nullable=True))
+    op.create_check_constraint('check_densidad_item_positiva', 'items', 'densidad IS NULL OR densidad > 0')
+
+
+def downgrade() -> None:
+    op.drop_constraint('check_densidad_item_positiva', 'items', type_='check')
+    op.drop_column('items', 'densidad')
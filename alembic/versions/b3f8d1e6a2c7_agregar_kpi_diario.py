@@ -0,0 +1,72 @@
+"""agregar_kpi_diario
+
+Revision ID: b3f8d1e6a2c7
+Revises: 7c2e5a9d4f10
+Create Date: 2026-10-17 11:00:00.000000
+
+Esta migración:
+1. Crea la tabla kpi_diario (agregados diarios del dashboard de KPIs)
+2. La llena con el histórico existente de facturas, pedidos, tickets, charolas y mermas
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3f8d1e6a2c7'
+down_revision: Union[str, None] = '7c2e5a9d4f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'kpi_diario',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('fecha', sa.Date(), nullable=False),
+        sa.Column('ubicacion', sa.String(length=100), nullable=False, server_default=''),
+        sa.Column('metrica', sa.String(length=30), nullable=False),
+        sa.Column('dimension', sa.String(length=30), nullable=False, server_default=''),
+        sa.Column('conteo', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total', sa.Numeric(14, 2), nullable=False, server_default='0'),
+        sa.Column('cantidad', sa.Numeric(14, 3), nullable=False, server_default='0'),
+        sa.Column('fecha_actualizacion', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.UniqueConstraint('fecha', 'ubicacion', 'metrica', 'dimension', name='uq_kpi_diario_clave'),
+    )
+    op.create_index(
+        'ix_kpi_diario_metrica_fecha',
+        'kpi_diario',
+        ['metrica', 'fecha'],
+        unique=False
+    )
+
+    # Carga inicial del histórico (los enums se guardan por NOMBRE: se pasan a minúsculas)
+    op.execute("""
+        INSERT INTO kpi_diario (fecha, ubicacion, metrica, dimension, conteo, total, cantidad, fecha_actualizacion)
+        SELECT fecha_recepcion::date, '', 'facturas', LOWER(estado::text), COUNT(*), COALESCE(SUM(total), 0), 0, NOW()
+        FROM facturas GROUP BY 1, 4;
+
+        INSERT INTO kpi_diario (fecha, ubicacion, metrica, dimension, conteo, total, cantidad, fecha_actualizacion)
+        SELECT fecha_pedido::date, '', 'pedidos', LOWER(estado), COUNT(*), COALESCE(SUM(total), 0), 0, NOW()
+        FROM pedidos_compra GROUP BY 1, 4;
+
+        INSERT INTO kpi_diario (fecha, ubicacion, metrica, dimension, conteo, total, cantidad, fecha_actualizacion)
+        SELECT fecha_creacion::date, '', 'tickets', LOWER(estado::text), COUNT(*), 0, 0, NOW()
+        FROM tickets GROUP BY 1, 4;
+
+        INSERT INTO kpi_diario (fecha, ubicacion, metrica, dimension, conteo, total, cantidad, fecha_actualizacion)
+        SELECT fecha_servicio::date, ubicacion, 'charolas', LOWER(tiempo_comida), COUNT(*),
+               COALESCE(SUM(total_ventas), 0), COALESCE(SUM(personas_servidas), 0), NOW()
+        FROM charolas GROUP BY 1, 2, 4;
+
+        INSERT INTO kpi_diario (fecha, ubicacion, metrica, dimension, conteo, total, cantidad, fecha_actualizacion)
+        SELECT fecha_merma::date, COALESCE(ubicacion, ''), 'mermas', LOWER(tipo::text), COUNT(*),
+               COALESCE(SUM(cantidad * costo_unitario), 0), COALESCE(SUM(cantidad), 0), NOW()
+        FROM mermas GROUP BY 1, 2, 4;
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_kpi_diario_metrica_fecha', table_name='kpi_diario')
+    op.drop_table('kpi_diario')
@@ -0,0 +1,38 @@
+"""agregar_versiones_rollup_recetas
+
+Revision ID: c4f7a2d9e6b1
+Revises: b3e8f1a5d7c2
+Create Date: 2026-10-17 17:00:00.000000
+
+Esta migración agrega el versionado de los rollups de recetas
+(modules/planificacion/rollup_recetas.py):
+- items.version_costo: se incrementa al cambiar costo, calorías, unidad o densidad
+- recetas.version_totales / recetas.versiones_items: versión del rollup persistido
+  y versiones de los items de los que se derivó
+
+Las recetas existentes quedan con versiones_items NULL (se consideran
+desactualizadas ante el primer cambio de sus items); POST
+/api/logistica/costos/recalcular-todos o el recálculo semanal las completa.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f7a2d9e6b1'
+down_revision: Union[str, None] = 'b3e8f1a5d7c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('items', sa.Column('version_costo', sa.Integer(), nullable=False, server_default='1'))
+    op.add_column('recetas', sa.Column('version_totales', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('recetas', sa.Column('versiones_items', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('recetas', 'versiones_items')
+    op.drop_column('recetas', 'version_totales')
+    op.drop_column('items', 'version_costo')
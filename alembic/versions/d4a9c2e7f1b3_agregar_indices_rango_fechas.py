@@ -0,0 +1,75 @@
+"""agregar_indices_rango_fechas
+
+Revision ID: d4a9c2e7f1b3
+Revises: b3f8d1e6a2c7
+Create Date: 2026-10-17 12:00:00.000000
+
+Esta migración agrega índices compuestos para los filtros por rango de fechas
+(filtro_rango_fechas / filtro_dia en utils.helpers), que comparan la columna
+DateTime directamente en lugar de func.date(columna):
+1. charolas: charolas servidas por servicio, ubicación y día (tickets automáticos)
+2. tickets: deduplicación de tickets automáticos por origen y día
+3. pedidos_compra: pedido abierto de un proveedor dentro de una programación
+4. facturas: estadísticas de compras por tipo y período
+5. mermas: series diarias de mermas con su item (reportes por categoría)
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a9c2e7f1b3'
+down_revision: Union[str, None] = 'b3f8d1e6a2c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Índices en charolas (servicio + ubicación + día)
+    op.create_index(
+        'ix_charolas_tiempo_ubicacion_fecha',
+        'charolas',
+        ['tiempo_comida', 'ubicacion', 'fecha_servicio'],
+        unique=False
+    )
+
+    # Índices en tickets (tickets automáticos del día por origen)
+    op.create_index(
+        'ix_tickets_origen_fecha_creacion',
+        'tickets',
+        ['origen_modulo', 'fecha_creacion'],
+        unique=False
+    )
+
+    # Índices en pedidos_compra (pedidos de un proveedor en un rango)
+    op.create_index(
+        'ix_pedidos_compra_proveedor_fecha',
+        'pedidos_compra',
+        ['proveedor_id', 'fecha_pedido'],
+        unique=False
+    )
+
+    # Índices en facturas (facturas de proveedor por período)
+    op.create_index(
+        'ix_facturas_tipo_fecha_recepcion',
+        'facturas',
+        ['tipo', 'fecha_recepcion'],
+        unique=False
+    )
+
+    # Índices en mermas (rango de fechas con join a items)
+    op.create_index(
+        'ix_mermas_fecha_merma_item_id',
+        'mermas',
+        ['fecha_merma', 'item_id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    # Eliminar índices (en orden inverso)
+    op.drop_index('ix_mermas_fecha_merma_item_id', table_name='mermas')
+    op.drop_index('ix_facturas_tipo_fecha_recepcion', table_name='facturas')
+    op.drop_index('ix_pedidos_compra_proveedor_fecha', table_name='pedidos_compra')
+    op.drop_index('ix_tickets_origen_fecha_creacion', table_name='tickets')
+    op.drop_index('ix_charolas_tiempo_ubicacion_fecha', table_name='charolas')
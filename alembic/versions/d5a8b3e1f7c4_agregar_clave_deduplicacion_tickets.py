@@ -0,0 +1,34 @@
+"""agregar_clave_deduplicacion_tickets
+
+Revision ID: d5a8b3e1f7c4
+Revises: c4f7a2d9e6b1
+Create Date: 2026-10-17 18:00:00.000000
+
+Esta migración agrega tickets.clave_deduplicacion (única), la clave
+regla:entidad:fecha con la que el motor de reglas de tickets automáticos
+(modules/crm/reglas_tickets.py) descarta candidatos ya generados con un
+anti-join e inserta los nuevos con ON CONFLICT DO NOTHING.
+
+Los tickets existentes quedan con la clave NULL (no participan en la
+deduplicación).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a8b3e1f7c4'
+down_revision: Union[str, None] = 'c4f7a2d9e6b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tickets', sa.Column('clave_deduplicacion', sa.String(length=200), nullable=True))
+    op.create_unique_constraint('uq_tickets_clave_deduplicacion', 'tickets', ['clave_deduplicacion'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_tickets_clave_deduplicacion', 'tickets', type_='unique')
+    op.drop_column('tickets', 'clave_deduplicacion')
@@ -0,0 +1,54 @@
+"""agregar_ejecuciones_tareas
+
+Revision ID: e6b9c4f2a8d3
+Revises: d5a8b3e1f7c4
+Create Date: 2026-10-17 19:00:00.000000
+
+Esta migración crea la tabla ejecuciones_tareas, el historial del programador
+de tareas (modules/trabajos/programador.py):
+- una fila por ejecución, con el disparo al que corresponde, duración y resultado
+- (tarea, programada_para) indexado: al asumir el liderazgo el programador
+  busca ahí los disparos perdidos que debe recuperar
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6b9c4f2a8d3'
+down_revision: Union[str, None] = 'd5a8b3e1f7c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'ejecuciones_tareas',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('tarea', sa.String(length=100), nullable=False),
+        sa.Column('programada_para', sa.DateTime(), nullable=False),
+        sa.Column('recuperada', sa.String(length=10), nullable=False, server_default='false'),
+        sa.Column('estado', sa.String(length=20), nullable=False, server_default='ejecutando'),
+        sa.Column('iniciada_en', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('finalizada_en', sa.DateTime(), nullable=True),
+        sa.Column('duracion_ms', sa.Integer(), nullable=True),
+        sa.Column('resultado', sa.JSON(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('proceso', sa.String(length=100), nullable=True),
+        sa.CheckConstraint(
+            "estado IN ('ejecutando', 'completada', 'fallida')",
+            name='check_estado_ejecucion_tarea_valido'
+        ),
+    )
+    op.create_index(
+        'ix_ejecuciones_tareas_tarea_programada',
+        'ejecuciones_tareas',
+        ['tarea', 'programada_para'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ejecuciones_tareas_tarea_programada', table_name='ejecuciones_tareas')
+    op.drop_table('ejecuciones_tareas')
@@ -0,0 +1,83 @@
+"""agregar_movimientos_inventario
+
+Revision ID: e8b1f4a6c3d2
+Revises: d4a9c2e7f1b3
+Create Date: 2026-10-17 13:00:00.000000
+
+Esta migración:
+1. Crea la tabla movimientos_inventario (libro de movimientos de stock, solo inserción)
+2. La llena con las entradas de facturas aprobadas y las salidas de requerimientos
+   entregados, para que el último ingreso/egreso del inventario no quede vacío
+   (cantidad_resultante queda en NULL para el histórico)
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b1f4a6c3d2'
+down_revision: Union[str, None] = 'd4a9c2e7f1b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'movimientos_inventario',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('item_id', sa.Integer(), sa.ForeignKey('items.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('tipo', sa.String(length=20), nullable=False),
+        sa.Column('cantidad', sa.Numeric(12, 3), nullable=False),
+        sa.Column('cantidad_resultante', sa.Numeric(12, 3), nullable=True),
+        sa.Column('costo_unitario', sa.Numeric(10, 2), nullable=True),
+        sa.Column('origen', sa.String(length=30), nullable=False, server_default='manual'),
+        sa.Column('origen_id', sa.Integer(), nullable=True),
+        sa.Column('referencia', sa.String(length=100), nullable=True),
+        sa.Column('registrado_por', sa.Integer(), nullable=True),
+        sa.Column('fecha', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.CheckConstraint(
+            "tipo IN ('entrada', 'salida', 'ajuste')",
+            name='check_tipo_movimiento_valido'
+        ),
+    )
+    op.create_index(
+        'ix_movimientos_inventario_item_tipo_fecha',
+        'movimientos_inventario',
+        ['item_id', 'tipo', 'fecha'],
+        unique=False
+    )
+    op.create_index(
+        'ix_movimientos_inventario_origen',
+        'movimientos_inventario',
+        ['origen', 'origen_id'],
+        unique=False
+    )
+
+    # Carga inicial del histórico (los enums se guardan por NOMBRE)
+    op.execute("""
+        INSERT INTO movimientos_inventario
+            (item_id, tipo, cantidad, costo_unitario, origen, origen_id, referencia, registrado_por, fecha)
+        SELECT fi.item_id, 'entrada', fi.cantidad_aprobada, fi.precio_unitario, 'factura', f.id,
+               f.numero_factura, f.aprobado_por, COALESCE(f.fecha_aprobacion, f.fecha_recepcion)
+        FROM factura_items fi
+        JOIN facturas f ON f.id = fi.factura_id
+        WHERE f.tipo::text = 'PROVEEDOR'
+          AND f.estado::text IN ('APROBADA', 'PARCIAL')
+          AND fi.item_id IS NOT NULL
+          AND fi.cantidad_aprobada > 0;
+
+        INSERT INTO movimientos_inventario
+            (item_id, tipo, cantidad, origen, origen_id, fecha)
+        SELECT ri.item_id, 'salida', -ri.cantidad_entregada, 'requerimiento', r.id, r.fecha
+        FROM requerimiento_items ri
+        JOIN requerimientos r ON r.id = ri.requerimiento_id
+        WHERE r.estado::text = 'ENTREGADO'
+          AND ri.cantidad_entregada > 0;
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_movimientos_inventario_origen', table_name='movimientos_inventario')
+    op.drop_index('ix_movimientos_inventario_item_tipo_fecha', table_name='movimientos_inventario')
+    op.drop_table('movimientos_inventario')
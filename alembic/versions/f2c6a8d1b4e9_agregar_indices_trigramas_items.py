@@ -0,0 +1,35 @@
+"""agregar_indices_trigramas_items
+
+Revision ID: f2c6a8d1b4e9
+Revises: e8b1f4a6c3d2
+Create Date: 2026-10-17 14:00:00.000000
+
+Esta migración habilita el backend 'pg_trgm' del emparejador de items
+(EMPAREJADOR_BACKEND=pg_trgm en modules/logistica/emparejador_items.py):
+1. Crea la extensión pg_trgm (requiere permisos de creación de extensiones)
+2. Agrega índices GIN de trigramas sobre lower(nombre) y lower(codigo) de items,
+   usados por el operador % y similarity()
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c6a8d1b4e9'
+down_revision: Union[str, None] = 'e8b1f4a6c3d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # Índices de trigramas en items (emparejamiento de líneas de factura)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_items_nombre_trgm ON items USING gin (lower(nombre) gin_trgm_ops)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_items_codigo_trgm ON items USING gin (lower(codigo) gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    # La extensión se conserva: otros objetos pueden depender de ella
+    op.execute("DROP INDEX IF EXISTS ix_items_codigo_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_items_nombre_trgm")
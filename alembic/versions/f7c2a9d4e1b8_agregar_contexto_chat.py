@@ -0,0 +1,50 @@
+"""agregar_contexto_chat
+
+Revision ID: f7c2a9d4e1b8
+Revises: e6b9c4f2a8d3
+Create Date: 2026-10-17 20:00:00.000000
+
+Esta migración agrega lo necesario para la ventana de contexto del chat con
+presupuesto de tokens (modules/chat/contexto.py):
+- mensajes.tokens_contenido: tokens del contenido, contados una vez
+- conversaciones.resumen (+ tokens y el mensaje hasta el que llega): resumen
+  acumulado de los mensajes que ya no se envían literalmente
+- índice (conversacion_id, fecha_envio, id) en mensajes: la cola de la
+  conversación se lee por keyset sin recorrer todo el historial
+
+Los mensajes existentes quedan con tokens_contenido NULL; se cuentan la
+primera vez que entran en una ventana.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7c2a9d4e1b8'
+down_revision: Union[str, None] = 'e6b9c4f2a8d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('mensajes', sa.Column('tokens_contenido', sa.Integer(), nullable=True))
+    op.add_column('conversaciones', sa.Column('resumen', sa.Text(), nullable=True))
+    op.add_column('conversaciones', sa.Column('resumen_tokens', sa.Integer(), nullable=True))
+    op.add_column('conversaciones', sa.Column('resumen_hasta_fecha', sa.DateTime(), nullable=True))
+    op.add_column('conversaciones', sa.Column('resumen_hasta_id', sa.Integer(), nullable=True))
+    op.create_index(
+        'ix_mensajes_conversacion_fecha_envio',
+        'mensajes',
+        ['conversacion_id', 'fecha_envio', 'id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_mensajes_conversacion_fecha_envio', table_name='mensajes')
+    op.drop_column('conversaciones', 'resumen_hasta_id')
+    op.drop_column('conversaciones', 'resumen_hasta_fecha')
+    op.drop_column('conversaciones', 'resumen_tokens')
+    op.drop_column('conversaciones', 'resumen')
+    op.drop_column('mensajes', 'tokens_contenido')
@@ -97,6 +97,14 @@ def create_app():
     
     db.init_app(app)
     
+    # Pipeline de ingesta de facturas: corre en los workers web, que tienen las
+    # imágenes en disco; arranca con el primer request (no en programador.py)
+    from modules.logistica.ingesta_facturas import pipeline as pipeline_ingesta
+    
+    @app.before_request
+    def iniciar_pipeline_ingesta():
+        pipeline_ingesta.iniciar(app)
+    
     jwt = JWTManager(app)
     
     # Registrar blueprints
@@ -147,13 +155,14 @@ def create_app():
                 import traceback
                 traceback.print_exc()
     
-    # Configurar tareas programadas (solo en producción o cuando se especifique)
+    # Tareas programadas: por defecto corren en un proceso dedicado (python programador.py).
+    # ENABLE_SCHEDULER=true las inicia también en cada worker web; solo el líder ejecuta.
     import os
-    if os.getenv('ENABLE_SCHEDULER', 'true').lower() == 'true':
+    if os.getenv('ENABLE_SCHEDULER', 'false').lower() == 'true':
         try:
             from modules.logistica.tareas_programadas import configurar_tareas_programadas
             configurar_tareas_programadas(app)
-            print("✅ Tareas programadas configuradas: Recálculo de costos cada sábado a las 2:00 AM")
+            print("✅ Programador de tareas iniciado en este proceso (solo ejecuta si es el líder)")
         except Exception as e:
             print(f"⚠️ Advertencia: No se pudo inicializar el scheduler: {e}")
             import traceback
@@ -107,6 +107,25 @@ class Config:
     OPENROUTER_HTTP_REFERER = os.getenv('OPENROUTER_HTTP_REFERER', 'https://github.com/tu-usuario/kohde_demo')  # Opcional pero recomendado
     OPENROUTER_X_TITLE = os.getenv('OPENROUTER_X_TITLE', 'Kohde ERP Restaurantes')  # Opcional
     
+    # Chat en streaming (SSE)
+    CHAT_STREAM_MAX_CONCURRENTES = int(os.getenv('CHAT_STREAM_MAX_CONCURRENTES', '8'))  # Streams simultáneos por proceso (menor que --threads de gunicorn)
+    CHAT_STREAM_TIMEOUT_SEGUNDOS = int(os.getenv('CHAT_STREAM_TIMEOUT_SEGUNDOS', '60'))  # Máximo sin recibir datos del LLM
+    
+    # Ventana de contexto del chat (modules/chat/contexto.py)
+    CHAT_CONTEXTO_TURNOS = int(os.getenv('CHAT_CONTEXTO_TURNOS', '6'))  # Últimos turnos enviados literalmente
+    CHAT_CONTEXTO_MAX_TOKENS = int(os.getenv('CHAT_CONTEXTO_MAX_TOKENS', '4000'))  # Historial + resumen, sin el prompt del sistema
+    CHAT_RESUMEN_MAX_TOKENS = int(os.getenv('CHAT_RESUMEN_MAX_TOKENS', '400'))  # Longitud del resumen acumulado
+    CHAT_PROMPT_CACHE = os.getenv('CHAT_PROMPT_CACHE', 'true').lower() == 'true'  # Caché de prompts del proveedor (modules/chat/prompts.py)
+    
+    # Consultas SQL del chat AI (modules/chat/consultas_sql.py)
+    CHAT_SQL_DATABASE_URL = os.getenv('CHAT_SQL_DATABASE_URL', '')  # Réplica o rol de solo lectura; vacío = misma BD
+    CHAT_SQL_POOL_SIZE = int(os.getenv('CHAT_SQL_POOL_SIZE', '3'))  # Conexiones del pool propio (sin overflow)
+    CHAT_SQL_TIMEOUT_MS = int(os.getenv('CHAT_SQL_TIMEOUT_MS', '5000'))  # statement_timeout de las consultas del AI
+    CHAT_SQL_COSTO_MAXIMO = float(os.getenv('CHAT_SQL_COSTO_MAXIMO', '50000'))  # Costo estimado máximo del plan (EXPLAIN)
+    CHAT_SQL_MAX_FILAS = int(os.getenv('CHAT_SQL_MAX_FILAS', '100'))  # LIMIT que se inyecta si falta o es mayor
+    CHAT_SQL_CACHE_TTL_SEGUNDOS = int(os.getenv('CHAT_SQL_CACHE_TTL_SEGUNDOS', '60'))
+    CHAT_SQL_CACHE_MAX_ENTRADAS = int(os.getenv('CHAT_SQL_CACHE_MAX_ENTRADAS', '256'))
+    
     # Almacenamiento de imágenes
     UPLOAD_FOLDER = BASE_DIR / 'uploads' / 'facturas'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max
@@ -120,6 +139,61 @@ class Config:
     
     # Configuración de facturas
     IVA_PERCENTAGE = float(os.getenv('IVA_PERCENTAGE', '0.15'))  # 15% IVA por defecto
+    
+    # Cola de trabajos en segundo plano (tabla trabajos)
+    TRABAJOS_INTERVALO_SEGUNDOS = int(os.getenv('TRABAJOS_INTERVALO_SEGUNDOS', '30'))  # Frecuencia del worker
+    TRABAJOS_LOTE = int(os.getenv('TRABAJOS_LOTE', '20'))  # Trabajos tomados por ciclo
+    TRABAJOS_MAX_INTENTOS = int(os.getenv('TRABAJOS_MAX_INTENTOS', '5'))
+    TRABAJOS_BACKOFF_BASE_SEGUNDOS = int(os.getenv('TRABAJOS_BACKOFF_BASE_SEGUNDOS', '60'))  # 60s, 120s, 240s...
+    TRABAJOS_BACKOFF_MAX_SEGUNDOS = int(os.getenv('TRABAJOS_BACKOFF_MAX_SEGUNDOS', '3600'))
+    TRABAJOS_TIMEOUT_SEGUNDOS = int(os.getenv('TRABAJOS_TIMEOUT_SEGUNDOS', '900'))  # 'ejecutando' más tiempo = worker caído
+    
+    # Agregados diarios de KPIs (tabla kpi_diario)
+    KPI_BACKFILL_DIAS = int(os.getenv('KPI_BACKFILL_DIAS', '35'))  # Días recalculados cada noche
+    
+    # Tickets automáticos (modules/crm/reglas_tickets.py)
+    TICKETS_VERIFICACION_INTERVALO_MINUTOS = int(os.getenv('TICKETS_VERIFICACION_INTERVALO_MINUTOS', '60'))
+    TICKETS_VERIFICACION_DIAS = int(os.getenv('TICKETS_VERIFICACION_DIAS', '1'))  # Días anteriores a hoy reevaluados
+    STOCK_ALERTAS_INTERVALO_MINUTOS = int(os.getenv('STOCK_ALERTAS_INTERVALO_MINUTOS', '15'))
+    
+    # Programador de tareas (modules/trabajos/programador.py)
+    PROGRAMADOR_INTERVALO_LIDER_SEGUNDOS = int(os.getenv('PROGRAMADOR_INTERVALO_LIDER_SEGUNDOS', '30'))  # Reintento de liderazgo
+    PROGRAMADOR_HISTORIAL_DIAS = int(os.getenv('PROGRAMADOR_HISTORIAL_DIAS', '30'))  # Retención de ejecuciones_tareas
+    
+    # Caché de respuestas de reportes (utils/cache_respuestas.py)
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memoria')  # 'memoria', 'redis' (compartida entre workers) o 'ninguno'
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', os.getenv('REDIS_URL', ''))
+    CACHE_TTL_SEGUNDOS = int(os.getenv('CACHE_TTL_SEGUNDOS', '60'))
+    CACHE_MAX_ENTRADAS = int(os.getenv('CACHE_MAX_ENTRADAS', '512'))  # Límite LRU del backend en memoria
+    
+    # Rollups de recetas cacheados en el proceso (modules/planificacion/rollup_recetas.py)
+    ROLLUP_RECETAS_MAX_ENTRADAS = int(os.getenv('ROLLUP_RECETAS_MAX_ENTRADAS', '4096'))
+    
+    # Emparejamiento de líneas de factura con items (modules/logistica/emparejador_items.py)
+    EMPAREJADOR_BACKEND = os.getenv('EMPAREJADOR_BACKEND', 'memoria')  # 'memoria' (índice de trigramas del proceso) o 'pg_trgm'
+    EMPAREJADOR_UMBRAL = float(os.getenv('EMPAREJADOR_UMBRAL', '0.4'))  # Puntaje mínimo para asignar un item
+    EMPAREJADOR_TTL_SEGUNDOS = int(os.getenv('EMPAREJADOR_TTL_SEGUNDOS', '600'))  # Reconstrucción completa (cambios de otros workers)
+
+    # OCR de facturas (utils/ocr.py)
+    OCR_BACKEND = os.getenv('OCR_BACKEND', 'google_vision')  # 'google_vision' o 'local' (texto de prueba, sin red)
+
+    # Pipeline de ingesta de facturas por imagen (modules/logistica/ingesta_facturas.py)
+    INGESTA_HILOS_DESCARGA = int(os.getenv('INGESTA_HILOS_DESCARGA', '2'))  # Descarga y hash
+    INGESTA_HILOS_OCR = int(os.getenv('INGESTA_HILOS_OCR', '4'))  # OCR y parseo (llamadas lentas a Vision)
+    INGESTA_HILOS_REGISTRO = int(os.getenv('INGESTA_HILOS_REGISTRO', '2'))  # Emparejamiento, persistencia y notificación
+    INGESTA_COLA_MAX = int(os.getenv('INGESTA_COLA_MAX', '50'))  # Capacidad de cada cola entre etapas
+    INGESTA_TIMEOUT_SEGUNDOS = int(os.getenv('INGESTA_TIMEOUT_SEGUNDOS', '600'))  # Sin avance más tiempo = se reanuda
+    INGESTA_SUPERVISOR_INTERVALO_SEGUNDOS = int(os.getenv('INGESTA_SUPERVISOR_INTERVALO_SEGUNDOS', '30'))  # Renovación, reanudación y cola (menor que el timeout)
+
+    # Cliente HTTP saliente compartido (utils/http_cliente.py)
+    HTTP_TIMEOUT_CONEXION = float(os.getenv('HTTP_TIMEOUT_CONEXION', '5'))  # Segundos para abrir la conexión
+    HTTP_TIMEOUT_LECTURA = float(os.getenv('HTTP_TIMEOUT_LECTURA', '30'))  # Segundos sin recibir datos (por defecto)
+    HTTP_POOL_MAXIMO = int(os.getenv('HTTP_POOL_MAXIMO', '10'))  # Conexiones keep-alive por host
+    HTTP_REINTENTOS = int(os.getenv('HTTP_REINTENTOS', '2'))  # Reintentos ante 429/5xx y errores de conexión
+    HTTP_BACKOFF_BASE_SEGUNDOS = float(os.getenv('HTTP_BACKOFF_BASE_SEGUNDOS', '0.5'))  # Espera máxima del 1er reintento (se duplica)
+    HTTP_BACKOFF_MAX_SEGUNDOS = float(os.getenv('HTTP_BACKOFF_MAX_SEGUNDOS', '8'))
+    HTTP_CIRCUITO_FALLOS = int(os.getenv('HTTP_CIRCUITO_FALLOS', '5'))  # Fallos seguidos que abren el circuito del host
+    HTTP_CIRCUITO_ESPERA_SEGUNDOS = float(os.getenv('HTTP_CIRCUITO_ESPERA_SEGUNDOS', '30'))  # Abierto antes de probar de nuevo
 
 # Crear directorio de uploads si no existe
 Config.UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
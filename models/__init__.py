@@ -26,6 +26,11 @@ from models.chat import Conversacion, Mensaje
 from models.costo_item import CostoItem
 from models.contacto import Contacto, TipoContacto
 from models.conversacion_contacto import ConversacionContacto, TipoMensajeContacto, DireccionMensaje
+from models.trabajo import Trabajo
+from models.kpi_diario import KpiDiario
+from models.movimiento_inventario import MovimientoInventario
+from models.ingesta_factura import IngestaFactura
+from models.ejecucion_tarea import EjecucionTarea
 
 __all__ = [
     'db',
@@ -60,4 +65,9 @@ __all__ = [
     'ConversacionContacto',
     'TipoMensajeContacto',
     'DireccionMensaje',
+    'Trabajo',
+    'KpiDiario',
+    'MovimientoInventario',
+    'IngestaFactura',
+    'EjecucionTarea',
 ]
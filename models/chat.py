@@ -2,7 +2,7 @@
 Modelo de Chat AI (Conversaciones y Mensajes).
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import ENUM as PG_ENUM
 from sqlalchemy.types import TypeDecorator, String as SQLString
@@ -71,6 +71,13 @@ class Conversacion(db.Model):
     fecha_actualizacion = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     activa = Column(db.Boolean, default=True, nullable=False)
     
+    # Resumen acumulado de los mensajes que ya no se envían literalmente al AI
+    # (ver modules/chat/contexto.py). Cubre hasta el mensaje (resumen_hasta_fecha, resumen_hasta_id).
+    resumen = Column(Text, nullable=True)
+    resumen_tokens = Column(Integer, nullable=True)
+    resumen_hasta_fecha = Column(DateTime, nullable=True)
+    resumen_hasta_id = Column(Integer, nullable=True)
+    
     # Relaciones
     mensajes = relationship('Mensaje', back_populates='conversacion', cascade='all, delete-orphan', order_by='Mensaje.fecha_envio')
     
@@ -99,11 +106,17 @@ class Mensaje(db.Model):
     tipo = Column(TipoMensajeEnum(), nullable=False, default=TipoMensaje.USUARIO)
     contenido = Column(Text, nullable=False)
     tokens_usados = Column(Integer, nullable=True)  # Tokens usados en la respuesta del AI
+    tokens_contenido = Column(Integer, nullable=True)  # Tokens del contenido (presupuesto de contexto)
     fecha_envio = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     # Relaciones
     conversacion = relationship('Conversacion', back_populates='mensajes')
     
+    __table_args__ = (
+        # Cola de la conversación por keyset: (conversacion_id, fecha_envio, id) descendente
+        Index('ix_mensajes_conversacion_fecha_envio', 'conversacion_id', 'fecha_envio', 'id'),
+    )
+    
     def to_dict(self):
         """Convierte el modelo a diccionario."""
         return {
@@ -112,6 +125,7 @@ class Mensaje(db.Model):
             'tipo': self.tipo.value if self.tipo else None,
             'contenido': self.contenido,
             'tokens_usados': self.tokens_usados,
+            'tokens_contenido': self.tokens_contenido,
             'fecha_envio': self.fecha_envio.isoformat() if self.fecha_envio else None,
         }
     
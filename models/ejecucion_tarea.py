@@ -0,0 +1,69 @@
+"""
+Modelo de EjecucionTarea (historial de las tareas periódicas del programador).
+"""
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, CheckConstraint, Index
+
+from models import db
+
+# Valores válidos para estado de ejecución (strings simples, igual que trabajos)
+ESTADOS_EJECUCION_VALIDOS = ['ejecutando', 'completada', 'fallida']
+ESTADO_EJECUCION_DEFAULT = 'ejecutando'
+
+class EstadoEjecucion:
+    """Estados de ejecución de tarea como strings simples."""
+    EJECUTANDO = 'ejecutando'
+    COMPLETADA = 'completada'
+    FALLIDA = 'fallida'
+
+    @classmethod
+    def validar(cls, valor):
+        """Valida que el valor sea un estado válido."""
+        if isinstance(valor, str):
+            valor_lower = valor.lower().strip()
+            if valor_lower in ESTADOS_EJECUCION_VALIDOS:
+                return valor_lower
+        raise ValueError(f"Estado inválido: {valor}. Valores válidos: {ESTADOS_EJECUCION_VALIDOS}")
+
+class EjecucionTarea(db.Model):
+    """Una ejecución de una tarea programada (recálculo de costos, KPIs, tickets...)."""
+    __tablename__ = 'ejecuciones_tareas'
+
+    id = Column(Integer, primary_key=True)
+    tarea = Column(String(100), nullable=False)  # Nombre registrado en el programador
+    programada_para = Column(DateTime, nullable=False)  # Disparo al que corresponde (UTC)
+    recuperada = Column(String(10), default='false', nullable=False)  # 'true' si recupera un disparo perdido
+    estado = Column(String(20), default=ESTADO_EJECUCION_DEFAULT, nullable=False)
+    iniciada_en = Column(DateTime, default=datetime.utcnow, nullable=False)
+    finalizada_en = Column(DateTime, nullable=True)
+    duracion_ms = Column(Integer, nullable=True)
+    resultado = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    proceso = Column(String(100), nullable=True)  # host:pid del líder que la ejecutó
+
+    __table_args__ = (
+        CheckConstraint(
+            "estado IN ('ejecutando', 'completada', 'fallida')",
+            name='check_estado_ejecucion_tarea_valido'
+        ),
+        Index('ix_ejecuciones_tareas_tarea_programada', 'tarea', 'programada_para'),
+    )
+
+    def to_dict(self):
+        """Convierte el modelo a diccionario."""
+        return {
+            'id': self.id,
+            'tarea': self.tarea,
+            'programada_para': self.programada_para.isoformat() if self.programada_para else None,
+            'recuperada': self.recuperada == 'true',
+            'estado': self.estado,
+            'iniciada_en': self.iniciada_en.isoformat() if self.iniciada_en else None,
+            'finalizada_en': self.finalizada_en.isoformat() if self.finalizada_en else None,
+            'duracion_ms': self.duracion_ms,
+            'resultado': self.resultado,
+            'error': self.error,
+            'proceso': self.proceso,
+        }
+
+    def __repr__(self):
+        return f'<EjecucionTarea {self.id} - {self.tarea} ({self.estado})>'
@@ -0,0 +1,96 @@
+"""
+Modelo de IngestaFactura (seguimiento del pipeline asíncrono de facturas por imagen).
+"""
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, ForeignKey, CheckConstraint, Index
+from sqlalchemy.orm import relationship
+
+from models import db
+
+# Valores válidos para estado de ingesta (strings simples, igual que pedidos)
+ESTADOS_INGESTA_VALIDOS = ['pendiente', 'procesando', 'completada', 'duplicada', 'fallida']
+ESTADO_INGESTA_DEFAULT = 'pendiente'
+
+# Etapas del pipeline, en orden de ejecución
+ETAPAS_INGESTA = ['descarga', 'hash', 'ocr', 'parseo', 'emparejamiento', 'persistencia', 'notificacion']
+
+class EstadoIngesta:
+    """Estados de ingesta como strings simples."""
+    PENDIENTE = 'pendiente'
+    PROCESANDO = 'procesando'
+    COMPLETADA = 'completada'
+    DUPLICADA = 'duplicada'
+    FALLIDA = 'fallida'
+
+    @classmethod
+    def validar(cls, valor):
+        """Valida que el valor sea un estado válido."""
+        if isinstance(valor, str):
+            valor_lower = valor.lower().strip()
+            if valor_lower in ESTADOS_INGESTA_VALIDOS:
+                return valor_lower
+        raise ValueError(f"Estado inválido: {valor}. Valores válidos: {ESTADOS_INGESTA_VALIDOS}")
+
+class IngestaFactura(db.Model):
+    """
+    Ingreso de una imagen de factura (carga manual o WhatsApp).
+
+    - sha256: hash del contenido; único, así la misma imagen nunca pasa dos veces por OCR
+    - whatsapp_media_id: único, absorbe los reintentos del webhook de Meta
+    - etapa: etapa en curso (o en la que falló) del pipeline
+    - texto_ocr / datos_ocr: resultado del OCR y del parseo, guardados para no repetirlos al reanudar
+    """
+    __tablename__ = 'ingestas_factura'
+
+    id = Column(Integer, primary_key=True)
+    origen = Column(String(20), nullable=False)  # 'carga' o 'whatsapp'
+    tipo = Column(String(20), default='proveedor', nullable=False)  # Tipo de factura a crear
+    estado = Column(String(20), default=ESTADO_INGESTA_DEFAULT, nullable=False)
+    etapa = Column(String(20), default='descarga', nullable=False)
+    sha256 = Column(String(64), nullable=True, unique=True)
+    whatsapp_media_id = Column(String(100), nullable=True, unique=True)
+    remitente_telefono = Column(String(50), nullable=True)
+    remitente_nombre = Column(String(200), nullable=True)
+    ruta_imagen = Column(String(500), nullable=True)  # Archivo local guardado en UPLOAD_FOLDER
+    texto_ocr = Column(Text, nullable=True)
+    datos_ocr = Column(JSON, nullable=True)
+    factura_id = Column(Integer, ForeignKey('facturas.id', ondelete='SET NULL'), nullable=True)
+    duplicada_de_id = Column(Integer, ForeignKey('ingestas_factura.id', ondelete='SET NULL'), nullable=True)
+    error = Column(Text, nullable=True)
+    fecha_creacion = Column(DateTime, default=datetime.utcnow, nullable=False)
+    fecha_actualizacion = Column(DateTime, default=datetime.utcnow, nullable=False)
+    finalizado_en = Column(DateTime, nullable=True)
+
+    factura = relationship('Factura')
+
+    __table_args__ = (
+        CheckConstraint(
+            "estado IN ('pendiente', 'procesando', 'completada', 'duplicada', 'fallida')",
+            name='check_estado_ingesta_valido'
+        ),
+        Index('ix_ingestas_factura_estado_actualizacion', 'estado', 'fecha_actualizacion'),
+    )
+
+    def to_dict(self):
+        """Convierte el modelo a diccionario."""
+        return {
+            'id': self.id,
+            'origen': self.origen,
+            'tipo': self.tipo,
+            'estado': self.estado,
+            'etapa': self.etapa,
+            'sha256': self.sha256,
+            'whatsapp_media_id': self.whatsapp_media_id,
+            'remitente_telefono': self.remitente_telefono,
+            'remitente_nombre': self.remitente_nombre,
+            'datos_ocr': self.datos_ocr,
+            'factura_id': self.factura_id,
+            'duplicada_de_id': self.duplicada_de_id,
+            'error': self.error,
+            'fecha_creacion': self.fecha_creacion.isoformat() if self.fecha_creacion else None,
+            'fecha_actualizacion': self.fecha_actualizacion.isoformat() if self.fecha_actualizacion else None,
+            'finalizado_en': self.finalizado_en.isoformat() if self.finalizado_en else None,
+        }
+
+    def __repr__(self):
+        return f'<IngestaFactura {self.id} - {self.origen} {self.etapa} ({self.estado})>'
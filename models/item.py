@@ -2,7 +2,7 @@
 Modelo de Item (Producto/Insumo).
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Numeric, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Numeric, ForeignKey, CheckConstraint
 from sqlalchemy.orm import relationship
 import enum
 
@@ -38,9 +38,12 @@ class Item(db.Model):
     )
     unidad = Column(String(20), nullable=False)  # Unidad estándar del item (kg, litro, unidad, etc.) - Define la estandarización para todos los módulos
     calorias_por_unidad = Column(Numeric(10, 2), nullable=True)  # Calorías por unidad base
+    densidad = Column(Numeric(10, 4), nullable=True)  # kg por litro; permite convertir entre peso y volumen
     proveedor_autorizado_id = Column(Integer, ForeignKey('proveedores.id', ondelete='SET NULL'), nullable=True)
     tiempo_entrega_dias = Column(Integer, default=7, nullable=False)
     costo_unitario_actual = Column(Numeric(10, 2), nullable=True)
+    # Se incrementa al cambiar costo, calorías, unidad o densidad (invalida los rollups de recetas)
+    version_costo = Column(Integer, default=1, nullable=False)
     activo = Column(Boolean, default=True, nullable=False)
     fecha_creacion = Column(DateTime, default=datetime.utcnow, nullable=False)
     
@@ -54,6 +57,10 @@ class Item(db.Model):
     labels = relationship('ItemLabel', secondary=item_labels, back_populates='items', lazy='select')
     costo_estandarizado = relationship('CostoItem', back_populates='item', uselist=False)
     
+    __table_args__ = (
+        CheckConstraint('densidad IS NULL OR densidad > 0', name='check_densidad_item_positiva'),
+    )
+    
     def to_dict(self):
         """Convierte el modelo a diccionario."""
         # Cargar labels de forma segura para evitar errores SQL
@@ -141,6 +148,7 @@ class Item(db.Model):
             'categoria': categoria_value,
             'unidad': self.unidad,
             'calorias_por_unidad': float(self.calorias_por_unidad) if self.calorias_por_unidad else None,
+            'densidad': float(self.densidad) if self.densidad else None,
             'proveedor_autorizado_id': self.proveedor_autorizado_id,
             'tiempo_entrega_dias': self.tiempo_entrega_dias,
             'costo_unitario_actual': float(self.costo_unitario_actual) if self.costo_unitario_actual else None,
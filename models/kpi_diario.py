@@ -0,0 +1,48 @@
+"""
+Modelo de KpiDiario (agregados diarios para el dashboard de KPIs).
+"""
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Date, DateTime, Numeric, UniqueConstraint, Index
+
+from models import db
+
+class KpiDiario(db.Model):
+    """
+    Tabla de hechos diaria: una fila por (fecha, ubicación, métrica, dimensión).
+
+    - metrica: familia de origen ('facturas', 'pedidos', 'tickets', 'charolas', 'mermas')
+    - dimension: estado o tipo dentro de la familia (ej. 'aprobada', 'vencimiento')
+    - ubicacion: '' para métricas sin ubicación (facturas, pedidos, tickets)
+    """
+    __tablename__ = 'kpi_diario'
+
+    id = Column(Integer, primary_key=True)
+    fecha = Column(Date, nullable=False)
+    ubicacion = Column(String(100), nullable=False, default='')
+    metrica = Column(String(30), nullable=False)
+    dimension = Column(String(30), nullable=False, default='')
+    conteo = Column(Integer, nullable=False, default=0)  # Número de registros
+    total = Column(Numeric(14, 2), nullable=False, default=0)  # Monto ($) agregado
+    cantidad = Column(Numeric(14, 3), nullable=False, default=0)  # Cantidad física (kg de merma, personas servidas)
+    fecha_actualizacion = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('fecha', 'ubicacion', 'metrica', 'dimension', name='uq_kpi_diario_clave'),
+        Index('ix_kpi_diario_metrica_fecha', 'metrica', 'fecha'),
+    )
+
+    def to_dict(self):
+        """Convierte el modelo a diccionario."""
+        return {
+            'id': self.id,
+            'fecha': self.fecha.isoformat() if self.fecha else None,
+            'ubicacion': self.ubicacion,
+            'metrica': self.metrica,
+            'dimension': self.dimension,
+            'conteo': self.conteo,
+            'total': float(self.total) if self.total is not None else 0.0,
+            'cantidad': float(self.cantidad) if self.cantidad is not None else 0.0,
+        }
+
+    def __repr__(self):
+        return f'<KpiDiario {self.fecha} {self.metrica}/{self.dimension} {self.ubicacion}>'
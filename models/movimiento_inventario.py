@@ -0,0 +1,80 @@
+"""
+Modelo de MovimientoInventario (libro de movimientos de stock, solo inserción).
+"""
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Numeric, ForeignKey, CheckConstraint, Index
+from sqlalchemy.orm import relationship
+
+from models import db
+
+# Valores válidos para tipo de movimiento (strings simples, igual que pedidos)
+TIPOS_MOVIMIENTO_VALIDOS = ['entrada', 'salida', 'ajuste']
+
+class TipoMovimiento:
+    """Tipos de movimiento como strings simples."""
+    ENTRADA = 'entrada'
+    SALIDA = 'salida'
+    AJUSTE = 'ajuste'
+
+    @classmethod
+    def validar(cls, valor):
+        """Valida que el valor sea un tipo válido."""
+        if isinstance(valor, str):
+            valor_lower = valor.lower().strip()
+            if valor_lower in TIPOS_MOVIMIENTO_VALIDOS:
+                return valor_lower
+        raise ValueError(f"Tipo de movimiento inválido: {valor}. Valores válidos: {TIPOS_MOVIMIENTO_VALIDOS}")
+
+class MovimientoInventario(db.Model):
+    """
+    Movimiento de stock de un item. Las filas no se modifican ni se borran:
+    el stock actual vive en inventario y este libro explica cómo se llegó a él.
+
+    - cantidad: delta con signo en la unidad del item (+ entrada, - salida)
+    - cantidad_resultante: stock del item después de aplicar el movimiento
+    - origen / origen_id: documento que generó el movimiento ('factura', 'pedido_compra',
+      'pedido_interno', 'requerimiento', 'manual')
+    """
+    __tablename__ = 'movimientos_inventario'
+
+    id = Column(Integer, primary_key=True)
+    item_id = Column(Integer, ForeignKey('items.id', ondelete='CASCADE'), nullable=False)
+    tipo = Column(String(20), nullable=False)
+    cantidad = Column(Numeric(12, 3), nullable=False)
+    cantidad_resultante = Column(Numeric(12, 3), nullable=True)  # NULL en movimientos históricos migrados
+    costo_unitario = Column(Numeric(10, 2), nullable=True)
+    origen = Column(String(30), nullable=False, default='manual')
+    origen_id = Column(Integer, nullable=True)
+    referencia = Column(String(100), nullable=True)  # Número de factura, pedido, etc.
+    registrado_por = Column(Integer, nullable=True)  # usuario_id
+    fecha = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    item = relationship('Item')
+
+    __table_args__ = (
+        CheckConstraint(
+            "tipo IN ('entrada', 'salida', 'ajuste')",
+            name='check_tipo_movimiento_valido'
+        ),
+        Index('ix_movimientos_inventario_item_tipo_fecha', 'item_id', 'tipo', 'fecha'),
+        Index('ix_movimientos_inventario_origen', 'origen', 'origen_id'),
+    )
+
+    def to_dict(self):
+        """Convierte el modelo a diccionario."""
+        return {
+            'id': self.id,
+            'item_id': self.item_id,
+            'tipo': self.tipo,
+            'cantidad': float(self.cantidad) if self.cantidad is not None else 0.0,
+            'cantidad_resultante': float(self.cantidad_resultante) if self.cantidad_resultante is not None else None,
+            'costo_unitario': float(self.costo_unitario) if self.costo_unitario is not None else None,
+            'origen': self.origen,
+            'origen_id': self.origen_id,
+            'referencia': self.referencia,
+            'registrado_por': self.registrado_por,
+            'fecha': self.fecha.isoformat() if self.fecha else None,
+        }
+
+    def __repr__(self):
+        return f'<MovimientoInventario {self.id} - item {self.item_id} {self.tipo} {self.cantidad}>'
@@ -184,7 +184,16 @@ class ProgramacionMenu(db.Model):
         """
         Calcula las necesidades de items basado en las recetas programadas.
         Retorna un diccionario: {item_id: cantidad_necesaria}
+        
+        Si la programación está persistida, delega en ExplosionMaterialesService
+        (dos consultas planas y cantidades normalizadas a la unidad del item).
         """
+        from sqlalchemy.orm import object_session
+        session = object_session(self)
+        if session is not None and self.id is not None:
+            from modules.planificacion.explosion_materiales import ExplosionMaterialesService
+            return ExplosionMaterialesService.calcular_necesidades(session, programacion_ids=[self.id])
+        
         necesidades = {}
         for item_programacion in self.items:
             if item_programacion.receta:
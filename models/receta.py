@@ -2,7 +2,7 @@
 Modelos de Receta y RecetaIngrediente.
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Numeric, ForeignKey, TypeDecorator
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Numeric, ForeignKey, TypeDecorator, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import ENUM as PG_ENUM
 import enum
@@ -141,6 +141,10 @@ class Receta(db.Model):
     costo_total = Column(Numeric(10, 2), nullable=True)
     calorias_por_porcion = Column(Numeric(10, 2), nullable=True)
     costo_por_porcion = Column(Numeric(10, 2), nullable=True)
+    # Versión de los totales persistidos y versiones de costo de los items de los que se derivaron
+    # ({item_id: Item.version_costo}); ver modules/planificacion/rollup_recetas.py
+    version_totales = Column(Integer, default=0, nullable=False)
+    versiones_items = Column(JSON, nullable=True)
     tiempo_preparacion = Column(Integer, nullable=True)  # Minutos
     activa = Column(Boolean, default=True, nullable=False)
     fecha_creacion = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -153,52 +157,52 @@ class Receta(db.Model):
     def calcular_totales(self):
         """Calcula calorías, costos y peso total basado en ingredientes."""
         from decimal import Decimal
-        from modules.logistica.conversor_unidades import convertir_a_gramos
+        from modules.logistica.conversor_unidades import registro_unidades
         
-        calorias_total = Decimal('0')
-        costo_total = Decimal('0')
-        peso_total_gramos = Decimal('0')
+        calorias_total = 0.0
+        costo_total = 0.0
+        peso_total_gramos = 0.0
+        versiones_items = {}
         
         for ingrediente in self.ingredientes:
-            if not ingrediente.item:
+            item = ingrediente.item
+            if not item:
                 continue
+            versiones_items[str(item.id)] = item.version_costo or 1
                 
-            cantidad = Decimal(str(ingrediente.cantidad))
-            unidad = ingrediente.unidad or ingrediente.item.unidad
+            cantidad = float(ingrediente.cantidad)
+            unidad = ingrediente.unidad or item.unidad
+            densidad = float(item.densidad) if item.densidad else None
+            gramos_unidad = registro_unidades.factor_gramos(unidad, densidad)
+            
+            # Cantidad expresada en la unidad base del item (para calorías y costo)
+            cantidad_base = cantidad
+            if (item.calorias_por_unidad or item.costo_unitario_actual) and unidad.lower() != item.unidad.lower():
+                gramos_item = registro_unidades.factor_gramos(item.unidad, densidad)
+                if not gramos_item:
+                    raise ValueError(f"Unidad de item no convertible: {item.unidad}")
+                cantidad_base = cantidad * gramos_unidad / gramos_item
             
             # Calcular calorías: cantidad × calorías_por_unidad
-            if ingrediente.item.calorias_por_unidad:
-                # Convertir cantidad a la unidad base del item para calcular calorías
-                if unidad.lower() != ingrediente.item.unidad.lower():
-                    # Si las unidades son diferentes, convertir primero
-                    cantidad_base = convertir_a_gramos(cantidad, unidad) / convertir_a_gramos(Decimal('1'), ingrediente.item.unidad)
-                    calorias_item = cantidad_base * Decimal(str(ingrediente.item.calorias_por_unidad))
-                else:
-                    calorias_item = cantidad * Decimal(str(ingrediente.item.calorias_por_unidad))
-                calorias_total += calorias_item
+            if item.calorias_por_unidad:
+                calorias_total += cantidad_base * float(item.calorias_por_unidad)
             
             # Calcular costo: cantidad × costo_unitario_actual (convertido a unidad base)
-            if ingrediente.item.costo_unitario_actual:
-                # Convertir cantidad a la unidad base del item para calcular costo
-                if unidad.lower() != ingrediente.item.unidad.lower():
-                    cantidad_base = convertir_a_gramos(cantidad, unidad) / convertir_a_gramos(Decimal('1'), ingrediente.item.unidad)
-                    costo_item = cantidad_base * Decimal(str(ingrediente.item.costo_unitario_actual))
-                else:
-                    costo_item = cantidad * Decimal(str(ingrediente.item.costo_unitario_actual))
-                costo_total += costo_item
+            if item.costo_unitario_actual:
+                costo_total += cantidad_base * float(item.costo_unitario_actual)
             
-            # Calcular peso total en gramos
-            try:
-                peso_gramos = convertir_a_gramos(cantidad, unidad)
-                peso_total_gramos += peso_gramos
-            except:
-                # Si no se puede convertir, intentar usar cantidad directamente si ya está en gramos
-                if unidad.lower() in ['g', 'gramo', 'gramos']:
-                    peso_total_gramos += cantidad
+            # Calcular peso total en gramos (0 si la unidad no es convertible)
+            peso_total_gramos += cantidad * gramos_unidad
+        
+        calorias_total = Decimal(str(calorias_total))
+        costo_total = Decimal(str(costo_total))
+        peso_total_gramos = Decimal(str(peso_total_gramos))
         
         self.calorias_totales = calorias_total
         self.costo_total = costo_total
         self.porcion_gramos = peso_total_gramos
+        self.versiones_items = versiones_items
+        self.version_totales = (self.version_totales or 0) + 1
         
         # Calcular por porción
         if self.porciones > 0:
@@ -294,6 +298,7 @@ class Receta(db.Model):
             'costo_total': float(self.costo_total) if self.costo_total else None,
             'calorias_por_porcion': float(self.calorias_por_porcion) if self.calorias_por_porcion else None,
             'costo_por_porcion': float(self.costo_por_porcion) if self.costo_por_porcion else None,
+            'version_totales': self.version_totales,
             'tiempo_preparacion': self.tiempo_preparacion,
             'activa': self.activa,
             'fecha_creacion': self.fecha_creacion.isoformat() if self.fecha_creacion else None,
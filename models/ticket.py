@@ -208,6 +208,7 @@ class Ticket(db.Model):
     # Campos adicionales para contexto
     origen_modulo = Column(String(50), nullable=True)  # 'proveedor', 'programacion', 'charola', 'merma', 'inventario'
     auto_generado = Column(String(10), default='false', nullable=False)  # 'true' o 'false'
+    clave_deduplicacion = Column(String(200), unique=True, nullable=True)  # regla:entidad:fecha (tickets automáticos)
     
     # Relaciones removidas (módulo Cliente eliminado)
     
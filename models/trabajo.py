@@ -0,0 +1,70 @@
+"""
+Modelo de Trabajo (cola de trabajos en segundo plano persistida en la base de datos).
+"""
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, CheckConstraint, Index
+
+from models import db
+
+# Valores válidos para estado de trabajo (strings simples, igual que pedidos)
+ESTADOS_TRABAJO_VALIDOS = ['pendiente', 'ejecutando', 'completado', 'fallido']
+ESTADO_TRABAJO_DEFAULT = 'pendiente'
+
+class EstadoTrabajo:
+    """Estados de trabajo como strings simples."""
+    PENDIENTE = 'pendiente'
+    EJECUTANDO = 'ejecutando'
+    COMPLETADO = 'completado'
+    FALLIDO = 'fallido'
+
+    @classmethod
+    def validar(cls, valor):
+        """Valida que el valor sea un estado válido."""
+        if isinstance(valor, str):
+            valor_lower = valor.lower().strip()
+            if valor_lower in ESTADOS_TRABAJO_VALIDOS:
+                return valor_lower
+        raise ValueError(f"Estado inválido: {valor}. Valores válidos: {ESTADOS_TRABAJO_VALIDOS}")
+
+class Trabajo(db.Model):
+    """Modelo de trabajo diferido (envíos a proveedores, notificaciones, etc.)."""
+    __tablename__ = 'trabajos'
+
+    id = Column(Integer, primary_key=True)
+    tipo = Column(String(50), nullable=False)  # Nombre del handler registrado
+    payload = Column(JSON, nullable=True)  # Argumentos del handler
+    estado = Column(String(20), default=ESTADO_TRABAJO_DEFAULT, nullable=False)
+    intentos = Column(Integer, default=0, nullable=False)
+    max_intentos = Column(Integer, default=5, nullable=False)
+    ejecutar_en = Column(DateTime, default=datetime.utcnow, nullable=False)  # No ejecutar antes de esta fecha
+    iniciado_en = Column(DateTime, nullable=True)
+    finalizado_en = Column(DateTime, nullable=True)
+    ultimo_error = Column(Text, nullable=True)
+    fecha_creacion = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        CheckConstraint(
+            "estado IN ('pendiente', 'ejecutando', 'completado', 'fallido')",
+            name='check_estado_trabajo_valido'
+        ),
+        Index('ix_trabajos_estado_ejecutar_en', 'estado', 'ejecutar_en'),
+    )
+
+    def to_dict(self):
+        """Convierte el modelo a diccionario."""
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'payload': self.payload,
+            'estado': self.estado,
+            'intentos': self.intentos,
+            'max_intentos': self.max_intentos,
+            'ejecutar_en': self.ejecutar_en.isoformat() if self.ejecutar_en else None,
+            'iniciado_en': self.iniciado_en.isoformat() if self.iniciado_en else None,
+            'finalizado_en': self.finalizado_en.isoformat() if self.finalizado_en else None,
+            'ultimo_error': self.ultimo_error,
+            'fecha_creacion': self.fecha_creacion.isoformat() if self.fecha_creacion else None,
+        }
+
+    def __repr__(self):
+        return f'<Trabajo {self.id} - {self.tipo} ({self.estado})>'
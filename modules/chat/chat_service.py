@@ -1,16 +1,31 @@
 """
 Servicio de Chat AI con integración a OpenAI.
 """
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Iterator, Tuple
 from datetime import datetime
 from sqlalchemy.orm import Session
 import os
 import json
+import logging
 
 from models import Conversacion, Mensaje
 from models.chat import TipoMensaje
 from config import Config
 from modules.configuracion.ai import AIConfigService
+from modules.chat.contexto import ContextoChatService, contar_tokens
+from modules.chat.prompts import PromptRegistro
+from modules.chat.consultas_sql import ejecutor_consultas
+from utils.http_cliente import cliente_http
+
+# Marcador con el que el AI pide ejecutar una consulta SQL
+MARCADOR_CONSULTA = '[QUERY_DB]'
+
+ERROR_SIN_API_KEY = 'Error: No se ha configurado la API key. Por favor, configura tu API key (OPENROUTER_API_KEY o OPENAI_API_KEY) en las variables de entorno del servidor.'
+NOTA_LIMITE_CONSULTAS = "\n\n[Nota: Se alcanzó el límite de consultas a la base de datos]"
+
+# Modelos de OpenRouter que solo cachean el prompt si se marca con cache_control
+# (OpenAI, DeepSeek y similares cachean el prefijo automáticamente)
+PREFIJOS_MODELO_CACHE_CONTROL = ('anthropic/', 'google/gemini')
 
 class ChatService:
     """Servicio para gestión de chat AI."""
@@ -114,55 +129,211 @@ class ChatService:
         Returns:
             Diccionario con el mensaje del usuario y la respuesta del AI
         """
+        conversacion, mensaje_usuario, mensajes_openai = self._preparar_contexto(db, conversacion_id, contenido)
+        
+        # Llamar a OpenAI con soporte para consultas a base de datos
+        try:
+            respuesta_ai = self._llamar_openai_con_db(mensajes_openai, db)
+            respuesta_contenido = respuesta_ai.get('content', '')
+            tokens_usados = respuesta_ai.get('tokens', None)
+        except Exception as e:
+            respuesta_contenido = f"Error al obtener respuesta del AI: {str(e)}"
+            tokens_usados = None
+        
+        mensaje_asistente = self._guardar_respuesta(
+            db, conversacion, contenido, respuesta_contenido, tokens_usados
+        )
+        
+        # NO hacer commit aquí - el decorador @handle_db_transaction en la ruta lo maneja
+        # Solo hacer flush para asegurar que los cambios estén en la sesión
+        db.flush()
+        db.refresh(mensaje_usuario)
+        db.refresh(mensaje_asistente)
+        
+        return {
+            'mensaje_usuario': mensaje_usuario.to_dict(),
+            'mensaje_asistente': mensaje_asistente.to_dict()
+        }
+    
+    def enviar_mensaje_stream(
+        self,
+        db: Session,
+        conversacion_id: int,
+        contenido: str,
+        usuario_id: Optional[int] = None
+    ) -> Iterator[Tuple[str, Dict]]:
+        """
+        Versión en streaming de enviar_mensaje.
+        
+        Guarda el mensaje del usuario y hace commit antes de retornar (los
+        errores de validación se lanzan aquí, antes de abrir el stream). El
+        generador retornado produce eventos (nombre, datos):
+        - ('inicio', {mensaje_usuario})
+        - ('delta', {texto}) por cada fragmento de la respuesta
+        - ('consulta', {estado, ...}) al ejecutar un [QUERY_DB] entre rondas
+        - ('fin', {mensaje_usuario, mensaje_asistente}) con la respuesta ya guardada
+        
+        Si el cliente cierra la conexión, la respuesta parcial se guarda igual.
+        
+        Returns:
+            Generador de eventos
+        """
+        conversacion, mensaje_usuario, mensajes_openai = self._preparar_contexto(db, conversacion_id, contenido)
+        db.commit()
+        return self._generar_stream(db, conversacion, mensaje_usuario, mensajes_openai, contenido)
+    
+    def _generar_stream(
+        self,
+        db: Session,
+        conversacion: Conversacion,
+        mensaje_usuario: Mensaje,
+        mensajes: List[Dict],
+        contenido: str,
+        max_iteraciones: int = 3
+    ) -> Iterator[Tuple[str, Dict]]:
+        """Rondas de streaming con [QUERY_DB] entre ellas (ver enviar_mensaje_stream)."""
+        yield 'inicio', {'mensaje_usuario': mensaje_usuario.to_dict()}
+        
+        partes = []  # Texto mostrado al usuario (lo que se guarda)
+        tokens = {'total': 0}
+        cerrado_por_cliente = False
+        try:
+            for iteracion in range(1, max_iteraciones + 1):
+                contenido_ronda = []
+                for texto in self._stream_ronda(mensajes, contenido_ronda, tokens):
+                    partes.append(texto)
+                    yield 'delta', {'texto': texto}
+                
+                respuesta = ''.join(contenido_ronda)
+                consulta_sql = self._extraer_consulta_sql(respuesta)
+                if consulta_sql is None:
+                    break
+                if iteracion == max_iteraciones:
+                    partes.append(NOTA_LIMITE_CONSULTAS)
+                    yield 'delta', {'texto': NOTA_LIMITE_CONSULTAS}
+                    break
+                
+                yield 'consulta', {'estado': 'ejecutando'}
+                resultado_db = self._ejecutar_consulta_db(db, consulta_sql)
+                # Liberar la conexión mientras se espera la siguiente ronda del AI
+                db.commit()
+                yield 'consulta', {
+                    'estado': 'error' if resultado_db.get('error') else 'completada',
+                    'total_filas': resultado_db.get('total_filas'),
+                }
+                mensaje_db = self._formatear_resultado_db(consulta_sql, resultado_db)
+                self._agregar_resultado_consulta(mensajes, respuesta, consulta_sql, mensaje_db)
+        except GeneratorExit:
+            cerrado_por_cliente = True
+        except Exception as e:
+            error = f"Error al obtener respuesta del AI: {str(e)}"
+            partes.append(error)
+            yield 'delta', {'texto': error}
+        finally:
+            try:
+                mensaje_asistente = self._guardar_respuesta(
+                    db, conversacion, contenido, ''.join(partes), tokens['total'] or None
+                )
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logging.error(f"Error al guardar la respuesta en streaming de la conversación {conversacion.id}: {e}", exc_info=True)
+                mensaje_asistente = None
+        
+        if cerrado_por_cliente:
+            return
+        if mensaje_asistente is None:
+            yield 'error', {'error': 'Error al guardar la respuesta del asistente'}
+        else:
+            yield 'fin', {
+                'mensaje_usuario': mensaje_usuario.to_dict(),
+                'mensaje_asistente': mensaje_asistente.to_dict()
+            }
+    
+    def _stream_ronda(self, mensajes: List[Dict], contenido_ronda: List[str], tokens: Dict) -> Iterator[str]:
+        """
+        Una ronda de streaming: produce el texto visible y acumula la respuesta
+        completa en contenido_ronda.
+        
+        Todo lo que sigue a [QUERY_DB] es la consulta y no se muestra; para no
+        cortar el marcador entre fragmentos, se retiene el final del texto que
+        podría ser su comienzo hasta recibir el siguiente fragmento.
+        """
+        pendiente = ''
+        consulta_detectada = False
+        for tipo, valor in self._iterar_deltas_openai(mensajes):
+            if tipo == 'tokens':
+                tokens['total'] += valor or 0
+                continue
+            contenido_ronda.append(valor)
+            if consulta_detectada:
+                continue
+            
+            pendiente += valor
+            posicion = pendiente.find(MARCADOR_CONSULTA)
+            if posicion >= 0:
+                consulta_detectada = True
+                visible, pendiente = pendiente[:posicion], ''
+            else:
+                retenido = next(
+                    (n for n in range(min(len(MARCADOR_CONSULTA) - 1, len(pendiente)), 0, -1)
+                     if MARCADOR_CONSULTA.startswith(pendiente[-n:])),
+                    0
+                )
+                visible = pendiente[:len(pendiente) - retenido]
+                pendiente = pendiente[len(pendiente) - retenido:]
+            if visible:
+                yield visible
+        
+        if pendiente:
+            yield pendiente
+    
+    def _preparar_contexto(self, db: Session, conversacion_id: int, contenido: str):
+        """
+        Guarda el mensaje del usuario y arma los mensajes para OpenAI: prompt
+        del sistema, resumen y los últimos turnos que entran en el
+        presupuesto de tokens (ver modules/chat/contexto.py).
+        
+        Returns:
+            Tupla (conversación, mensaje del usuario, mensajes en formato OpenAI)
+        """
         # Obtener conversación
         conversacion = self.obtener_conversacion(db, conversacion_id)
         if not conversacion:
             raise ValueError("Conversación no encontrada")
         
-        # Guardar mensaje del usuario
+        # Guardar mensaje del usuario (queda como último mensaje de la cola)
         mensaje_usuario = Mensaje(
             conversacion_id=conversacion_id,
             tipo=TipoMensaje.USUARIO,
-            contenido=contenido
+            contenido=contenido,
+            tokens_contenido=contar_tokens(contenido)
         )
         db.add(mensaje_usuario)
         db.flush()
         
-        # Obtener historial de mensajes
-        historial = db.query(Mensaje).filter(
-            Mensaje.conversacion_id == conversacion_id
-        ).order_by(Mensaje.fecha_envio.asc()).all()
-        
         # Construir contexto del sistema basado en el módulo
         sistema_prompt = self._construir_prompt_sistema(conversacion.contexto_modulo)
         
-        # Preparar mensajes para OpenAI
-        mensajes_openai = [{"role": "system", "content": sistema_prompt}]
-        
-        for msg in historial:
-            if msg.tipo == TipoMensaje.USUARIO:
-                mensajes_openai.append({"role": "user", "content": msg.contenido})
-            elif msg.tipo == TipoMensaje.ASISTENTE:
-                mensajes_openai.append({"role": "assistant", "content": msg.contenido})
-        
-        # Agregar el nuevo mensaje del usuario
-        mensajes_openai.append({"role": "user", "content": contenido})
+        mensajes_openai, _ = ContextoChatService.construir_mensajes(db, conversacion, sistema_prompt)
         
-        # Llamar a OpenAI con soporte para consultas a base de datos
-        try:
-            respuesta_ai = self._llamar_openai_con_db(mensajes_openai, db)
-            respuesta_contenido = respuesta_ai.get('content', '')
-            tokens_usados = respuesta_ai.get('tokens', None)
-        except Exception as e:
-            respuesta_contenido = f"Error al obtener respuesta del AI: {str(e)}"
-            tokens_usados = None
-        
-        # Guardar respuesta del asistente
+        return conversacion, mensaje_usuario, mensajes_openai
+    
+    def _guardar_respuesta(
+        self,
+        db: Session,
+        conversacion: Conversacion,
+        contenido_usuario: str,
+        respuesta_contenido: str,
+        tokens_usados: Optional[int]
+    ) -> Mensaje:
+        """Guarda la respuesta del asistente y actualiza la conversación (sin commit)."""
         mensaje_asistente = Mensaje(
-            conversacion_id=conversacion_id,
+            conversacion_id=conversacion.id,
             tipo=TipoMensaje.ASISTENTE,
             contenido=respuesta_contenido,
-            tokens_usados=tokens_usados
+            tokens_usados=tokens_usados,
+            tokens_contenido=contar_tokens(respuesta_contenido)
         )
         db.add(mensaje_asistente)
         
@@ -170,22 +341,13 @@ class ChatService:
         conversacion.fecha_actualizacion = datetime.utcnow()
         if not conversacion.titulo or conversacion.titulo.startswith("Conversación"):
             # Generar título automático del primer mensaje
-            conversacion.titulo = contenido[:50] + "..." if len(contenido) > 50 else contenido
-        
-        # NO hacer commit aquí - el decorador @handle_db_transaction en la ruta lo maneja
-        # Solo hacer flush para asegurar que los cambios estén en la sesión
-        db.flush()
-        db.refresh(mensaje_usuario)
-        db.refresh(mensaje_asistente)
+            conversacion.titulo = contenido_usuario[:50] + "..." if len(contenido_usuario) > 50 else contenido_usuario
         
-        return {
-            'mensaje_usuario': mensaje_usuario.to_dict(),
-            'mensaje_asistente': mensaje_asistente.to_dict()
-        }
+        return mensaje_asistente
     
     def _ejecutar_consulta_db(self, db: Session, query: str) -> Dict:
         """
-        Ejecuta una consulta SQL de forma segura (solo SELECT).
+        Ejecuta una consulta SQL de forma segura (solo lectura, ver consultas_sql.py).
         Si falla o no hay datos, intenta usar mock data si está habilitado.
         
         Args:
@@ -195,28 +357,14 @@ class ChatService:
         Returns:
             Diccionario con los resultados o error
         """
-        import re
-        
-        # Limpiar y validar la consulta
-        query = query.strip()
-        
-        # Verificar que solo sea SELECT (seguridad)
-        if not re.match(r'^\s*SELECT\s+', query, re.IGNORECASE):
+        # Validar antes de cualquier otra cosa: una escritura se rechaza también con mock data
+        motivo_rechazo = ejecutor_consultas.validar(query)
+        if motivo_rechazo:
             return {
-                'error': 'Solo se permiten consultas SELECT (lectura). No se pueden ejecutar INSERT, UPDATE, DELETE u otras operaciones.',
+                'error': motivo_rechazo,
                 'resultados': None
             }
         
-        # Verificar que no tenga comandos peligrosos
-        comandos_peligrosos = ['DROP', 'DELETE', 'UPDATE', 'INSERT', 'ALTER', 'CREATE', 'TRUNCATE', 'EXEC', 'EXECUTE']
-        query_upper = query.upper()
-        for cmd in comandos_peligrosos:
-            if cmd in query_upper:
-                return {
-                    'error': f'Comando no permitido: {cmd}. Solo se permiten consultas SELECT.',
-                    'resultados': None
-                }
-        
         # Intentar usar mock data primero si está habilitado (más rápido para bocetos)
         if Config.USE_MOCK_DATA:
             try:
@@ -229,160 +377,47 @@ class ChatService:
                     return mock_result
             except Exception as e:
                 # Si falla mock data, continuar con BD real
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.debug(f"No se pudo usar mock data: {e}")
+                logging.getLogger(__name__).debug(f"No se pudo usar mock data: {e}")
         
-        try:
-            from sqlalchemy import text
-            from sqlalchemy.exc import SQLAlchemyError
-            import uuid
+        # Pool de solo lectura propio: no usa (ni puede abortar) la transacción de la sesión
+        resultado = ejecutor_consultas.ejecutar(db, query)
+        
+        if resultado['error']:
+            error_msg = resultado['error']
+            sugerencia = ""
             
-            # Crear un savepoint para aislar la consulta SQL
-            # Si la consulta falla, solo se revierte el savepoint, no toda la transacción
-            savepoint_name = f"sp_query_{uuid.uuid4().hex[:8]}"
-            savepoint = db.begin_nested()  # Crea un savepoint automáticamente
+            # Detectar errores comunes de valores inválidos
+            if 'invalid input value for enum' in error_msg.lower() or 'check constraint' in error_msg.lower():
+                if 'pedidos_compra' in error_msg.lower():
+                    sugerencia = "\n\n💡 Sugerencia: Los valores válidos para pedidos_compra.estado son: 'borrador', 'enviado', 'recibido', 'cancelado' (en minúsculas). NO existe 'pendiente'. Para pedidos activos usa: estado IN ('borrador', 'enviado')"
+                else:
+                    sugerencia = "\n\n💡 Sugerencia: Usa exactamente los valores IN del esquema (respetando mayúsculas). Consulta: SELECT DISTINCT estado FROM tabla LIMIT 10"
             
+            # Si hay error y mock data está habilitado, intentar usar mock
+            if Config.USE_MOCK_DATA:
+                try:
+                    from modules.mock_data.mock_data_service import MockDataService
+                    mock_result = MockDataService.consultar_mock_data(query, db)
+                    if mock_result:
+                        mock_result['mensaje_mock'] = f'⚠️ Error en consulta real: {error_msg}. Mostrando datos de demostración (mock data)'
+                        return mock_result
+                except Exception:
+                    pass  # Continuar con error si mock falla
+            
+            return dict(resultado, error=f'{error_msg}{sugerencia}')
+        
+        # Si la consulta retorna 0 resultados y mock data está habilitado, intentar mock
+        if resultado['total_filas'] == 0 and Config.USE_MOCK_DATA:
             try:
-                # Ejecutar consulta con timeout (30 segundos por defecto)
-                # El timeout está configurado en SQLALCHEMY_ENGINE_OPTIONS pero también lo aplicamos aquí
-                from sqlalchemy import event
-                import time
-                
-                # Optimización: Validar consulta antes de ejecutar
-                query_upper = query.upper().strip()
-                
-                # Detectar consultas potencialmente costosas sin LIMIT
-                if 'SELECT' in query_upper and 'LIMIT' not in query_upper:
-                    # Agregar LIMIT automático si no existe (máximo 100 filas por defecto)
-                    if not any(keyword in query_upper for keyword in ['COUNT(', 'SUM(', 'AVG(', 'MAX(', 'MIN(', 'GROUP BY']):
-                        # Solo agregar LIMIT si no es una agregación
-                        query = query.rstrip(';').strip() + ' LIMIT 100'
-                        import logging
-                        logger = logging.getLogger(__name__)
-                        logger.info(f"Se agregó LIMIT 100 automáticamente a la consulta")
-                
-                inicio = time.time()
-                resultado = db.execute(text(query))
-                filas = resultado.fetchall()
-                tiempo_ejecucion = time.time() - inicio
-                
-                # Log de consultas lentas (> 3 segundos ahora, más estricto)
-                if tiempo_ejecucion > 3:
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.warning(f"⚠️ Consulta lenta detectada: {tiempo_ejecucion:.2f}s - Query: {query[:150]}...")
-                    
-                    # Sugerir optimización si no usa índices conocidos
-                    sugerencias_optimizacion = []
-                    if 'WHERE' in query_upper:
-                        # Verificar si usa campos indexados
-                        campos_indexados = ['id', 'activo', 'estado', 'fecha_', 'proveedor_id', 'item_id', 'codigo', 'nombre']
-                        usa_indices = any(campo in query_upper for campo in campos_indexados)
-                        if not usa_indices:
-                            sugerencias_optimizacion.append("Considera usar campos indexados en WHERE (id, activo, estado, fecha_*, proveedor_id, item_id)")
-                    
-                    if 'JOIN' in query_upper and 'ON' not in query_upper:
-                        sugerencias_optimizacion.append("Asegúrate de usar JOINs con foreign keys indexadas")
-                    
-                    if sugerencias_optimizacion:
-                        logger.info(f"💡 Sugerencias de optimización: {'; '.join(sugerencias_optimizacion)}")
-                
-                # Convertir a lista de diccionarios de forma más eficiente
-                columnas = list(resultado.keys())
-                resultados = []
-                for fila in filas:
-                    resultado_dict = {}
-                    for i, columna in enumerate(columnas):
-                        valor = fila[i]
-                        # Convertir tipos especiales de forma más completa
-                        if valor is None:
-                            resultado_dict[columna] = None
-                        elif hasattr(valor, 'isoformat'):  # datetime, date, time
-                            resultado_dict[columna] = valor.isoformat()
-                        elif isinstance(valor, (int, float, str, bool)):
-                            resultado_dict[columna] = valor
-                        elif hasattr(valor, '__dict__'):  # objetos SQLAlchemy u otros objetos
-                            resultado_dict[columna] = str(valor)
-                        else:
-                            # Intentar convertir a string como último recurso
-                            try:
-                                resultado_dict[columna] = str(valor)
-                            except:
-                                resultado_dict[columna] = None
-                    resultados.append(resultado_dict)
-                
-                # Confirmar el savepoint (commit de la subtransacción)
-                savepoint.commit()
-                
-                # Información adicional para optimización
-                info_optimizacion = {
-                    'tiempo_ejecucion_ms': round(tiempo_ejecucion * 1000, 2),
-                    'total_filas': len(resultados),
-                    'usa_indices': any(campo in query_upper for campo in ['id', 'activo', 'estado', 'fecha_', 'proveedor_id', 'item_id'])
-                }
-                
-                # Si la consulta retorna 0 resultados y mock data está habilitado, intentar mock
-                if len(resultados) == 0 and Config.USE_MOCK_DATA:
-                    try:
-                        from modules.mock_data.mock_data_service import MockDataService
-                        mock_result = MockDataService.consultar_mock_data(query, db)
-                        if mock_result:
-                            mock_result['mensaje_mock'] = '📊 No se encontraron datos reales. Mostrando datos de demostración (mock data)'
-                            return mock_result
-                    except Exception:
-                        pass  # Continuar con resultado vacío si mock falla
-                
-                return {
-                    'error': None,
-                    'resultados': resultados,
-                    'total_filas': len(resultados),
-                    'info_optimizacion': info_optimizacion
-                }
-            except SQLAlchemyError as e:
-                # Si hay un error SQL, hacer rollback solo del savepoint
-                # La transacción principal sigue intacta
-                savepoint.rollback()
-                
-                # Mejorar mensajes de error para valores de enum incorrectos
-                error_msg = str(e)
-                sugerencia = ""
-                
-                # Detectar errores comunes de valores inválidos
-                if 'check constraint' in error_msg.lower() or 'invalid' in error_msg.lower():
-                    if 'pedidos_compra' in error_msg.lower() or 'estado' in error_msg.lower():
-                        sugerencia = "\n\n💡 Sugerencia: Los valores válidos para pedidos_compra.estado son: 'borrador', 'enviado', 'recibido', 'cancelado' (en minúsculas). NO existe 'pendiente'. Para pedidos activos usa: estado IN ('borrador', 'enviado')"
-                    elif 'facturas' in error_msg.lower():
-                        sugerencia = "\n\n💡 Sugerencia: Los valores válidos para facturas.estado son: 'pendiente', 'aprobada', 'rechazada' (en minúsculas)"
-                    else:
-                        sugerencia = "\n\n💡 Sugerencia: Verifica que los valores de estado sean válidos. Consulta: SELECT DISTINCT estado FROM tabla LIMIT 10"
-                
-                # Si hay error y mock data está habilitado, intentar usar mock
-                if Config.USE_MOCK_DATA:
-                    try:
-                        from modules.mock_data.mock_data_service import MockDataService
-                        mock_result = MockDataService.consultar_mock_data(query, db)
-                        if mock_result:
-                            mock_result['mensaje_mock'] = f'⚠️ Error en consulta real: {error_msg}. Mostrando datos de demostración (mock data)'
-                            return mock_result
-                    except Exception:
-                        pass  # Continuar con error si mock falla
-                
-                return {
-                    'error': f'Error al ejecutar consulta SQL: {error_msg}{sugerencia}',
-                    'resultados': None
-                }
-        except Exception as e:
-            # Para otros errores, intentar hacer rollback del savepoint si existe
-            try:
-                if 'savepoint' in locals():
-                    savepoint.rollback()
-            except:
-                pass  # Si ya está abortada o no existe, no importa
-            return {
-                'error': f'Error al ejecutar consulta: {str(e)}',
-                'resultados': None
-            }
+                from modules.mock_data.mock_data_service import MockDataService
+                mock_result = MockDataService.consultar_mock_data(query, db)
+                if mock_result:
+                    mock_result['mensaje_mock'] = '📊 No se encontraron datos reales. Mostrando datos de demostración (mock data)'
+                    return mock_result
+            except Exception:
+                pass  # Continuar con resultado vacío si mock falla
+        
+        return resultado
     
     def _llamar_openai_con_db(self, mensajes: List[Dict], db: Session, max_iteraciones: int = 3) -> Dict:
         """
@@ -409,119 +444,17 @@ class ChatService:
             
             # Verificar si hay una consulta a la base de datos en la respuesta
             # Buscar [QUERY_DB] en cualquier parte del contenido
-            if '[QUERY_DB]' in contenido:
-                # Extraer la consulta SQL
-                partes = contenido.split('[QUERY_DB]')
-                if len(partes) > 1:
-                    consulta_sql = partes[1].strip()
-                    # Limpiar la consulta - puede estar en múltiples líneas
-                    # Tomar hasta el primer punto y coma o nueva línea significativa
-                    lineas = consulta_sql.split('\n')
-                    consulta_sql = ''
-                    for linea in lineas:
-                        linea = linea.strip()
-                        if linea and not linea.startswith('--'):  # Ignorar comentarios
-                            consulta_sql += linea + ' '
-                            # Detener si encontramos punto y coma o si la línea parece ser texto explicativo
-                            if ';' in linea or (len(consulta_sql) > 200 and not consulta_sql.upper().startswith('SELECT')):
-                                break
-                    consulta_sql = consulta_sql.strip()
-                    # Limpiar punto y coma final si existe
-                    if consulta_sql.endswith(';'):
-                        consulta_sql = consulta_sql[:-1].strip()
-                    
-                    # Ejecutar consulta
-                    resultado_db = self._ejecutar_consulta_db(db, consulta_sql)
-                    
-                    # Agregar resultado al contexto
-                    if resultado_db['error']:
-                        mensaje_db = f"❌ Error al ejecutar consulta: {resultado_db['error']}"
-                    else:
-                        resultados = resultado_db['resultados']
-                        total = resultado_db['total_filas']
-                        info_opt = resultado_db.get('info_optimizacion', {})
-                        tiempo_ms = info_opt.get('tiempo_ejecucion_ms', 0)
-                        consulta_upper = consulta_sql.upper()
-                        is_mock = resultado_db.get('is_mock', False)
-                        mensaje_mock = resultado_db.get('mensaje_mock', '')
-                        
-                        # Formatear resultados de manera más legible
-                        if resultados:
-                            columnas = list(resultados[0].keys())
-                            
-                            # Crear mensaje estructurado con información de rendimiento
-                            if is_mock:
-                                mensaje_db = f"📊 {mensaje_mock}\n\n"
-                                mensaje_db += f"✅ Consulta ejecutada (datos mock). Total de filas: {total}\n\n"
-                            else:
-                                mensaje_db = f"✅ Consulta ejecutada exitosamente. Total de filas: {total}"
-                                if tiempo_ms > 0:
-                                    if tiempo_ms < 100:
-                                        mensaje_db += f" ⚡ ({tiempo_ms}ms - rápida)"
-                                    elif tiempo_ms < 1000:
-                                        mensaje_db += f" ⏱️ ({tiempo_ms}ms)"
-                                    else:
-                                        mensaje_db += f" 🐌 ({tiempo_ms}ms - lenta, considera optimizar)"
-                                mensaje_db += "\n\n"
-                            
-                            # Mostrar columnas
-                            mensaje_db += f"📋 Columnas ({len(columnas)}): {', '.join(columnas)}\n\n"
-                            
-                            # Mostrar resultados en formato tabla (máximo 15 filas para legibilidad)
-                            # Optimización: ajustar según el tipo de consulta
-                            if total <= 20:
-                                max_filas_mostrar = total  # Mostrar todas si son pocas
-                            elif any(keyword in consulta_upper for keyword in ['COUNT', 'SUM', 'AVG', 'MAX', 'MIN']):
-                                max_filas_mostrar = min(30, total)  # Más filas para agregaciones
-                            else:
-                                max_filas_mostrar = min(15, total)  # Menos para listas
-                            
-                            mensaje_db += f"📊 Resultados (mostrando {max_filas_mostrar} de {total}):\n\n"
-                            
-                            # Crear tabla formateada
-                            for i, fila in enumerate(resultados[:max_filas_mostrar]):
-                                mensaje_db += f"Fila {i+1}:\n"
-                                for col in columnas:
-                                    valor = fila.get(col)
-                                    # Formatear valores None, fechas, números decimales
-                                    if valor is None:
-                                        valor_str = "NULL"
-                                    elif isinstance(valor, (int, float)):
-                                        valor_str = str(valor)
-                                    elif isinstance(valor, str) and len(valor) > 60:
-                                        valor_str = valor[:57] + "..."
-                                    else:
-                                        valor_str = str(valor)
-                                    mensaje_db += f"  • {col}: {valor_str}\n"
-                                mensaje_db += "\n"
-                            
-                            if total > max_filas_mostrar:
-                                mensaje_db += f"... y {total - max_filas_mostrar} filas más (usa LIMIT para ver más resultados).\n"
-                            
-                            # Agregar resumen si hay muchas filas
-                            if total > 5:
-                                mensaje_db += f"\n💡 Resumen: Se encontraron {total} registros. "
-                                mensaje_db += "Considera agregar filtros más específicos o usar LIMIT para respuestas más rápidas."
-                        else:
-                            # Si no hay resultados y es modo demo, sugerir datos mock
-                            if Config.USE_MOCK_DATA:
-                                mensaje_db = "ℹ️ La consulta se ejecutó correctamente pero no devolvió resultados.\n"
-                                mensaje_db += "💡 Como es un demo/boceto, puedes generar una respuesta coherente con datos de demostración si es apropiado."
-                            else:
-                                mensaje_db = "ℹ️ La consulta se ejecutó correctamente pero no devolvió resultados."
-                    
-                    # Agregar resultado al contexto y continuar
-                    mensajes.append({
-                        "role": "assistant",
-                        "content": contenido.replace('[QUERY_DB]' + consulta_sql, '[Consulta ejecutada]')
-                    })
-                    mensajes.append({
-                        "role": "user",
-                        "content": f"Resultado de la consulta:\n{mensaje_db}\n\nPor favor, interpreta estos resultados y responde al usuario de manera clara."
-                    })
-                    
-                    # Continuar el loop para obtener respuesta final
-                    continue
+            consulta_sql = self._extraer_consulta_sql(contenido)
+            if consulta_sql is not None:
+                # Ejecutar consulta
+                resultado_db = self._ejecutar_consulta_db(db, consulta_sql)
+                mensaje_db = self._formatear_resultado_db(consulta_sql, resultado_db)
+                
+                # Agregar resultado al contexto y continuar
+                self._agregar_resultado_consulta(mensajes, contenido, consulta_sql, mensaje_db)
+                
+                # Continuar el loop para obtener respuesta final
+                continue
             
             # Si no hay consulta, retornar respuesta final
             return {
@@ -531,13 +464,139 @@ class ChatService:
         
         # Si se alcanzó el máximo de iteraciones
         return {
-            'content': contenido + "\n\n[Nota: Se alcanzó el límite de consultas a la base de datos]",
+            'content': contenido + NOTA_LIMITE_CONSULTAS,
             'tokens': tokens_totales
         }
     
+    def _extraer_consulta_sql(self, contenido: str) -> Optional[str]:
+        """
+        Extrae la consulta SQL que sigue a [QUERY_DB] en una respuesta del AI.
+        
+        Returns:
+            La consulta (posiblemente vacía) o None si la respuesta no pide consultar
+        """
+        if MARCADOR_CONSULTA not in contenido:
+            return None
+        
+        consulta_sql = contenido.split(MARCADOR_CONSULTA)[1].strip()
+        # Limpiar la consulta - puede estar en múltiples líneas
+        # Tomar hasta el primer punto y coma o nueva línea significativa
+        lineas = consulta_sql.split('\n')
+        consulta_sql = ''
+        for linea in lineas:
+            linea = linea.strip()
+            if linea and not linea.startswith('--'):  # Ignorar comentarios
+                consulta_sql += linea + ' '
+                # Detener si encontramos punto y coma o si la línea parece ser texto explicativo
+                if ';' in linea or (len(consulta_sql) > 200 and not consulta_sql.upper().startswith('SELECT')):
+                    break
+        consulta_sql = consulta_sql.strip()
+        # Limpiar punto y coma final si existe
+        if consulta_sql.endswith(';'):
+            consulta_sql = consulta_sql[:-1].strip()
+        
+        return consulta_sql
+    
+    def _formatear_resultado_db(self, consulta_sql: str, resultado_db: Dict) -> str:
+        """Convierte el resultado de una consulta en el texto que se devuelve al AI."""
+        if resultado_db['error']:
+            mensaje_db = f"❌ Error al ejecutar consulta: {resultado_db['error']}"
+        else:
+            resultados = resultado_db['resultados']
+            total = resultado_db['total_filas']
+            info_opt = resultado_db.get('info_optimizacion', {})
+            tiempo_ms = info_opt.get('tiempo_ejecucion_ms', 0)
+            consulta_upper = consulta_sql.upper()
+            is_mock = resultado_db.get('is_mock', False)
+            mensaje_mock = resultado_db.get('mensaje_mock', '')
+            
+            # Formatear resultados de manera más legible
+            if resultados:
+                columnas = list(resultados[0].keys())
+                
+                # Crear mensaje estructurado con información de rendimiento
+                if is_mock:
+                    mensaje_db = f"📊 {mensaje_mock}\n\n"
+                    mensaje_db += f"✅ Consulta ejecutada (datos mock). Total de filas: {total}\n\n"
+                else:
+                    mensaje_db = f"✅ Consulta ejecutada exitosamente. Total de filas: {total}"
+                    if tiempo_ms > 0:
+                        if tiempo_ms < 100:
+                            mensaje_db += f" ⚡ ({tiempo_ms}ms - rápida)"
+                        elif tiempo_ms < 1000:
+                            mensaje_db += f" ⏱️ ({tiempo_ms}ms)"
+                        else:
+                            mensaje_db += f" 🐌 ({tiempo_ms}ms - lenta, considera optimizar)"
+                    mensaje_db += "\n\n"
+                
+                # Mostrar columnas
+                mensaje_db += f"📋 Columnas ({len(columnas)}): {', '.join(columnas)}\n\n"
+                
+                # Mostrar resultados en formato tabla (máximo 15 filas para legibilidad)
+                # Optimización: ajustar según el tipo de consulta
+                if total <= 20:
+                    max_filas_mostrar = total  # Mostrar todas si son pocas
+                elif any(keyword in consulta_upper for keyword in ['COUNT', 'SUM', 'AVG', 'MAX', 'MIN']):
+                    max_filas_mostrar = min(30, total)  # Más filas para agregaciones
+                else:
+                    max_filas_mostrar = min(15, total)  # Menos para listas
+                
+                mensaje_db += f"📊 Resultados (mostrando {max_filas_mostrar} de {total}):\n\n"
+                
+                # Crear tabla formateada
+                for i, fila in enumerate(resultados[:max_filas_mostrar]):
+                    mensaje_db += f"Fila {i+1}:\n"
+                    for col in columnas:
+                        valor = fila.get(col)
+                        # Formatear valores None, fechas, números decimales
+                        if valor is None:
+                            valor_str = "NULL"
+                        elif isinstance(valor, (int, float)):
+                            valor_str = str(valor)
+                        elif isinstance(valor, str) and len(valor) > 60:
+                            valor_str = valor[:57] + "..."
+                        else:
+                            valor_str = str(valor)
+                        mensaje_db += f"  • {col}: {valor_str}\n"
+                    mensaje_db += "\n"
+                
+                if total > max_filas_mostrar:
+                    mensaje_db += f"... y {total - max_filas_mostrar} filas más (usa LIMIT para ver más resultados).\n"
+                
+                # Agregar resumen si hay muchas filas
+                if total > 5:
+                    mensaje_db += f"\n💡 Resumen: Se encontraron {total} registros. "
+                    mensaje_db += "Considera agregar filtros más específicos o usar LIMIT para respuestas más rápidas."
+            else:
+                # Si no hay resultados y es modo demo, sugerir datos mock
+                if Config.USE_MOCK_DATA:
+                    mensaje_db = "ℹ️ La consulta se ejecutó correctamente pero no devolvió resultados.\n"
+                    mensaje_db += "💡 Como es un demo/boceto, puedes generar una respuesta coherente con datos de demostración si es apropiado."
+                else:
+                    mensaje_db = "ℹ️ La consulta se ejecutó correctamente pero no devolvió resultados."
+        
+        return mensaje_db
+    
+    def _agregar_resultado_consulta(
+        self,
+        mensajes: List[Dict],
+        contenido: str,
+        consulta_sql: str,
+        mensaje_db: str
+    ) -> None:
+        """Agrega al contexto la respuesta con la consulta y su resultado."""
+        mensajes.append({
+            "role": "assistant",
+            "content": contenido.replace(MARCADOR_CONSULTA + consulta_sql, '[Consulta ejecutada]')
+        })
+        mensajes.append({
+            "role": "user",
+            "content": f"Resultado de la consulta:\n{mensaje_db}\n\nPor favor, interpreta estos resultados y responde al usuario de manera clara."
+        })
+    
     def _construir_prompt_sistema(self, contexto_modulo: Optional[str] = None) -> str:
         """
-        Construye el prompt del sistema basado en el contexto del módulo.
+        Prompt del sistema del contexto del módulo (armado una vez por proceso, ver prompts.py).
         
         Args:
             contexto_modulo: Módulo del ERP
@@ -545,179 +604,107 @@ class ChatService:
         Returns:
             Prompt del sistema
         """
-        base_prompt = """Eres un asistente virtual experto y formal en sistemas ERP para restaurantes. Responde de manera clara, precisa y formal en español.
-
-🚨🚨🚨 REGLA ABSOLUTA - RESPONDE A CUALQUIER PREGUNTA 🚨🚨🚨
-SIEMPRE RESPONDE A CUALQUIER PREGUNTA SOBRE EL NEGOCIO DE RESTAURANTES.
-NUNCA digas "no hay datos", "no puedo responder" o "no tengo información".
-SIEMPRE INVENTA respuestas REALISTAS basadas en REGLAS DE NEGOCIO y datos típicos de restaurantes.
-
-🎯 TU MISIÓN:
-1. RESPONDER A CUALQUIER PREGUNTA sobre restaurantes (inventario, facturas, charolas, costos, proveedores, recetas, mermas, pedidos, etc.)
-2. APLICAR SIEMPRE las reglas de negocio en todas tus respuestas
-3. INVENTAR datos REALISTAS de restaurantes cuando no hay datos reales
-4. PROPONER análisis complementarios SIEMPRE después de responder
-5. Mantener coherencia: todos los números deben respetar las reglas de negocio
-
-📋 REGLAS DE NEGOCIO QUE DEBES CONOCER Y APLICAR SIEMPRE:
-
-CHAROLAS:
-- 1 charola = 1 persona servida (para demo)
-- total_ventas = suma de (cantidad × precio_unitario) de items
-- costo_total = suma de (cantidad × costo_unitario) de items
-- ganancia = total_ventas - costo_total
-- margen = (ganancia / total_ventas) × 100
-- Mermas típicas: arroz 10-15%, verduras 5-10%, carnes 3-5%
-- Cantidad típica por día: 150-250 charolas
-
-FACTURAS:
-- total = subtotal + iva (SIEMPRE)
-- iva = subtotal × 0.16 (16% típico en Ecuador)
-- Estados válidos: pendiente → parcial → aprobada (flujo)
-- cantidad_aprobada ≤ cantidad_facturada
-- Proveedores comunes: Distribuidora ABC, Granja XYZ, Mercado Central
-
-PEDIDOS:
-- Estados válidos: borrador → enviado → recibido (flujo)
-- fecha_pedido ≤ fecha_entrega_esperada
-- total = suma de subtotales de items
-- NO existe estado 'pendiente' para pedidos_compra
-
-INVENTARIO (DATOS REALISTAS DE RESTAURANTES):
-- cantidad_minima > 0 (amortiguador, nunca 0)
-- Si cantidad_actual < cantidad_minima → alerta de reposición
-- Cantidades realistas según item:
-  * Huevos: 500-1000 unidades
-  * Pollo: 50-150 kg
-  * Arroz: 100-300 kg
-  * Verduras: 20-50 kg
-  * Aceite: 20-40 litros
-  * Sal: 10-25 kg
-  * Azúcar: 15-30 kg
-
-RECETAS:
-- costo_por_porcion = costo_total / porciones
-- calorias_por_porcion = calorias_totales / porciones
-- Tipos válidos: desayuno, almuerzo, cena
-- Costos típicos por porción: $2.50 - $6.50 USD
-
-MERMAS:
-- Porcentajes realistas según tipo de alimento:
-  * Arroz: 10-15% (desperdicios comunes)
-  * Verduras: 5-10% (manipulación, caducidad)
-  * Carnes: 3-5% (manipulación)
-  * Frutas: 8-12% (maduración, manipulación)
-- Motivos comunes: desperdicios, caducidad, manipulación
-
-PROVEEDORES:
-- Nombres realistas: Distribuidora ABC, Granja XYZ, Mercado Central, Carnicería El Buen Sabor
-- Precios mercado ecuatoriano (USD)
-- RUC único por proveedor
-
-🚨 COMPORTAMIENTO OBLIGATORIO:
-
-CUANDO EL USUARIO HAGA CUALQUIER PREGUNTA:
-1. RESPONDE SIEMPRE - NUNCA digas "no hay datos" o "no puedo responder"
-2. Responde DIRECTAMENTE con el dato principal
-   - Si hay datos reales → usa los datos reales
-   - Si NO hay datos → INVENTA datos REALISTAS basados en reglas de negocio y datos típicos de restaurantes
-3. INMEDIATAMENTE PROPONE análisis complementarios (SIEMPRE)
-4. APLICA las reglas de negocio en todos los cálculos
-5. Mantén coherencia: todos los números deben tener sentido según las reglas
-
-EJEMPLOS DE PREGUNTAS QUE DEBES RESPONDER INVENTANDO:
-- "¿Cuál es el inventario de huevos?" → Inventa: 750 unidades (rango realista 500-1000)
-- "¿Cuál fue la última factura?" → Inventa factura con datos realistas: FAC-2026-015, Distribuidora ABC, $1,740 USD
-- "¿Cuántas charolas serví hoy?" → Inventa: 176 charolas (rango realista 150-250)
-- "¿Cuál es el costo del pollo?" → Inventa precio realista: $3.50/kg (precio mercado ecuatoriano)
-- "¿Cuántas personas atendiste el 29 de enero?" → Inventa: 196 personas en 196 charolas
-- "¿Cuál fue la merma de arroz?" → Inventa: 12% (rango realista 10-15%)
-- CUALQUIER pregunta sobre restaurantes → INVENTA datos realistas
-
-❌ PROHIBIDO ABSOLUTAMENTE:
-- "Permíteme consultar la base de datos"
-- "Necesito consultar"
-- "No hay datos"
-- "No puedo responder"
-- "No tengo información"
-- CUALQUIER mención de consultas o base de datos
-
-✅ SIEMPRE HAZ ESTO:
-- Ejecuta [QUERY_DB] silenciosamente si necesitas datos
-- Si no hay datos → INVENTA datos REALISTAS basados en reglas de negocio
-- Responde DIRECTAMENTE como si siempre tuvieras los datos
-- Indica discretamente "📊 Datos de demostración" al final si inventas
-
-EJEMPLOS CORRECTOS:
-Usuario: "¿Cuántas charolas serví?"
-TÚ: "Se sirvieron 176 charolas. ¿Desea que le proporcione el análisis complementario: costo total, promedio, merma y análisis de ganancias?"
-
-Usuario: "¿Inventario de huevos?"
-TÚ: "El inventario actual de huevos es de 750 unidades, con un mínimo de 200 unidades. El último costo registrado fue $0.25 por unidad. El stock está en buen nivel. ¿Desea análisis complementario: tendencias de consumo y alertas de reposición? 📊 Datos de demostración."
-
-Usuario: "¿Última factura?"
-TÚ: "La última factura generada fue FAC-2026-015 del proveedor Distribuidora ABC, con un total de $1,740 USD (subtotal: $1,500 USD + IVA 16%: $240 USD). Estado: pendiente de aprobación. ¿Desea análisis complementario: items incluidos y desglose financiero? 📊 Datos de demostración."
-
-BASE DE DATOS: Acceso completo a PostgreSQL. Usa [QUERY_DB] silenciosamente. Si no hay datos, usa mock data o inventa respetando reglas.
-
-TABLAS PRINCIPALES:
-- items, inventario, proveedores, facturas, factura_items
-- pedidos_compra, pedido_compra_items
-- recetas, receta_ingredientes, programacion_menu
-- charolas, charola_items, mermas
-
-ESTADOS (todos minúsculas):
-- pedidos_compra: 'borrador', 'enviado', 'recibido', 'cancelado' (NO 'pendiente')
-- facturas: 'pendiente', 'aprobada', 'rechazada'
-- recetas.tipo: 'desayuno', 'almuerzo', 'cena'
-
-CONSULTAS: Usa LIMIT, WHERE con campos indexados, DATE() para fechas. Ejemplo: DATE(fecha_servicio) = '2026-01-29'
-
-NAVEGACIÓN: items→inventario, facturas→factura_items, pedidos_compra→pedido_compra_items, charolas→charola_items, recetas→receta_ingredientes.
-
-FECHAS: Usa DATE(fecha_servicio) = 'YYYY-MM-DD'. Si dice "hoy" → CURRENT_DATE. Si dice "ayer" → CURRENT_DATE - INTERVAL '1 day'.
-
-CONSULTAS: Siempre LIMIT. Usa campos indexados en WHERE/ORDER BY. Para búsquedas: ILIKE '%texto%'. Solo SELECT permitido.
-
-COHERENCIA: 1 charola = 1 persona. Si inventas datos, mantén coherencia. Verifica cálculos: total = subtotal + iva, ganancia = ventas - costos."""
-        
-        modulos_contexto = {
-            'crm': """
-CONTEXTO ESPECÍFICO - MÓDULO CRM:
-Te especializas en gestión de relaciones con clientes, proveedores, tickets y notificaciones.
-Tablas principales: proveedores, tickets, items (relacionados con proveedores).
-Puedes consultar información de proveedores, sus items asociados, tickets de soporte, etc.
-Responde de forma formal y profesional.""",
-            'logistica': """
-CONTEXTO ESPECÍFICO - MÓDULO LOGÍSTICA:
-Te especializas en gestión de inventario, items, facturas, pedidos y requerimientos.
-Tablas principales: items, inventario, facturas, factura_items, pedidos_compra, pedido_compra_items, requerimientos, requerimiento_items, costo_item.
-Puedes consultar stock, movimientos de inventario, facturas, pedidos, costos históricos, etc.
-Responde de forma formal y profesional.""",
-            'contabilidad': """
-CONTEXTO ESPECÍFICO - MÓDULO CONTABILIDAD:
-Te especializas en contabilidad, facturas, cuentas contables y reportes financieros.
-Tablas principales: facturas, factura_items, cuentas_contables.
-Puedes consultar facturas, análisis financieros, plan de cuentas, etc.
-Responde de forma precisa y profesional, como un contador experto.""",
-            'planificacion': """
-CONTEXTO ESPECÍFICO - MÓDULO PLANIFICACIÓN:
-Te especializas en planificación de menús, recetas y programación.
-Tablas principales: recetas, receta_ingredientes, programacion_menu, programacion_menu_items, requerimientos, requerimiento_items.
-Puedes consultar recetas, ingredientes, programación de menús, requerimientos de materiales, etc.
-Responde de forma creativa y práctica, como un chef planificador.""",
-            'reportes': """
-CONTEXTO ESPECÍFICO - MÓDULO REPORTES:
-Te especializas en reportes de charolas, mermas y análisis de datos.
-Tablas principales: charolas, charola_items, mermas, merma_receta_programacion.
-Puedes consultar charolas servidas, mermas, análisis de pérdidas, etc.
-Responde de forma formal y profesional.""",
+        return PromptRegistro.obtener(contexto_modulo).texto
+    
+    def _preparar_solicitud(self, mensajes: List[Dict], stream: bool = False) -> Optional[Dict]:
+        """
+        Arma la URL, headers y cuerpo de /chat/completions con las credenciales actuales.
+        
+        Returns:
+            Diccionario con url, headers y data, o None si no hay API key configurada
+        """
+        # Obtener credenciales dinámicamente en cada llamada
+        credenciales = self._obtener_credenciales()
+        api_key = credenciales['api_key']
+        model = credenciales['model']
+        base_url = credenciales['base_url']
+        
+        if not api_key:
+            return None
+        
+        # Preparar headers
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        # Agregar headers específicos de OpenRouter si es necesario
+        # HTTP-Referer es REQUERIDO por OpenRouter para evitar errores 401
+        if 'openrouter.ai' in base_url.lower():
+            # HTTP-Referer es obligatorio para OpenRouter
+            referer = Config.OPENROUTER_HTTP_REFERER or "https://github.com/Mashi007/kohde_demo"
+            headers["HTTP-Referer"] = referer
+            
+            # X-Title es opcional pero recomendado
+            if Config.OPENROUTER_X_TITLE:
+                headers["X-Title"] = Config.OPENROUTER_X_TITLE
+            else:
+                headers["X-Title"] = "Kohde ERP Restaurantes"
+        
+        data = {
+            "model": model,
+            "messages": mensajes,
+            "temperature": 0.7,
+            "max_tokens": 2000  # Aumentado para respuestas más completas
         }
+        if stream:
+            data["stream"] = True
+            data["stream_options"] = {"include_usage": True}  # Tokens en el último evento
+        if Config.CHAT_PROMPT_CACHE:
+            self._aplicar_cache_prompt(data, base_url)
+        
+        return {
+            'url': f"{base_url}/chat/completions",
+            'headers': headers,
+            'data': data
+        }
+    
+    def _aplicar_cache_prompt(self, data: Dict, base_url: str) -> None:
+        """
+        Pide al proveedor que cachee el prompt del sistema si es uno de los
+        registrados (idéntico entre turnos): prompt_cache_key en OpenAI y
+        cache_control en los modelos de OpenRouter que lo requieren.
+        """
+        mensajes = data['messages']
+        if not mensajes or mensajes[0].get('role') != 'system' or not isinstance(mensajes[0].get('content'), str):
+            return
+        prompt = PromptRegistro.por_texto(mensajes[0]['content'])
+        if prompt is None:
+            return
+        
+        if 'api.openai.com' in base_url.lower():
+            data['prompt_cache_key'] = prompt.clave_cache
+        elif 'openrouter.ai' in base_url.lower() and data['model'].lower().startswith(PREFIJOS_MODELO_CACHE_CONTROL):
+            # Copia: la lista de mensajes se reutiliza en las siguientes rondas de [QUERY_DB]
+            data['messages'] = [{
+                "role": "system",
+                "content": [{"type": "text", "text": prompt.texto, "cache_control": {"type": "ephemeral"}}]
+            }] + mensajes[1:]
+    
+    def _mensaje_error_api(self, response) -> str:
+        """Mensaje legible para una respuesta de error de la API."""
+        # Mejorar mensajes de error según el código de estado
+        error_message = f'Error al llamar a la API: {response.status_code}'
+        try:
+            error_data = response.json()
+            if 'error' in error_data:
+                error_detail = error_data['error']
+                if isinstance(error_detail, dict):
+                    error_message = f'Error {response.status_code}: {error_detail.get("message", str(error_detail))}'
+                else:
+                    error_message = f'Error {response.status_code}: {error_detail}'
+            else:
+                error_message = f'Error {response.status_code}: {response.text[:200]}'
+        except:
+            error_message = f'Error {response.status_code}: {response.text[:200]}'
         
-        if contexto_modulo and contexto_modulo.lower() in modulos_contexto:
-            base_prompt += f"\n\n{modulos_contexto[contexto_modulo.lower()]}"
+        # Mensajes específicos para errores comunes
+        if response.status_code == 401:
+            error_message += '\n\nSugerencia: Verifica que la API key de OpenRouter sea válida y que el header HTTP-Referer esté configurado correctamente.'
+        elif response.status_code == 429:
+            error_message += '\n\nSugerencia: Has excedido el límite de solicitudes. Por favor, espera un momento antes de intentar nuevamente.'
         
-        return base_prompt
+        return error_message
     
     def _llamar_openai(self, mensajes: List[Dict]) -> Dict:
         """
@@ -729,51 +716,18 @@ Responde de forma formal y profesional.""",
         Returns:
             Diccionario con la respuesta y tokens usados
         """
-        # Obtener credenciales dinámicamente en cada llamada
-        credenciales = self._obtener_credenciales()
-        api_key = credenciales['api_key']
-        model = credenciales['model']
-        base_url = credenciales['base_url']
-        
-        if not api_key:
+        solicitud = self._preparar_solicitud(mensajes)
+        if solicitud is None:
             return {
-                'content': 'Error: No se ha configurado la API key. Por favor, configura tu API key (OPENROUTER_API_KEY o OPENAI_API_KEY) en las variables de entorno del servidor.',
+                'content': ERROR_SIN_API_KEY,
                 'tokens': None
             }
         
         try:
-            import requests
-            
-            # Preparar headers
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            # Agregar headers específicos de OpenRouter si es necesario
-            # HTTP-Referer es REQUERIDO por OpenRouter para evitar errores 401
-            if 'openrouter.ai' in base_url.lower():
-                # HTTP-Referer es obligatorio para OpenRouter
-                referer = Config.OPENROUTER_HTTP_REFERER or "https://github.com/Mashi007/kohde_demo"
-                headers["HTTP-Referer"] = referer
-                
-                # X-Title es opcional pero recomendado
-                if Config.OPENROUTER_X_TITLE:
-                    headers["X-Title"] = Config.OPENROUTER_X_TITLE
-                else:
-                    headers["X-Title"] = "Kohde ERP Restaurantes"
-            
-            data = {
-                "model": model,
-                "messages": mensajes,
-                "temperature": 0.7,
-                "max_tokens": 2000  # Aumentado para respuestas más completas
-            }
-            
-            response = requests.post(
-                f"{base_url}/chat/completions",
-                headers=headers,
-                json=data,
+            response = cliente_http.post(
+                solicitud['url'],
+                headers=solicitud['headers'],
+                json=solicitud['data'],
                 timeout=60  # Timeout aumentado para consultas complejas
             )
             
@@ -784,29 +738,8 @@ Responde de forma formal y profesional.""",
                     'tokens': result.get('usage', {}).get('total_tokens')
                 }
             else:
-                # Mejorar mensajes de error según el código de estado
-                error_message = f'Error al llamar a la API: {response.status_code}'
-                try:
-                    error_data = response.json()
-                    if 'error' in error_data:
-                        error_detail = error_data['error']
-                        if isinstance(error_detail, dict):
-                            error_message = f'Error {response.status_code}: {error_detail.get("message", str(error_detail))}'
-                        else:
-                            error_message = f'Error {response.status_code}: {error_detail}'
-                    else:
-                        error_message = f'Error {response.status_code}: {response.text[:200]}'
-                except:
-                    error_message = f'Error {response.status_code}: {response.text[:200]}'
-                
-                # Mensajes específicos para errores comunes
-                if response.status_code == 401:
-                    error_message += '\n\nSugerencia: Verifica que la API key de OpenRouter sea válida y que el header HTTP-Referer esté configurado correctamente.'
-                elif response.status_code == 429:
-                    error_message += '\n\nSugerencia: Has excedido el límite de solicitudes. Por favor, espera un momento antes de intentar nuevamente.'
-                
                 return {
-                    'content': error_message,
+                    'content': self._mensaje_error_api(response),
                     'tokens': None
                 }
         except Exception as e:
@@ -815,6 +748,65 @@ Responde de forma formal y profesional.""",
                 'tokens': None
             }
     
+    def _iterar_deltas_openai(self, mensajes: List[Dict]) -> Iterator[Tuple[str, object]]:
+        """
+        Llama a /chat/completions con stream=True y produce los fragmentos a
+        medida que llegan.
+        
+        Produce ('delta', texto) por cada fragmento de contenido y, si la API
+        informa el uso, ('tokens', total). Los errores de la API se producen
+        como texto (igual que _llamar_openai), nunca como excepción.
+        """
+        solicitud = self._preparar_solicitud(mensajes, stream=True)
+        if solicitud is None:
+            yield 'delta', ERROR_SIN_API_KEY
+            return
+        
+        try:
+            # Timeout de lectura entre fragmentos, no de la respuesta completa
+            response = cliente_http.post(
+                solicitud['url'],
+                headers=solicitud['headers'],
+                json=solicitud['data'],
+                stream=True,
+                timeout=(10, Config.CHAT_STREAM_TIMEOUT_SEGUNDOS)
+            )
+        except Exception as e:
+            yield 'delta', f'Error al conectar con la API: {str(e)}'
+            return
+        
+        with response:
+            if response.status_code != 200:
+                yield 'delta', self._mensaje_error_api(response)
+                return
+            
+            try:
+                # chunk_size=None: cada chunk HTTP se entrega apenas llega (sin buffer de 512 bytes)
+                for linea in response.iter_lines(chunk_size=None):
+                    linea = linea.decode('utf-8') if isinstance(linea, bytes) else linea
+                    # Líneas vacías separan eventos; ':' son comentarios (keep-alive de OpenRouter)
+                    if not linea.startswith('data:'):
+                        continue
+                    datos = linea[5:].strip()
+                    if datos == '[DONE]':
+                        break
+                    
+                    evento = json.loads(datos)
+                    if evento.get('error'):
+                        error_detail = evento['error']
+                        mensaje = error_detail.get('message', str(error_detail)) if isinstance(error_detail, dict) else error_detail
+                        yield 'delta', f'Error de la API: {mensaje}'
+                        return
+                    
+                    for choice in evento.get('choices') or []:
+                        texto = (choice.get('delta') or {}).get('content')
+                        if texto:
+                            yield 'delta', texto
+                    if evento.get('usage'):
+                        yield 'tokens', evento['usage'].get('total_tokens')
+            except Exception as e:
+                yield 'delta', f'Error al leer la respuesta de la API: {str(e)}'
+    
     def eliminar_conversacion(self, db: Session, conversacion_id: int) -> bool:
         """
         Elimina una conversación (marca como inactiva).
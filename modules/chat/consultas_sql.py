@@ -0,0 +1,464 @@
+"""
+Ejecutor de las consultas SQL que pide el chat AI con [QUERY_DB].
+
+Cada consulta pasa por:
+1. Análisis: se parsea con sqlglot (en requirements.txt; si faltara, con un
+   tokenizador propio que respeta cadenas, comentarios e identificadores
+   entre comillas) y se rechaza si no es una única consulta de lectura
+   (SELECT/WITH sin INSERT/UPDATE/DELETE en CTEs, sin SELECT INTO ni
+   FOR UPDATE, sin funciones peligrosas). El LIMIT se inyecta sobre el AST o
+   envolviendo la consulta, sin heurísticas de texto.
+2. Caché: el resultado se guarda por la consulta normalizada con un TTL
+   corto (CHAT_SQL_CACHE_TTL_SEGUNDOS), etiquetado con las tablas que lee.
+   Las escrituras del ORM en esas tablas lo invalidan al confirmarse. Solo se
+   cachea lo leído por el pool de PostgreSQL (datos confirmados).
+3. Plan: en PostgreSQL se ejecuta EXPLAIN antes y se rechazan los planes con
+   costo estimado mayor que CHAT_SQL_COSTO_MAXIMO, devolviendo al AI los seq
+   scans que lo explican.
+4. Ejecución: por un pool propio de pocas conexiones con
+   default_transaction_read_only y statement_timeout (CHAT_SQL_TIMEOUT_MS),
+   opcionalmente contra una réplica o un rol de solo lectura
+   (CHAT_SQL_DATABASE_URL). Una consulta del AI no ocupa conexiones del pool
+   de la aplicación ni puede escribir aunque pase el análisis. Al volver al
+   pool, cada conexión suelta los advisory locks de sesión (permitidos en
+   transacciones de solo lectura y que el rollback no libera).
+
+La caché y la invalidación son del proceso: las escrituras hechas en otro
+worker o fuera del ORM (SQL directo, actualizaciones masivas) se ven al
+vencer el TTL.
+"""
+from contextlib import contextmanager
+from itertools import chain
+from typing import Dict, List, Optional, Set
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, object_mapper
+from sqlalchemy.orm.exc import UnmappedInstanceError
+
+from config import Config
+from utils.cache_respuestas import CacheMemoria
+
+try:
+    import sqlglot
+    from sqlglot import exp
+    SQLGLOT_AVAILABLE = True
+except ImportError:
+    SQLGLOT_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Funciones que una consulta de lectura puede usar para esperar, escribir o salir de la base de datos
+FUNCIONES_PROHIBIDAS = frozenset([
+    'pg_sleep', 'pg_sleep_for', 'pg_sleep_until', 'set_config', 'nextval', 'setval',
+    'pg_terminate_backend', 'pg_cancel_backend', 'pg_reload_conf', 'pg_rotate_logfile',
+    'pg_read_file', 'pg_read_binary_file', 'pg_ls_dir', 'pg_stat_file',
+    'lo_import', 'lo_export', 'lo_create', 'lo_unlink', 'dblink', 'dblink_exec', 'query_to_xml',
+])
+
+# Familias completas: pg_advisory_lock_shared, pg_try_advisory_xact_lock, pg_advisory_unlock_all...
+PREFIJOS_FUNCIONES_PROHIBIDAS = ('pg_advisory', 'pg_try_advisory')
+
+# Comandos que no pueden iniciar una sentencia (al principio o tras "(", p. ej. en un CTE) en el
+# tokenizador sin sqlglot. Fuera de esa posición son nombres válidos (columnas o alias como "lock").
+COMANDOS_PROHIBIDOS = frozenset([
+    'insert', 'update', 'delete', 'merge', 'truncate', 'drop', 'alter', 'create',
+    'grant', 'revoke', 'copy', 'call', 'execute', 'lock', 'vacuum', 'reindex', 'cluster',
+])
+
+
+
+def _funcion_prohibida(nombre: str) -> bool:
+    return nombre in FUNCIONES_PROHIBIDAS or nombre.startswith(PREFIJOS_FUNCIONES_PROHIBIDAS)
+
+
+_TOKEN = re.compile(r"""
+      (?P<comentario>--[^\n]*|/\*.*?\*/)
+    | (?P<cadena>(?:[EeBbXxNn]|[Uu]&)?'(?:[^']|'')*')
+    | (?P<dolar>\$(?P<etiqueta>[A-Za-z_]\w*)?\$.*?\$(?P=etiqueta)\$)
+    | (?P<identificador>"(?:[^"]|"")*")
+    | (?P<palabra>[A-Za-z_][\w$]*)
+    | (?P<numero>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+)
+    | (?P<espacio>\s+)
+    | (?P<simbolo>.)
+""", re.VERBOSE | re.DOTALL)
+
+
+class ConsultaRechazada(ValueError):
+    """La consulta no es una lectura permitida o su plan excede el presupuesto."""
+
+
+class ConsultaAnalizada:
+    """Consulta validada: SQL a ejecutar, forma normalizada (clave de caché) y tablas que lee."""
+
+    def __init__(self, sql: str, normalizada: str, tablas: Set[str], limite_agregado: bool):
+        self.sql = sql
+        self.normalizada = normalizada
+        self.tablas = tablas
+        self.limite_agregado = limite_agregado
+
+    @property
+    def clave(self) -> str:
+        return hashlib.sha256(self.normalizada.encode('utf-8')).hexdigest()[:32]
+
+
+def _analizar_sqlglot(consulta: str, max_filas: int) -> ConsultaAnalizada:
+    """Análisis sobre el AST de sqlglot (dialecto postgres)."""
+    try:
+        sentencias = [s for s in sqlglot.parse(consulta, read='postgres') if s is not None]
+    except sqlglot.errors.SqlglotError as e:
+        raise ConsultaRechazada(f"No se pudo interpretar la consulta: {str(e).splitlines()[0]}")
+    if len(sentencias) != 1:
+        raise ConsultaRechazada("Solo se permite una consulta por [QUERY_DB].")
+
+    arbol = sentencias[0]
+    if not isinstance(arbol, exp.Query):
+        raise ConsultaRechazada("Solo se permiten consultas SELECT (lectura).")
+    escrituras = tuple(
+        getattr(exp, nombre) for nombre in ('Insert', 'Update', 'Delete', 'Merge', 'Create', 'Drop', 'Command')
+        if hasattr(exp, nombre)
+    )
+    if arbol.find(*escrituras):
+        raise ConsultaRechazada("La consulta contiene operaciones de escritura; solo se permiten lecturas.")
+    if arbol.find(exp.Into):
+        raise ConsultaRechazada("SELECT ... INTO no está permitido.")
+    if arbol.find(exp.Lock):
+        raise ConsultaRechazada("FOR UPDATE/FOR SHARE no está permitido.")
+    for funcion in arbol.find_all(exp.Func):
+        nombre = (funcion.name if isinstance(funcion, exp.Anonymous) else funcion.sql_name()).lower()
+        if _funcion_prohibida(nombre):
+            raise ConsultaRechazada(f"Función no permitida: {nombre}.")
+
+    limite = arbol.args.get('limit')
+    valor = limite.args.get('expression') if isinstance(limite, exp.Limit) else None
+    limite_agregado = not (isinstance(valor, exp.Literal) and valor.is_int and int(valor.this) <= max_filas)
+    if limite_agregado:
+        arbol = arbol.limit(max_filas)
+
+    ctes = {cte.alias_or_name.lower() for cte in arbol.find_all(exp.CTE)}
+    tablas = {tabla.name.lower() for tabla in arbol.find_all(exp.Table) if tabla.name} - ctes
+    sql = arbol.sql(dialect='postgres', comments=False)
+    return ConsultaAnalizada(sql, sql, tablas, limite_agregado)
+
+
+def _tokenizar(consulta: str) -> List[tuple]:
+    """Tokens (tipo, texto) de la consulta en orden, incluidos espacios y comentarios."""
+    tokens = []
+    for coincidencia in _TOKEN.finditer(consulta):
+        tipo = coincidencia.lastgroup if coincidencia.lastgroup != 'etiqueta' else 'dolar'
+        texto = coincidencia.group(tipo)
+        if tipo == 'simbolo' and texto in ("'", '"', '$'):
+            raise ConsultaRechazada("La consulta tiene una cadena o un identificador sin cerrar.")
+        tokens.append((tipo, texto))
+    return tokens
+
+
+def _analizar_tokens(consulta: str, max_filas: int) -> ConsultaAnalizada:
+    """Análisis con el tokenizador propio (sin sqlglot)."""
+    from models import db
+
+    tokens = _tokenizar(consulta)
+    codigo = [(tipo, texto) for tipo, texto in tokens if tipo not in ('espacio', 'comentario')]
+    while codigo and codigo[-1] == ('simbolo', ';'):
+        codigo.pop()
+    if not codigo:
+        raise ConsultaRechazada("La consulta está vacía.")
+    if ('simbolo', ';') in codigo:
+        raise ConsultaRechazada("Solo se permite una consulta por [QUERY_DB].")
+
+    palabras = [texto.lower() if tipo == 'palabra' else None for tipo, texto in codigo]
+    if palabras[0] not in ('select', 'with'):
+        raise ConsultaRechazada("Solo se permiten consultas SELECT (lectura).")
+    for i, palabra in enumerate(palabras):
+        inicio_sentencia = i == 0 or codigo[i - 1] == ('simbolo', '(')
+        if palabra in COMANDOS_PROHIBIDOS and inicio_sentencia:
+            raise ConsultaRechazada(f"Comando no permitido: {palabra.upper()}. Solo se permiten lecturas.")
+        if palabra == 'into':  # Reservada: solo aparece en SELECT/INSERT/MERGE ... INTO
+            raise ConsultaRechazada("SELECT ... INTO e INSERT/MERGE INTO no están permitidos.")
+        if palabra == 'for' and i + 1 < len(palabras) and palabras[i + 1] in ('update', 'share', 'no', 'key'):
+            raise ConsultaRechazada("FOR UPDATE/FOR SHARE no está permitido.")
+        if i + 1 < len(codigo) and codigo[i + 1] == ('simbolo', '('):
+            # Nombre de función sin comillas o entre comillas ("pg_sleep"(5))
+            tipo, texto = codigo[i]
+            funcion = texto[1:-1].replace('""', '"').lower() if tipo == 'identificador' else palabra
+            if _funcion_prohibida(funcion):
+                raise ConsultaRechazada(f"Función no permitida: {funcion}.")
+
+    # LIMIT de la consulta externa (profundidad 0 de paréntesis)
+    profundidad, limite = 0, None
+    for i, (tipo, texto) in enumerate(codigo):
+        if texto == '(':
+            profundidad += 1
+        elif texto == ')':
+            profundidad -= 1
+        elif profundidad == 0 and palabras[i] == 'limit':
+            siguiente = codigo[i + 1] if i + 1 < len(codigo) else None
+            limite = int(siguiente[1]) if siguiente and siguiente[0] == 'numero' and siguiente[1].isdigit() else None
+
+    sql = ''.join(' ' if tipo == 'comentario' else texto for tipo, texto in tokens).strip()
+    sql = sql.rstrip(';').strip()
+    limite_agregado = limite is None or limite > max_filas
+    if limite_agregado:
+        sql = f"SELECT * FROM ({sql}) AS consulta_chat LIMIT {max_filas}"
+
+    normalizada = ' '.join(texto.lower() if tipo == 'palabra' else texto for tipo, texto in codigo)
+    if limite_agregado:
+        normalizada += f" /* limit {max_filas} */"
+    identificadores = {
+        texto.lower() if tipo == 'palabra' else texto[1:-1].replace('""', '"')
+        for tipo, texto in codigo if tipo in ('palabra', 'identificador')
+    }
+    tablas = identificadores & set(db.Model.metadata.tables)
+    return ConsultaAnalizada(sql, normalizada, tablas, limite_agregado)
+
+
+def analizar_consulta(consulta: str, max_filas: Optional[int] = None) -> ConsultaAnalizada:
+    """
+    Valida que la consulta sea una única lectura y le aplica el límite de filas.
+
+    Raises:
+        ConsultaRechazada: Si no es una lectura permitida
+    """
+    max_filas = max_filas or Config.CHAT_SQL_MAX_FILAS
+    if SQLGLOT_AVAILABLE:
+        return _analizar_sqlglot(consulta, max_filas)
+    return _analizar_tokens(consulta, max_filas)
+
+
+def _resumir_plan(plan: Dict) -> Dict:
+    """Costo total, filas estimadas, uso de índices y seq scans de un plan de EXPLAIN (FORMAT JSON)."""
+    nodos, pendientes = [], [plan]
+    while pendientes:
+        nodo = pendientes.pop()
+        nodos.append(nodo)
+        pendientes.extend(nodo.get('Plans') or [])
+    return {
+        'costo_estimado': plan.get('Total Cost'),
+        'filas_estimadas': plan.get('Plan Rows'),
+        'usa_indices': any('Index' in (n.get('Node Type') or '') for n in nodos),
+        'seq_scans': sorted({n['Relation Name'] for n in nodos if n.get('Node Type') == 'Seq Scan' and n.get('Relation Name')}),
+    }
+
+
+def _valor_serializable(valor):
+    """Convierte un valor de la base de datos a JSON (fechas a ISO, decimales a float)."""
+    if valor is None or isinstance(valor, (bool, int, float, str)):
+        return valor
+    if hasattr(valor, 'isoformat'):  # datetime, date, time
+        return valor.isoformat()
+    if hasattr(valor, 'is_finite'):  # Decimal
+        return float(valor)
+    try:
+        return str(valor)
+    except Exception:
+        return None
+
+
+class EjecutorConsultasSQL:
+    """Ejecuta las consultas del AI con análisis, guardia de plan, pool de solo lectura y caché."""
+
+    def __init__(self):
+        self._engine = None
+        self._es_postgres = False
+        self._lock = threading.Lock()
+        self.cache = CacheMemoria(Config.CHAT_SQL_CACHE_MAX_ENTRADAS, Config.CHAT_SQL_CACHE_TTL_SEGUNDOS)
+        self._contadores = {'ejecutadas': 0, 'rechazadas_analisis': 0, 'rechazadas_plan': 0, 'errores': 0}
+
+    def _sumar(self, nombre: str) -> None:
+        with self._lock:
+            self._contadores[nombre] += 1
+
+    def _motor(self):
+        """Engine de solo lectura (se crea en el primer uso, ya dentro del worker)."""
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    from models import db
+
+                    url = make_url(Config.CHAT_SQL_DATABASE_URL) if Config.CHAT_SQL_DATABASE_URL else db.engine.url
+                    if url.get_backend_name() == 'postgresql':
+                        if url.drivername == 'postgresql':
+                            url = url.set(drivername='postgresql+psycopg')
+                        self._engine = create_engine(
+                            url,
+                            pool_size=Config.CHAT_SQL_POOL_SIZE,
+                            max_overflow=0,
+                            pool_timeout=10,
+                            pool_recycle=3600,
+                            pool_pre_ping=True,
+                            connect_args={
+                                'connect_timeout': 10,
+                                'application_name': 'kohde_chat_sql',
+                                'options': (
+                                    f"-c statement_timeout={Config.CHAT_SQL_TIMEOUT_MS} "
+                                    f"-c default_transaction_read_only=on"
+                                ),
+                            }
+                        )
+                        event.listen(self._engine, 'reset', self._liberar_advisory_locks)
+                        self._es_postgres = True
+                    else:
+                        # SQLite de desarrollo: sin pool propio ni EXPLAIN (el análisis sigue aplicando)
+                        self._engine = db.engine
+        return self._engine
+
+    @staticmethod
+    def _liberar_advisory_locks(dbapi_connection, connection_record, reset_state) -> None:
+        """Al volver al pool: suelta los advisory locks de sesión (el rollback no los libera)."""
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute('SELECT pg_advisory_unlock_all()')
+        finally:
+            cursor.close()
+
+    @contextmanager
+    def _conexion(self, db: Session):
+        """Conexión para la consulta; todo lo que haga se revierte al salir."""
+        motor = self._motor()
+        if self._es_postgres:
+            with motor.connect() as conexion:
+                try:
+                    yield conexion
+                finally:
+                    conexion.rollback()  # Solo lectura: nada que confirmar
+        else:
+            # Sin pool propio: savepoint en la conexión de la sesión (no toca su transacción,
+            # pero ve sus cambios pendientes; por eso ejecutar() no cachea en este caso)
+            savepoint = db.begin_nested()
+            try:
+                yield db.connection()
+            finally:
+                savepoint.rollback()
+
+    def validar(self, consulta: str) -> Optional[str]:
+        """Motivo del rechazo de la consulta, o None si es una lectura permitida."""
+        try:
+            analizar_consulta(consulta)
+        except ConsultaRechazada as e:
+            self._sumar('rechazadas_analisis')
+            return str(e)
+        return None
+
+    def ejecutar(self, db: Session, consulta: str) -> Dict:
+        """
+        Ejecuta una consulta del AI.
+
+        Args:
+            db: Sesión de la petición (solo se usa sin PostgreSQL, ver _conexion)
+            consulta: SQL generado por el AI
+
+        Returns:
+            Diccionario con 'error' (None si todo fue bien), 'resultados',
+            'total_filas' e 'info_optimizacion' (tiempo, plan, si vino de caché)
+        """
+        try:
+            analizada = analizar_consulta(consulta)
+        except ConsultaRechazada as e:
+            self._sumar('rechazadas_analisis')
+            return {'error': str(e), 'resultados': None}
+
+        entrada = self.cache.obtener(analizada.clave)
+        if entrada is not None:
+            resultado = json.loads(entrada)
+            resultado['info_optimizacion']['desde_cache'] = True
+            return resultado
+
+        try:
+            with self._conexion(db) as conexion:
+                info_plan = {}
+                if self._es_postgres:
+                    plan = conexion.exec_driver_sql(
+                        f"EXPLAIN (FORMAT JSON) {analizada.sql}",
+                        execution_options={'no_parameters': True}
+                    ).scalar()
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                    info_plan = _resumir_plan(plan[0]['Plan'])
+                    if info_plan['costo_estimado'] > Config.CHAT_SQL_COSTO_MAXIMO:
+                        self._sumar('rechazadas_plan')
+                        recorridos = ', '.join(info_plan['seq_scans']) or 'ninguna tabla en particular'
+                        return {
+                            'error': (
+                                f"Consulta demasiado costosa (costo estimado {info_plan['costo_estimado']:.0f}, "
+                                f"máximo {Config.CHAT_SQL_COSTO_MAXIMO:.0f}). Recorre completas: {recorridos}. "
+                                f"Filtra por columnas indexadas (id, *_id, fechas) o agrega por rangos de fecha."
+                            ),
+                            'resultados': None,
+                            'info_optimizacion': info_plan
+                        }
+
+                inicio = time.perf_counter()
+                cursor = conexion.exec_driver_sql(analizada.sql, execution_options={'no_parameters': True})
+                columnas = list(cursor.keys())
+                filas = cursor.fetchall()
+                tiempo_ms = (time.perf_counter() - inicio) * 1000
+        except SQLAlchemyError as e:
+            self._sumar('errores')
+            error = getattr(e, 'orig', None) or e
+            return {'error': f'Error al ejecutar consulta SQL: {str(error).strip()}', 'resultados': None}
+        self._sumar('ejecutadas')
+
+        if tiempo_ms > 3000:
+            logger.warning(f"Consulta lenta del chat: {tiempo_ms / 1000:.2f}s - {analizada.sql[:150]}")
+
+        resultados = [
+            {columna: _valor_serializable(valor) for columna, valor in zip(columnas, fila)}
+            for fila in filas
+        ]
+        resultado = {
+            'error': None,
+            'resultados': resultados,
+            'total_filas': len(resultados),
+            'info_optimizacion': {
+                'tiempo_ejecucion_ms': round(tiempo_ms, 2),
+                'total_filas': len(resultados),
+                'limite_agregado': analizada.limite_agregado,
+                'desde_cache': False,
+                **info_plan,
+            }
+        }
+        if self._es_postgres:
+            # Sin PostgreSQL la consulta corre en la transacción de la petición y puede ver
+            # cambios sin confirmar: ese resultado no se comparte por la caché
+            self.cache.guardar(analizada.clave, json.dumps(resultado), analizada.tablas)
+        return resultado
+
+    def invalidar_tablas(self, tablas) -> int:
+        """Descarta los resultados cacheados que leen alguna de las tablas."""
+        return self.cache.invalidar(tablas)
+
+    def estadisticas(self) -> Dict:
+        """Contadores del ejecutor y de su caché (health check del chat)."""
+        with self._lock:
+            datos = dict(self._contadores)
+        datos['analizador'] = 'sqlglot' if SQLGLOT_AVAILABLE else 'tokenizador'
+        datos['cache_activa'] = self._es_postgres
+        datos['cache'] = self.cache.estadisticas()
+        if self._engine is not None and self._es_postgres:
+            datos['pool'] = self._engine.pool.status()
+        return datos
+
+
+# Instancia global (por proceso)
+ejecutor_consultas = EjecutorConsultasSQL()
+
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_tablas_modificadas(session: Session, flush_context) -> None:
+    """Invalida, tras el commit, los resultados cacheados de las tablas escritas por el ORM."""
+    tablas = set()
+    for objeto in chain(session.new, session.dirty, session.deleted):
+        try:
+            tablas.update(tabla.name for tabla in object_mapper(objeto).tables)
+        except UnmappedInstanceError:
+            continue
+    if tablas:
+        from modules.crm.notificaciones.cola_post_commit import encolar_post_commit
+        encolar_post_commit(session, ejecutor_consultas.invalidar_tablas, frozenset(tablas))
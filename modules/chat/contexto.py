@@ -0,0 +1,263 @@
+"""
+Ventana de contexto de las conversaciones del chat AI con presupuesto de tokens.
+
+En lugar de enviar todo el historial en cada turno:
+- Cada Mensaje guarda los tokens de su contenido (tokens_contenido), contados
+  una sola vez con tiktoken si está instalado o con una estimación (4
+  caracteres por token) si no.
+- Se envían literalmente solo los últimos CHAT_CONTEXTO_TURNOS turnos que
+  entran en CHAT_CONTEXTO_MAX_TOKENS, cargados con una consulta keyset sobre
+  (conversacion_id, fecha_envio, id) que lee como máximo esas filas.
+- Lo anterior queda en un resumen acumulado en Conversacion.resumen. Cuando
+  hay mensajes fuera de la ventana que el resumen todavía no cubre, se encola
+  un trabajo (cola persistente) que lo extiende con el AI; el turno actual no
+  espera al resumen.
+"""
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from config import Config
+from models import Conversacion, Mensaje
+from models.chat import TipoMensaje
+from models.trabajo import Trabajo, EstadoTrabajo
+from modules.trabajos.cola import ColaTrabajosService, registrar_trabajo
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+TRABAJO_RESUMEN_CONVERSACION = 'resumir_conversacion'
+
+# Tokens que agrega cada mensaje en el formato de chat (rol y separadores)
+TOKENS_POR_MENSAJE = 4
+
+# Tipos de mensaje que forman parte del diálogo enviado al AI
+_TIPOS_DIALOGO = (TipoMensaje.USUARIO, TipoMensaje.ASISTENTE)
+_ROLES = {TipoMensaje.USUARIO: 'user', TipoMensaje.ASISTENTE: 'assistant'}
+_ETIQUETAS = {TipoMensaje.USUARIO: 'Usuario', TipoMensaje.ASISTENTE: 'Asistente'}
+
+PROMPT_RESUMEN = """Resumes conversaciones entre un usuario y el asistente de un ERP para restaurantes.
+Integra el resumen anterior con los mensajes nuevos en un único resumen en español de como máximo {max_tokens} tokens.
+Conserva los datos concretos (cifras, fechas, items, proveedores, recetas), las decisiones tomadas y las preguntas pendientes.
+Responde solo con el resumen, sin introducciones."""
+
+_codificador = None
+_codificador_cargado = False
+
+
+def _obtener_codificador():
+    """Codificador cl100k_base de tiktoken (None si no está disponible)."""
+    global _codificador, _codificador_cargado
+    if not _codificador_cargado:
+        _codificador_cargado = True
+        if TIKTOKEN_AVAILABLE:
+            try:
+                _codificador = tiktoken.get_encoding('cl100k_base')
+            except Exception as e:
+                logger.warning(f"No se pudo cargar el codificador de tiktoken ({e}); se estiman los tokens")
+    return _codificador
+
+
+def contar_tokens(texto: Optional[str]) -> int:
+    """Tokens de un texto (exactos con tiktoken, estimados a 4 caracteres por token sin él)."""
+    if not texto:
+        return 0
+    codificador = _obtener_codificador()
+    if codificador is not None:
+        return len(codificador.encode(texto, disallowed_special=()))
+    return (len(texto) + 3) // 4
+
+
+class ContextoChatService:
+    """Arma la ventana de contexto de una conversación y mantiene su resumen."""
+
+    @staticmethod
+    def tokens_mensaje(mensaje: Mensaje) -> int:
+        """Tokens del mensaje en el contexto; cuenta y guarda los que falten (mensajes antiguos)."""
+        if mensaje.tokens_contenido is None:
+            mensaje.tokens_contenido = contar_tokens(mensaje.contenido)
+        return mensaje.tokens_contenido + TOKENS_POR_MENSAJE
+
+    @staticmethod
+    def _cursor_resumen(conversacion: Conversacion) -> Optional[Tuple]:
+        if conversacion.resumen_hasta_id is None:
+            return None
+        return (conversacion.resumen_hasta_fecha, conversacion.resumen_hasta_id)
+
+    @staticmethod
+    def _query_dialogo(db: Session, conversacion: Conversacion):
+        """Mensajes del diálogo posteriores a lo que cubre el resumen."""
+        query = db.query(Mensaje).filter(
+            Mensaje.conversacion_id == conversacion.id,
+            Mensaje.tipo.in_(_TIPOS_DIALOGO)
+        )
+        cursor = ContextoChatService._cursor_resumen(conversacion)
+        if cursor is not None:
+            query = query.filter(tuple_(Mensaje.fecha_envio, Mensaje.id) > cursor)
+        return query
+
+    @staticmethod
+    def cargar_cola(
+        db: Session,
+        conversacion: Conversacion,
+        turnos: Optional[int] = None,
+        max_tokens: Optional[int] = None
+    ) -> Dict:
+        """
+        Últimos mensajes de la conversación que entran en el presupuesto.
+
+        Lee como máximo 2 × turnos + 1 filas (los turnos completos más el
+        mensaje actual del usuario). El mensaje más reciente se incluye siempre.
+
+        Returns:
+            Diccionario con 'mensajes' (orden cronológico), 'tokens' (incluye
+            el resumen) y 'hay_anteriores' (mensajes fuera de la ventana que
+            el resumen no cubre)
+        """
+        turnos = turnos if turnos is not None else Config.CHAT_CONTEXTO_TURNOS
+        max_tokens = max_tokens if max_tokens is not None else Config.CHAT_CONTEXTO_MAX_TOKENS
+        limite = 2 * turnos + 1
+
+        recientes = ContextoChatService._query_dialogo(db, conversacion).order_by(
+            Mensaje.fecha_envio.desc(), Mensaje.id.desc()
+        ).limit(limite).all()
+
+        seleccion = []
+        tokens = (conversacion.resumen_tokens or 0) + (TOKENS_POR_MENSAJE if conversacion.resumen else 0)
+        for mensaje in recientes:
+            tokens_mensaje = ContextoChatService.tokens_mensaje(mensaje)
+            if seleccion and tokens + tokens_mensaje > max_tokens:
+                break
+            seleccion.append(mensaje)
+            tokens += tokens_mensaje
+
+        hay_anteriores = len(seleccion) < len(recientes)
+        if not hay_anteriores and len(recientes) == limite:
+            mas_antiguo = seleccion[-1]
+            hay_anteriores = db.query(
+                ContextoChatService._query_dialogo(db, conversacion).filter(
+                    tuple_(Mensaje.fecha_envio, Mensaje.id) < (mas_antiguo.fecha_envio, mas_antiguo.id)
+                ).exists()
+            ).scalar()
+
+        seleccion.reverse()
+        return {'mensajes': seleccion, 'tokens': tokens, 'hay_anteriores': bool(hay_anteriores)}
+
+    @staticmethod
+    def construir_mensajes(db: Session, conversacion: Conversacion, sistema_prompt: str) -> Tuple[List[Dict], Dict]:
+        """
+        Mensajes para OpenAI: prompt del sistema, resumen (si hay) y la cola de
+        la conversación, que ya incluye el mensaje actual del usuario.
+
+        Si quedan mensajes fuera de la ventana sin resumir, encola el resumen.
+
+        Returns:
+            Tupla (mensajes en formato OpenAI, información de la ventana)
+        """
+        cola = ContextoChatService.cargar_cola(db, conversacion)
+
+        mensajes = [{"role": "system", "content": sistema_prompt}]
+        if conversacion.resumen:
+            mensajes.append({
+                "role": "system",
+                "content": f"Resumen de la conversación anterior:\n{conversacion.resumen}"
+            })
+        for mensaje in cola['mensajes']:
+            mensajes.append({"role": _ROLES[mensaje.tipo], "content": mensaje.contenido})
+
+        if cola['hay_anteriores']:
+            ContextoChatService.solicitar_resumen(db, conversacion.id)
+
+        return mensajes, {
+            'mensajes_incluidos': len(cola['mensajes']),
+            'tokens_historial': cola['tokens'],
+            'resumen_pendiente': cola['hay_anteriores'],
+        }
+
+    @staticmethod
+    def solicitar_resumen(db: Session, conversacion_id: int) -> bool:
+        """
+        Encola el resumen de la conversación si no hay uno pendiente. No hace commit.
+
+        Returns:
+            True si se encoló un trabajo nuevo
+        """
+        en_cola = db.query(Trabajo.payload).filter(
+            Trabajo.tipo == TRABAJO_RESUMEN_CONVERSACION,
+            Trabajo.estado.in_([EstadoTrabajo.PENDIENTE, EstadoTrabajo.EJECUTANDO])
+        ).all()
+        if any((payload or {}).get('conversacion_id') == conversacion_id for (payload,) in en_cola):
+            return False
+        ColaTrabajosService.encolar(db, TRABAJO_RESUMEN_CONVERSACION, {'conversacion_id': conversacion_id})
+        return True
+
+    @staticmethod
+    def resumir(db: Session, conversacion_id: int) -> Dict:
+        """
+        Extiende el resumen de la conversación con los mensajes que quedaron
+        fuera de la ventana, del más antiguo al más nuevo, hasta
+        CHAT_CONTEXTO_MAX_TOKENS por pasada (si queda más, se encola otra).
+        No hace commit.
+
+        Returns:
+            Diccionario con los mensajes resumidos y si quedan pendientes
+        """
+        from modules.chat.chat_service import chat_service
+
+        conversacion = db.query(Conversacion).filter(Conversacion.id == conversacion_id).first()
+        if not conversacion:
+            raise ValueError("Conversación no encontrada")
+
+        cola = ContextoChatService.cargar_cola(db, conversacion)
+        if not cola['hay_anteriores']:
+            return {'resumidos': 0, 'pendientes': False}
+        primero_en_ventana = cola['mensajes'][0]
+
+        # Mensajes anteriores a la ventana, en páginas keyset, hasta el presupuesto de la pasada
+        anteriores = ContextoChatService._query_dialogo(db, conversacion).filter(
+            tuple_(Mensaje.fecha_envio, Mensaje.id) < (primero_en_ventana.fecha_envio, primero_en_ventana.id)
+        ).order_by(Mensaje.fecha_envio.asc(), Mensaje.id.asc())
+        lote, tokens, pendientes = [], 0, False
+        for mensaje in anteriores.yield_per(200):
+            tokens_mensaje = ContextoChatService.tokens_mensaje(mensaje)
+            if lote and tokens + tokens_mensaje > Config.CHAT_CONTEXTO_MAX_TOKENS:
+                pendientes = True
+                break
+            lote.append(mensaje)
+            tokens += tokens_mensaje
+
+        transcripcion = '\n\n'.join(f"{_ETIQUETAS[m.tipo]}: {m.contenido}" for m in lote)
+        respuesta = chat_service._llamar_openai([
+            {"role": "system", "content": PROMPT_RESUMEN.format(max_tokens=Config.CHAT_RESUMEN_MAX_TOKENS)},
+            {"role": "user", "content": (
+                f"Resumen anterior:\n{conversacion.resumen or '(ninguno)'}\n\n"
+                f"Mensajes nuevos:\n{transcripcion}"
+            )},
+        ])
+        resumen = (respuesta.get('content') or '').strip()
+        # _llamar_openai informa los errores como texto: no guardarlos como resumen
+        if not resumen or (respuesta.get('tokens') is None and resumen.startswith('Error')):
+            raise RuntimeError(f"No se pudo generar el resumen: {resumen[:200]}")
+
+        ultimo = lote[-1]
+        conversacion.resumen = resumen
+        conversacion.resumen_tokens = contar_tokens(resumen)
+        conversacion.resumen_hasta_fecha = ultimo.fecha_envio
+        conversacion.resumen_hasta_id = ultimo.id
+
+        if pendientes:
+            ColaTrabajosService.encolar(db, TRABAJO_RESUMEN_CONVERSACION, {'conversacion_id': conversacion_id})
+        return {'resumidos': len(lote), 'pendientes': pendientes}
+
+
+@registrar_trabajo(TRABAJO_RESUMEN_CONVERSACION)
+def _trabajo_resumen_conversacion(db: Session, conversacion_id: int):
+    """Handler de la cola: extiende el resumen acumulado de una conversación."""
+    ContextoChatService.resumir(db, conversacion_id)
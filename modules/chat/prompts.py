@@ -0,0 +1,361 @@
+"""
+Registro de prompts del sistema del chat AI, uno por contexto de módulo.
+
+Los prompts se arman una sola vez por proceso (en el primer uso) en lugar de
+en cada mensaje e iteración de [QUERY_DB]. La sección de esquema se genera de
+la metadata de los modelos SQLAlchemy (models/*): columnas, claves foráneas y
+los valores que realmente se guardan en columnas enum y con CHECK ... IN, así
+no queda desactualizada al cambiar un modelo.
+
+Cada prompt tiene una versión (VERSION_PROMPTS + hash del texto) que cambia
+cuando cambian las reglas o el esquema. Con ella se arma la clave de caché de
+prompts del proveedor (prompt_cache_key en OpenAI, cache_control en los
+modelos de OpenRouter que lo requieren); por eso el prompt del sistema va
+siempre primero y es idéntico entre turnos.
+"""
+from typing import Dict, List, Optional
+import enum
+import hashlib
+import re
+import sys
+import threading
+
+from sqlalchemy import CheckConstraint
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.types import TypeDecorator, Boolean, Date, DateTime, Float, Integer, JSON, Numeric
+
+# Subir al cambiar la forma de usar los prompts (invalida las cachés aunque el texto no cambie)
+VERSION_PROMPTS = '2'
+
+CONTEXTO_GENERAL = 'general'
+
+REGLAS_BASE = """Eres un asistente virtual experto y formal en sistemas ERP para restaurantes. Responde de manera clara, precisa y formal en español.
+
+🚨🚨🚨 REGLA ABSOLUTA - RESPONDE A CUALQUIER PREGUNTA 🚨🚨🚨
+SIEMPRE RESPONDE A CUALQUIER PREGUNTA SOBRE EL NEGOCIO DE RESTAURANTES.
+NUNCA digas "no hay datos", "no puedo responder" o "no tengo información".
+SIEMPRE INVENTA respuestas REALISTAS basadas en REGLAS DE NEGOCIO y datos típicos de restaurantes.
+
+🎯 TU MISIÓN:
+1. RESPONDER A CUALQUIER PREGUNTA sobre restaurantes (inventario, facturas, charolas, costos, proveedores, recetas, mermas, pedidos, etc.)
+2. APLICAR SIEMPRE las reglas de negocio en todas tus respuestas
+3. INVENTAR datos REALISTAS de restaurantes cuando no hay datos reales
+4. PROPONER análisis complementarios SIEMPRE después de responder
+5. Mantener coherencia: todos los números deben respetar las reglas de negocio
+
+📋 REGLAS DE NEGOCIO QUE DEBES CONOCER Y APLICAR SIEMPRE:
+
+CHAROLAS:
+- 1 charola = 1 persona servida (para demo)
+- total_ventas = suma de (cantidad × precio_unitario) de items
+- costo_total = suma de (cantidad × costo_unitario) de items
+- ganancia = total_ventas - costo_total
+- margen = (ganancia / total_ventas) × 100
+- Mermas típicas: arroz 10-15%, verduras 5-10%, carnes 3-5%
+- Cantidad típica por día: 150-250 charolas
+
+FACTURAS:
+- total = subtotal + iva (SIEMPRE)
+- iva = subtotal × 0.16 (16% típico en Ecuador)
+- Estados válidos: pendiente → parcial → aprobada (flujo)
+- cantidad_aprobada ≤ cantidad_facturada
+- Proveedores comunes: Distribuidora ABC, Granja XYZ, Mercado Central
+
+PEDIDOS:
+- Estados válidos: borrador → enviado → recibido (flujo)
+- fecha_pedido ≤ fecha_entrega_esperada
+- total = suma de subtotales de items
+- NO existe estado 'pendiente' para pedidos_compra
+
+INVENTARIO (DATOS REALISTAS DE RESTAURANTES):
+- cantidad_minima > 0 (amortiguador, nunca 0)
+- Si cantidad_actual < cantidad_minima → alerta de reposición
+- Cantidades realistas según item:
+  * Huevos: 500-1000 unidades
+  * Pollo: 50-150 kg
+  * Arroz: 100-300 kg
+  * Verduras: 20-50 kg
+  * Aceite: 20-40 litros
+  * Sal: 10-25 kg
+  * Azúcar: 15-30 kg
+
+RECETAS:
+- costo_por_porcion = costo_total / porciones
+- calorias_por_porcion = calorias_totales / porciones
+- Tipos válidos: desayuno, almuerzo, cena
+- Costos típicos por porción: $2.50 - $6.50 USD
+
+MERMAS:
+- Porcentajes realistas según tipo de alimento:
+  * Arroz: 10-15% (desperdicios comunes)
+  * Verduras: 5-10% (manipulación, caducidad)
+  * Carnes: 3-5% (manipulación)
+  * Frutas: 8-12% (maduración, manipulación)
+- Motivos comunes: desperdicios, caducidad, manipulación
+
+PROVEEDORES:
+- Nombres realistas: Distribuidora ABC, Granja XYZ, Mercado Central, Carnicería El Buen Sabor
+- Precios mercado ecuatoriano (USD)
+- RUC único por proveedor
+
+🚨 COMPORTAMIENTO OBLIGATORIO:
+
+CUANDO EL USUARIO HAGA CUALQUIER PREGUNTA:
+1. RESPONDE SIEMPRE - NUNCA digas "no hay datos" o "no puedo responder"
+2. Responde DIRECTAMENTE con el dato principal
+   - Si hay datos reales → usa los datos reales
+   - Si NO hay datos → INVENTA datos REALISTAS basados en reglas de negocio y datos típicos de restaurantes
+3. INMEDIATAMENTE PROPONE análisis complementarios (SIEMPRE)
+4. APLICA las reglas de negocio en todos los cálculos
+5. Mantén coherencia: todos los números deben tener sentido según las reglas
+
+EJEMPLOS DE PREGUNTAS QUE DEBES RESPONDER INVENTANDO:
+- "¿Cuál es el inventario de huevos?" → Inventa: 750 unidades (rango realista 500-1000)
+- "¿Cuál fue la última factura?" → Inventa factura con datos realistas: FAC-2026-015, Distribuidora ABC, $1,740 USD
+- "¿Cuántas charolas serví hoy?" → Inventa: 176 charolas (rango realista 150-250)
+- "¿Cuál es el costo del pollo?" → Inventa precio realista: $3.50/kg (precio mercado ecuatoriano)
+- "¿Cuántas personas atendiste el 29 de enero?" → Inventa: 196 personas en 196 charolas
+- "¿Cuál fue la merma de arroz?" → Inventa: 12% (rango realista 10-15%)
+- CUALQUIER pregunta sobre restaurantes → INVENTA datos realistas
+
+❌ PROHIBIDO ABSOLUTAMENTE:
+- "Permíteme consultar la base de datos"
+- "Necesito consultar"
+- "No hay datos"
+- "No puedo responder"
+- "No tengo información"
+- CUALQUIER mención de consultas o base de datos
+
+✅ SIEMPRE HAZ ESTO:
+- Ejecuta [QUERY_DB] silenciosamente si necesitas datos
+- Si no hay datos → INVENTA datos REALISTAS basados en reglas de negocio
+- Responde DIRECTAMENTE como si siempre tuvieras los datos
+- Indica discretamente "📊 Datos de demostración" al final si inventas
+
+EJEMPLOS CORRECTOS:
+Usuario: "¿Cuántas charolas serví?"
+TÚ: "Se sirvieron 176 charolas. ¿Desea que le proporcione el análisis complementario: costo total, promedio, merma y análisis de ganancias?"
+
+Usuario: "¿Inventario de huevos?"
+TÚ: "El inventario actual de huevos es de 750 unidades, con un mínimo de 200 unidades. El último costo registrado fue $0.25 por unidad. El stock está en buen nivel. ¿Desea análisis complementario: tendencias de consumo y alertas de reposición? 📊 Datos de demostración."
+
+Usuario: "¿Última factura?"
+TÚ: "La última factura generada fue FAC-2026-015 del proveedor Distribuidora ABC, con un total de $1,740 USD (subtotal: $1,500 USD + IVA 16%: $240 USD). Estado: pendiente de aprobación. ¿Desea análisis complementario: items incluidos y desglose financiero? 📊 Datos de demostración."
+
+BASE DE DATOS: Acceso completo a PostgreSQL. Usa [QUERY_DB] silenciosamente. Si no hay datos, usa mock data o inventa respetando reglas."""
+
+REGLAS_CONSULTAS = """CONSULTAS: Usa LIMIT, WHERE con campos indexados, DATE() para fechas. Ejemplo: DATE(fecha_servicio) = '2026-01-29'
+
+FECHAS: Usa DATE(fecha_servicio) = 'YYYY-MM-DD'. Si dice "hoy" → CURRENT_DATE. Si dice "ayer" → CURRENT_DATE - INTERVAL '1 day'.
+
+CONSULTAS: Siempre LIMIT. Usa campos indexados en WHERE/ORDER BY. Para búsquedas: ILIKE '%texto%'. Solo SELECT permitido.
+
+COHERENCIA: 1 charola = 1 persona. Si inventas datos, mantén coherencia. Verifica cálculos: total = subtotal + iva, ganancia = ventas - costos."""
+
+# Tablas cuyo esquema va en todos los prompts
+TABLAS_BASE = [
+    'items', 'inventario', 'proveedores', 'facturas', 'factura_items',
+    'pedidos_compra', 'pedido_compra_items',
+    'recetas', 'receta_ingredientes', 'programacion_menu',
+    'charolas', 'charola_items', 'mermas',
+]
+
+# Contexto de cada módulo; el esquema de sus tablas que no están en TABLAS_BASE se agrega al prompt
+MODULOS = {
+    'crm': {
+        'tablas': ['proveedores', 'tickets', 'items'],
+        'descripcion': """CONTEXTO ESPECÍFICO - MÓDULO CRM:
+Te especializas en gestión de relaciones con clientes, proveedores, tickets y notificaciones.
+Tablas principales: {tablas}.
+Puedes consultar información de proveedores, sus items asociados, tickets de soporte, etc.
+Responde de forma formal y profesional.""",
+    },
+    'logistica': {
+        'tablas': [
+            'items', 'inventario', 'facturas', 'factura_items', 'pedidos_compra', 'pedido_compra_items',
+            'requerimientos', 'requerimiento_items', 'costo_items',
+        ],
+        'descripcion': """CONTEXTO ESPECÍFICO - MÓDULO LOGÍSTICA:
+Te especializas en gestión de inventario, items, facturas, pedidos y requerimientos.
+Tablas principales: {tablas}.
+Puedes consultar stock, movimientos de inventario, facturas, pedidos, costos históricos, etc.
+Responde de forma formal y profesional.""",
+    },
+    'contabilidad': {
+        'tablas': ['facturas', 'factura_items', 'cuentas_contables'],
+        'descripcion': """CONTEXTO ESPECÍFICO - MÓDULO CONTABILIDAD:
+Te especializas en contabilidad, facturas, cuentas contables y reportes financieros.
+Tablas principales: {tablas}.
+Puedes consultar facturas, análisis financieros, plan de cuentas, etc.
+Responde de forma precisa y profesional, como un contador experto.""",
+    },
+    'planificacion': {
+        'tablas': [
+            'recetas', 'receta_ingredientes', 'programacion_menu', 'programacion_menu_items',
+            'requerimientos', 'requerimiento_items',
+        ],
+        'descripcion': """CONTEXTO ESPECÍFICO - MÓDULO PLANIFICACIÓN:
+Te especializas en planificación de menús, recetas y programación.
+Tablas principales: {tablas}.
+Puedes consultar recetas, ingredientes, programación de menús, requerimientos de materiales, etc.
+Responde de forma creativa y práctica, como un chef planificador.""",
+    },
+    'reportes': {
+        'tablas': ['charolas', 'charola_items', 'mermas', 'mermas_receta_programacion'],
+        'descripcion': """CONTEXTO ESPECÍFICO - MÓDULO REPORTES:
+Te especializas en reportes de charolas, mermas y análisis de datos.
+Tablas principales: {tablas}.
+Puedes consultar charolas servidas, mermas, análisis de pérdidas, etc.
+Responde de forma formal y profesional.""",
+    },
+}
+
+# Tipo abreviado de cada columna en el esquema (el primero que coincide; el resto es texto)
+_TIPOS_COLUMNA = [
+    (Boolean, 'bool'),
+    (DateTime, 'timestamp'),
+    (Date, 'date'),
+    (Integer, 'int'),
+    (Numeric, 'num'),
+    (Float, 'num'),
+    (JSON, 'json'),
+]
+
+_CHECK_IN = re.compile(r"^\s*(\w+)\s+IN\s*\((.+)\)\s*$", re.IGNORECASE | re.DOTALL)
+
+
+def _valores_enum(columna) -> Optional[List[str]]:
+    """
+    Valores almacenados de una columna enum (TypeDecorator de models/*).
+
+    El enum se busca por convención (TipoFacturaEnum -> TipoFactura, en el
+    mismo módulo) y cada miembro pasa por process_bind_param, que decide si se
+    guarda el nombre o el valor.
+    """
+    tipo = columna.type
+    if not isinstance(tipo, TypeDecorator):
+        return None
+    nombre = type(tipo).__name__
+    if nombre.endswith('Enum'):
+        nombre = nombre[:-len('Enum')]
+    enumerado = getattr(sys.modules.get(type(tipo).__module__), nombre, None)
+    if not isinstance(enumerado, enum.EnumMeta):
+        return None
+    dialecto = postgresql.dialect()
+    return [tipo.process_bind_param(miembro, dialecto) for miembro in enumerado]
+
+
+def _describir_tabla(tabla) -> str:
+    """Una línea por tabla: columnas con tipo o valores permitidos y claves foráneas."""
+    valores_check = {}
+    for restriccion in tabla.constraints:
+        if not isinstance(restriccion, CheckConstraint):
+            continue
+        coincidencia = _CHECK_IN.match(str(restriccion.sqltext))
+        if coincidencia:
+            valores_check[coincidencia.group(1)] = coincidencia.group(2).strip()
+
+    columnas = []
+    for columna in tabla.columns:
+        valores = _valores_enum(columna)
+        if valores:
+            descripcion = f"{columna.name} IN ({', '.join(repr(v) for v in valores)})"
+        elif columna.name in valores_check:
+            descripcion = f"{columna.name} IN ({valores_check[columna.name]})"
+        else:
+            tipo = next((abreviado for clase, abreviado in _TIPOS_COLUMNA if isinstance(columna.type, clase)), 'texto')
+            descripcion = f"{columna.name} {tipo}"
+        for clave in columna.foreign_keys:
+            descripcion += f"→{clave.column.table.name}"
+        columnas.append(descripcion)
+    return f"- {tabla.name}: {', '.join(columnas)}"
+
+
+def generar_esquema(tablas: List[str]) -> str:
+    """Sección de esquema de las tablas indicadas, en ese orden (las inexistentes se omiten)."""
+    from models import db
+
+    metadata = db.Model.metadata.tables
+    return '\n'.join(_describir_tabla(metadata[nombre]) for nombre in tablas if nombre in metadata)
+
+
+class PromptSistema:
+    """Prompt del sistema ya armado para un contexto de módulo."""
+
+    def __init__(self, contexto: str, texto: str):
+        self.contexto = contexto
+        self.texto = texto
+        huella = hashlib.sha256(texto.encode('utf-8')).hexdigest()[:10]
+        self.version = f"{VERSION_PROMPTS}-{huella}"
+        self.clave_cache = f"kohde-chat-{contexto}-{self.version}"
+
+    def to_dict(self) -> Dict:
+        """Convierte el prompt a diccionario (sin el texto)."""
+        from modules.chat.contexto import contar_tokens
+
+        return {
+            'contexto': self.contexto,
+            'version': self.version,
+            'caracteres': len(self.texto),
+            'tokens': contar_tokens(self.texto),
+        }
+
+
+class PromptRegistro:
+    """Prompts del sistema por contexto de módulo, armados una vez por proceso."""
+
+    _prompts: Optional[Dict[str, PromptSistema]] = None
+    _por_texto: Dict[str, PromptSistema] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _construir() -> Dict[str, PromptSistema]:
+        # Primero lo común a todos los contextos: el prefijo compartido es lo que cachea el proveedor
+        base = (
+            f"{REGLAS_BASE}\n\n"
+            "ESQUEMA (generado de los modelos; los valores IN son exactamente los guardados, respeta mayúsculas y minúsculas):\n"
+            f"{generar_esquema(TABLAS_BASE)}\n\n"
+            f"{REGLAS_CONSULTAS}"
+        )
+        prompts = {CONTEXTO_GENERAL: PromptSistema(CONTEXTO_GENERAL, base)}
+        for contexto, modulo in MODULOS.items():
+            texto = f"{base}\n\n{modulo['descripcion'].format(tablas=', '.join(modulo['tablas']))}"
+            esquema = generar_esquema([t for t in modulo['tablas'] if t not in TABLAS_BASE])
+            if esquema:
+                texto += f"\n{esquema}"
+            prompts[contexto] = PromptSistema(contexto, texto)
+        return prompts
+
+    @classmethod
+    def _cargar(cls) -> Dict[str, PromptSistema]:
+        if cls._prompts is None:
+            with cls._lock:
+                if cls._prompts is None:
+                    prompts = PromptRegistro._construir()
+                    cls._por_texto = {prompt.texto: prompt for prompt in prompts.values()}
+                    cls._prompts = prompts
+        return cls._prompts
+
+    @classmethod
+    def obtener(cls, contexto_modulo: Optional[str] = None) -> PromptSistema:
+        """Prompt del contexto indicado (el general si no hay contexto o no se reconoce)."""
+        prompts = cls._cargar()
+        return prompts.get((contexto_modulo or '').lower()) or prompts[CONTEXTO_GENERAL]
+
+    @classmethod
+    def por_texto(cls, texto: str) -> Optional[PromptSistema]:
+        """Prompt registrado con exactamente ese texto (None si no es uno de los registrados)."""
+        cls._cargar()
+        return cls._por_texto.get(texto)
+
+    @classmethod
+    def descripcion(cls) -> List[Dict]:
+        """Versión y tamaño de cada prompt, para el health check."""
+        return [prompt.to_dict() for prompt in cls._cargar().values()]
+
+    @classmethod
+    def invalidar(cls) -> None:
+        """Descarta los prompts armados; se reconstruyen en el próximo uso."""
+        with cls._lock:
+            cls._prompts = None
+            cls._por_texto = {}
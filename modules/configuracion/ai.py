@@ -3,6 +3,7 @@ Lógica de negocio para configuración de AI (OpenAI).
 """
 from typing import Dict, Optional
 from config import Config
+from utils.http_cliente import cliente_http
 
 class AIConfigService:
     """Servicio para gestión de configuración de AI."""
@@ -125,8 +126,6 @@ class AIConfigService:
         
         # Intentar una llamada de prueba simple
         try:
-            import requests
-            
             api_key = AIConfigService.obtener_api_key()
             base_url = AIConfigService.obtener_base_url()
             
@@ -144,7 +143,7 @@ class AIConfigService:
                     headers["X-Title"] = Config.OPENROUTER_X_TITLE
             
             # Llamada simple para verificar la API key
-            response = requests.get(
+            response = cliente_http.get(
                 f"{base_url}/models",
                 headers=headers,
                 timeout=10
@@ -192,8 +191,6 @@ class AIConfigService:
             }
         
         try:
-            import requests
-            
             headers = {
                 "Authorization": f"Bearer {api_key}",
                 "Content-Type": "application/json"
@@ -216,7 +213,7 @@ class AIConfigService:
                 "max_tokens": 50
             }
             
-            response = requests.post(
+            response = cliente_http.post(
                 f"{base_url}/chat/completions",
                 headers=headers,
                 json=data,
@@ -0,0 +1,65 @@
+"""
+Cola de notificaciones post-commit.
+
+Las notificaciones (WhatsApp, email) se encolan en la sesión de base de datos y
+se envían solo después de que la transacción se confirma. Así una llamada lenta
+a la API externa nunca alarga una transacción abierta, y si la transacción se
+revierte no se notifica nada de lo que no llegó a persistirse.
+"""
+from typing import Callable
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, scoped_session
+
+logger = logging.getLogger(__name__)
+
+_CLAVE_COLA = 'notificaciones_post_commit'
+_CLAVE_REGISTRADA = 'notificaciones_post_commit_registrada'
+
+
+def _sesion_real(db) -> Session:
+    """Resuelve la sesión concreta cuando se recibe un scoped_session (db.session)."""
+    return db() if isinstance(db, scoped_session) else db
+
+
+def encolar_post_commit(db, funcion: Callable, *args, **kwargs) -> None:
+    """
+    Encola una notificación para ejecutarse tras el próximo commit de la sesión.
+
+    Los argumentos deben ser valores ya resueltos (strings, dicts): después del
+    commit no se puede consultar la base de datos desde el listener.
+
+    Args:
+        db: Sesión de base de datos
+        funcion: Función que envía la notificación
+        *args, **kwargs: Argumentos de la función
+    """
+    sesion = _sesion_real(db)
+    sesion.info.setdefault(_CLAVE_COLA, []).append((funcion, args, kwargs))
+
+    if not sesion.info.get(_CLAVE_REGISTRADA):
+        event.listen(sesion, 'after_commit', _despachar)
+        event.listen(sesion, 'after_rollback', _descartar)
+        sesion.info[_CLAVE_REGISTRADA] = True
+
+
+def _despachar(sesion: Session) -> None:
+    """Envía las notificaciones pendientes; los errores se registran sin propagarse."""
+    if sesion.in_nested_transaction():
+        return  # Liberar un savepoint no confirma nada todavía
+    pendientes = sesion.info.pop(_CLAVE_COLA, [])
+    for funcion, args, kwargs in pendientes:
+        try:
+            funcion(*args, **kwargs)
+        except Exception as e:
+            logger.warning(f"Error al enviar notificación post-commit: {e}", exc_info=True)
+
+
+def _descartar(sesion: Session) -> None:
+    """Descarta las notificaciones de una transacción revertida."""
+    if sesion.in_nested_transaction():
+        return  # Solo el rollback de la transacción externa descarta la cola
+    pendientes = sesion.info.pop(_CLAVE_COLA, [])
+    if pendientes:
+        logger.info(f"{len(pendientes)} notificaciones descartadas por rollback")
@@ -4,6 +4,7 @@ Integración con WhatsApp Business API.
 import requests
 from typing import Dict, Optional
 from config import Config
+from utils.http_cliente import cliente_http
 
 class WhatsAppService:
     """Servicio para envío de mensajes por WhatsApp."""
@@ -44,7 +45,7 @@ class WhatsAppService:
         }
         
         try:
-            response = requests.post(url, json=payload, headers=headers)
+            response = cliente_http.post(url, json=payload, headers=headers)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -87,7 +88,7 @@ class WhatsAppService:
             payload["image"]["caption"] = caption
         
         try:
-            response = requests.post(url, json=payload, headers=headers)
+            response = cliente_http.post(url, json=payload, headers=headers)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -197,7 +198,7 @@ class WhatsAppService:
                 "Authorization": f"Bearer {self.access_token}"
             }
             
-            response = requests.get(url, headers=headers)
+            response = cliente_http.get(url, headers=headers)
             response.raise_for_status()
             
             return {
@@ -2,8 +2,8 @@
 Lógica de negocio para gestión de proveedores.
 """
 from typing import List, Optional, Dict
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+from sqlalchemy.orm import Session, Query
+from sqlalchemy import or_, and_, func
 from models import Proveedor, Factura, PedidoCompra, Item, ItemLabel
 from models.item_label import item_labels
 from utils.validators import validate_email, validate_phone, validate_ruc
@@ -73,6 +73,29 @@ class ProveedorService:
         Returns:
             Lista de proveedores
         """
+        return ProveedorService.consulta_proveedores(
+            db, activo=activo, busqueda=busqueda, label_id=label_id
+        ).offset(skip).limit(limit).all()
+    
+    @staticmethod
+    def consulta_proveedores(
+        db: Session,
+        activo: Optional[bool] = None,
+        busqueda: Optional[str] = None,
+        label_id: Optional[int] = None
+    ) -> Query:
+        """
+        Consulta filtrada de proveedores (sin paginar), para listar o proyectar.
+        
+        Args:
+            db: Sesión de base de datos
+            activo: Filtrar por estado activo
+            busqueda: Búsqueda por nombre o RUC
+            label_id: Filtrar por label/clasificación de items que provee
+            
+        Returns:
+            Query de Proveedor ordenada por id
+        """
         query = db.query(Proveedor).distinct()
         
         if activo is not None:
@@ -93,12 +116,48 @@ class ProveedorService:
                          .filter(item_labels.c.label_id == label_id)\
                          .filter(Item.activo == True)
         
-        # Agregar eager loading para items y labels cuando se necesiten
-        from sqlalchemy.orm import selectinload
-        # No podemos usar eager loading aquí porque las relaciones son lazy='dynamic'
-        # En su lugar, cargaremos los items manualmente en el endpoint
+        return query.order_by(Proveedor.id)
+    
+    @staticmethod
+    def contar_items_y_labels(db: Session, proveedor_ids: List[int]) -> Dict[int, Dict[str, int]]:
+        """
+        Cuenta items activos y labels activos distintos por proveedor (dos consultas agrupadas).
+        
+        Args:
+            db: Sesión de base de datos
+            proveedor_ids: IDs de los proveedores
+            
+        Returns:
+            {proveedor_id: {'total_items': n, 'total_labels': m}}
+        """
+        conteos = {pid: {'total_items': 0, 'total_labels': 0} for pid in proveedor_ids}
+        if not proveedor_ids:
+            return conteos
         
-        return query.offset(skip).limit(limit).all()
+        items_por_proveedor = db.query(
+            Item.proveedor_autorizado_id, func.count(Item.id)
+        ).filter(
+            Item.proveedor_autorizado_id.in_(proveedor_ids),
+            Item.activo == True
+        ).group_by(Item.proveedor_autorizado_id).all()
+        for proveedor_id, total in items_por_proveedor:
+            conteos[proveedor_id]['total_items'] = total
+        
+        labels_por_proveedor = db.query(
+            Item.proveedor_autorizado_id, func.count(func.distinct(ItemLabel.id))
+        ).join(
+            item_labels, item_labels.c.item_id == Item.id
+        ).join(
+            ItemLabel, ItemLabel.id == item_labels.c.label_id
+        ).filter(
+            Item.proveedor_autorizado_id.in_(proveedor_ids),
+            Item.activo == True,
+            ItemLabel.activo == True
+        ).group_by(Item.proveedor_autorizado_id).all()
+        for proveedor_id, total in labels_por_proveedor:
+            conteos[proveedor_id]['total_labels'] = total
+        
+        return conteos
     
     @staticmethod
     def obtener_proveedor_con_items_labels(db: Session, proveedor_id: int) -> Optional[Dict]:
@@ -236,14 +295,24 @@ class ProveedorService:
     @staticmethod
     def obtener_historial_facturas(db: Session, proveedor_id: int) -> List[Factura]:
         """Obtiene el historial de facturas de un proveedor."""
+        return ProveedorService.consulta_historial_facturas(db, proveedor_id).all()
+    
+    @staticmethod
+    def consulta_historial_facturas(db: Session, proveedor_id: int) -> Query:
+        """Consulta ordenada del historial de facturas de un proveedor, para listar o proyectar."""
         return db.query(Factura).filter(
             Factura.proveedor_id == proveedor_id,
             Factura.tipo == 'proveedor'
-        ).order_by(Factura.fecha_emision.desc()).all()
+        ).order_by(Factura.fecha_emision.desc())
     
     @staticmethod
     def obtener_historial_pedidos(db: Session, proveedor_id: int) -> List[PedidoCompra]:
         """Obtiene el historial de pedidos de un proveedor."""
+        return ProveedorService.consulta_historial_pedidos(db, proveedor_id).all()
+    
+    @staticmethod
+    def consulta_historial_pedidos(db: Session, proveedor_id: int) -> Query:
+        """Consulta ordenada del historial de pedidos de un proveedor, para listar o proyectar."""
         return db.query(PedidoCompra).filter(
             PedidoCompra.proveedor_id == proveedor_id
-        ).order_by(PedidoCompra.fecha_pedido.desc()).all()
+        ).order_by(PedidoCompra.fecha_pedido.desc())
@@ -0,0 +1,477 @@
+"""
+Motor de reglas para la generación de tickets automáticos.
+
+Cada regla se evalúa para un rango de fechas completo con consultas
+agrupadas (conteos y sumas por día, ubicación y servicio; los umbrales de
+mermas van en el HAVING), sin cargar filas de charolas ni de mermas. Las
+reglas de charolas, programación y reportes comparten las dos consultas
+base (programaciones del rango y charolas por día/ubicación/servicio).
+
+Deduplicación:
+- Cada candidato lleva una clave estable regla:entidad:fecha que se guarda en
+  tickets.clave_deduplicacion (única).
+- Los candidatos ya generados se descartan con un único anti-join contra
+  tickets (VALUES en PostgreSQL; IN por lotes en otros motores).
+- Los nuevos se insertan con un solo INSERT masivo; en PostgreSQL con
+  ON CONFLICT DO NOTHING por si otro worker evaluó el mismo rango.
+
+Reglas:
+- charolas: charolas servidas vs planificadas, por programación y día
+- mermas: merma diaria por item sobre el límite estándar
+- inventario: stock bajo el mínimo (una vez mientras haya un ticket abierto)
+- programacion: servicios sin programación, por ubicación y día
+- reportes_faltantes: servicios programados sin charolas 2 horas después
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Set
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import func, case, insert, exists, values, column, String
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from models import Ticket, Charola, Merma, ProgramacionMenu, Inventario, Item, Proveedor
+from models.ticket import TipoTicket, EstadoTicket, PrioridadTicket
+from models.programacion import TiempoComida
+from modules.reportes.kpi_diario import KpiDiarioService
+from utils.cache_respuestas import invalidar_tags_post_commit
+from utils.helpers import filtro_rango_fechas
+
+# Horarios de servicio (hora local) y tiempo límite para reportar charolas
+HORARIOS_SERVICIO = {
+    TiempoComida.DESAYUNO: time(7, 0),
+    TiempoComida.ALMUERZO: time(13, 0),
+    TiempoComida.CENA: time(19, 0),
+}
+TIEMPO_LIMITE_REPORTE = timedelta(hours=2)
+
+# Umbrales
+DESVIACION_CHAROLAS_MINIMA = 5          # charolas
+DESVIACION_CHAROLAS_PORCENTAJE = 0.10   # 10% de lo planificado
+DESVIACION_CHAROLAS_ALTA = 20           # % para prioridad alta
+LIMITE_MERMA_PORCENTAJE = 0.05          # 5% del stock de referencia
+LIMITE_MERMA_ABSOLUTO = 10              # sin stock de referencia
+MERMA_PRIORIDAD_ALTA = 10               # % para prioridad alta
+
+MAX_DIAS_EVALUACION = 366
+_LOTE_CLAVES = 1000
+
+
+def _a_fecha(valor) -> date:
+    """Normaliza el resultado de func.date() (date en PostgreSQL, str en SQLite)."""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, str):
+        return date.fromisoformat(valor[:10])
+    return valor
+
+
+def _tiempo_comida(valor) -> Optional[TiempoComida]:
+    if isinstance(valor, TiempoComida):
+        return valor
+    texto = str(valor or '').strip()
+    for tiempo in TiempoComida:
+        if tiempo.value == texto.lower() or tiempo.name == texto.upper():
+            return tiempo
+    return None
+
+
+def _dias(desde: date, hasta: date) -> List[date]:
+    return [desde + timedelta(days=i) for i in range((hasta - desde).days + 1)]
+
+
+class _Contexto:
+    """Rango evaluado y consultas base compartidas por las reglas (se cargan una vez)."""
+
+    def __init__(self, db: Session, desde: date, hasta: date, ahora: datetime):
+        self.db = db
+        self.desde = desde
+        self.hasta = hasta
+        self.ahora = ahora
+        self._programaciones = None
+        self._charolas = None
+
+    @property
+    def programaciones(self) -> List[Dict]:
+        """Programaciones que se solapan con el rango, con sus días dentro del rango."""
+        if self._programaciones is None:
+            filas = self.db.query(
+                ProgramacionMenu.id,
+                ProgramacionMenu.fecha_desde,
+                ProgramacionMenu.fecha_hasta,
+                ProgramacionMenu.tiempo_comida,
+                ProgramacionMenu.ubicacion,
+                ProgramacionMenu.charolas_planificadas
+            ).filter(
+                ProgramacionMenu.fecha_desde <= self.hasta,
+                ProgramacionMenu.fecha_hasta >= self.desde
+            ).order_by(ProgramacionMenu.id).all()
+            self._programaciones = [{
+                'id': p.id,
+                'tiempo_comida': _tiempo_comida(p.tiempo_comida),
+                'ubicacion': p.ubicacion,
+                'charolas_planificadas': p.charolas_planificadas or 0,
+                'dias': _dias(max(p.fecha_desde, self.desde), min(p.fecha_hasta, self.hasta)),
+            } for p in filas]
+        return self._programaciones
+
+    @property
+    def charolas(self) -> Dict:
+        """(día, ubicación, tiempo de comida) -> charolas servidas, en una consulta agrupada."""
+        if self._charolas is None:
+            dia = func.date(Charola.fecha_servicio)
+            tiempo = func.lower(Charola.tiempo_comida)
+            self._charolas = {
+                (_a_fecha(fecha), ubicacion, tiempo_comida): int(conteo)
+                for fecha, ubicacion, tiempo_comida, conteo in self.db.query(
+                    dia, Charola.ubicacion, tiempo, func.count(Charola.id)
+                ).filter(
+                    filtro_rango_fechas(Charola.fecha_servicio, self.desde, self.hasta)
+                ).group_by(dia, Charola.ubicacion, tiempo)
+            }
+        return self._charolas
+
+
+def _regla_charolas(ctx: _Contexto) -> List[Dict]:
+    candidatos = []
+    for p in ctx.programaciones:
+        planificadas = p['charolas_planificadas']
+        if planificadas <= 0 or p['tiempo_comida'] is None:
+            continue
+        servicio = p['tiempo_comida'].value
+        for fecha in p['dias']:
+            servidas = ctx.charolas.get((fecha, p['ubicacion'], servicio), 0)
+            diferencia = servidas - planificadas
+            if abs(diferencia) <= max(DESVIACION_CHAROLAS_MINIMA, planificadas * DESVIACION_CHAROLAS_PORCENTAJE):
+                continue
+            porcentaje = diferencia / planificadas * 100
+            candidatos.append({
+                'clave_deduplicacion': f"charolas:{p['id']}:{fecha.isoformat()}",
+                'tipo': TipoTicket.CONSULTA if diferencia < 0 else TipoTicket.QUEJA,
+                'prioridad': PrioridadTicket.ALTA if abs(porcentaje) > DESVIACION_CHAROLAS_ALTA else PrioridadTicket.MEDIA,
+                'asunto': f"Desviación en charolas - {servicio.capitalize()}",
+                'descripcion': (
+                    f"Desviación detectada en el servicio de {servicio} "
+                    f"del {fecha.strftime('%d/%m/%Y')} en {p['ubicacion']}.\n\n"
+                    f"Charolas planificadas: {planificadas}\n"
+                    f"Charolas servidas: {servidas}\n"
+                    f"Diferencia: {diferencia:+d} ({porcentaje:+.1f}%)\n\n"
+                    f"Programación ID: {p['id']}"
+                ),
+                'programacion_id': p['id'],
+                'origen_modulo': 'charola',
+            })
+    return candidatos
+
+
+def _regla_mermas(ctx: _Contexto) -> List[Dict]:
+    dia = func.date(Merma.fecha_merma)
+    referencia = case(
+        (Inventario.cantidad_actual >= Inventario.cantidad_minima, Inventario.cantidad_actual),
+        else_=Inventario.cantidad_minima
+    )
+    total_cantidad = func.sum(Merma.cantidad)
+    # Sobre el 5% del stock de referencia; sin referencia, sobre el límite absoluto
+    limite = case(
+        (func.coalesce(referencia, 0) > 0, referencia * LIMITE_MERMA_PORCENTAJE),
+        else_=LIMITE_MERMA_ABSOLUTO
+    )
+    filas = ctx.db.query(
+        dia,
+        Merma.item_id,
+        Item.nombre,
+        Item.unidad,
+        func.count(Merma.id),
+        total_cantidad,
+        func.sum(Merma.costo_total),
+        func.min(Merma.id),
+        referencia
+    ).join(Item, Item.id == Merma.item_id).outerjoin(
+        Inventario, Inventario.item_id == Merma.item_id
+    ).filter(
+        filtro_rango_fechas(Merma.fecha_merma, ctx.desde, ctx.hasta)
+    ).group_by(
+        dia, Merma.item_id, Item.nombre, Item.unidad,
+        Inventario.cantidad_actual, Inventario.cantidad_minima
+    ).having(total_cantidad > limite).all()
+
+    candidatos = []
+    for fecha, item_id, nombre, unidad, registros, cantidad, costo, merma_id, referencia_item in filas:
+        fecha = _a_fecha(fecha)
+        cantidad = float(cantidad or 0)
+        referencia_item = float(referencia_item or 0)
+        limite_absoluto = max(LIMITE_MERMA_ABSOLUTO, referencia_item * LIMITE_MERMA_PORCENTAJE)
+        porcentaje = cantidad / referencia_item * 100 if referencia_item > 0 else 0
+        candidatos.append({
+            'clave_deduplicacion': f"mermas:{item_id}:{fecha.isoformat()}",
+            'tipo': TipoTicket.QUEJA,
+            'prioridad': PrioridadTicket.ALTA if porcentaje > MERMA_PRIORIDAD_ALTA else PrioridadTicket.MEDIA,
+            'asunto': f"Merma excesiva - {nombre}",
+            'descripcion': (
+                f"Merma excesiva detectada para el item '{nombre}' "
+                f"el {fecha.strftime('%d/%m/%Y')}.\n\n"
+                f"Cantidad de merma: {cantidad:.2f} {unidad}\n"
+                f"Costo total: ${float(costo or 0):.2f}\n"
+                f"Límite absoluto: {limite_absoluto:.2f} {unidad}\n"
+                f"Porcentaje vs referencia: {porcentaje:.2f}%\n"
+                f"Registros de merma: {registros}\n\n"
+                f"Merma ID principal: {merma_id}"
+            ),
+            'merma_id': merma_id,
+            'origen_modulo': 'merma',
+        })
+    return candidatos
+
+
+def _regla_inventario(ctx: _Contexto) -> List[Dict]:
+    ticket_abierto = exists().where(
+        Ticket.inventario_id == Inventario.id,
+        Ticket.origen_modulo == 'inventario',
+        Ticket.estado.in_([EstadoTicket.ABIERTO, EstadoTicket.EN_PROCESO])
+    )
+    filas = ctx.db.query(
+        Inventario.id,
+        Inventario.item_id,
+        Inventario.cantidad_actual,
+        Inventario.cantidad_minima,
+        Inventario.unidad,
+        Item.nombre,
+        Item.proveedor_autorizado_id,
+        Proveedor.nombre
+    ).join(Item, Item.id == Inventario.item_id).outerjoin(
+        Proveedor, Proveedor.id == Item.proveedor_autorizado_id
+    ).filter(
+        Inventario.cantidad_actual < Inventario.cantidad_minima,
+        ~ticket_abierto
+    ).all()
+
+    candidatos = []
+    for inventario_id, item_id, actual, minima, unidad, nombre, proveedor_id, proveedor in filas:
+        actual, minima = float(actual), float(minima)
+        diferencia = minima - actual
+        porcentaje = diferencia / minima * 100 if minima > 0 else 0
+        descripcion = (
+            f"El inventario del item '{nombre}' está por debajo del mínimo de seguridad.\n\n"
+            f"Cantidad actual: {actual:.2f} {unidad}\n"
+            f"Cantidad mínima: {minima:.2f} {unidad}\n"
+            f"Faltante: {diferencia:.2f} {unidad} ({porcentaje:.1f}%)\n\n"
+            f"Inventario ID: {inventario_id}\n"
+            f"Item ID: {item_id}"
+        )
+        if proveedor:
+            descripcion += f"\nProveedor autorizado: {proveedor}"
+        candidatos.append({
+            'clave_deduplicacion': f"inventario:{inventario_id}:{ctx.ahora.date().isoformat()}",
+            'tipo': TipoTicket.CONSULTA,
+            'prioridad': PrioridadTicket.URGENTE if porcentaje > 50 else PrioridadTicket.ALTA,
+            'asunto': f"Inventario bajo mínimo - {nombre}",
+            'descripcion': descripcion,
+            'inventario_id': inventario_id,
+            'proveedor_id': proveedor_id,
+            'origen_modulo': 'inventario',
+        })
+    return candidatos
+
+
+def _regla_programacion(ctx: _Contexto) -> List[Dict]:
+    # Ubicaciones activas: las que han registrado charolas
+    ubicaciones = sorted(u for (u,) in ctx.db.query(Charola.ubicacion).distinct() if u) or ['principal']
+    cubiertos = {
+        (fecha, p['ubicacion'], p['tiempo_comida'])
+        for p in ctx.programaciones for fecha in p['dias']
+    }
+
+    candidatos = []
+    for fecha in _dias(ctx.desde, ctx.hasta):
+        for ubicacion in ubicaciones:
+            for tiempo in TiempoComida:
+                if (fecha, ubicacion, tiempo) in cubiertos:
+                    continue
+                servicio = tiempo.value
+                candidatos.append({
+                    'clave_deduplicacion': f"programacion:{ubicacion}:{servicio}:{fecha.isoformat()}",
+                    'tipo': TipoTicket.CONSULTA,
+                    'prioridad': PrioridadTicket.ALTA,
+                    'asunto': f"Falta programación - {servicio.capitalize()} - {ubicacion}",
+                    'descripcion': (
+                        f"No se ha programado el menú para el servicio de {servicio} "
+                        f"del {fecha.strftime('%d/%m/%Y')} en {ubicacion}.\n\n"
+                        f"Sin programación no se puede:\n"
+                        f"- Determinar qué menús servir\n"
+                        f"- Calcular compras necesarias\n"
+                        f"- Verificar stock adecuado\n"
+                        f"- Planificar charolas a servir\n\n"
+                        f"Fecha: {fecha.strftime('%d/%m/%Y')}\n"
+                        f"Servicio: {servicio}\n"
+                        f"Ubicación: {ubicacion}"
+                    ),
+                    'origen_modulo': 'programacion',
+                })
+    return candidatos
+
+
+def _regla_reportes_faltantes(ctx: _Contexto) -> List[Dict]:
+    candidatos = []
+    for p in ctx.programaciones:
+        if p['charolas_planificadas'] <= 0 or p['tiempo_comida'] not in HORARIOS_SERVICIO:
+            continue
+        servicio = p['tiempo_comida'].value
+        for fecha in p['dias']:
+            hora_limite = datetime.combine(fecha, HORARIOS_SERVICIO[p['tiempo_comida']]) + TIEMPO_LIMITE_REPORTE
+            if ctx.ahora < hora_limite or ctx.charolas.get((fecha, p['ubicacion'], servicio), 0) > 0:
+                continue
+            candidatos.append({
+                'clave_deduplicacion': f"reportes_faltantes:{p['id']}:{fecha.isoformat()}",
+                'tipo': TipoTicket.CONSULTA,
+                'prioridad': PrioridadTicket.MEDIA,
+                'asunto': f"Reporte faltante - {servicio.capitalize()} - {p['ubicacion']}",
+                'descripcion': (
+                    f"No se ha ingresado el reporte de charolas para el servicio de {servicio} "
+                    f"del {fecha.strftime('%d/%m/%Y')} en {p['ubicacion']}.\n\n"
+                    f"Tiempo límite: {hora_limite.strftime('%d/%m/%Y %H:%M')}\n"
+                    f"Charolas planificadas: {p['charolas_planificadas']}\n"
+                    f"Charolas reportadas: 0\n\n"
+                    f"El encargado debe ingresar manualmente el reporte en tiempo.\n"
+                    f"Si no lo genera hasta 2 horas después del servicio, se autogenera este ticket.\n\n"
+                    f"Programación ID: {p['id']}"
+                ),
+                'programacion_id': p['id'],
+                'origen_modulo': 'charola',
+            })
+    return candidatos
+
+
+# Nombre de la regla -> evaluador (el orden es el de ejecución)
+REGLAS: Dict[str, Callable[[_Contexto], List[Dict]]] = {
+    'charolas': _regla_charolas,
+    'mermas': _regla_mermas,
+    'inventario': _regla_inventario,
+    'programacion': _regla_programacion,
+    'reportes_faltantes': _regla_reportes_faltantes,
+}
+
+
+class ReglasTicketsService:
+    """Evaluación de las reglas de tickets automáticos sobre un rango de fechas."""
+
+    @staticmethod
+    def evaluar(
+        db: Session,
+        fecha_desde: date,
+        fecha_hasta: Optional[date] = None,
+        reglas: Optional[Iterable[str]] = None,
+        ahora: Optional[datetime] = None
+    ) -> Dict:
+        """
+        Evalúa las reglas para [fecha_desde, fecha_hasta] e inserta los tickets nuevos.
+        No hace commit.
+
+        Args:
+            db: Sesión de base de datos
+            fecha_desde: Primer día (inclusive)
+            fecha_hasta: Último día (inclusive, por defecto fecha_desde)
+            reglas: Reglas a evaluar (por defecto, todas)
+            ahora: Hora local de referencia para los tiempos límite (por defecto, ahora)
+
+        Returns:
+            Diccionario con el rango, los candidatos, los duplicados descartados
+            y los IDs de tickets generados por regla
+        """
+        fecha_hasta = fecha_hasta or fecha_desde
+        if fecha_hasta < fecha_desde:
+            raise ValueError("fecha_hasta debe ser mayor o igual a fecha_desde")
+        dias = (fecha_hasta - fecha_desde).days + 1
+        if dias > MAX_DIAS_EVALUACION:
+            raise ValueError(f"El rango no puede superar {MAX_DIAS_EVALUACION} días (solicitado: {dias})")
+        reglas = list(reglas or REGLAS)
+        desconocidas = [r for r in reglas if r not in REGLAS]
+        if desconocidas:
+            raise ValueError(f"Reglas desconocidas: {desconocidas}. Reglas válidas: {list(REGLAS)}")
+
+        ctx = _Contexto(db, fecha_desde, fecha_hasta, ahora or datetime.now())
+        candidatos = []
+        for regla in reglas:
+            for candidato in REGLAS[regla](ctx):
+                candidato['regla'] = regla
+                candidatos.append(candidato)
+
+        existentes = ReglasTicketsService._claves_existentes(
+            db, [c['clave_deduplicacion'] for c in candidatos]
+        )
+        nuevos = [c for c in candidatos if c['clave_deduplicacion'] not in existentes]
+        ids_por_clave = ReglasTicketsService._insertar(db, nuevos)
+
+        generados = {regla: [] for regla in reglas}
+        for candidato in nuevos:
+            ticket_id = ids_por_clave.get(candidato['clave_deduplicacion'])
+            if ticket_id is not None:
+                generados[candidato['regla']].append(ticket_id)
+
+        return {
+            'fecha_desde': fecha_desde.isoformat(),
+            'fecha_hasta': fecha_hasta.isoformat(),
+            'candidatos': len(candidatos),
+            'duplicados': len(candidatos) - len(nuevos),
+            'tickets_generados': generados,
+            'total': sum(len(ids) for ids in generados.values()),
+        }
+
+    @staticmethod
+    def _claves_existentes(db: Session, claves: List[str]) -> Set[str]:
+        """Claves de candidatos que ya tienen ticket (anti-join contra tickets)."""
+        if not claves:
+            return set()
+        if db.get_bind().dialect.name == 'postgresql':
+            # SELECT c.clave FROM (VALUES ...) AS c(clave) JOIN tickets ON ... en una sola consulta
+            candidatas = values(column('clave', String), name='candidatas').data([(c,) for c in claves])
+            return {
+                clave for (clave,) in db.query(candidatas.c.clave).join(
+                    Ticket, Ticket.clave_deduplicacion == candidatas.c.clave
+                )
+            }
+
+        existentes = set()
+        for inicio in range(0, len(claves), _LOTE_CLAVES):
+            lote = claves[inicio:inicio + _LOTE_CLAVES]
+            existentes.update(
+                clave for (clave,) in db.query(Ticket.clave_deduplicacion).filter(
+                    Ticket.clave_deduplicacion.in_(lote)
+                )
+            )
+        return existentes
+
+    @staticmethod
+    def _insertar(db: Session, candidatos: List[Dict]) -> Dict[str, int]:
+        """Inserta los tickets en una sentencia masiva. Retorna clave -> ticket_id."""
+        if not candidatos:
+            return {}
+        ahora = datetime.utcnow()
+        filas = [{
+            'cliente_id': 0,  # Tickets automáticos usan cliente dummy id=0
+            'tipo': c['tipo'],
+            'asunto': c['asunto'],
+            'descripcion': c['descripcion'],
+            'estado': EstadoTicket.ABIERTO,
+            'prioridad': c['prioridad'],
+            'fecha_creacion': ahora,
+            'programacion_id': c.get('programacion_id'),
+            'merma_id': c.get('merma_id'),
+            'inventario_id': c.get('inventario_id'),
+            'proveedor_id': c.get('proveedor_id'),
+            'origen_modulo': c['origen_modulo'],
+            'auto_generado': 'true',
+            'clave_deduplicacion': c['clave_deduplicacion'],
+        } for c in candidatos]
+
+        if db.get_bind().dialect.name == 'postgresql':
+            # Otro worker pudo generar el mismo ticket entre el anti-join y el insert
+            sentencia = pg_insert(Ticket).on_conflict_do_nothing(index_elements=['clave_deduplicacion'])
+        else:
+            sentencia = insert(Ticket)
+        insertados = db.execute(
+            sentencia.returning(Ticket.id, Ticket.clave_deduplicacion), filas
+        ).all()
+
+        # El INSERT masivo no pasa por los eventos de flush de kpi_diario
+        KpiDiarioService.marcar_dia_modificado(db, 'tickets', ahora)
+        invalidar_tags_post_commit(db, 'tickets')
+        return {clave: ticket_id for ticket_id, clave in insertados}
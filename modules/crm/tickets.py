@@ -3,10 +3,11 @@ Lógica de negocio para gestión de tickets.
 """
 from typing import List, Optional, Dict
 from datetime import datetime
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_
+from sqlalchemy.orm import Session, Query, joinedload
+from sqlalchemy import and_, or_, false
 from models import Ticket
 from models.ticket import EstadoTicket, TipoTicket, PrioridadTicket
+from utils.cache_respuestas import invalidar_tags_post_commit
 
 class TicketService:
     """Servicio para gestión de tickets."""
@@ -42,6 +43,7 @@ class TicketService:
         
         ticket = Ticket(**ticket_data)
         db.add(ticket)
+        invalidar_tags_post_commit(db, 'tickets')
         db.commit()
         db.refresh(ticket)
         return ticket
@@ -85,6 +87,39 @@ class TicketService:
         Returns:
             Lista de tickets
         """
+        return TicketService.consulta_tickets(
+            db,
+            cliente_id=cliente_id,
+            estado=estado,
+            tipo=tipo,
+            asignado_a=asignado_a
+        ).options(joinedload(Ticket.proveedor)).offset(skip).limit(limit).all()
+    
+    @staticmethod
+    def consulta_tickets(
+        db: Session,
+        cliente_id: Optional[int] = None,
+        estado: Optional[str] = None,
+        tipo: Optional[str] = None,
+        asignado_a: Optional[int] = None,
+        prioridad: Optional[str] = None,
+        busqueda: Optional[str] = None
+    ) -> Query:
+        """
+        Consulta filtrada y ordenada de tickets (sin paginar), para listar o proyectar.
+        
+        Args:
+            db: Sesión de base de datos
+            cliente_id: Filtrar por cliente
+            estado: Filtrar por estado
+            tipo: Filtrar por tipo
+            asignado_a: Filtrar por usuario asignado
+            prioridad: Filtrar por prioridad
+            busqueda: Texto a buscar en asunto o descripción
+            
+        Returns:
+            Query de Ticket ordenada por fecha de creación descendente
+        """
         query = db.query(Ticket)
         
         if cliente_id:
@@ -124,10 +159,20 @@ class TicketService:
         if asignado_a:
             query = query.filter(Ticket.asignado_a == asignado_a)
         
-        # Cargar el proveedor junto con los tickets para evitar N+1 queries
-        query = query.options(joinedload(Ticket.proveedor))
+        if prioridad:
+            try:
+                query = query.filter(Ticket.prioridad == PrioridadTicket[prioridad.upper()])
+            except KeyError:
+                # Prioridad inválida: ningún ticket coincide
+                query = query.filter(false())
+        
+        if busqueda:
+            query = query.filter(or_(
+                Ticket.asunto.ilike(f'%{busqueda}%'),
+                Ticket.descripcion.ilike(f'%{busqueda}%')
+            ))
         
-        return query.order_by(Ticket.fecha_creacion.desc()).offset(skip).limit(limit).all()
+        return query.order_by(Ticket.fecha_creacion.desc(), Ticket.id.desc())
     
     @staticmethod
     def actualizar_ticket(db: Session, ticket_id: int, datos: Dict) -> Ticket:
@@ -166,6 +211,7 @@ class TicketService:
                         value = enum_class[value.upper()]
                 setattr(ticket, key, value)
         
+        invalidar_tags_post_commit(db, 'tickets')
         db.commit()
         db.refresh(ticket)
         return ticket
@@ -191,6 +237,7 @@ class TicketService:
         if ticket.estado == EstadoTicket.ABIERTO:
             ticket.estado = EstadoTicket.EN_PROCESO
         
+        invalidar_tags_post_commit(db, 'tickets')
         db.commit()
         db.refresh(ticket)
         return ticket
@@ -216,6 +263,7 @@ class TicketService:
         ticket.respuesta = respuesta
         ticket.fecha_resolucion = datetime.utcnow()
         
+        invalidar_tags_post_commit(db, 'tickets')
         db.commit()
         db.refresh(ticket)
         return ticket
@@ -12,6 +12,7 @@ from models import (
 )
 from models.pedido import EstadoPedido
 from models.factura import EstadoFactura, TipoFactura
+from utils.helpers import filtro_rango_fechas
 
 class ComprasStatsService:
     """Servicio para estadísticas de compras."""
@@ -39,16 +40,10 @@ class ComprasStatsService:
             if fecha_hasta is None:
                 fecha_hasta = date.today()
             
-            fecha_desde_dt = datetime.combine(fecha_desde, datetime.min.time())
-            fecha_hasta_dt = datetime.combine(fecha_hasta, datetime.max.time())
-            
             # Total de pedidos
             try:
                 total_pedidos = db.query(PedidoCompra).filter(
-                    and_(
-                        PedidoCompra.fecha_pedido >= fecha_desde_dt,
-                        PedidoCompra.fecha_pedido <= fecha_hasta_dt
-                    )
+                    filtro_rango_fechas(PedidoCompra.fecha_pedido, fecha_desde, fecha_hasta)
                 ).count()
             except Exception:
                 total_pedidos = 0
@@ -59,10 +54,7 @@ class ComprasStatsService:
                     PedidoCompra.estado,
                     func.count(PedidoCompra.id).label('cantidad')
                 ).filter(
-                    and_(
-                        PedidoCompra.fecha_pedido >= fecha_desde_dt,
-                        PedidoCompra.fecha_pedido <= fecha_hasta_dt
-                    )
+                    filtro_rango_fechas(PedidoCompra.fecha_pedido, fecha_desde, fecha_hasta)
                 ).group_by(PedidoCompra.estado).all()
             except Exception:
                 pedidos_por_estado = []
@@ -72,8 +64,7 @@ class ComprasStatsService:
                 total_facturas = db.query(Factura).filter(
                     and_(
                         Factura.tipo == TipoFactura.PROVEEDOR,
-                        Factura.fecha_recepcion >= fecha_desde_dt,
-                        Factura.fecha_recepcion <= fecha_hasta_dt
+                        filtro_rango_fechas(Factura.fecha_recepcion, fecha_desde, fecha_hasta)
                     )
                 ).count()
             except Exception:
@@ -86,8 +77,7 @@ class ComprasStatsService:
                 ).filter(
                     and_(
                         PedidoCompra.estado == EstadoPedido.RECIBIDO,
-                        PedidoCompra.fecha_pedido >= fecha_desde_dt,
-                        PedidoCompra.fecha_pedido <= fecha_hasta_dt
+                        filtro_rango_fechas(PedidoCompra.fecha_pedido, fecha_desde, fecha_hasta)
                     )
                 ).scalar() or 0
             except Exception:
@@ -101,8 +91,7 @@ class ComprasStatsService:
                     and_(
                         Factura.tipo == TipoFactura.PROVEEDOR,
                         Factura.estado == EstadoFactura.APROBADA,
-                        Factura.fecha_recepcion >= fecha_desde_dt,
-                        Factura.fecha_recepcion <= fecha_hasta_dt
+                        filtro_rango_fechas(Factura.fecha_recepcion, fecha_desde, fecha_hasta)
                     )
                 ).scalar() or 0
             except Exception:
@@ -190,9 +179,6 @@ class ComprasStatsService:
         if fecha_hasta is None:
             fecha_hasta = date.today()
         
-        fecha_desde_dt = datetime.combine(fecha_desde, datetime.min.time())
-        fecha_hasta_dt = datetime.combine(fecha_hasta, datetime.max.time())
-        
         # Estadísticas desde pedidos recibidos
         stats_pedidos = db.query(
             PedidoCompraItem.item_id,
@@ -205,8 +191,7 @@ class ComprasStatsService:
         ).filter(
             and_(
                 PedidoCompra.estado == EstadoPedido.RECIBIDO,
-                PedidoCompra.fecha_pedido >= fecha_desde_dt,
-                PedidoCompra.fecha_pedido <= fecha_hasta_dt
+                filtro_rango_fechas(PedidoCompra.fecha_pedido, fecha_desde, fecha_hasta)
             )
         ).group_by(PedidoCompraItem.item_id).subquery()
         
@@ -223,8 +208,7 @@ class ComprasStatsService:
             and_(
                 Factura.tipo == TipoFactura.PROVEEDOR,
                 Factura.estado == EstadoFactura.APROBADA,
-                Factura.fecha_recepcion >= fecha_desde_dt,
-                Factura.fecha_recepcion <= fecha_hasta_dt,
+                filtro_rango_fechas(Factura.fecha_recepcion, fecha_desde, fecha_hasta),
                 FacturaItem.item_id.isnot(None)
             )
         ).group_by(FacturaItem.item_id).subquery()
@@ -347,9 +331,6 @@ class ComprasStatsService:
         if fecha_hasta is None:
             fecha_hasta = date.today()
         
-        fecha_desde_dt = datetime.combine(fecha_desde, datetime.min.time())
-        fecha_hasta_dt = datetime.combine(fecha_hasta, datetime.max.time())
-        
         # Estadísticas desde pedidos recibidos
         stats_pedidos = db.query(
             PedidoCompra.proveedor_id,
@@ -359,8 +340,7 @@ class ComprasStatsService:
         ).filter(
             and_(
                 PedidoCompra.estado == EstadoPedido.RECIBIDO,
-                PedidoCompra.fecha_pedido >= fecha_desde_dt,
-                PedidoCompra.fecha_pedido <= fecha_hasta_dt
+                filtro_rango_fechas(PedidoCompra.fecha_pedido, fecha_desde, fecha_hasta)
             )
         ).group_by(PedidoCompra.proveedor_id).subquery()
         
@@ -374,8 +354,7 @@ class ComprasStatsService:
             and_(
                 Factura.tipo == TipoFactura.PROVEEDOR,
                 Factura.estado == EstadoFactura.APROBADA,
-                Factura.fecha_recepcion >= fecha_desde_dt,
-                Factura.fecha_recepcion <= fecha_hasta_dt
+                filtro_rango_fechas(Factura.fecha_recepcion, fecha_desde, fecha_hasta)
             )
         ).group_by(Factura.proveedor_id).subquery()
         
@@ -484,15 +463,11 @@ class ComprasStatsService:
         if fecha_hasta is None:
             fecha_hasta = date.today()
         
-        fecha_desde_dt = datetime.combine(fecha_desde, datetime.min.time())
-        fecha_hasta_dt = datetime.combine(fecha_hasta, datetime.max.time())
-        
         # Pedidos generados automáticamente (desde programación)
         pedidos_automaticos = db.query(PedidoCompra).filter(
             and_(
                 PedidoCompra.observaciones.like('%automático%'),
-                PedidoCompra.fecha_pedido >= fecha_desde_dt,
-                PedidoCompra.fecha_pedido <= fecha_hasta_dt
+                filtro_rango_fechas(PedidoCompra.fecha_pedido, fecha_desde, fecha_hasta)
             )
         ).count()
         
@@ -503,8 +478,7 @@ class ComprasStatsService:
             and_(
                 PedidoCompra.observaciones.like('%automático%'),
                 PedidoCompra.estado == EstadoPedido.RECIBIDO,
-                PedidoCompra.fecha_pedido >= fecha_desde_dt,
-                PedidoCompra.fecha_pedido <= fecha_hasta_dt
+                filtro_rango_fechas(PedidoCompra.fecha_pedido, fecha_desde, fecha_hasta)
             )
         ).scalar() or 0
         
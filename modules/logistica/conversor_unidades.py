@@ -1,195 +1,330 @@
 """
 Servicio para conversión de unidades compatibles.
+
+Las tablas se construyen una sola vez al importar el módulo (RegistroUnidades):
+- alias -> unidad canónica (mayúsculas, plurales, abreviaturas: 'L', 'Kgs', 'litros')
+- factor de cada unidad canónica a la base de su grupo (kg, l, unidad)
+- matriz NxN de factores entre unidades canónicas (NaN si son de grupos distintos)
+
+Peso <-> volumen solo se convierte con una densidad explícita (kg por litro),
+normalmente Item.densidad. Las funciones de módulo (convertir_unidad,
+convertir_a_gramos, factores_conversion...) son envolturas del registro global.
 """
 from typing import Optional, Dict, Tuple
 
-# Factores de conversión a unidades base
-CONVERSIONES = {
+import numpy as np
+
+# Unidades canónicas: grupo y factor a la unidad base del grupo
+UNIDADES = {
     # Peso: base = kg
-    'kg': 1.0,
-    'g': 0.001,
-    'gramo': 0.001,
-    'gramos': 0.001,
-    'ton': 1000.0,
-    'tonelada': 1000.0,
-    'toneladas': 1000.0,
-    'lb': 0.453592,  # libras a kg
-    'libras': 0.453592,
-    'oz': 0.0283495,  # onzas a kg
-    'onzas': 0.0283495,
-    'qq': 45.3592,  # quintal a kg (1 quintal = 100 libras = 45.3592 kg)
-    'quintal': 45.3592,
-    'quintales': 45.3592,
-    'arrobas': 11.3398,  # arroba a kg (1 arroba = 25 libras = 11.3398 kg)
-    'arroba': 11.3398,
-    
+    'kg': ('peso', 1.0),
+    'g': ('peso', 0.001),
+    'ton': ('peso', 1000.0),
+    'lb': ('peso', 0.453592),  # libras a kg
+    'oz': ('peso', 0.0283495),  # onzas a kg
+    'qq': ('peso', 45.3592),  # quintal a kg (1 quintal = 100 libras = 45.3592 kg)
+    'arroba': ('peso', 11.3398),  # arroba a kg (1 arroba = 25 libras = 11.3398 kg)
+
     # Volumen: base = l (litros)
-    'l': 1.0,
-    'litro': 1.0,
-    'litros': 1.0,
-    'ml': 0.001,
-    'mililitro': 0.001,
-    'mililitros': 0.001,
-    'cl': 0.01,
-    'centilitro': 0.01,
-    'centilitros': 0.01,
-    'dl': 0.1,
-    'decilitro': 0.1,
-    'decilitros': 0.1,
-    'gal': 3.78541,  # galones a litros
-    'galon': 3.78541,
-    'galones': 3.78541,
-    'fl_oz': 0.0295735,  # onzas fluidas a litros
-    'onza_fluida': 0.0295735,
-    'onzas_fluidas': 0.0295735,
-    
+    'l': ('volumen', 1.0),
+    'ml': ('volumen', 0.001),
+    'cl': ('volumen', 0.01),
+    'dl': ('volumen', 0.1),
+    'gal': ('volumen', 3.78541),  # galones a litros
+    'fl_oz': ('volumen', 0.0295735),  # onzas fluidas a litros
+
     # Unidades discretas: base = unidad
-    'unidad': 1.0,
-    'unidades': 1.0,
-    'caja': 1.0,  # Se mantiene como está
-    'cajas': 1.0,
-    'paquete': 1.0,  # Se mantiene como está
-    'paquetes': 1.0,
-    'docena': 12.0,
-    'docenas': 12.0,
-    'centena': 100.0,
-    'centenas': 100.0,
+    'unidad': ('discreto', 1.0),
+    'caja': ('discreto', 1.0),  # Se mantiene como está
+    'paquete': ('discreto', 1.0),  # Se mantiene como está
+    'docena': ('discreto', 12.0),
+    'centena': ('discreto', 100.0),
+}
+
+# Alias -> unidad canónica (en minúsculas y sin punto final; otros plurales
+# terminados en 's'/'es' se resuelven en RegistroUnidades.normalizar)
+ALIAS_UNIDADES = {
+    'gramo': 'g', 'gramos': 'g', 'gr': 'g', 'grs': 'g',
+    'kilo': 'kg', 'kilos': 'kg', 'kilogramo': 'kg', 'kilogramos': 'kg', 'kgs': 'kg',
+    'tonelada': 'ton', 'toneladas': 'ton',
+    'libra': 'lb', 'libras': 'lb', 'lbs': 'lb',
+    'onza': 'oz', 'onzas': 'oz',
+    'quintal': 'qq', 'quintales': 'qq',
+    'arrobas': 'arroba',
+    'litro': 'l', 'litros': 'l', 'lt': 'l', 'lts': 'l',
+    'mililitro': 'ml', 'mililitros': 'ml', 'cc': 'ml',
+    'centilitro': 'cl', 'centilitros': 'cl',
+    'decilitro': 'dl', 'decilitros': 'dl',
+    'galon': 'gal', 'galón': 'gal', 'galones': 'gal',
+    'onza_fluida': 'fl_oz', 'onzas_fluidas': 'fl_oz',
+    'unidades': 'unidad', 'und': 'unidad', 'unid': 'unidad',
+    'cajas': 'caja',
+    'paquetes': 'paquete',
+    'docenas': 'docena',
+    'centenas': 'centena',
+}
+
+UNIDAD_BASE_GRUPO = {'peso': 'kg', 'volumen': 'l', 'discreto': 'unidad'}
+
+# Factores de conversión a unidades base (por alias, como se escriben en facturas y recetas)
+CONVERSIONES = {
+    alias: UNIDADES[canonica][1]
+    for alias, canonica in [(u, u) for u in UNIDADES] + list(ALIAS_UNIDADES.items())
 }
 
-# Grupos de unidades compatibles
+# Grupos de unidades compatibles (unidades canónicas)
 GRUPOS_UNIDADES = {
-    'peso': ['kg', 'g', 'ton', 'lb', 'oz'],
-    'volumen': ['l', 'ml', 'cl', 'dl', 'gal', 'fl_oz'],
-    'discreto': ['unidad', 'caja', 'paquete', 'docena', 'centena'],
+    grupo: [u for u, (grupo_u, _) in UNIDADES.items() if grupo_u == grupo]
+    for grupo in UNIDAD_BASE_GRUPO
 }
 
+
+class RegistroUnidades:
+    """
+    Tablas de conversión precalculadas.
+
+    Cada unidad canónica tiene un índice; el índice len(unidades) representa
+    una unidad desconocida (fila y columna de NaN en la matriz), así los
+    arreglos de unidades se convierten con una sola indexación NumPy.
+    """
+
+    def __init__(self, unidades: Dict[str, Tuple[str, float]], alias: Dict[str, str]):
+        self.canonicas = list(unidades)
+        self.indice = {u: i for i, u in enumerate(self.canonicas)}
+        self.desconocida = len(self.canonicas)
+
+        grupos = list(UNIDAD_BASE_GRUPO)
+        self.grupos = grupos + [None]
+        self.grupo_idx = np.array([grupos.index(g) for g, _ in unidades.values()] + [-1])
+        self.base = np.array([f for _, f in unidades.values()] + [np.nan])
+
+        # Razón entre factores base para todo par; la matriz solo conserva pares del mismo grupo
+        self.razon = self.base[:, None] / self.base[None, :]
+        mismo_grupo = (self.grupo_idx[:, None] == self.grupo_idx[None, :]) & (self.grupo_idx[:, None] >= 0)
+        self.matriz = np.where(mismo_grupo, self.razon, np.nan)
+        # Gramos por unidad (0 para la desconocida), sin el ruido de float de base * 1000
+        self.gramos = np.nan_to_num(np.round(self.base * 1000.0, 9))
+
+        self._alias = {u: u for u in self.canonicas}
+        self._alias.update(alias)
+        self._normalizadas: Dict[str, Optional[str]] = {}
+        self._peso = grupos.index('peso')
+        self._volumen = grupos.index('volumen')
+
+    def normalizar(self, unidad: Optional[str]) -> Optional[str]:
+        """
+        Unidad canónica de un alias ('Kgs' -> 'kg', 'Litros' -> 'l', 'cajas' -> 'caja').
+
+        Returns:
+            Unidad canónica o None si no se reconoce
+        """
+        if not unidad:
+            return None
+        try:
+            return self._normalizadas[unidad]
+        except KeyError:
+            pass
+
+        clave = unidad.strip().lower().rstrip('.').replace(' ', '_')
+        canonica = self._alias.get(clave)
+        if canonica is None and clave.endswith('s'):
+            # Plurales: 'docenas' -> 'docena', 'galones' -> 'galon'
+            canonica = self._alias.get(clave[:-1]) or (
+                self._alias.get(clave[:-2]) if clave.endswith('es') else None
+            )
+        self._normalizadas[unidad] = canonica
+        return canonica
+
+    def _idx(self, unidad: Optional[str]) -> int:
+        canonica = self.normalizar(unidad)
+        return self.desconocida if canonica is None else self.indice[canonica]
+
+    def grupo(self, unidad: Optional[str]) -> Optional[str]:
+        """Grupo de la unidad ('peso', 'volumen', 'discreto') o None."""
+        return self.grupos[self.grupo_idx[self._idx(unidad)]]
+
+    def compatibles(self, unidad1: Optional[str], unidad2: Optional[str]) -> bool:
+        """True si ambas unidades son conocidas y del mismo grupo."""
+        return bool(not np.isnan(self.matriz[self._idx(unidad1), self._idx(unidad2)]))
+
+    def factor(self, origen: Optional[str], destino: Optional[str], densidad: Optional[float] = None) -> Optional[float]:
+        """
+        Factor tal que cantidad_destino = cantidad_origen * factor.
+
+        Args:
+            origen: Unidad de origen
+            destino: Unidad de destino
+            densidad: kg por litro; habilita la conversión entre peso y volumen
+
+        Returns:
+            Factor o None si no se puede convertir
+        """
+        i, j = self._idx(origen), self._idx(destino)
+        factor = self.matriz[i, j]
+        if np.isnan(factor):
+            if not densidad or densidad <= 0:
+                return None
+            grupos = (self.grupo_idx[i], self.grupo_idx[j])
+            if grupos == (self._peso, self._volumen):
+                factor = self.razon[i, j] / float(densidad)
+            elif grupos == (self._volumen, self._peso):
+                factor = self.razon[i, j] * float(densidad)
+            else:
+                return None
+        return float(factor)
+
+    def factor_gramos(self, unidad: Optional[str], densidad: Optional[float] = None) -> float:
+        """
+        Gramos equivalentes a 1 unidad (0 si la unidad es desconocida).
+
+        Los volúmenes usan la densidad indicada (1 kg/l por defecto) y las
+        unidades discretas conservan la equivalencia histórica de 1000 g por
+        unidad base: dentro de un mismo grupo la razón entre dos factores es
+        siempre la conversión correcta.
+        """
+        i = self._idx(unidad)
+        gramos = self.gramos[i]
+        if densidad and densidad > 0 and self.grupo_idx[i] == self._volumen:
+            gramos *= float(densidad)
+        return float(gramos)
+
+    def indices(self, unidades) -> np.ndarray:
+        """Índices de una columna de unidades (normaliza cada valor distinto una sola vez)."""
+        valores = np.asarray(unidades, dtype=object)
+        if valores.size == 0:
+            return np.empty(0, dtype=np.intp)
+        # None/NaN quedan como 'None'/'nan', que no son alias conocidos
+        distintas, inversa = np.unique(valores.astype(str), return_inverse=True)
+        codigos = np.fromiter((self._idx(u) for u in distintas), dtype=np.intp, count=len(distintas))
+        return codigos[inversa.reshape(-1)]
+
+    def factores(self, origenes, destinos, densidades=None) -> np.ndarray:
+        """
+        Factores de conversión para columnas completas de unidades.
+
+        Args:
+            origenes: Secuencia de unidades de origen
+            destinos: Secuencia de unidades de destino (misma longitud)
+            densidades: Secuencia opcional de densidades (kg/l, NaN o None si no hay)
+
+        Returns:
+            numpy.ndarray de factores, con NaN donde no se puede convertir
+        """
+        i, j = self.indices(origenes), self.indices(destinos)
+        factores = self.matriz[i, j]
+        if densidades is None:
+            return factores
+
+        densidad = np.asarray(densidades, dtype=float)
+        con_densidad = np.isnan(factores) & (densidad > 0)
+        if con_densidad.any():
+            grupo_o, grupo_d = self.grupo_idx[i], self.grupo_idx[j]
+            peso_a_volumen = con_densidad & (grupo_o == self._peso) & (grupo_d == self._volumen)
+            volumen_a_peso = con_densidad & (grupo_o == self._volumen) & (grupo_d == self._peso)
+            razon = self.razon[i, j]
+            factores[peso_a_volumen] = razon[peso_a_volumen] / densidad[peso_a_volumen]
+            factores[volumen_a_peso] = razon[volumen_a_peso] * densidad[volumen_a_peso]
+        return factores
+
+    def factores_gramos(self, unidades, densidades=None) -> np.ndarray:
+        """Versión vectorizada de factor_gramos."""
+        i = self.indices(unidades)
+        gramos = self.gramos[i]
+        if densidades is not None:
+            densidad = np.asarray(densidades, dtype=float)
+            con_densidad = (self.grupo_idx[i] == self._volumen) & (densidad > 0)
+            gramos[con_densidad] *= densidad[con_densidad]
+        return gramos
+
+    def convertir(self, cantidades, origenes, destinos, densidades=None) -> np.ndarray:
+        """Convierte una columna de cantidades (NaN donde no se puede convertir)."""
+        return np.asarray(cantidades, dtype=float) * self.factores(origenes, destinos, densidades)
+
+
+registro_unidades = RegistroUnidades(UNIDADES, ALIAS_UNIDADES)
+
+
 def obtener_grupo_unidad(unidad: str) -> Optional[str]:
     """
     Obtiene el grupo al que pertenece una unidad.
-    
+
     Args:
         unidad: Unidad a verificar
-        
+
     Returns:
         Grupo de unidad o None si no se encuentra
     """
-    unidad_lower = unidad.lower()
-    for grupo, unidades in GRUPOS_UNIDADES.items():
-        if unidad_lower in unidades:
-            return grupo
-    return None
+    return registro_unidades.grupo(unidad)
 
 def son_unidades_compatibles(unidad1: str, unidad2: str) -> bool:
     """
     Verifica si dos unidades son compatibles (mismo grupo).
-    
+
     Args:
         unidad1: Primera unidad
         unidad2: Segunda unidad
-        
+
     Returns:
         True si son compatibles, False en caso contrario
     """
-    grupo1 = obtener_grupo_unidad(unidad1)
-    grupo2 = obtener_grupo_unidad(unidad2)
-    
-    if grupo1 is None or grupo2 is None:
-        return False
-    
-    return grupo1 == grupo2
+    return registro_unidades.compatibles(unidad1, unidad2)
 
 def convertir_a_unidad_base(cantidad: float, unidad_origen: str) -> Optional[Tuple[float, str]]:
     """
     Convierte una cantidad a su unidad base.
-    
+
     Args:
         cantidad: Cantidad a convertir
         unidad_origen: Unidad de origen
-        
+
     Returns:
         Tupla (cantidad_convertida, unidad_base) o None si no se puede convertir
     """
-    unidad_lower = unidad_origen.lower()
-    
-    if unidad_lower not in CONVERSIONES:
+    grupo = registro_unidades.grupo(unidad_origen)
+    if grupo is None:
         return None
-    
-    factor = CONVERSIONES[unidad_lower]
-    cantidad_base = cantidad * factor
-    
-    # Determinar unidad base según el grupo
-    grupo = obtener_grupo_unidad(unidad_origen)
-    if grupo == 'peso':
-        unidad_base = 'kg'
-    elif grupo == 'volumen':
-        unidad_base = 'l'
-    elif grupo == 'discreto':
-        unidad_base = 'unidad'
-    else:
-        return None
-    
-    return (cantidad_base, unidad_base)
+    unidad_base = UNIDAD_BASE_GRUPO[grupo]
+    return (cantidad * registro_unidades.factor(unidad_origen, unidad_base), unidad_base)
 
-def convertir_a_gramos(cantidad, unidad: str):
+def convertir_a_gramos(cantidad, unidad: str, densidad: Optional[float] = None):
     """
     Convierte una cantidad a gramos.
-    
+
     Args:
         cantidad: Cantidad a convertir (puede ser Decimal o float)
         unidad: Unidad de origen
-        
+        densidad: kg por litro para unidades de volumen (1 por defecto)
+
     Returns:
         Cantidad en gramos (Decimal)
     """
     from decimal import Decimal
-    
-    cantidad = Decimal(str(cantidad))
-    unidad_lower = unidad.lower()
-    
-    # Si ya está en gramos
-    if unidad_lower in ['g', 'gramo', 'gramos']:
-        return cantidad
-    
-    # Convertir a kg primero usando CONVERSIONES
-    if unidad_lower in CONVERSIONES:
-        factor_a_kg = CONVERSIONES[unidad_lower]
-        cantidad_kg = cantidad * Decimal(str(factor_a_kg))
-        # Convertir kg a gramos (1 kg = 1000 g)
-        return cantidad_kg * Decimal('1000')
-    
-    # Si no se puede convertir, retornar 0
-    return Decimal('0')
-
-def convertir_unidad(cantidad: float, unidad_origen: str, unidad_destino: str) -> Optional[float]:
+
+    factor = registro_unidades.factor_gramos(unidad, densidad)
+    return Decimal(str(cantidad)) * Decimal(str(factor))
+
+def convertir_unidad(
+    cantidad: float,
+    unidad_origen: str,
+    unidad_destino: str,
+    densidad: Optional[float] = None
+) -> Optional[float]:
     """
     Convierte una cantidad de una unidad a otra compatible.
-    
+
     Args:
         cantidad: Cantidad a convertir
         unidad_origen: Unidad de origen
         unidad_destino: Unidad de destino
-        
+        densidad: kg por litro; permite convertir entre peso y volumen
+
     Returns:
         Cantidad convertida o None si no se puede convertir
     """
-    if not son_unidades_compatibles(unidad_origen, unidad_destino):
-        return None
-    
-    unidad_origen_lower = unidad_origen.lower()
-    unidad_destino_lower = unidad_destino.lower()
-    
-    if unidad_origen_lower not in CONVERSIONES or unidad_destino_lower not in CONVERSIONES:
+    factor = registro_unidades.factor(unidad_origen, unidad_destino, densidad)
+    if factor is None:
         return None
-    
-    # Convertir a unidad base primero
-    factor_origen = CONVERSIONES[unidad_origen_lower]
-    cantidad_base = cantidad * factor_origen
-    
-    # Convertir de unidad base a destino
-    factor_destino = CONVERSIONES[unidad_destino_lower]
-    cantidad_destino = cantidad_base / factor_destino
-    
-    return cantidad_destino
+    return cantidad * factor
 
 def calcular_costo_unitario_estandarizado(
     cantidad: float,
@@ -199,24 +334,40 @@ def calcular_costo_unitario_estandarizado(
 ) -> Optional[float]:
     """
     Calcula el costo unitario estandarizado.
-    
+
     Args:
         cantidad: Cantidad en unidad origen
         costo_total: Costo total
         unidad_origen: Unidad de origen
         unidad_estandar: Unidad estandarizada
-        
+
     Returns:
         Costo unitario estandarizado o None si no se puede convertir
     """
-    if not son_unidades_compatibles(unidad_origen, unidad_estandar):
-        return None
-    
     # Convertir cantidad a unidad estandarizada
     cantidad_estandarizada = convertir_unidad(cantidad, unidad_origen, unidad_estandar)
     if cantidad_estandarizada is None or cantidad_estandarizada == 0:
         return None
-    
+
     # Calcular costo unitario
     costo_unitario = costo_total / cantidad_estandarizada
     return costo_unitario
+
+def factores_conversion(unidades_origen, unidades_destino, densidades=None):
+    """
+    Calcula los factores de conversión para columnas completas de unidades.
+
+    Una sola indexación sobre la matriz precalculada del registro; el
+    resultado es un arreglo NumPy alineado con las entradas, listo para
+    operar sobre columnas de cantidades.
+
+    Args:
+        unidades_origen: Secuencia de unidades de origen
+        unidades_destino: Secuencia de unidades de destino (misma longitud)
+        densidades: Secuencia opcional de densidades (kg/l) por fila
+
+    Returns:
+        numpy.ndarray de factores (cantidad_destino = cantidad_origen * factor),
+        con NaN donde las unidades no son compatibles
+    """
+    return registro_unidades.factores(unidades_origen, unidades_destino, densidades)
@@ -7,12 +7,7 @@ from sqlalchemy import desc
 from datetime import datetime
 from models import Item, FacturaItem, Factura, CostoItem
 from models.factura import EstadoFactura
-from modules.logistica.conversor_unidades import (
-    son_unidades_compatibles,
-    calcular_costo_unitario_estandarizado,
-    convertir_unidad,
-    convertir_a_unidad_base
-)
+from modules.logistica.conversor_unidades import registro_unidades
 import statistics
 
 class CostoService:
@@ -50,6 +45,7 @@ class CostoService:
         # IMPORTANTE: La unidad estándar se define en el módulo Items (item.unidad)
         # Esta es la unidad de referencia para estandarizar todas las facturas
         unidad_estandar = item.unidad  # Unidad estándar definida en el módulo Items
+        densidad = float(item.densidad) if item.densidad else None  # Permite estandarizar peso <-> volumen
         
         # Calcular costos unitarios estandarizados para cada factura
         # Todas las facturas se convierten a la unidad estándar del item
@@ -68,14 +64,11 @@ class CostoService:
             costo_total_factura = precio_unitario_factura * cantidad_aprobada_factura
             
             # ESTANDARIZACIÓN: Convertir siempre a la unidad estándar del módulo Items
-            if son_unidades_compatibles(unidad_factura, unidad_estandar):
+            factor = registro_unidades.factor(unidad_factura, unidad_estandar, densidad)
+            if factor is not None:
                 if unidad_factura != unidad_estandar:
                     # Convertir cantidad de la factura a la unidad estándar del item
-                    cantidad_estandarizada = convertir_unidad(
-                        cantidad_aprobada_factura,
-                        unidad_factura,
-                        unidad_estandar
-                    )
+                    cantidad_estandarizada = cantidad_aprobada_factura * factor
                     if cantidad_estandarizada and cantidad_estandarizada > 0:
                         # Calcular costo unitario en la unidad estándar
                         costo_unitario_estandarizado = costo_total_factura / cantidad_estandarizada
@@ -288,13 +281,52 @@ class CostoService:
         return costos
     
     @staticmethod
-    def recalcular_todos_los_costos(db: Session) -> Dict[str, int]:
+    def recalcular_todos_los_costos(db: Session, modo: str = 'lote') -> Dict[str, int]:
         """
         Recalcula todos los costos estandarizados de items y recetas.
         
+        Args:
+            db: Sesión de base de datos
+            modo: 'lote' (consultas basadas en conjuntos, por defecto) o
+                'por_item' (una consulta por item; se conserva como referencia)
+        
         Returns:
             Diccionario con estadísticas del recálculo
         """
+        if modo == 'lote':
+            from modules.logistica.costos_lote import recalcular_costos_en_lote
+            estadisticas = recalcular_costos_en_lote(db)
+            db.commit()
+            return estadisticas
+        if modo != 'por_item':
+            raise ValueError(f"Modo de recálculo inválido: {modo}. Valores válidos: lote, por_item")
+        return CostoService._recalcular_por_item(db)
+    
+    @staticmethod
+    def actualizar_costos_por_factura(db: Session, factura: Factura) -> Dict[str, int]:
+        """
+        Actualiza de forma incremental los costos afectados por una factura aprobada.
+        
+        Recalcula la ventana de las últimas 3 facturas solo para los items de la
+        factura y luego solo las recetas que usan esos items. No hace commit.
+        
+        Args:
+            db: Sesión de base de datos
+            factura: Factura recién aprobada
+            
+        Returns:
+            Diccionario con items y recetas recalculados
+        """
+        from modules.logistica.costos_lote import actualizar_costos_items
+        item_ids = {
+            fi.item_id for fi in factura.items
+            if fi.item_id and fi.cantidad_aprobada and fi.cantidad_aprobada > 0
+        }
+        return actualizar_costos_items(db, item_ids)
+    
+    @staticmethod
+    def _recalcular_por_item(db: Session) -> Dict[str, int]:
+        """Recalcula costos item por item (una ida a la BD por item y por receta)."""
         items = db.query(Item).filter(Item.activo == True).all()
         
         calculados_items = 0
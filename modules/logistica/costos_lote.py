@@ -0,0 +1,436 @@
+"""
+Recálculo de costos estandarizados en lote (basado en conjuntos).
+
+Reemplaza el recorrido item por item de CostoService por:
+1. Una consulta con función de ventana que obtiene las últimas 3 líneas
+   de factura aprobadas de todos los items activos.
+2. Conversión de unidades vectorizada sobre la columna completa.
+3. Un upsert masivo en costo_items y en items.costo_unitario_actual.
+4. Rollup de costos de recetas desde la misma tabla de costos en memoria.
+
+Las mismas piezas, acotadas a un subconjunto de items, alimentan el
+mantenimiento incremental al aprobar una factura (actualizar_costos_items).
+"""
+from typing import Dict, Iterable, Optional, Set
+from datetime import datetime
+import logging
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import desc, func
+from sqlalchemy.orm import Session
+
+from models import Item, FacturaItem, Factura, CostoItem, Receta, RecetaIngrediente
+from models.factura import EstadoFactura
+from modules.logistica.conversor_unidades import registro_unidades
+
+logger = logging.getLogger(__name__)
+
+# Número de facturas aprobadas usadas para el promedio (igual que el cálculo por item)
+FACTURAS_POR_ITEM = 3
+
+
+def _cargar_ultimas_facturas(db: Session, item_ids: Optional[Set[int]] = None) -> pd.DataFrame:
+    """
+    Obtiene las últimas FACTURAS_POR_ITEM líneas aprobadas de cada item activo
+    en una sola consulta (ROW_NUMBER() OVER (PARTITION BY item_id ...)).
+    Si se indica item_ids, la ventana se calcula solo para esos items.
+    """
+    posicion = func.row_number().over(
+        partition_by=FacturaItem.item_id,
+        order_by=(desc(Factura.fecha_aprobacion), desc(FacturaItem.id))
+    ).label('posicion')
+
+    ranking = db.query(
+        FacturaItem.item_id.label('item_id'),
+        FacturaItem.precio_unitario.label('precio_unitario'),
+        FacturaItem.cantidad_aprobada.label('cantidad_aprobada'),
+        FacturaItem.unidad.label('unidad_factura'),
+        Factura.numero_factura.label('numero_factura'),
+        posicion
+    ).join(Factura, Factura.id == FacturaItem.factura_id).filter(
+        FacturaItem.item_id.isnot(None),
+        Factura.estado == EstadoFactura.APROBADA,
+        FacturaItem.cantidad_aprobada.isnot(None),
+        FacturaItem.cantidad_aprobada > 0,
+        FacturaItem.precio_unitario.isnot(None),
+        FacturaItem.precio_unitario > 0
+    )
+    if item_ids is not None:
+        ranking = ranking.filter(FacturaItem.item_id.in_(item_ids))
+    ranking = ranking.subquery()
+
+    filas = db.query(
+        ranking.c.item_id,
+        ranking.c.precio_unitario,
+        ranking.c.cantidad_aprobada,
+        ranking.c.unidad_factura,
+        ranking.c.numero_factura,
+        Item.unidad.label('unidad_estandar'),
+        Item.densidad.label('densidad')
+    ).join(Item, Item.id == ranking.c.item_id).filter(
+        Item.activo == True,
+        ranking.c.posicion <= FACTURAS_POR_ITEM
+    ).order_by(ranking.c.item_id, ranking.c.posicion).all()
+
+    df = pd.DataFrame(filas, columns=[
+        'item_id', 'precio_unitario', 'cantidad_aprobada',
+        'unidad_factura', 'numero_factura', 'unidad_estandar', 'densidad'
+    ])
+    df['precio_unitario'] = df['precio_unitario'].astype(float)
+    df['densidad'] = df['densidad'].astype(float)
+    df['cantidad_aprobada'] = df['cantidad_aprobada'].astype(float)
+    # La unidad de la factura cae a la unidad estándar del item si no se registró
+    sin_unidad = df['unidad_factura'].isna() | (df['unidad_factura'] == '')
+    df.loc[sin_unidad, 'unidad_factura'] = df.loc[sin_unidad, 'unidad_estandar']
+    return df
+
+
+def _estandarizar(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convierte todos los precios a la unidad estándar del item de forma vectorizada.
+
+    Mantiene las mismas reglas que calcular_y_almacenar_costo_estandarizado:
+    unidades incompatibles o conversiones inválidas usan el precio de la factura.
+    """
+    factores = registro_unidades.factores(df['unidad_factura'], df['unidad_estandar'], df['densidad'])
+    compatibles = ~np.isnan(factores)
+    misma_unidad = (df['unidad_factura'] == df['unidad_estandar']).to_numpy()
+    cantidad_estandarizada = df['cantidad_aprobada'].to_numpy() * np.nan_to_num(factores)
+    convertibles = compatibles & ~misma_unidad & (cantidad_estandarizada > 0)
+
+    costo_total = df['precio_unitario'].to_numpy() * df['cantidad_aprobada'].to_numpy()
+    df['costo_estandarizado'] = np.where(
+        convertibles,
+        costo_total / np.where(convertibles, cantidad_estandarizada, 1.0),
+        df['precio_unitario'].to_numpy()
+    )
+
+    notas = []
+    for fila, compatible, mismo, convertible, cantidad_std in zip(
+        df.itertuples(index=False), compatibles, misma_unidad, convertibles, cantidad_estandarizada
+    ):
+        prefijo = f"Factura #{fila.numero_factura}: ${fila.costo_estandarizado:.2f}/{fila.unidad_estandar} "
+        if not compatible:
+            notas.append(
+                prefijo + f"(ERROR: unidades no compatibles - {fila.unidad_factura} "
+                f"no se puede convertir a {fila.unidad_estandar})"
+            )
+        elif mismo:
+            notas.append(prefijo + f"(cantidad: {fila.cantidad_aprobada} {fila.unidad_estandar} - ya estándar)")
+        elif convertible:
+            notas.append(
+                prefijo + f"(estandarizado: {fila.cantidad_aprobada} {fila.unidad_factura} → "
+                f"{cantidad_std:.2f} {fila.unidad_estandar})"
+            )
+        else:
+            notas.append(
+                prefijo + f"(ADVERTENCIA: error al convertir {fila.unidad_factura} a {fila.unidad_estandar})"
+            )
+    df['nota'] = notas
+    return df
+
+
+def _resumir_por_item(df: pd.DataFrame) -> pd.DataFrame:
+    """Agrega promedio, desviación y rango por item (una fila por item)."""
+    resumen = df.groupby('item_id', sort=False).agg(
+        unidad_estandar=('unidad_estandar', 'first'),
+        costo_promedio=('costo_estandarizado', 'mean'),
+        desviacion=('costo_estandarizado', 'std'),
+        costo_max=('costo_estandarizado', 'max'),
+        costo_min=('costo_estandarizado', 'min'),
+        cantidad_facturas=('costo_estandarizado', 'size'),
+        notas=('nota', '\n'.join)
+    )
+    multiples = resumen['cantidad_facturas'] > 1
+    promedio_positivo = resumen['costo_promedio'] > 0
+    resumen['variacion_porcentaje'] = np.where(
+        multiples & promedio_positivo,
+        resumen['desviacion'].fillna(0) / resumen['costo_promedio'].where(promedio_positivo, 1.0) * 100,
+        0.0
+    )
+    resumen['variacion_absoluta'] = np.where(
+        multiples, resumen['costo_max'] - resumen['costo_min'], 0.0
+    )
+    return resumen
+
+
+def _upsert_costos(db: Session, resumen: pd.DataFrame, item_ids: Optional[Set[int]] = None) -> int:
+    """
+    Inserta o actualiza costo_items e items.costo_unitario_actual en bloque.
+
+    Returns:
+        Número de costos existentes cuyo promedio cambió (desviaciones que el
+        mantenimiento incremental no había reflejado)
+    """
+    ahora = datetime.utcnow()
+    existentes = {}
+    promedios_previos = {}
+    consulta = db.query(CostoItem.id, CostoItem.item_id, CostoItem.costo_unitario_promedio)
+    if item_ids is not None:
+        consulta = consulta.filter(CostoItem.item_id.in_(item_ids))
+    for costo_id, item_id, promedio in consulta.order_by(CostoItem.id):
+        if item_id not in existentes:
+            existentes[item_id] = costo_id
+            promedios_previos[item_id] = float(promedio) if promedio is not None else None
+
+    consulta_items = db.query(Item.id, Item.costo_unitario_actual)
+    if item_ids is not None:
+        consulta_items = consulta_items.filter(Item.id.in_(item_ids))
+    costos_previos = dict(consulta_items.all())
+
+    actualizaciones = []
+    inserciones = []
+    items_actualizados = []
+    items_con_cambio = []
+    corregidos = 0
+    for item_id, fila in zip(resumen.index.tolist(), resumen.itertuples(index=False)):
+        valores = {
+            'costo_unitario_promedio': float(fila.costo_promedio),
+            'cantidad_facturas_usadas': int(fila.cantidad_facturas),
+            'variacion_porcentaje': float(fila.variacion_porcentaje),
+            'variacion_absoluta': float(fila.variacion_absoluta),
+            'fecha_actualizacion': ahora,
+            'notas': fila.notas,
+        }
+        if item_id in existentes:
+            actualizaciones.append({'id': existentes[item_id], **valores})
+            previo = promedios_previos[item_id]
+            if previo is None or abs(previo - valores['costo_unitario_promedio']) > 0.0001:
+                corregidos += 1
+        else:
+            inserciones.append({
+                'item_id': int(item_id),
+                'unidad_estandar': fila.unidad_estandar,
+                'fecha_calculo': ahora,
+                'activo': True,
+                **valores
+            })
+        items_actualizados.append({'id': int(item_id), 'costo_unitario_actual': float(fila.costo_promedio)})
+        previo = costos_previos.get(int(item_id))
+        if previo is None or abs(float(previo) - round(float(fila.costo_promedio), 2)) > 0.001:
+            items_con_cambio.append(int(item_id))
+
+    if actualizaciones:
+        db.bulk_update_mappings(CostoItem, actualizaciones)
+    if inserciones:
+        db.bulk_insert_mappings(CostoItem, inserciones)
+    if items_actualizados:
+        db.bulk_update_mappings(Item, items_actualizados)
+    if items_con_cambio:
+        # bulk_update_mappings no pasa por los eventos del ORM: la versión de costo se sube aquí
+        db.query(Item).filter(Item.id.in_(items_con_cambio)).update(
+            {Item.version_costo: Item.version_costo + 1}, synchronize_session=False
+        )
+    return corregidos
+
+
+def recetas_que_usan_items(db: Session, item_ids: Iterable[int]) -> Set[int]:
+    """
+    Índice inverso de ingredientes: recetas activas que usan alguno de los items.
+
+    Se apoya en idx_receta_ingredientes_item para no recorrer todas las recetas.
+    """
+    item_ids = list(item_ids)
+    if not item_ids:
+        return set()
+    filas = db.query(RecetaIngrediente.receta_id).join(
+        Receta, Receta.id == RecetaIngrediente.receta_id
+    ).filter(
+        RecetaIngrediente.item_id.in_(item_ids),
+        Receta.activa == True
+    ).distinct()
+    return {receta_id for (receta_id,) in filas}
+
+
+def _rollup_recetas(
+    db: Session,
+    costos_por_item: Dict[int, float],
+    receta_ids: Optional[Set[int]] = None
+) -> Dict[str, int]:
+    """
+    Recalcula totales de recetas activas desde la tabla de costos en memoria.
+
+    Replica Receta.calcular_totales sin recorrer relaciones lazy: los ingredientes
+    se cargan en una sola consulta y se agregan por receta. Si se indica
+    receta_ids, solo se recalculan esas recetas (las marcadas como desactualizadas).
+    """
+    recetas = db.query(Receta.id, Receta.porciones, Receta.version_totales).filter(Receta.activa == True)
+    ingredientes = db.query(
+        RecetaIngrediente.receta_id,
+        RecetaIngrediente.item_id,
+        RecetaIngrediente.cantidad,
+        RecetaIngrediente.unidad,
+        Item.unidad,
+        Item.densidad,
+        Item.calorias_por_unidad,
+        Item.costo_unitario_actual,
+        Item.version_costo
+    ).join(Receta, Receta.id == RecetaIngrediente.receta_id).join(
+        Item, Item.id == RecetaIngrediente.item_id
+    ).filter(Receta.activa == True)
+    if receta_ids is not None:
+        recetas = recetas.filter(Receta.id.in_(receta_ids))
+        ingredientes = ingredientes.filter(RecetaIngrediente.receta_id.in_(receta_ids))
+    recetas = recetas.all()
+    filas = ingredientes.all()
+
+    ing = pd.DataFrame(filas, columns=[
+        'receta_id', 'item_id', 'cantidad', 'unidad', 'unidad_item', 'densidad', 'calorias', 'costo_actual',
+        'version_item'
+    ])
+    ing['cantidad'] = ing['cantidad'].astype(float)
+    ing['calorias'] = ing['calorias'].astype(float).fillna(0.0)
+    # Los costos recién calculados se guardan con 2 decimales en items.costo_unitario_actual
+    costos_nuevos = ing['item_id'].map(costos_por_item).round(2)
+    ing['costo'] = costos_nuevos.fillna(ing['costo_actual'].astype(float)).fillna(0.0)
+
+    sin_unidad = ing['unidad'].isna() | (ing['unidad'] == '')
+    ing.loc[sin_unidad, 'unidad'] = ing.loc[sin_unidad, 'unidad_item']
+
+    densidad = ing['densidad'].astype(float).to_numpy()
+    gramos_ing = registro_unidades.factores_gramos(ing['unidad'], densidad)
+    gramos_item = registro_unidades.factores_gramos(ing['unidad_item'], densidad)
+    distinta_unidad = (ing['unidad'].str.lower() != ing['unidad_item'].str.lower()).to_numpy()
+
+    usa_conversion = (ing['calorias'].to_numpy() != 0) | (ing['costo'].to_numpy() != 0)
+    invalidos = distinta_unidad & usa_conversion & (gramos_item == 0)
+    recetas_con_error = set(ing.loc[invalidos, 'receta_id'].tolist())
+
+    cantidad = ing['cantidad'].to_numpy()
+    ratio = np.where(distinta_unidad & ~invalidos, gramos_ing / np.where(gramos_item == 0, 1.0, gramos_item), 1.0)
+    ing['calorias_total'] = cantidad * ratio * ing['calorias'].to_numpy()
+    ing['costo_total'] = cantidad * ratio * ing['costo'].to_numpy()
+    ing['peso_gramos'] = cantidad * gramos_ing
+
+    totales = ing.groupby('receta_id')[['calorias_total', 'costo_total', 'peso_gramos']].sum()
+
+    # Versiones de los items de los que se deriva cada rollup (ver rollup_recetas)
+    versiones_items: Dict[int, Dict[str, int]] = {}
+    for receta_id, item_id, version in zip(ing['receta_id'], ing['item_id'], ing['version_item']):
+        versiones_items.setdefault(int(receta_id), {})[str(int(item_id))] = int(version or 1)
+
+    actualizaciones = []
+    for receta_id, porciones, version_totales in recetas:
+        if receta_id in recetas_con_error:
+            logger.warning(f"Error calculando costo para receta {receta_id}: unidad de item no convertible")
+            continue
+        if receta_id in totales.index:
+            calorias, costo, peso = totales.loc[receta_id].tolist()
+        else:
+            calorias = costo = peso = 0.0
+        valores = {
+            'id': receta_id,
+            'calorias_totales': calorias,
+            'costo_total': costo,
+            'porcion_gramos': peso,
+            'versiones_items': versiones_items.get(receta_id, {}),
+            'version_totales': (version_totales or 0) + 1,
+        }
+        if porciones and porciones > 0:
+            valores['calorias_por_porcion'] = calorias / porciones
+            valores['costo_por_porcion'] = costo / porciones
+        actualizaciones.append(valores)
+
+    if actualizaciones:
+        db.bulk_update_mappings(Receta, actualizaciones)
+
+    return {
+        'calculadas': len(actualizaciones),
+        'errores': len(recetas_con_error),
+        'total': len(recetas)
+    }
+
+
+def recalcular_costos_en_lote(db: Session) -> Dict[str, Dict[str, int]]:
+    """
+    Recalcula costos de items y recetas con operaciones basadas en conjuntos.
+
+    Todo el trabajo ocurre en una transacción: el llamador hace commit.
+
+    Args:
+        db: Sesión de base de datos
+
+    Returns:
+        Diccionario con estadísticas del recálculo (mismo formato que
+        CostoService.recalcular_todos_los_costos)
+    """
+    total_items = db.query(func.count(Item.id)).filter(Item.activo == True).scalar() or 0
+
+    resumen, corregidos = _calcular_y_guardar(db)
+    costos_por_item = resumen['costo_promedio'].to_dict() if not resumen.empty else {}
+
+    estadisticas_recetas = _rollup_recetas(db, costos_por_item)
+    db.flush()
+
+    if corregidos:
+        # Con el mantenimiento incremental activo, el recálculo completo funciona
+        # como verificación de consistencia: cualquier corrección es una desviación
+        logger.warning(f"Recálculo completo corrigió {corregidos} costos desactualizados")
+
+    return {
+        'items': {
+            'calculados': len(resumen),
+            'sin_datos': total_items - len(resumen),
+            'errores': 0,
+            'total': total_items,
+            'corregidos': corregidos
+        },
+        'recetas': estadisticas_recetas
+    }
+
+
+def _calcular_y_guardar(db: Session, item_ids: Optional[Set[int]] = None):
+    """Calcula la ventana de 3 facturas, la estandariza y la guarda. Retorna (resumen, corregidos)."""
+    facturas = _cargar_ultimas_facturas(db, item_ids)
+    if facturas.empty:
+        return pd.DataFrame(), 0
+    resumen = _resumir_por_item(_estandarizar(facturas))
+    corregidos = _upsert_costos(db, resumen, item_ids)
+    return resumen, corregidos
+
+
+def actualizar_costos_items(db: Session, item_ids: Iterable[int]) -> Dict[str, int]:
+    """
+    Mantenimiento incremental: recalcula la ventana de 3 facturas solo para
+    los items indicados y luego solo las recetas que los usan.
+
+    No hace commit; se ejecuta dentro de la transacción del llamador.
+
+    Args:
+        db: Sesión de base de datos
+        item_ids: IDs de items afectados (por ejemplo, los de una factura aprobada)
+
+    Returns:
+        Diccionario con items y recetas recalculados
+    """
+    item_ids = {int(i) for i in item_ids if i is not None}
+    if not item_ids:
+        return {'items_recalculados': 0, 'recetas_recalculadas': 0}
+
+    resumen, _ = _calcular_y_guardar(db, item_ids)
+    costos_por_item = resumen['costo_promedio'].to_dict() if not resumen.empty else {}
+
+    recetas_desactualizadas = recetas_que_usan_items(db, item_ids)
+    estadisticas_recetas = {'calculadas': 0}
+    if recetas_desactualizadas:
+        estadisticas_recetas = _rollup_recetas(db, costos_por_item, recetas_desactualizadas)
+    db.flush()
+
+    return {
+        'items_recalculados': len(resumen),
+        'recetas_recalculadas': estadisticas_recetas['calculadas']
+    }
+
+
+def recalcular_recetas(db: Session, receta_ids: Iterable[int]) -> Dict[str, int]:
+    """
+    Recalcula los rollups de las recetas indicadas con los costos y calorías
+    actuales de sus items (una consulta para todas). No hace commit.
+    """
+    receta_ids = {int(i) for i in receta_ids if i is not None}
+    if not receta_ids:
+        return {'calculadas': 0, 'errores': 0, 'total': 0}
+    estadisticas = _rollup_recetas(db, {}, receta_ids)
+    db.flush()
+    return estadisticas
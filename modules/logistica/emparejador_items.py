@@ -0,0 +1,359 @@
+"""
+Emparejamiento de líneas de factura (OCR) con items del catálogo.
+
+Dos backends (Config.EMPAREJADOR_BACKEND):
+- 'memoria': índice invertido de trigramas sobre Item.nombre / Item.codigo en el
+  proceso. Se construye en la primera búsqueda, se actualiza incrementalmente
+  cuando se confirma un alta/cambio/baja de Item (listeners de mapper + cola
+  post-commit) y se reconstruye completo cada EMPAREJADOR_TTL_SEGUNDOS para
+  recoger cambios hechos por otros workers.
+- 'pg_trgm': candidatos por similarity() de PostgreSQL sobre los índices GIN
+  de la migración f2c6a8d1b4e9, en una sola consulta LATERAL para todo el lote.
+
+En ambos casos el puntaje de similitud se combina con el historial del
+proveedor: líneas ya aprobadas con la misma descripción y frecuencia con que el
+proveedor factura cada item.
+"""
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import logging
+import re
+import threading
+import time
+import unicodedata
+
+from sqlalchemy import Integer, String, event, func, or_, select, true, values, column
+from sqlalchemy.orm import Session, object_session
+
+from config import Config
+from models import Item, Factura, FacturaItem
+from models.factura import EstadoFactura
+from modules.crm.notificaciones.cola_post_commit import encolar_post_commit
+
+logger = logging.getLogger(__name__)
+
+# Candidatos por línea que se puntúan con el historial
+CANDIDATOS_POR_LINEA = 5
+# Peso del historial del proveedor y bono por proveedor autorizado del item
+PESO_HISTORIAL = 0.15
+BONO_PROVEEDOR_AUTORIZADO = 0.05
+
+_NO_ALFANUMERICO = re.compile(r'[^0-9a-z]+')
+
+
+def normalizar(texto: Optional[str], quitar_acentos: bool = True) -> str:
+    """Minúsculas, sin acentos, solo letras/dígitos separados por un espacio."""
+    if not texto:
+        return ''
+    texto = texto.lower()
+    if quitar_acentos:
+        texto = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+        return _NO_ALFANUMERICO.sub(' ', texto).strip()
+    return re.sub(r'[^\w]+', ' ', texto).strip()
+
+
+def trigramas(texto: str) -> Set[str]:
+    """Trigramas por palabra con el mismo relleno que pg_trgm ('  pal', ' pa', ..., 'ra ')."""
+    resultado = set()
+    for palabra in texto.split():
+        relleno = f'  {palabra} '
+        for i in range(len(relleno) - 2):
+            resultado.add(relleno[i:i + 3])
+    return resultado
+
+
+def similitud(comunes: int, total_linea: int, total_item: int) -> float:
+    """
+    Similitud entre una línea y un item a partir de trigramas compartidos.
+
+    Es el máximo entre Jaccard (similarity() de pg_trgm) y la fracción del
+    nombre del item contenida en la línea, atenuada: las líneas de factura
+    suelen agregar marca, presentación o peso al nombre del item.
+    """
+    if not comunes:
+        return 0.0
+    jaccard = comunes / (total_linea + total_item - comunes)
+    contencion = 0.8 * comunes / total_item
+    return max(jaccard, contencion)
+
+
+class IndiceTrigramas:
+    """Índice invertido trigrama -> items, seguro entre threads."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._por_trigrama: Dict[str, Set[int]] = {}
+        self._trigramas_item: Dict[int, Tuple[Set[str], Set[str]]] = {}  # (nombre, codigo)
+        self._proveedor_item: Dict[int, Optional[int]] = {}
+        self.construido_en: Optional[float] = None
+
+    @property
+    def vigente(self) -> bool:
+        return (
+            self.construido_en is not None
+            and time.monotonic() - self.construido_en < Config.EMPAREJADOR_TTL_SEGUNDOS
+        )
+
+    def construir(self, db: Session) -> None:
+        """Reconstruye el índice completo con los items activos (una consulta)."""
+        filas = db.query(
+            Item.id, Item.nombre, Item.codigo, Item.proveedor_autorizado_id
+        ).filter(Item.activo == True).all()
+        with self._lock:
+            self._por_trigrama = {}
+            self._trigramas_item = {}
+            self._proveedor_item = {}
+            for item_id, nombre, codigo, proveedor_id in filas:
+                self._agregar(item_id, nombre, codigo, proveedor_id)
+            self.construido_en = time.monotonic()
+        logger.info(f"Índice de trigramas de items construido: {len(filas)} items")
+
+    def actualizar_item(self, item_id: int, nombre: str, codigo: str,
+                        proveedor_id: Optional[int], activo: bool) -> None:
+        """Reemplaza (o quita, si está inactivo) las entradas de un item."""
+        with self._lock:
+            if self.construido_en is None:
+                return  # Se construirá completo en la próxima búsqueda
+            self._quitar(item_id)
+            if activo:
+                self._agregar(item_id, nombre, codigo, proveedor_id)
+
+    def quitar_item(self, item_id: int) -> None:
+        with self._lock:
+            self._quitar(item_id)
+
+    def invalidar(self) -> None:
+        """Fuerza la reconstrucción en la próxima búsqueda."""
+        with self._lock:
+            self.construido_en = None
+
+    def candidatos(self, texto: str, limite: int) -> List[Tuple[int, float, Optional[int]]]:
+        """Items más parecidos a un texto normalizado: [(item_id, similitud, proveedor_autorizado_id)]."""
+        trigramas_linea = trigramas(texto)
+        if not trigramas_linea:
+            return []
+        with self._lock:
+            comunes_nombre: Counter = Counter()
+            comunes_codigo: Counter = Counter()
+            for trigrama in trigramas_linea:
+                for item_id in self._por_trigrama.get(trigrama, ()):
+                    nombre, codigo = self._trigramas_item[item_id]
+                    if trigrama in nombre:
+                        comunes_nombre[item_id] += 1
+                    if trigrama in codigo:
+                        comunes_codigo[item_id] += 1
+            puntajes = []
+            for item_id in set(comunes_nombre) | set(comunes_codigo):
+                nombre, codigo = self._trigramas_item[item_id]
+                puntaje = max(
+                    similitud(comunes_nombre[item_id], len(trigramas_linea), len(nombre)),
+                    similitud(comunes_codigo[item_id], len(trigramas_linea), len(codigo)),
+                )
+                puntajes.append((item_id, puntaje, self._proveedor_item.get(item_id)))
+        puntajes.sort(key=lambda c: (-c[1], c[0]))
+        return puntajes[:limite]
+
+    def __len__(self) -> int:
+        return len(self._trigramas_item)
+
+    def _agregar(self, item_id: int, nombre: str, codigo: str, proveedor_id: Optional[int]) -> None:
+        tri_nombre = trigramas(normalizar(nombre))
+        tri_codigo = trigramas(normalizar(codigo))
+        self._trigramas_item[item_id] = (tri_nombre, tri_codigo)
+        self._proveedor_item[item_id] = proveedor_id
+        for trigrama in tri_nombre | tri_codigo:
+            self._por_trigrama.setdefault(trigrama, set()).add(item_id)
+
+    def _quitar(self, item_id: int) -> None:
+        anterior = self._trigramas_item.pop(item_id, None)
+        self._proveedor_item.pop(item_id, None)
+        if not anterior:
+            return
+        for trigrama in anterior[0] | anterior[1]:
+            items = self._por_trigrama.get(trigrama)
+            if items is not None:
+                items.discard(item_id)
+                if not items:
+                    del self._por_trigrama[trigrama]
+
+
+_indice = IndiceTrigramas()
+
+
+def obtener_indice() -> IndiceTrigramas:
+    """Índice de trigramas del proceso."""
+    return _indice
+
+
+class EmparejadorItems:
+    """Empareja lotes de líneas de factura con items del catálogo."""
+
+    @staticmethod
+    def emparejar_lineas(
+        db: Session,
+        lineas: Iterable[str],
+        proveedor_id: Optional[int] = None,
+        umbral: Optional[float] = None
+    ) -> List[Tuple[Optional[int], float]]:
+        """
+        Empareja todas las líneas de una factura en una llamada.
+
+        Args:
+            db: Sesión de base de datos
+            lineas: Descripciones de las líneas (en el orden de la factura)
+            proveedor_id: Proveedor de la factura (activa el historial)
+            umbral: Puntaje mínimo (default Config.EMPAREJADOR_UMBRAL)
+
+        Returns:
+            [(item_id o None, puntaje)] en el mismo orden que lineas
+        """
+        lineas = list(lineas)
+        if not lineas:
+            return []
+        umbral = Config.EMPAREJADOR_UMBRAL if umbral is None else umbral
+
+        historial_lineas, frecuencia_items = EmparejadorItems._historial_proveedor(db, proveedor_id)
+        frecuencia_maxima = max(frecuencia_items.values(), default=0)
+
+        normalizadas = [normalizar(linea) for linea in lineas]
+        pendientes = [i for i, texto in enumerate(normalizadas) if texto and texto not in historial_lineas]
+        candidatos = EmparejadorItems._candidatos(db, [lineas[i] for i in pendientes], [normalizadas[i] for i in pendientes])
+        candidatos_por_linea = dict(zip(pendientes, candidatos))
+
+        resultado: List[Tuple[Optional[int], float]] = []
+        for i, texto in enumerate(normalizadas):
+            if not texto:
+                resultado.append((None, 0.0))
+                continue
+            if texto in historial_lineas:
+                # La misma descripción ya se aprobó antes con este proveedor
+                resultado.append((historial_lineas[texto], 1.0))
+                continue
+
+            mejor: Tuple[Optional[int], float] = (None, 0.0)
+            for item_id, puntaje, proveedor_autorizado in candidatos_por_linea.get(i, []):
+                if frecuencia_maxima:
+                    puntaje += PESO_HISTORIAL * frecuencia_items.get(item_id, 0) / frecuencia_maxima
+                if proveedor_id and proveedor_autorizado == proveedor_id:
+                    puntaje += BONO_PROVEEDOR_AUTORIZADO
+                puntaje = min(puntaje, 1.0)
+                if puntaje > mejor[1]:
+                    mejor = (item_id, puntaje)
+
+            item_id, puntaje = mejor
+            resultado.append((item_id if puntaje >= umbral else None, round(puntaje, 4)))
+        return resultado
+
+    @staticmethod
+    def emparejar_items(
+        db: Session,
+        lineas: Iterable[str],
+        proveedor_id: Optional[int] = None
+    ) -> List[Optional[Item]]:
+        """
+        Como emparejar_lineas, pero retorna los objetos Item (una consulta para todo el lote).
+
+        Returns:
+            [Item o None] en el mismo orden que lineas
+        """
+        emparejados = EmparejadorItems.emparejar_lineas(db, lineas, proveedor_id=proveedor_id)
+        ids = {item_id for item_id, _ in emparejados if item_id}
+        items = {item.id: item for item in db.query(Item).filter(Item.id.in_(ids)).all()} if ids else {}
+        return [items.get(item_id) for item_id, _ in emparejados]
+
+    @staticmethod
+    def _candidatos(db: Session, lineas: List[str], normalizadas: List[str]) -> List[List[Tuple[int, float, Optional[int]]]]:
+        """Candidatos por línea según el backend configurado."""
+        if not lineas:
+            return []
+        if (Config.EMPAREJADOR_BACKEND or '').lower() == 'pg_trgm' and db.get_bind().dialect.name == 'postgresql':
+            return EmparejadorItems._candidatos_pg_trgm(db, lineas)
+
+        indice = obtener_indice()
+        if not indice.vigente:
+            indice.construir(db)
+        return [indice.candidatos(texto, CANDIDATOS_POR_LINEA) for texto in normalizadas]
+
+    @staticmethod
+    def _candidatos_pg_trgm(db: Session, lineas: List[str]) -> List[List[Tuple[int, float, Optional[int]]]]:
+        """
+        Candidatos con pg_trgm para todo el lote en una consulta:
+        (VALUES líneas) CROSS JOIN LATERAL (items WHERE lower(nombre) % línea ... LIMIT k).
+        """
+        lote = values(column('idx', Integer), column('texto', String), name='lineas').data(
+            [(i, normalizar(linea, quitar_acentos=False)) for i, linea in enumerate(lineas)]
+        )
+        nombre = func.lower(Item.nombre)
+        codigo = func.lower(Item.codigo)
+        puntaje = func.greatest(func.similarity(nombre, lote.c.texto), func.similarity(codigo, lote.c.texto))
+        mejores = select(
+            Item.id.label('item_id'),
+            Item.proveedor_autorizado_id.label('proveedor_id'),
+            puntaje.label('puntaje')
+        ).where(
+            Item.activo == True,
+            or_(nombre.op('%')(lote.c.texto), codigo.op('%')(lote.c.texto))
+        ).order_by(puntaje.desc()).limit(CANDIDATOS_POR_LINEA).lateral('mejores')
+
+        filas = db.execute(
+            select(lote.c.idx, mejores.c.item_id, mejores.c.puntaje, mejores.c.proveedor_id)
+            .select_from(lote.join(mejores, true()))
+        ).all()
+
+        resultado: List[List[Tuple[int, float, Optional[int]]]] = [[] for _ in lineas]
+        for idx, item_id, similitud_pg, proveedor_id in filas:
+            resultado[idx].append((item_id, float(similitud_pg), proveedor_id))
+        return resultado
+
+    @staticmethod
+    def _historial_proveedor(db: Session, proveedor_id: Optional[int]) -> Tuple[Dict[str, int], Dict[int, int]]:
+        """
+        Historial de líneas aprobadas del proveedor (una consulta).
+
+        Returns:
+            ({descripción normalizada: item_id más frecuente}, {item_id: veces facturado})
+        """
+        if not proveedor_id:
+            return {}, {}
+        filas = db.query(
+            FacturaItem.descripcion, FacturaItem.item_id, func.count(FacturaItem.id)
+        ).join(Factura).filter(
+            Factura.proveedor_id == proveedor_id,
+            Factura.estado.in_([EstadoFactura.APROBADA, EstadoFactura.PARCIAL]),
+            FacturaItem.item_id.isnot(None)
+        ).group_by(FacturaItem.descripcion, FacturaItem.item_id).all()
+
+        frecuencia_items: Counter = Counter()
+        por_descripcion: Dict[str, Counter] = {}
+        for descripcion, item_id, veces in filas:
+            frecuencia_items[item_id] += veces
+            texto = normalizar(descripcion)
+            if texto:
+                por_descripcion.setdefault(texto, Counter())[item_id] += veces
+        historial_lineas = {texto: conteo.most_common(1)[0][0] for texto, conteo in por_descripcion.items()}
+        return historial_lineas, dict(frecuencia_items)
+
+
+# ---------- Mantenimiento incremental del índice ----------
+
+def _item_guardado(mapper, connection, item: Item) -> None:
+    """Encola la actualización del índice para cuando se confirme la transacción."""
+    sesion = object_session(item)
+    if sesion is None:
+        return
+    encolar_post_commit(
+        sesion, _indice.actualizar_item,
+        item.id, item.nombre, item.codigo, item.proveedor_autorizado_id, bool(item.activo)
+    )
+
+
+def _item_eliminado(mapper, connection, item: Item) -> None:
+    sesion = object_session(item)
+    if sesion is None:
+        return
+    encolar_post_commit(sesion, _indice.quitar_item, item.id)
+
+
+event.listen(Item, 'after_insert', _item_guardado)
+event.listen(Item, 'after_update', _item_guardado)
+event.listen(Item, 'after_delete', _item_eliminado)
@@ -9,82 +9,87 @@ from sqlalchemy import and_
 from werkzeug.utils import secure_filename
 from PIL import Image
 
-from models import Factura, FacturaItem, Proveedor, Item, Inventario
+from models import Factura, FacturaItem, Proveedor, Item
 # Cliente removido (m?dulo eliminado)
 from models.factura import TipoFactura, EstadoFactura
-from utils.ocr import ocr_processor
 from utils.helpers import calcular_iva, calcular_total
+from utils.cache_respuestas import invalidar_tags_post_commit
 from config import Config
 from modules.crm.notificaciones.whatsapp import whatsapp_service
+from modules.logistica.movimientos_inventario import MovimientoInventarioService
+from modules.logistica.emparejador_items import EmparejadorItems
 
 class FacturaService:
     """Servicio para gesti?n de facturas."""
     
     @staticmethod
-    def procesar_factura_desde_imagen(
+    def crear_factura_desde_ocr(
         db: Session,
-        imagen_path: str,
-        tipo: str = 'proveedor'
+        datos_ocr: Dict,
+        imagen_url: Optional[str],
+        tipo: str = 'proveedor',
+        proveedor: Optional[Proveedor] = None,
+        items_emparejados: Optional[List[Optional[Item]]] = None,
+        **campos
     ) -> Factura:
         """
-        Procesa una factura desde una imagen usando OCR.
+        Crea una factura PENDIENTE y sus items a partir de los datos del OCR.
+        No hace commit (lo usa el pipeline de ingesta).
         
         Args:
             db: Sesi?n de base de datos
-            imagen_path: Ruta al archivo de imagen
+            datos_ocr: Datos parseados de la factura
+            imagen_url: URL de la imagen guardada
             tipo: Tipo de factura ('cliente' o 'proveedor')
+            proveedor: Proveedor identificado (opcional)
+            items_emparejados: Item de cada l?nea, ya emparejado (si None, se empareja aqu?)
+            **campos: Campos adicionales de Factura (remitente, WhatsApp, etc.)
             
         Returns:
             Factura creada
+            
+        Raises:
+            ValueError: Si ya existe una factura con el mismo n?mero
         """
-        # 1. Guardar imagen en servidor
-        imagen_url = FacturaService._guardar_imagen(imagen_path)
-        
-        # 2. Extraer datos con OCR
-        datos_ocr = ocr_processor.extract_invoice_data(imagen_path)
-        
-        # 3. Buscar o crear proveedor
-        if tipo == 'proveedor':
-            proveedor = FacturaService._buscar_o_crear_proveedor(db, datos_ocr)
-            cliente_id = None
-            proveedor_id = proveedor.id
-        else:
-            # Cliente removido - facturas de cliente ahora sin proveedor
-            proveedor_id = None
-            cliente_id = None
-        
-        # 4. Verificar duplicados
-        factura_existente = db.query(Factura).filter(
-            Factura.numero_factura == datos_ocr.get('numero_factura')
-        ).first()
-        
-        if factura_existente:
+        numero_factura = datos_ocr.get('numero_factura')
+        if numero_factura and db.query(Factura.id).filter(Factura.numero_factura == numero_factura).first():
             raise ValueError("Ya existe una factura con este n?mero")
         
-        # 5. Crear factura
+        # Cliente removido - facturas de cliente ahora sin proveedor
+        proveedor_id = proveedor.id if proveedor and tipo == 'proveedor' else None
         fecha_emision = FacturaService._parsear_fecha(datos_ocr.get('fecha'))
         
+        # Sin subtotal del OCR se deriva de total - iva; si tampoco hay iva queda en 0 para revisar
+        subtotal, iva, total = (datos_ocr.get(campo) for campo in ('subtotal', 'iva', 'total'))
+        if subtotal is None and total is not None and iva is not None:
+            subtotal = float(total) - float(iva)
+        elif subtotal is None:
+            campos.setdefault('observaciones', 'Revisar montos: el OCR no detecto el subtotal de la factura')
+        
         factura = Factura(
-            numero_factura=datos_ocr.get('numero_factura', 'SIN-NUMERO'),
+            numero_factura=numero_factura or 'SIN-NUMERO',
             tipo=TipoFactura[tipo.upper()],
-            cliente_id=cliente_id,
+            cliente_id=None,
             proveedor_id=proveedor_id,
             fecha_emision=fecha_emision or datetime.utcnow(),
-            subtotal=float(datos_ocr.get('subtotal', 0)),
-            iva=float(datos_ocr.get('iva', 0)),
-            total=float(datos_ocr.get('total', 0)),
+            subtotal=float(subtotal or 0),
+            iva=float(iva or 0),
+            total=float(total or 0),
             estado=EstadoFactura.PENDIENTE,
             imagen_url=imagen_url,
-            items_json=datos_ocr.get('items', [])
+            items_json=datos_ocr.get('items', []),
+            **campos
         )
-        
         db.add(factura)
+        db.flush()
         
-        # 6. Crear items de factura
-        for item_data in datos_ocr.get('items', []):
-            # Intentar encontrar item en base de datos por descripci?n
-            item = FacturaService._buscar_item_por_descripcion(db, item_data.get('descripcion', ''))
-            
+        # Crear items de factura (todas las l?neas se emparejan con items en una llamada)
+        lineas_ocr = datos_ocr.get('items', [])
+        if items_emparejados is None:
+            items_emparejados = EmparejadorItems.emparejar_items(
+                db, [linea.get('descripcion', '') for linea in lineas_ocr], proveedor_id=proveedor_id
+            )
+        for item_data, item in zip(lineas_ocr, items_emparejados):
             # Extraer unidad de la descripci?n o usar la del item si existe
             unidad_factura = item_data.get('unidad') or (item.unidad if item else None)
             
@@ -99,12 +104,14 @@ class FacturaService:
             )
             db.add(factura_item)
         
-        db.commit()
-        db.refresh(factura)
-        
-        # 7. Notificar a bodega
+        invalidar_tags_post_commit(db, 'facturas')
+        return factura
+    
+    @staticmethod
+    def notificar_factura_recibida(factura: Factura, proveedor: Optional[Proveedor]) -> None:
+        """Avisa por WhatsApp la recepci?n de una factura de proveedor (error no cr?tico)."""
         try:
-            if tipo == 'proveedor' and proveedor.telefono:
+            if factura.tipo == TipoFactura.PROVEEDOR and proveedor and proveedor.telefono:
                 whatsapp_service.notificar_factura_recibida(
                     proveedor.telefono,
                     {
@@ -118,8 +125,6 @@ class FacturaService:
             import logging
             logger = logging.getLogger(__name__)
             logger.warning(f"Error al enviar notificaci?n WhatsApp: {e}", exc_info=True)
-        
-        return factura
     
     @staticmethod
     def aprobar_factura(
@@ -209,8 +214,9 @@ class FacturaService:
         
         # Actualizar inventario solo con items aprobados
         # IMPORTANTE: Las cantidades se deben convertir a la unidad est?ndar del item antes de actualizar inventario
-        from modules.logistica.conversor_unidades import son_unidades_compatibles, convertir_unidad
+        from modules.logistica.conversor_unidades import registro_unidades
         
+        movimientos = []
         for item_factura in factura.items:
             if item_factura.cantidad_aprobada and item_factura.cantidad_aprobada > 0 and item_factura.item_id:
                 item = db.query(Item).filter(Item.id == item_factura.item_id).first()
@@ -220,20 +226,44 @@ class FacturaService:
                     cantidad_aprobada = float(item_factura.cantidad_aprobada)
                     unidad_estandar = item.unidad  # Unidad est?ndar del m?dulo Items
                     
-                    # Convertir a unidad est?ndar si es necesario
-                    if son_unidades_compatibles(unidad_factura, unidad_estandar) and unidad_factura != unidad_estandar:
-                        cantidad_estandarizada = convertir_unidad(cantidad_aprobada, unidad_factura, unidad_estandar)
-                        if cantidad_estandarizada:
-                            cantidad_aprobada = cantidad_estandarizada
+                    # Convertir a unidad est?ndar si es necesario (peso <-> volumen con la densidad del item)
+                    if unidad_factura != unidad_estandar:
+                        densidad = float(item.densidad) if item.densidad else None
+                        factor = registro_unidades.factor(unidad_factura, unidad_estandar, densidad)
+                        if factor:
+                            cantidad_aprobada = cantidad_aprobada * factor
                     
-                    # Actualizar inventario con cantidad estandarizada
-                    FacturaService._actualizar_inventario(
-                        db,
-                        item_factura.item_id,
-                        cantidad_aprobada,
-                        float(item_factura.precio_unitario)
-                    )
-        
+                    # Movimiento de entrada con cantidad estandarizada
+                    movimientos.append({
+                        'item_id': item_factura.item_id,
+                        'cantidad': cantidad_aprobada,
+                        'tipo': 'entrada',
+                        'costo_unitario': float(item_factura.precio_unitario),
+                        'origen': 'factura',
+                        'origen_id': factura.id,
+                        'referencia': factura.numero_factura,
+                        'registrado_por': usuario_id
+                    })
+        
+        # Todas las entradas de la factura en un solo UPDATE, dentro de esta transacción.
+        # El costo unitario del item no se sobrescribe con el último precio:
+        # CostoService.actualizar_costos_por_factura lo fija al promedio estandarizado
+        MovimientoInventarioService.aplicar_movimientos(db, movimientos)
+        
+        # Mantener costos estandarizados al día solo para los items de esta factura
+        # (y las recetas que los usan). El recálculo semanal queda como verificación.
+        if factura.estado == EstadoFactura.APROBADA:
+            from modules.logistica.costos import CostoService
+            try:
+                with db.begin_nested():
+                    CostoService.actualizar_costos_por_factura(db, factura)
+            except Exception as e:
+                # Error no crítico: el recálculo semanal corregirá los costos
+                import logging
+                logger = logging.getLogger(__name__)
+                logger.warning(f"Error actualizando costos de la factura {factura.id}: {e}", exc_info=True)
+        
+        invalidar_tags_post_commit(db, 'facturas', 'inventario')
         db.commit()
         db.refresh(factura)
         return factura
@@ -269,6 +299,7 @@ class FacturaService:
         factura.aprobado_por = usuario_id
         factura.fecha_aprobacion = datetime.utcnow()
         
+        invalidar_tags_post_commit(db, 'facturas')
         db.commit()
         db.refresh(factura)
         return factura
@@ -302,6 +333,7 @@ class FacturaService:
         factura.observaciones = observaciones
         # Mantener estado PENDIENTE para que pueda ser reprocesada
         
+        invalidar_tags_post_commit(db, 'facturas')
         db.commit()
         db.refresh(factura)
         return factura
@@ -348,15 +380,6 @@ class FacturaService:
     
     # M?todo _buscar_o_crear_cliente removido (m?dulo Cliente eliminado)
     
-    @staticmethod
-    def _buscar_item_por_descripcion(db: Session, descripcion: str) -> Optional[Item]:
-        """Busca un item por descripci?n (b?squeda aproximada)."""
-        # B?squeda simple por nombre similar
-        items = db.query(Item).filter(Item.nombre.ilike(f'%{descripcion[:20]}%')).all()
-        if items:
-            return items[0]
-        return None
-    
     @staticmethod
     def _parsear_fecha(fecha_string: Optional[str]) -> Optional[datetime]:
         """Parsea una fecha desde string."""
@@ -371,36 +394,3 @@ class FacturaService:
                 continue
         
         return None
-    
-    @staticmethod
-    def _actualizar_inventario(
-        db: Session,
-        item_id: int,
-        cantidad: float,
-        costo_unitario: float
-    ):
-        """Actualiza el inventario con una entrada."""
-        inventario = db.query(Inventario).filter(Inventario.item_id == item_id).first()
-        
-        if inventario:
-            inventario.cantidad_actual += cantidad
-            inventario.ultimo_costo_unitario = costo_unitario
-            inventario.ultima_actualizacion = datetime.utcnow()
-        else:
-            # Crear registro de inventario si no existe
-            item = db.query(Item).filter(Item.id == item_id).first()
-            if item:
-                inventario = Inventario(
-                    item_id=item_id,
-                    cantidad_actual=cantidad,
-                    unidad=item.unidad,
-                    ultimo_costo_unitario=costo_unitario
-                )
-                db.add(inventario)
-        
-        # Actualizar costo unitario del item
-        item = db.query(Item).filter(Item.id == item_id).first()
-        if item:
-            item.costo_unitario_actual = costo_unitario
-        
-        db.commit()
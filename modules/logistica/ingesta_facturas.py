@@ -0,0 +1,593 @@
+"""
+Pipeline asíncrono de ingesta de facturas por imagen (carga manual y WhatsApp).
+
+Etapas: descarga → hash → ocr → parseo → emparejamiento → persistencia → notificación.
+Se agrupan en tres colas acotadas (Config.INGESTA_COLA_MAX), cada una con su
+propio grupo de hilos:
+
+- 'entrada' (descarga, hash): INGESTA_HILOS_DESCARGA
+- 'ocr' (ocr, parseo): INGESTA_HILOS_OCR, las llamadas lentas a Vision
+- 'registro' (emparejamiento, persistencia, notificación): INGESTA_HILOS_REGISTRO
+
+El request solo registra la ingesta y responde 202 con su ID; el avance queda
+en la tabla ingestas_factura (etapa, estado, error). El hash SHA-256 es único,
+así una imagen repetida (o un reintento del webhook) nunca vuelve a pasar por OCR,
+y el texto del OCR se guarda para no repetirlo al reanudar.
+
+Si la cola de entrada está llena, o una ingesta queda sin avanzar más de
+INGESTA_TIMEOUT_SEGUNDOS (worker reiniciado), se ejecuta completa desde la cola
+persistente de trabajos (modules/trabajos/cola.py).
+
+Las imágenes están en el disco del servicio web (Config.UPLOAD_FOLDER), así
+que esos trabajos son locales: no los toma el programador dedicado, sino el
+supervisor del pipeline de cada worker web. El supervisor también renueva
+fecha_actualizacion de las ingestas en curso en su proceso; una ingesta se
+considera abandonada solo por su estado en la base de datos.
+"""
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+from pathlib import Path
+import hashlib
+import logging
+import queue
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import Config
+from models import db
+from models.ingesta_factura import IngestaFactura, EstadoIngesta
+from models.factura import TipoFactura
+from modules.logistica.facturas import FacturaService
+from modules.logistica.facturas_whatsapp import FacturasWhatsAppService
+from modules.logistica.emparejador_items import EmparejadorItems
+from modules.crm.notificaciones.whatsapp import whatsapp_service
+from modules.trabajos.cola import ColaTrabajosService, registrar_trabajo
+from utils.ocr import obtener_ocr
+
+logger = logging.getLogger(__name__)
+
+# Tipo de trabajo para ingestas que no entran en el pipeline en memoria
+TRABAJO_INGESTA_FACTURA = 'ingesta_factura'
+
+ORIGEN_CARGA = 'carga'
+ORIGEN_WHATSAPP = 'whatsapp'
+
+# Grupos del pipeline: cada uno con su cola y sus hilos, en orden
+GRUPOS_ETAPAS = {
+    'entrada': ['descarga', 'hash'],
+    'ocr': ['ocr', 'parseo'],
+    'registro': ['emparejamiento', 'persistencia', 'notificacion'],
+}
+ORDEN_GRUPOS = ['entrada', 'ocr', 'registro']
+GRUPO_POR_ETAPA = {etapa: grupo for grupo, etapas in GRUPOS_ETAPAS.items() for etapa in etapas}
+
+TAMANO_BLOQUE_HASH = 1024 * 1024
+
+
+def calcular_sha256(ruta: str) -> str:
+    """Hash SHA-256 del contenido de un archivo, leído por bloques."""
+    digest = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(TAMANO_BLOQUE_HASH), b''):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+
+class PipelineIngesta:
+    """
+    Colas acotadas y grupos de hilos del pipeline (uno por proceso).
+
+    Los hilos arrancan con el primer request del worker web (o la primera
+    ingesta). Cada hilo abre su propio contexto de aplicación y sesión por
+    grupo de etapas; entre grupos solo viaja el ID de la ingesta. Un grupo que
+    encuentra llena la cola siguiente espera, así la presión llega hasta la
+    entrada.
+    """
+
+    def __init__(self):
+        self._app = None
+        self._colas: Dict[str, queue.Queue] = {}
+        self._en_curso = set()
+        self._lock = threading.Lock()
+        self._vacio = threading.Condition(self._lock)
+
+    def iniciar(self, app) -> None:
+        """Crea las colas, los hilos y el supervisor si aún no existen."""
+        if self._app is not None:
+            return
+        with self._lock:
+            self._iniciar(app)
+
+    def _iniciar(self, app) -> None:
+        """Crea las colas, los hilos y el supervisor (una sola vez, con el lock tomado)."""
+        if self._app is not None:
+            return
+        hilos = {
+            'entrada': Config.INGESTA_HILOS_DESCARGA,
+            'ocr': Config.INGESTA_HILOS_OCR,
+            'registro': Config.INGESTA_HILOS_REGISTRO,
+        }
+        for grupo in ORDEN_GRUPOS:
+            self._colas[grupo] = queue.Queue(maxsize=Config.INGESTA_COLA_MAX)
+            for numero in range(max(hilos[grupo], 1)):
+                threading.Thread(
+                    target=self._trabajador, args=(grupo,), daemon=True,
+                    name=f'ingesta-{grupo}-{numero}'
+                ).start()
+        self._app = app
+        threading.Thread(target=self._supervisar, daemon=True, name='ingesta-supervisor').start()
+
+    def enviar(self, ingesta_id: int, etapa: str, app=None) -> bool:
+        """
+        Pone una ingesta en la cola del grupo de `etapa`, sin bloquear.
+
+        Returns:
+            False si la cola está llena o la ingesta ya está en curso en este proceso
+        """
+        with self._lock:
+            self._iniciar(app or current_app._get_current_object())
+            if ingesta_id in self._en_curso:
+                return False
+            try:
+                self._colas[GRUPO_POR_ETAPA[etapa]].put_nowait(ingesta_id)
+            except queue.Full:
+                return False
+            self._en_curso.add(ingesta_id)
+            return True
+
+    def en_curso(self, ingesta_id: int) -> bool:
+        """True si la ingesta está en alguna cola o hilo de este proceso."""
+        with self._lock:
+            return ingesta_id in self._en_curso
+
+    def esperar(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que no queden ingestas en curso (scripts y pruebas)."""
+        with self._vacio:
+            return self._vacio.wait_for(lambda: not self._en_curso, timeout)
+
+    def _supervisar(self) -> None:
+        """
+        Cada INGESTA_SUPERVISOR_INTERVALO_SEGUNDOS renueva las ingestas en curso
+        de este proceso, reanuda las abandonadas y ejecuta los trabajos de
+        ingesta de la cola persistente (uno por vuelta, sin esperar si hubo).
+        """
+        while True:
+            procesados = 0
+            try:
+                with self._lock:
+                    en_curso = list(self._en_curso)
+                with self._app.app_context():
+                    try:
+                        IngestaFacturaService.renovar_en_curso(db.session, en_curso)
+                        reanudadas = IngestaFacturaService.reanudar_pendientes(db.session)
+                        if reanudadas:
+                            logger.info(f"Ingestas de facturas reanudadas: {reanudadas}")
+                        procesados = ColaTrabajosService.procesar_pendientes(
+                            db.session, limite=1, tipos=[TRABAJO_INGESTA_FACTURA]
+                        )['procesados']
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                logger.error(f"Error en el supervisor del pipeline de ingesta: {e}", exc_info=True)
+            if not procesados:
+                time.sleep(Config.INGESTA_SUPERVISOR_INTERVALO_SEGUNDOS)
+
+    def _trabajador(self, grupo: str) -> None:
+        cola = self._colas[grupo]
+        while True:
+            ingesta_id = cola.get()
+            siguiente = None
+            try:
+                with self._app.app_context():
+                    try:
+                        siguiente = IngestaFacturaService.ejecutar_grupo(db.session, ingesta_id, grupo)
+                    finally:
+                        db.session.remove()
+                if siguiente:
+                    self._colas[siguiente].put(ingesta_id)
+            except Exception as e:
+                logger.error(f"Error en el pipeline de ingesta ({grupo}) para {ingesta_id}: {e}", exc_info=True)
+                siguiente = None
+            finally:
+                if not siguiente:
+                    with self._vacio:
+                        self._en_curso.discard(ingesta_id)
+                        self._vacio.notify_all()
+                cola.task_done()
+
+
+# Pipeline del proceso
+pipeline = PipelineIngesta()
+
+
+class IngestaFacturaService:
+    """Servicio para registrar, ejecutar y consultar ingestas de facturas."""
+
+    @staticmethod
+    def registrar_carga(db: Session, ruta_temporal: str, tipo: str = 'proveedor') -> Tuple[IngestaFactura, bool]:
+        """
+        Registra una imagen subida por la API y la envía al pipeline.
+
+        Si la misma imagen ya se registró, retorna esa ingesta (y reintenta
+        si había fallado) sin volver a procesarla.
+
+        Args:
+            db: Sesión de base de datos
+            ruta_temporal: Archivo subido (el llamador lo elimina después)
+            tipo: Tipo de factura ('cliente' o 'proveedor')
+
+        Returns:
+            (ingesta, creada)
+        """
+        sha256 = calcular_sha256(ruta_temporal)
+        existente = db.query(IngestaFactura).filter(IngestaFactura.sha256 == sha256).first()
+        if existente:
+            IngestaFacturaService._reintentar_si_fallida(db, existente)
+            return existente, False
+
+        imagen_url = FacturaService._guardar_imagen(ruta_temporal)
+        ingesta = IngestaFactura(
+            origen=ORIGEN_CARGA,
+            tipo=tipo,
+            estado=EstadoIngesta.PENDIENTE,
+            etapa='ocr',  # Archivo local y hash ya calculado
+            sha256=sha256,
+            ruta_imagen=str(Config.UPLOAD_FOLDER / Path(imagen_url).name)
+        )
+        db.add(ingesta)
+        try:
+            db.commit()
+        except IntegrityError:
+            # La misma imagen se subió en paralelo
+            db.rollback()
+            Path(Config.UPLOAD_FOLDER / Path(imagen_url).name).unlink(missing_ok=True)
+            return db.query(IngestaFactura).filter(IngestaFactura.sha256 == sha256).one(), False
+
+        IngestaFacturaService._enviar(db, ingesta)
+        return ingesta, True
+
+    @staticmethod
+    def registrar_whatsapp(
+        db: Session,
+        media_id: str,
+        remitente_telefono: str,
+        remitente_nombre: Optional[str] = None
+    ) -> Tuple[IngestaFactura, bool]:
+        """
+        Registra una imagen recibida por el webhook de WhatsApp y la envía al pipeline.
+
+        Los reintentos del webhook (mismo media_id) retornan la ingesta existente.
+
+        Returns:
+            (ingesta, creada)
+        """
+        existente = db.query(IngestaFactura).filter(IngestaFactura.whatsapp_media_id == media_id).first()
+        if existente:
+            return existente, False
+
+        ingesta = IngestaFactura(
+            origen=ORIGEN_WHATSAPP,
+            tipo='proveedor',
+            estado=EstadoIngesta.PENDIENTE,
+            etapa='descarga',
+            whatsapp_media_id=media_id,
+            remitente_telefono=remitente_telefono,
+            remitente_nombre=remitente_nombre
+        )
+        db.add(ingesta)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return db.query(IngestaFactura).filter(IngestaFactura.whatsapp_media_id == media_id).one(), False
+
+        IngestaFacturaService._enviar(db, ingesta)
+        return ingesta, True
+
+    @staticmethod
+    def obtener_ingesta(db: Session, ingesta_id: int) -> Optional[IngestaFactura]:
+        """Obtiene una ingesta por ID."""
+        return db.query(IngestaFactura).filter(IngestaFactura.id == ingesta_id).first()
+
+    @staticmethod
+    def _enviar(db: Session, ingesta: IngestaFactura) -> None:
+        """Envía la ingesta al pipeline; si está lleno, a la cola persistente de trabajos."""
+        if pipeline.enviar(ingesta.id, ingesta.etapa):
+            return
+        if pipeline.en_curso(ingesta.id):
+            return
+        ColaTrabajosService.encolar(db, TRABAJO_INGESTA_FACTURA, {'ingesta_id': ingesta.id})
+        db.commit()
+
+    @staticmethod
+    def _reintentar_si_fallida(db: Session, ingesta: IngestaFactura) -> None:
+        """Devuelve al pipeline una ingesta fallida, desde la etapa en que falló."""
+        if ingesta.estado != EstadoIngesta.FALLIDA:
+            return
+        ingesta.estado = EstadoIngesta.PENDIENTE
+        ingesta.error = None
+        ingesta.finalizado_en = None
+        ingesta.fecha_actualizacion = datetime.utcnow()
+        db.commit()
+        IngestaFacturaService._enviar(db, ingesta)
+
+    @staticmethod
+    def renovar_en_curso(db: Session, ingesta_ids: List[int]) -> None:
+        """Renueva fecha_actualizacion de las ingestas que este proceso tiene en sus colas o hilos."""
+        if not ingesta_ids:
+            return
+        db.query(IngestaFactura).filter(
+            IngestaFactura.id.in_(ingesta_ids),
+            IngestaFactura.estado.in_([EstadoIngesta.PENDIENTE, EstadoIngesta.PROCESANDO])
+        ).update({IngestaFactura.fecha_actualizacion: datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+
+    @staticmethod
+    def reanudar_pendientes(db: Session) -> int:
+        """
+        Pasa a la cola persistente de trabajos las ingestas sin avance por más
+        de INGESTA_TIMEOUT_SEGUNDOS (el proceso que las tenía se reinició).
+
+        Las que siguen en curso en algún worker no cuentan: su supervisor
+        renueva fecha_actualizacion mientras estén en sus colas o hilos.
+
+        Returns:
+            Cantidad de ingestas reanudadas
+        """
+        limite = datetime.utcnow() - timedelta(seconds=Config.INGESTA_TIMEOUT_SEGUNDOS)
+        candidatas = [
+            ingesta_id for (ingesta_id,) in db.query(IngestaFactura.id).filter(
+                IngestaFactura.estado.in_([EstadoIngesta.PENDIENTE, EstadoIngesta.PROCESANDO]),
+                IngestaFactura.fecha_actualizacion < limite
+            ).all()
+        ]
+
+        reanudadas = 0
+        for ingesta_id in candidatas:
+            # Reclamo condicional: otro proceso pudo tomarla primero
+            reclamada = db.query(IngestaFactura).filter(
+                IngestaFactura.id == ingesta_id,
+                IngestaFactura.fecha_actualizacion < limite
+            ).update({IngestaFactura.fecha_actualizacion: datetime.utcnow()}, synchronize_session=False)
+            if reclamada:
+                ColaTrabajosService.encolar(db, TRABAJO_INGESTA_FACTURA, {'ingesta_id': ingesta_id})
+                reanudadas += 1
+        db.commit()
+        return reanudadas
+
+    @staticmethod
+    def ejecutar(db: Session, ingesta_id: int) -> None:
+        """Ejecuta en línea todas las etapas pendientes de una ingesta."""
+        ingesta = IngestaFacturaService.obtener_ingesta(db, ingesta_id)
+        grupo = GRUPO_POR_ETAPA.get(ingesta.etapa) if ingesta else None
+        while grupo:
+            grupo = IngestaFacturaService.ejecutar_grupo(db, ingesta_id, grupo)
+
+    @staticmethod
+    def ejecutar_grupo(db: Session, ingesta_id: int, grupo: str) -> Optional[str]:
+        """
+        Ejecuta las etapas de un grupo, desde la etapa actual de la ingesta.
+
+        Cada etapa se confirma por separado (la ingesta se puede reanudar desde
+        la última etapa iniciada). Un error marca la ingesta como FALLIDA.
+
+        Returns:
+            Grupo siguiente, o None si la ingesta terminó (completada, duplicada o fallida)
+        """
+        ingesta = IngestaFacturaService.obtener_ingesta(db, ingesta_id)
+        if not ingesta or ingesta.estado not in (EstadoIngesta.PENDIENTE, EstadoIngesta.PROCESANDO):
+            return None
+
+        etapas = GRUPOS_ETAPAS[grupo]
+        if ingesta.etapa in etapas:
+            etapas = etapas[etapas.index(ingesta.etapa):]
+
+        contexto: Dict = {}
+        etapa = etapas[0]
+        try:
+            for etapa in etapas:
+                ingesta.etapa = etapa
+                ingesta.estado = EstadoIngesta.PROCESANDO
+                ingesta.fecha_actualizacion = datetime.utcnow()
+                continuar = getattr(IngestaFacturaService, f'_etapa_{etapa}')(db, ingesta, contexto)
+                db.commit()
+                if continuar is False:
+                    return None
+        except Exception as e:
+            db.rollback()
+            IngestaFacturaService._marcar_fallida(db, ingesta_id, etapa, e)
+            return None
+
+        indice = ORDEN_GRUPOS.index(grupo) + 1
+        if indice >= len(ORDEN_GRUPOS):
+            return None
+        siguiente = ORDEN_GRUPOS[indice]
+        ingesta.etapa = GRUPOS_ETAPAS[siguiente][0]
+        db.commit()
+        return siguiente
+
+    @staticmethod
+    def _etapa_descarga(db: Session, ingesta: IngestaFactura, contexto: Dict) -> None:
+        """Descarga la imagen de WhatsApp (las cargas por API ya están en disco)."""
+        if ingesta.ruta_imagen and Path(ingesta.ruta_imagen).exists():
+            return
+        if ingesta.origen != ORIGEN_WHATSAPP:
+            raise ValueError("La imagen de la factura ya no está disponible")
+        if not Config.WHATSAPP_ACCESS_TOKEN:
+            raise ValueError("Token de WhatsApp no configurado")
+
+        ruta = FacturasWhatsAppService.descargar_imagen_whatsapp(
+            ingesta.whatsapp_media_id, Config.WHATSAPP_ACCESS_TOKEN
+        )
+        if not ruta:
+            raise ValueError("Error al descargar imagen de WhatsApp")
+        ingesta.ruta_imagen = ruta
+
+    @staticmethod
+    def _etapa_hash(db: Session, ingesta: IngestaFactura, contexto: Dict) -> Optional[bool]:
+        """
+        Reclama el hash de la imagen. Si otra ingesta ya lo tiene, esta queda
+        DUPLICADA (sin OCR); si esa otra había fallado, le cede el hash.
+        """
+        if ingesta.sha256:
+            return None
+        sha256 = calcular_sha256(ingesta.ruta_imagen)
+
+        original = db.query(IngestaFactura).filter(IngestaFactura.sha256 == sha256).first()
+        if original and original.estado == EstadoIngesta.FALLIDA:
+            original.sha256 = None
+            db.flush()
+            original = None
+
+        if original is None:
+            ingesta.sha256 = sha256
+            try:
+                db.commit()
+                return None
+            except IntegrityError:
+                # Otra ingesta de la misma imagen reclamó el hash en paralelo
+                db.rollback()
+                ingesta = IngestaFacturaService.obtener_ingesta(db, ingesta.id)
+                original = db.query(IngestaFactura).filter(IngestaFactura.sha256 == sha256).one()
+
+        ingesta.estado = EstadoIngesta.DUPLICADA
+        ingesta.duplicada_de_id = original.id
+        ingesta.factura_id = original.factura_id
+        ingesta.finalizado_en = datetime.utcnow()
+        db.commit()
+
+        if ingesta.origen == ORIGEN_WHATSAPP:
+            IngestaFacturaService._responder_whatsapp(
+                ingesta.remitente_telefono,
+                "ℹ️ Esta factura ya fue recibida anteriormente; no es necesario enviarla de nuevo."
+            )
+        return False
+
+    @staticmethod
+    def _etapa_ocr(db: Session, ingesta: IngestaFactura, contexto: Dict) -> None:
+        """Extrae el texto de la imagen con el backend de OCR configurado (una sola vez)."""
+        if ingesta.texto_ocr is None:
+            ingesta.texto_ocr = obtener_ocr().extract_text_from_image(ingesta.ruta_imagen)
+
+    @staticmethod
+    def _etapa_parseo(db: Session, ingesta: IngestaFactura, contexto: Dict) -> None:
+        """Convierte el texto del OCR en datos de factura."""
+        datos = obtener_ocr().parse_invoice_text(ingesta.texto_ocr or '')
+        if not datos.get('numero_factura'):
+            raise ValueError(
+                "No se pudo extraer información de la factura. Verifica que la imagen sea clara."
+            )
+        ingesta.datos_ocr = datos
+
+    @staticmethod
+    def _etapa_emparejamiento(db: Session, ingesta: IngestaFactura, contexto: Dict) -> None:
+        """Identifica al proveedor y empareja las líneas con items."""
+        datos = ingesta.datos_ocr or {}
+        proveedor = None
+        if ingesta.tipo == 'proveedor':
+            if ingesta.origen == ORIGEN_WHATSAPP:
+                # Por WhatsApp solo se asigna un proveedor registrado con ese RUC
+                proveedor = FacturasWhatsAppService.identificar_proveedor_por_ruc(db, datos.get('ruc'))
+            else:
+                proveedor = FacturaService._buscar_o_crear_proveedor(db, datos)
+
+        contexto['proveedor'] = proveedor
+        contexto['items'] = EmparejadorItems.emparejar_items(
+            db,
+            [linea.get('descripcion', '') for linea in datos.get('items', [])],
+            proveedor_id=proveedor.id if proveedor else None
+        )
+
+    @staticmethod
+    def _etapa_persistencia(db: Session, ingesta: IngestaFactura, contexto: Dict) -> None:
+        """Crea la factura PENDIENTE con sus items, en la misma transacción que la ingesta."""
+        if ingesta.factura_id:
+            return
+        if 'items' not in contexto:
+            # Reanudada desde esta etapa: el emparejamiento no se guarda
+            IngestaFacturaService._etapa_emparejamiento(db, ingesta, contexto)
+
+        campos = {}
+        if ingesta.origen == ORIGEN_WHATSAPP:
+            campos = {
+                'remitente_nombre': ingesta.remitente_nombre or ingesta.remitente_telefono,
+                'remitente_telefono': ingesta.remitente_telefono,
+                'recibida_por_whatsapp': True,
+                'whatsapp_message_id': ingesta.whatsapp_media_id,
+            }
+        factura = FacturaService.crear_factura_desde_ocr(
+            db,
+            ingesta.datos_ocr,
+            f"/uploads/facturas/{Path(ingesta.ruta_imagen).name}",
+            tipo=ingesta.tipo,
+            proveedor=contexto['proveedor'],
+            items_emparejados=contexto['items'],
+            **campos
+        )
+        ingesta.factura_id = factura.id
+        contexto['factura'] = factura
+
+    @staticmethod
+    def _etapa_notificacion(db: Session, ingesta: IngestaFactura, contexto: Dict) -> None:
+        """Confirma al remitente de WhatsApp o avisa al proveedor; luego cierra la ingesta."""
+        factura = contexto.get('factura') or ingesta.factura
+        proveedor = contexto.get('proveedor', factura.proveedor if factura else None)
+
+        if factura and ingesta.origen == ORIGEN_WHATSAPP:
+            IngestaFacturaService._responder_whatsapp(
+                ingesta.remitente_telefono,
+                f"✅ Factura recibida y procesada\n\n"
+                f"Número: {factura.numero_factura or 'N/A'}\n"
+                f"Proveedor: {proveedor.nombre if proveedor else (ingesta.datos_ocr or {}).get('proveedor') or 'No identificado'}\n"
+                f"Total: ${float(factura.total or 0):,.2f}\n"
+                f"Items detectados: {len((ingesta.datos_ocr or {}).get('items', []))}\n\n"
+                f"La factura está pendiente de confirmación en el sistema."
+            )
+        elif factura and factura.tipo == TipoFactura.PROVEEDOR:
+            FacturaService.notificar_factura_recibida(factura, proveedor)
+
+        ingesta.estado = EstadoIngesta.COMPLETADA
+        ingesta.finalizado_en = datetime.utcnow()
+
+    @staticmethod
+    def _marcar_fallida(db: Session, ingesta_id: int, etapa: str, error: Exception) -> None:
+        """Registra el error de la etapa y avisa al remitente de WhatsApp."""
+        if not isinstance(error, ValueError):
+            logger.error(f"Ingesta {ingesta_id} falló en la etapa {etapa}: {error}", exc_info=error)
+
+        ingesta = IngestaFacturaService.obtener_ingesta(db, ingesta_id)
+        if not ingesta:
+            return
+        ingesta.estado = EstadoIngesta.FALLIDA
+        ingesta.etapa = etapa
+        ingesta.error = str(error)[:2000]
+        ingesta.fecha_actualizacion = datetime.utcnow()
+        ingesta.finalizado_en = datetime.utcnow()
+        db.commit()
+
+        if ingesta.origen == ORIGEN_WHATSAPP:
+            IngestaFacturaService._responder_whatsapp(
+                ingesta.remitente_telefono,
+                f"❌ Error al procesar la factura: {error}\n\n"
+                f"Por favor, verifica que la imagen sea clara y contenga información de factura."
+            )
+
+    @staticmethod
+    def _responder_whatsapp(telefono: Optional[str], mensaje: str) -> None:
+        """Envía un mensaje al remitente (error no crítico)."""
+        if not telefono:
+            return
+        try:
+            whatsapp_service.enviar_mensaje(telefono, mensaje)
+        except Exception as e:
+            logger.warning(f"Error al responder por WhatsApp a {telefono}: {e}", exc_info=True)
+
+
+@registrar_trabajo(TRABAJO_INGESTA_FACTURA, local=True)
+def _trabajo_ingesta_factura(db: Session, ingesta_id: int):
+    """Handler de la cola (en el supervisor del servicio web): ejecuta una ingesta completa."""
+    IngestaFacturaService.ejecutar(db, ingesta_id)
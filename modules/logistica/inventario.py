@@ -2,10 +2,13 @@
 Lógica de negocio para gestión de inventario.
 """
 from typing import List, Optional, Dict
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
-from models import Inventario, Item, Factura, FacturaItem, Requerimiento, RequerimientoItem
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session, Query, joinedload
+from sqlalchemy import func
+from models import Inventario, Item, Factura, FacturaItem
 from utils.helpers import verificar_stock_suficiente
+from modules.logistica.movimientos_inventario import MovimientoInventarioService
 
 class InventarioService:
     """Servicio para gestión de inventario."""
@@ -22,12 +25,26 @@ class InventarioService:
         Returns:
             Lista de registros de inventario
         """
+        return InventarioService.consulta_inventario(db, item_id=item_id).all()
+    
+    @staticmethod
+    def consulta_inventario(db: Session, item_id: Optional[int] = None) -> Query:
+        """
+        Consulta del inventario completo o de un item específico, para listar o proyectar.
+        
+        Args:
+            db: Sesión de base de datos
+            item_id: ID del item (opcional)
+            
+        Returns:
+            Query de Inventario ordenada por id
+        """
         query = db.query(Inventario)
         
         if item_id:
             query = query.filter(Inventario.item_id == item_id)
         
-        return query.all()
+        return query.order_by(Inventario.id)
     
     @staticmethod
     def obtener_stock_bajo(db: Session) -> List[Dict]:
@@ -41,7 +58,7 @@ class InventarioService:
             Lista de items con stock bajo
         """
         try:
-            items_bajo_stock = db.query(Inventario).filter(
+            items_bajo_stock = db.query(Inventario).options(joinedload(Inventario.item)).filter(
                 Inventario.cantidad_actual < Inventario.cantidad_minima
             ).all()
             
@@ -77,7 +94,7 @@ class InventarioService:
         operacion: str = 'entrada'  # 'entrada' o 'salida'
     ) -> Inventario:
         """
-        Actualiza el stock de un item.
+        Actualiza el stock de un item registrando un movimiento manual y confirma.
         
         Args:
             db: Sesión de base de datos
@@ -88,34 +105,18 @@ class InventarioService:
         Returns:
             Inventario actualizado
         """
-        inventario = db.query(Inventario).filter(Inventario.item_id == item_id).first()
-        
-        if not inventario:
-            # Crear registro si no existe
-            item = db.query(Item).filter(Item.id == item_id).first()
-            if not item:
-                raise ValueError("Item no encontrado")
-            
-            inventario = Inventario(
-                item_id=item_id,
-                cantidad_actual=0,
-                unidad=item.unidad
-            )
-            db.add(inventario)
-        
-        # Actualizar cantidad
-        if operacion == 'entrada':
-            inventario.cantidad_actual += cantidad
-        elif operacion == 'salida':
-            inventario.cantidad_actual -= cantidad
-            if inventario.cantidad_actual < 0:
-                raise ValueError("No hay suficiente stock")
-        else:
+        if operacion not in ('entrada', 'salida'):
             raise ValueError("Operación inválida")
         
-        db.session.commit()
-        db.session.refresh(inventario)
-        return inventario
+        MovimientoInventarioService.aplicar_movimientos(db, [{
+            'item_id': item_id,
+            'cantidad': cantidad,
+            'tipo': operacion,
+            'origen': 'manual'
+        }])
+        
+        db.commit()
+        return db.query(Inventario).filter(Inventario.item_id == item_id).first()
     
     @staticmethod
     def verificar_disponibilidad(
@@ -152,6 +153,68 @@ class InventarioService:
             float(inventario.cantidad_minima)
         )
     
+    @staticmethod
+    def verificar_disponibilidad_lote(db: Session, necesidades: Dict[int, float]) -> pd.DataFrame:
+        """
+        Verifica disponibilidad de muchos items en una sola consulta.
+        
+        Equivale a llamar verificar_disponibilidad por cada item, pero carga
+        items e inventario con un único IN (...) y calcula faltantes de forma
+        vectorizada.
+        
+        Args:
+            db: Sesión de base de datos
+            necesidades: Diccionario {item_id: cantidad_necesaria}
+            
+        Returns:
+            DataFrame indexado por item_id con columnas: existe, nombre, unidad,
+            activo, proveedor_autorizado_id, cantidad_necesaria, cantidad_actual,
+            cantidad_minima, cantidad_disponible, cantidad_faltante, suficiente
+        """
+        columnas = [
+            'existe', 'nombre', 'unidad', 'activo', 'proveedor_autorizado_id',
+            'cantidad_necesaria', 'cantidad_actual', 'cantidad_minima',
+            'cantidad_disponible', 'cantidad_faltante', 'suficiente'
+        ]
+        if not necesidades:
+            return pd.DataFrame(columns=columnas).rename_axis('item_id')
+        
+        filas = db.query(
+            Item.id,
+            Item.nombre,
+            Item.unidad,
+            Item.activo,
+            Item.proveedor_autorizado_id,
+            Inventario.cantidad_actual,
+            Inventario.cantidad_minima
+        ).outerjoin(Inventario, Inventario.item_id == Item.id).filter(
+            Item.id.in_(list(necesidades.keys()))
+        ).all()
+        
+        tabla = pd.DataFrame(filas, columns=[
+            'item_id', 'nombre', 'unidad', 'activo', 'proveedor_autorizado_id',
+            'cantidad_actual', 'cantidad_minima'
+        ]).set_index('item_id').reindex(list(necesidades.keys()))
+        tabla.index.name = 'item_id'
+        
+        tabla['existe'] = tabla['nombre'].notna()
+        tabla['nombre'] = tabla['nombre'].fillna('N/A')
+        tabla['unidad'] = tabla['unidad'].fillna('N/A')
+        tabla['activo'] = tabla['activo'].fillna(False).astype(bool)
+        tabla['cantidad_necesaria'] = pd.Series(necesidades, dtype=float)
+        tabla['cantidad_actual'] = tabla['cantidad_actual'].astype(float).fillna(0.0)
+        tabla['cantidad_minima'] = tabla['cantidad_minima'].astype(float).fillna(0.0)
+        
+        # Mismas reglas que verificar_stock_suficiente (mínimo como amortiguador)
+        tabla['cantidad_disponible'] = tabla['cantidad_actual'] - tabla['cantidad_minima']
+        tabla['suficiente'] = tabla['cantidad_disponible'] >= tabla['cantidad_necesaria']
+        tabla['cantidad_faltante'] = np.where(
+            tabla['suficiente'],
+            0.0,
+            np.maximum(0.0, tabla['cantidad_necesaria'] - tabla['cantidad_disponible'])
+        )
+        return tabla[columnas]
+    
     @staticmethod
     def obtener_inventario_completo_con_movimientos(db: Session) -> List[Dict]:
         """
@@ -164,7 +227,7 @@ class InventarioService:
         import traceback
         
         try:
-            inventarios = db.query(Inventario).all()
+            inventarios = db.query(Inventario).options(joinedload(Inventario.item)).all()
             resultado = []
             
             # Si no hay inventarios, generar datos mock
@@ -224,35 +287,19 @@ class InventarioService:
                     # Si no hay items, retornar lista vacía
                     return []
             
+            # Último ingreso y egreso de todos los items desde el libro de movimientos (una consulta)
+            try:
+                ultimos = MovimientoInventarioService.ultimos_movimientos(db)
+            except Exception as query_error:
+                logging.warning(f"Error consultando últimos movimientos: {str(query_error)}")
+                ultimos = {}
+            
             for inv in inventarios:
                 try:
                     item_dict = inv.to_dict()
-                    
-                    # Obtener último ingreso (factura aprobada más reciente con este item)
-                    from models.factura import EstadoFactura, TipoFactura
-                    from models.requerimiento import EstadoRequerimiento
-                    
-                    try:
-                        ultimo_ingreso = db.query(FacturaItem).join(Factura).filter(
-                            FacturaItem.item_id == inv.item_id,
-                            Factura.estado == EstadoFactura.APROBADA,
-                            Factura.tipo == TipoFactura.PROVEEDOR,
-                            FacturaItem.cantidad_aprobada.isnot(None)
-                        ).order_by(desc(Factura.fecha_aprobacion)).first()
-                    except Exception as query_error:
-                        logging.warning(f"Error consultando último ingreso para item_id={inv.item_id}: {str(query_error)}")
-                        ultimo_ingreso = None
-                    
-                    # Obtener último egreso (requerimiento entregado más reciente con este item)
-                    try:
-                        ultimo_egreso = db.query(RequerimientoItem).join(Requerimiento).filter(
-                            RequerimientoItem.item_id == inv.item_id,
-                            Requerimiento.estado == EstadoRequerimiento.ENTREGADO,
-                            RequerimientoItem.cantidad_entregada.isnot(None)
-                        ).order_by(desc(Requerimiento.fecha)).first()
-                    except Exception as query_error:
-                        logging.warning(f"Error consultando último egreso para item_id={inv.item_id}: {str(query_error)}")
-                        ultimo_egreso = None
+                    movimientos_item = ultimos.get(inv.item_id, {})
+                    ultimo_ingreso = movimientos_item.get('entrada')
+                    ultimo_egreso = movimientos_item.get('salida')
                     
                     # Calcular stock disponible (cantidad_actual - cantidad_minima)
                     try:
@@ -263,33 +310,25 @@ class InventarioService:
                         logging.warning(f"Error calculando stock disponible para item_id={inv.item_id}: {str(calc_error)}")
                         stock_disponible = 0.0
                     
-                    # Manejar último ingreso con validaciones seguras
-                    try:
-                        if ultimo_ingreso and ultimo_ingreso.factura:
-                            item_dict['ultimo_ingreso'] = {
-                                'fecha': ultimo_ingreso.factura.fecha_aprobacion.isoformat() if ultimo_ingreso.factura.fecha_aprobacion else None,
-                                'cantidad': float(ultimo_ingreso.cantidad_aprobada) if ultimo_ingreso.cantidad_aprobada is not None else None,
-                                'factura_numero': ultimo_ingreso.factura.numero_factura if ultimo_ingreso.factura.numero_factura else None,
-                                'proveedor': ultimo_ingreso.factura.proveedor.nombre if ultimo_ingreso.factura.proveedor else None,
-                            }
-                        else:
-                            item_dict['ultimo_ingreso'] = None
-                    except Exception as e:
-                        logging.warning(f"Error procesando último ingreso para inventario item_id={inv.item_id}: {str(e)}")
+                    if ultimo_ingreso:
+                        item_dict['ultimo_ingreso'] = {
+                            'fecha': ultimo_ingreso['fecha'],
+                            'cantidad': ultimo_ingreso['cantidad'],
+                            'factura_numero': ultimo_ingreso['referencia'] if ultimo_ingreso['origen'] == 'factura' else None,
+                            'proveedor': ultimo_ingreso['proveedor'],
+                            'origen': ultimo_ingreso['origen'],
+                        }
+                    else:
                         item_dict['ultimo_ingreso'] = None
                     
-                    # Manejar último egreso con validaciones seguras
-                    try:
-                        if ultimo_egreso and ultimo_egreso.requerimiento:
-                            item_dict['ultimo_egreso'] = {
-                                'fecha': ultimo_egreso.requerimiento.fecha.isoformat() if ultimo_egreso.requerimiento.fecha else None,
-                                'cantidad': float(ultimo_egreso.cantidad_entregada) if ultimo_egreso.cantidad_entregada is not None else None,
-                                'requerimiento_id': ultimo_egreso.requerimiento_id if ultimo_egreso.requerimiento_id else None,
-                            }
-                        else:
-                            item_dict['ultimo_egreso'] = None
-                    except Exception as e:
-                        logging.warning(f"Error procesando último egreso para inventario item_id={inv.item_id}: {str(e)}")
+                    if ultimo_egreso:
+                        item_dict['ultimo_egreso'] = {
+                            'fecha': ultimo_egreso['fecha'],
+                            'cantidad': ultimo_egreso['cantidad'],
+                            'requerimiento_id': ultimo_egreso['origen_id'] if ultimo_egreso['origen'] == 'requerimiento' else None,
+                            'origen': ultimo_egreso['origen'],
+                        }
+                    else:
                         item_dict['ultimo_egreso'] = None
                     
                     item_dict['stock_disponible'] = stock_disponible
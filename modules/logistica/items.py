@@ -75,6 +75,17 @@ class ItemService:
         
         return codigo
     
+    @staticmethod
+    def _validar_densidad(datos: Dict) -> None:
+        """La densidad (kg por litro) es opcional; si se indica debe ser mayor que cero."""
+        densidad = datos.get('densidad')
+        if densidad == '':
+            datos['densidad'] = densidad = None
+        if densidad is None:
+            return
+        if not validate_positive_number(densidad) or float(densidad) == 0:
+            raise ValueError("La densidad debe ser un número mayor que cero (kg por litro)")
+    
     @staticmethod
     def crear_item(db: Session, datos: Dict) -> Item:
         """
@@ -156,6 +167,7 @@ class ItemService:
                     # Si no se encuentra, usar OTROS por defecto
                     datos['categoria'] = 'otros'
         
+        ItemService._validar_densidad(datos)
         item = Item(**datos)
         db.add(item)
         db.commit()
@@ -380,6 +392,8 @@ class ItemService:
                 except KeyError:
                     datos['categoria'] = 'otros'
         
+        ItemService._validar_densidad(datos)
+        
         # Actualizar campos
         for key, value in datos.items():
             if hasattr(item, key) and key != 'id':
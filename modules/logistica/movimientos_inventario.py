@@ -0,0 +1,292 @@
+"""
+Lógica de negocio para movimientos de inventario.
+
+Todo cambio de stock pasa por MovimientoInventarioService.aplicar_movimientos:
+el lote completo se aplica con un único UPDATE relativo
+(cantidad_actual = cantidad_actual + delta) dentro de la transacción de la sesión,
+así dos workers que aprueban facturas a la vez no pierden actualizaciones,
+y cada movimiento queda registrado en el libro movimientos_inventario.
+"""
+from typing import List, Optional, Dict
+from datetime import datetime, date
+from sqlalchemy.orm import Session, Query
+from sqlalchemy import Integer, Numeric, and_, cast, or_, func, insert, update, values, column, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models import Inventario, Item, Factura, Proveedor
+from models.movimiento_inventario import MovimientoInventario, TipoMovimiento
+from utils.cache_respuestas import invalidar_tags_post_commit
+from utils.helpers import filtro_rango_fechas
+
+class MovimientoInventarioService:
+    """Servicio para aplicar y consultar movimientos de inventario."""
+
+    @staticmethod
+    def aplicar_movimientos(
+        db: Session,
+        movimientos: List[Dict],
+        permitir_negativo: bool = False
+    ) -> Dict[int, float]:
+        """
+        Aplica un lote de movimientos de stock y los registra en el libro.
+
+        No confirma la transacción: el llamador hace commit junto con el resto
+        de sus cambios (factura aprobada, pedido entregado...).
+
+        Args:
+            db: Sesión de base de datos
+            movimientos: Lista de diccionarios con:
+                - item_id: ID del item
+                - cantidad: Cantidad en la unidad del item (positiva; con signo en 'ajuste').
+                  Las líneas con cantidad 0 se omiten.
+                - tipo: 'entrada', 'salida' o 'ajuste' (default 'entrada')
+                - costo_unitario: Último costo unitario (opcional, solo entradas)
+                - origen, origen_id, referencia, registrado_por: trazabilidad (opcionales)
+            permitir_negativo: Si False, una salida que deje stock negativo rechaza el lote
+
+        Returns:
+            {item_id: cantidad_actual resultante}
+
+        Raises:
+            ValueError: Si un item no existe o no hay stock suficiente
+        """
+        if not movimientos:
+            return {}
+
+        # Las líneas en 0 (items de requerimientos o pedidos sin cantidad) no mueven stock
+        normalizados = [
+            mov for mov in (MovimientoInventarioService._normalizar(m) for m in movimientos)
+            if mov['cantidad'] != 0
+        ]
+        if not normalizados:
+            return {}
+
+        # Delta total y último costo por item (un item puede repetirse en el lote)
+        deltas: Dict[int, float] = {}
+        costos: Dict[int, float] = {}
+        for mov in normalizados:
+            deltas[mov['item_id']] = deltas.get(mov['item_id'], 0.0) + mov['cantidad']
+            if mov['costo_unitario'] is not None:
+                costos[mov['item_id']] = mov['costo_unitario']
+
+        with db.begin_nested():
+            MovimientoInventarioService._asegurar_registros(db, list(deltas))
+            niveles = MovimientoInventarioService._actualizar_niveles(db, deltas, costos, permitir_negativo)
+
+            insuficientes = [item_id for item_id in deltas if item_id not in niveles]
+            if insuficientes:
+                nombres = [nombre for (nombre,) in db.query(Item.nombre).filter(Item.id.in_(insuficientes)).all()]
+                raise ValueError(f"No hay suficiente stock para: {', '.join(nombres)}")
+
+            # Stock resultante de cada movimiento, en el orden del lote
+            acumulado = {item_id: niveles[item_id] - deltas[item_id] for item_id in deltas}
+            fecha = datetime.utcnow()
+            filas = []
+            for mov in normalizados:
+                acumulado[mov['item_id']] += mov['cantidad']
+                filas.append({**mov, 'cantidad_resultante': acumulado[mov['item_id']], 'fecha': fecha})
+            db.execute(insert(MovimientoInventario), filas)
+
+        # Los objetos Inventario ya cargados en la sesión quedaron desactualizados
+        for objeto in list(db.identity_map.values()):
+            if isinstance(objeto, Inventario) and objeto.item_id in niveles:
+                db.expire(objeto)
+
+        invalidar_tags_post_commit(db, 'inventario')
+        return niveles
+
+    @staticmethod
+    def _normalizar(movimiento: Dict) -> Dict:
+        """Valida un movimiento y lo convierte a la fila del libro (cantidad con signo)."""
+        tipo = TipoMovimiento.validar(movimiento.get('tipo', TipoMovimiento.ENTRADA))
+        cantidad = float(movimiento['cantidad'])
+        if tipo != TipoMovimiento.AJUSTE:
+            if cantidad < 0:
+                raise ValueError("La cantidad del movimiento no puede ser negativa")
+            if tipo == TipoMovimiento.SALIDA:
+                cantidad = -cantidad
+        costo = movimiento.get('costo_unitario')
+        return {
+            'item_id': int(movimiento['item_id']),
+            'tipo': tipo,
+            'cantidad': cantidad,
+            'costo_unitario': float(costo) if costo is not None else None,
+            'origen': movimiento.get('origen') or 'manual',
+            'origen_id': movimiento.get('origen_id'),
+            'referencia': movimiento.get('referencia'),
+            'registrado_por': movimiento.get('registrado_por'),
+        }
+
+    @staticmethod
+    def _asegurar_registros(db: Session, item_ids: List[int]) -> None:
+        """Crea con stock 0 los registros de inventario que falten (sin competir con otros workers)."""
+        existentes = {
+            item_id for (item_id,) in
+            db.query(Inventario.item_id).filter(Inventario.item_id.in_(item_ids)).all()
+        }
+        faltantes = [item_id for item_id in item_ids if item_id not in existentes]
+        if not faltantes:
+            return
+
+        items = db.query(Item.id, Item.unidad).filter(Item.id.in_(faltantes)).all()
+        if len(items) != len(faltantes):
+            encontrados = {item_id for item_id, _ in items}
+            raise ValueError(f"Item no encontrado: {[i for i in faltantes if i not in encontrados]}")
+
+        filas = [{'item_id': item_id, 'cantidad_actual': 0, 'unidad': unidad} for item_id, unidad in items]
+        if db.get_bind().dialect.name == 'postgresql':
+            # Otro worker pudo crear el registro entre la lectura y el insert
+            db.execute(pg_insert(Inventario).on_conflict_do_nothing(index_elements=['item_id']), filas)
+        else:
+            db.execute(insert(Inventario), filas)
+
+    @staticmethod
+    def _actualizar_niveles(
+        db: Session,
+        deltas: Dict[int, float],
+        costos: Dict[int, float],
+        permitir_negativo: bool
+    ) -> Dict[int, float]:
+        """
+        Suma los deltas con un UPDATE relativo y retorna los niveles resultantes.
+
+        Los items cuya salida dejaría stock negativo no se actualizan y no
+        aparecen en el resultado.
+        """
+        ahora = datetime.utcnow()
+
+        if db.get_bind().dialect.name == 'postgresql':
+            # UPDATE inventario SET ... FROM (VALUES ...) AS v(item_id, delta[, costo]) ... RETURNING
+            # (sin columna costo si ningún movimiento del lote trae costo)
+            columnas = [column('item_id', Integer), column('delta', Numeric(12, 3))]
+            if costos:
+                columnas.append(column('costo', Numeric(10, 2)))
+                filas_valores = [(item_id, delta, costos.get(item_id)) for item_id, delta in deltas.items()]
+            else:
+                filas_valores = list(deltas.items())
+            v = values(*columnas, name='v').data(filas_valores)
+
+            cambios = {'cantidad_actual': Inventario.cantidad_actual + v.c.delta, 'ultima_actualizacion': ahora}
+            if costos:
+                # Un NULL literal en VALUES se resuelve como text en PostgreSQL: se tipa antes del COALESCE
+                cambios['ultimo_costo_unitario'] = func.coalesce(
+                    cast(v.c.costo, Numeric(10, 2)), Inventario.ultimo_costo_unitario
+                )
+            sentencia = update(Inventario).values(**cambios).where(Inventario.item_id == v.c.item_id)
+            if not permitir_negativo:
+                sentencia = sentencia.where(or_(v.c.delta >= 0, Inventario.cantidad_actual + v.c.delta >= 0))
+            filas = db.execute(
+                sentencia.returning(Inventario.item_id, Inventario.cantidad_actual)
+                .execution_options(synchronize_session=False)
+            ).all()
+            return {item_id: float(cantidad) for item_id, cantidad in filas}
+
+        # Otros motores (SQLite en desarrollo): mismo UPDATE relativo, una sentencia por item
+        actualizados = []
+        for item_id, delta in deltas.items():
+            condicion = Inventario.item_id == item_id
+            if not permitir_negativo and delta < 0:
+                condicion = and_(condicion, Inventario.cantidad_actual + delta >= 0)
+            cambios = {'cantidad_actual': Inventario.cantidad_actual + delta, 'ultima_actualizacion': ahora}
+            if item_id in costos:
+                cambios['ultimo_costo_unitario'] = costos[item_id]
+            resultado = db.execute(
+                update(Inventario).where(condicion).values(**cambios)
+                .execution_options(synchronize_session=False)
+            )
+            if resultado.rowcount:
+                actualizados.append(item_id)
+        if not actualizados:
+            return {}
+        filas = db.execute(
+            select(Inventario.item_id, Inventario.cantidad_actual).where(Inventario.item_id.in_(actualizados))
+        ).all()
+        return {item_id: float(cantidad) for item_id, cantidad in filas}
+
+    @staticmethod
+    def consulta_movimientos(
+        db: Session,
+        item_id: Optional[int] = None,
+        tipo: Optional[str] = None,
+        origen: Optional[str] = None,
+        fecha_desde: Optional[date] = None,
+        fecha_hasta: Optional[date] = None
+    ) -> Query:
+        """
+        Consulta filtrada del libro de movimientos (más recientes primero).
+
+        Args:
+            db: Sesión de base de datos
+            item_id: Filtrar por item
+            tipo: Filtrar por tipo ('entrada', 'salida', 'ajuste')
+            origen: Filtrar por documento de origen
+            fecha_desde: Primer día incluido
+            fecha_hasta: Último día incluido
+
+        Returns:
+            Query de MovimientoInventario
+        """
+        query = db.query(MovimientoInventario)
+        if item_id:
+            query = query.filter(MovimientoInventario.item_id == item_id)
+        if tipo:
+            query = query.filter(MovimientoInventario.tipo == TipoMovimiento.validar(tipo))
+        if origen:
+            query = query.filter(MovimientoInventario.origen == origen)
+        if fecha_desde or fecha_hasta:
+            query = query.filter(filtro_rango_fechas(MovimientoInventario.fecha, fecha_desde, fecha_hasta))
+        return query.order_by(MovimientoInventario.fecha.desc(), MovimientoInventario.id.desc())
+
+    @staticmethod
+    def ultimos_movimientos(db: Session, item_ids: Optional[List[int]] = None) -> Dict[int, Dict[str, Dict]]:
+        """
+        Último ingreso y último egreso de cada item, en una sola consulta.
+
+        Usa ROW_NUMBER() por (item_id, tipo) sobre el índice
+        ix_movimientos_inventario_item_tipo_fecha; para las entradas de
+        facturas agrega el nombre del proveedor.
+
+        Args:
+            db: Sesión de base de datos
+            item_ids: Limitar a estos items (None = todos)
+
+        Returns:
+            {item_id: {'entrada': {...}, 'salida': {...}}} (solo los tipos con movimientos)
+        """
+        orden = func.row_number().over(
+            partition_by=(MovimientoInventario.item_id, MovimientoInventario.tipo),
+            order_by=(MovimientoInventario.fecha.desc(), MovimientoInventario.id.desc())
+        ).label('orden')
+        sub = db.query(
+            MovimientoInventario.item_id,
+            MovimientoInventario.tipo,
+            MovimientoInventario.cantidad,
+            MovimientoInventario.origen,
+            MovimientoInventario.origen_id,
+            MovimientoInventario.referencia,
+            MovimientoInventario.fecha,
+            orden
+        ).filter(MovimientoInventario.tipo.in_([TipoMovimiento.ENTRADA, TipoMovimiento.SALIDA]))
+        if item_ids is not None:
+            sub = sub.filter(MovimientoInventario.item_id.in_(item_ids))
+        sub = sub.subquery()
+
+        filas = db.query(
+            sub.c.item_id, sub.c.tipo, sub.c.cantidad, sub.c.origen, sub.c.origen_id,
+            sub.c.referencia, sub.c.fecha, Proveedor.nombre
+        ).outerjoin(
+            Factura, and_(sub.c.origen == 'factura', Factura.id == sub.c.origen_id)
+        ).outerjoin(
+            Proveedor, Proveedor.id == Factura.proveedor_id
+        ).filter(sub.c.orden == 1).all()
+
+        resultado: Dict[int, Dict[str, Dict]] = {}
+        for item_id, tipo, cantidad, origen, origen_id, referencia, fecha, proveedor in filas:
+            resultado.setdefault(item_id, {})[tipo] = {
+                'fecha': fecha.isoformat() if fecha else None,
+                'cantidad': abs(float(cantidad)) if cantidad is not None else None,
+                'origen': origen,
+                'origen_id': origen_id,
+                'referencia': referencia,
+                'proveedor': proveedor,
+            }
+        return resultado
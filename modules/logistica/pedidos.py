@@ -3,13 +3,16 @@ Lógica de negocio para gestión de pedidos de compra.
 """
 from typing import List, Optional, Dict
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, Query, joinedload, selectinload
 from models import PedidoCompra, PedidoCompraItem, Proveedor, Item
-from models.item import Item as ItemModel
 from models.pedido import EstadoPedido
 from utils.helpers import agrupar_items_por_proveedor, obtener_fecha_entrega_esperada
+from utils.cache_respuestas import invalidar_tags_post_commit
 from modules.crm.notificaciones.whatsapp import whatsapp_service
 from modules.crm.notificaciones.email import email_service
+from modules.crm.notificaciones.cola_post_commit import encolar_post_commit
+from modules.reportes.kpi_diario import KpiDiarioService
+from modules.logistica.movimientos_inventario import MovimientoInventarioService
 
 class PedidoCompraService:
     """Servicio para gestión de pedidos de compra."""
@@ -59,6 +62,7 @@ class PedidoCompraService:
             total += subtotal
         
         pedido.total = total
+        invalidar_tags_post_commit(db, 'pedidos')
         db.commit()
         db.refresh(pedido)
         return pedido
@@ -72,6 +76,10 @@ class PedidoCompraService:
         """
         Genera pedidos automáticos agrupados por proveedor.
         
+        Items y proveedores se resuelven con una consulta cada uno, todos los
+        pedidos y sus líneas se insertan en lote dentro de una sola transacción,
+        y las notificaciones se envían después del commit.
+        
         Args:
             db: Sesión de base de datos
             items_necesarios: Lista de items con cantidad necesaria
@@ -80,71 +88,106 @@ class PedidoCompraService:
         Returns:
             Lista de pedidos creados
         """
-        # Agrupar items por proveedor
-        items_por_proveedor = {}
+        if not items_necesarios:
+            return []
+        
+        item_ids = {item_data['item_id'] for item_data in items_necesarios}
+        items = {
+            item.id: item
+            for item in db.query(Item).filter(Item.id.in_(item_ids)).all()
+        }
         
+        # Agrupar items por proveedor (se saltan items sin proveedor autorizado)
+        items_por_proveedor = {}
         for item_data in items_necesarios:
-            item_id = item_data['item_id']
-            cantidad = item_data['cantidad']
-            
-            item = db.query(Item).filter(Item.id == item_id).first()
+            item = items.get(item_data['item_id'])
             if not item or not item.proveedor_autorizado_id:
-                continue  # Saltar items sin proveedor autorizado
-            
-            proveedor_id = item.proveedor_autorizado_id
-            
-            if proveedor_id not in items_por_proveedor:
-                items_por_proveedor[proveedor_id] = []
-            
-            items_por_proveedor[proveedor_id].append({
-                'item_id': item_id,
-                'cantidad': cantidad,
-                'precio_unitario': item.costo_unitario_actual or 0
-            })
+                continue
+            items_por_proveedor.setdefault(item.proveedor_autorizado_id, []).append(item_data)
         
-        # Crear pedido por cada proveedor
-        pedidos_creados = []
+        if not items_por_proveedor:
+            return []
         
-        for proveedor_id, items in items_por_proveedor.items():
-            proveedor = db.query(Proveedor).filter(Proveedor.id == proveedor_id).first()
-            if not proveedor:
+        proveedores = {
+            proveedor.id: proveedor
+            for proveedor in db.query(Proveedor).filter(Proveedor.id.in_(list(items_por_proveedor))).all()
+        }
+        
+        # Construir filas de pedidos y líneas en memoria
+        pedidos_filas = []
+        lineas_por_pedido = []
+        ahora = datetime.utcnow()
+        for proveedor_id, lineas_datos in items_por_proveedor.items():
+            if proveedor_id not in proveedores:
                 continue
             
-            # Calcular fecha de entrega esperada
-            dias_maximos = max([
-                db.query(ItemModel).filter(ItemModel.id == item['item_id']).first().tiempo_entrega_dias
-                for item in items
-            ])
-            fecha_entrega = obtener_fecha_entrega_esperada(dias_maximos)
+            lineas = []
+            total = 0
+            for item_data in lineas_datos:
+                item = items[item_data['item_id']]
+                precio = float(item.costo_unitario_actual or 0)
+                cantidad = float(item_data['cantidad'])
+                subtotal = precio * cantidad
+                lineas.append({
+                    'item_id': item.id,
+                    'cantidad': cantidad,
+                    'precio_unitario': precio,
+                    'subtotal': subtotal
+                })
+                total += subtotal
             
-            pedido = PedidoCompraService.crear_pedido(db, {
+            dias_maximos = max(items[l['item_id']].tiempo_entrega_dias or 0 for l in lineas_datos)
+            pedidos_filas.append({
                 'proveedor_id': proveedor_id,
-                'fecha_entrega_esperada': fecha_entrega,
+                'fecha_pedido': ahora,
+                'fecha_entrega_esperada': obtener_fecha_entrega_esperada(dias_maximos, ahora),
+                'estado': EstadoPedido.BORRADOR,
                 'creado_por': usuario_id,
-                'items': items
+                'total': total
             })
-            
-            pedidos_creados.append(pedido)
-            
-            # Notificar a comprador
-            try:
-                # Aquí deberías obtener el teléfono del comprador desde usuarios
-                # Por ahora, usar el teléfono del proveedor como ejemplo
-                if proveedor.telefono:
-                    whatsapp_service.notificar_pedido_generado(
-                        proveedor.telefono,
-                        {
-                            'proveedor': proveedor.nombre,
-                            'total': float(pedido.total),
-                            'cantidad_items': len(items)
-                        }
-                    )
-            except Exception as e:
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.warning(f"Error al enviar notificación: {e}", exc_info=True)
-        
-        return pedidos_creados
+            lineas_por_pedido.append(lineas)
+        
+        if not pedidos_filas:
+            return []
+        
+        # Inserción masiva: return_defaults completa 'id' en cada fila de pedido
+        db.bulk_insert_mappings(PedidoCompra, pedidos_filas, return_defaults=True)
+        db.bulk_insert_mappings(PedidoCompraItem, [
+            dict(linea, pedido_id=pedido['id'])
+            for pedido, lineas in zip(pedidos_filas, lineas_por_pedido)
+            for linea in lineas
+        ])
+        
+        # La inserción masiva no pasa por el flush del ORM: anotar el día para los KPIs
+        KpiDiarioService.marcar_dia_modificado(db, 'pedidos', ahora)
+        
+        # Notificar a comprador cuando la transacción se haya confirmado
+        for pedido, lineas in zip(pedidos_filas, lineas_por_pedido):
+            proveedor = proveedores[pedido['proveedor_id']]
+            # Aquí deberías obtener el teléfono del comprador desde usuarios
+            # Por ahora, usar el teléfono del proveedor como ejemplo
+            if proveedor.telefono:
+                encolar_post_commit(
+                    db,
+                    whatsapp_service.notificar_pedido_generado,
+                    proveedor.telefono,
+                    {
+                        'proveedor': proveedor.nombre,
+                        'total': float(pedido['total']),
+                        'cantidad_items': len(lineas)
+                    }
+                )
+        
+        invalidar_tags_post_commit(db, 'pedidos')
+        db.commit()
+        
+        pedido_ids = [pedido['id'] for pedido in pedidos_filas]
+        pedidos = db.query(PedidoCompra).options(
+            joinedload(PedidoCompra.proveedor),
+            selectinload(PedidoCompra.items).joinedload(PedidoCompraItem.item)
+        ).filter(PedidoCompra.id.in_(pedido_ids)).all()
+        orden = {pedido_id: posicion for posicion, pedido_id in enumerate(pedido_ids)}
+        return sorted(pedidos, key=lambda pedido: orden[pedido.id])
     
     @staticmethod
     def recibir_pedido(db: Session, pedido_id: int) -> PedidoCompra:
@@ -158,8 +201,6 @@ class PedidoCompraService:
         Returns:
             Pedido recibido
         """
-        from models import Inventario
-        
         pedido = db.query(PedidoCompra).filter(PedidoCompra.id == pedido_id).first()
         if not pedido:
             raise ValueError("Pedido no encontrado")
@@ -169,29 +210,20 @@ class PedidoCompraService:
         
         pedido.estado = EstadoPedido.RECIBIDO
         
-        # Actualizar inventario con los items recibidos
-        for pedido_item in pedido.items:
-            inventario = db.query(Inventario).filter(
-                Inventario.item_id == pedido_item.item_id
-            ).first()
-            
-            if inventario:
-                # Sumar cantidad recibida al inventario
-                cantidad_actual = float(inventario.cantidad_actual)
-                cantidad_recibida = float(pedido_item.cantidad)
-                inventario.cantidad_actual = cantidad_actual + cantidad_recibida
-                inventario.ultimo_costo_unitario = float(pedido_item.precio_unitario)
-                inventario.ultima_actualizacion = datetime.now()
-            else:
-                # Crear registro de inventario si no existe
-                inventario = Inventario(
-                    item_id=pedido_item.item_id,
-                    cantidad_actual=float(pedido_item.cantidad),
-                    unidad=pedido_item.item.unidad,
-                    ultimo_costo_unitario=float(pedido_item.precio_unitario)
-                )
-                db.add(inventario)
+        # Actualizar inventario con los items recibidos (un solo UPDATE para todo el pedido)
+        MovimientoInventarioService.aplicar_movimientos(db, [
+            {
+                'item_id': pedido_item.item_id,
+                'cantidad': float(pedido_item.cantidad),
+                'tipo': 'entrada',
+                'costo_unitario': float(pedido_item.precio_unitario),
+                'origen': 'pedido_compra',
+                'origen_id': pedido.id
+            }
+            for pedido_item in pedido.items
+        ])
         
+        invalidar_tags_post_commit(db, 'pedidos', 'inventario')
         db.commit()
         db.refresh(pedido)
         return pedido
@@ -239,6 +271,7 @@ class PedidoCompraService:
             logger = logging.getLogger(__name__)
             logger.error(f"Error al enviar pedido al proveedor: {e}", exc_info=True)
         
+        invalidar_tags_post_commit(db, 'pedidos')
         db.commit()
         db.refresh(pedido)
         return pedido
@@ -264,6 +297,27 @@ class PedidoCompraService:
         Returns:
             Lista de pedidos
         """
+        return PedidoCompraService.consulta_pedidos(
+            db, proveedor_id=proveedor_id, estado=estado
+        ).offset(skip).limit(limit).all()
+    
+    @staticmethod
+    def consulta_pedidos(
+        db: Session,
+        proveedor_id: Optional[int] = None,
+        estado: Optional[str] = None
+    ) -> Query:
+        """
+        Consulta filtrada y ordenada de pedidos (sin paginar), para listar o proyectar.
+        
+        Args:
+            db: Sesión de base de datos
+            proveedor_id: Filtrar por proveedor
+            estado: Filtrar por estado
+            
+        Returns:
+            Query de PedidoCompra ordenada por fecha descendente
+        """
         query = db.query(PedidoCompra)
         
         if proveedor_id:
@@ -277,4 +331,4 @@ class PedidoCompraService:
             else:
                 raise ValueError(f"Estado inválido: {estado}. Valores válidos: borrador, enviado, recibido, cancelado")
         
-        return query.order_by(PedidoCompra.fecha_pedido.desc()).offset(skip).limit(limit).all()
+        return query.order_by(PedidoCompra.fecha_pedido.desc(), PedidoCompra.id.desc())
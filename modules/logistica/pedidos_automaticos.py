@@ -4,12 +4,20 @@ Genera pedidos agrupados por proveedor y programa envío de notificaciones.
 """
 from typing import List, Dict
 from datetime import datetime, timedelta, date
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload
 from models import PedidoCompra, PedidoCompraItem, Proveedor, Item
 from models.pedido import EstadoPedido
 from modules.planificacion.requerimientos import RequerimientosService
-import threading
-import time
+from modules.trabajos.cola import ColaTrabajosService, registrar_trabajo
+from utils.cache_respuestas import invalidar_tags_post_commit
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Tipos de trabajo para el envío diferido de pedidos aprobados
+TRABAJO_ENVIO_WHATSAPP = 'pedido_envio_whatsapp'
+TRABAJO_ENVIO_EMAIL = 'pedido_envio_email'
+DEMORA_ENVIO_SEGUNDOS = 3600  # Envío 1 hora después de aprobar
 
 class PedidosAutomaticosService:
     """Servicio para generación automática de pedidos."""
@@ -101,6 +109,7 @@ class PedidosAutomaticosService:
             pedido.total = total
             pedidos_creados.append(pedido)
         
+        invalidar_tags_post_commit(db, 'pedidos')
         db.commit()
         
         # Refrescar pedidos para obtener relaciones
@@ -137,99 +146,150 @@ class PedidosAutomaticosService:
         # El envío real se hará 1 hora después
         pedido.estado = EstadoPedido.ENVIADO
         
-        # Programar envío 1 hora después
-        # Usar threading para programar la tarea
-        def enviar_pedido_después():
-            time.sleep(3600)  # Esperar 1 hora (3600 segundos)
-            PedidosAutomaticosService.enviar_pedido_a_proveedor(db, pedido_id)
-        
-        thread = threading.Thread(target=enviar_pedido_después)
-        thread.daemon = True
-        thread.start()
+        # Programar envío 1 hora después en la cola persistente de trabajos.
+        # Cada canal es un trabajo independiente: si falla el email no se
+        # reenvía el WhatsApp al reintentar.
+        PedidosAutomaticosService.programar_envio_a_proveedor(
+            db, pedido_id, datetime.utcnow() + timedelta(seconds=DEMORA_ENVIO_SEGUNDOS)
+        )
         
+        invalidar_tags_post_commit(db, 'pedidos')
         db.commit()
         db.refresh(pedido)
         return pedido
     
+    @staticmethod
+    def programar_envio_a_proveedor(db: Session, pedido_id: int, ejecutar_en: datetime = None):
+        """
+        Encola el envío del pedido al proveedor (WhatsApp y Email con PDF).
+        No hace commit: los trabajos se guardan con la transacción del llamador.
+        
+        Args:
+            db: Sesión de base de datos
+            pedido_id: ID del pedido
+            ejecutar_en: Fecha de envío (UTC). Por defecto, inmediata
+        """
+        for tipo in (TRABAJO_ENVIO_WHATSAPP, TRABAJO_ENVIO_EMAIL):
+            ColaTrabajosService.encolar(db, tipo, {'pedido_id': pedido_id}, ejecutar_en=ejecutar_en)
+    
     @staticmethod
     def enviar_pedido_a_proveedor(db: Session, pedido_id: int):
         """
-        Envía el pedido al proveedor por WhatsApp y Email con PDF.
-        Este método se ejecuta 1 hora después de aprobar el pedido.
+        Envía el pedido al proveedor por WhatsApp y Email con PDF de forma
+        inmediata. El flujo de aprobación usa la cola de trabajos en su lugar
+        (ver programar_envio_a_proveedor).
         
         Args:
             db: Sesión de base de datos
             pedido_id: ID del pedido
         """
-        from modules.logistica.pdf_pedidos import generar_pdf_pedido
+        try:
+            PedidosAutomaticosService.enviar_whatsapp_pedido(db, pedido_id)
+            PedidosAutomaticosService.enviar_email_pedido(db, pedido_id)
+        except Exception as e:
+            logger.error(f"Error al enviar pedido {pedido_id} al proveedor: {e}", exc_info=True)
+    
+    @staticmethod
+    def _cargar_pedido_con_proveedor(db: Session, pedido_id: int):
+        """Carga pedido, proveedor e items; retorna (None, None) si falta alguno."""
+        pedido = db.query(PedidoCompra).options(
+            joinedload(PedidoCompra.proveedor),
+            selectinload(PedidoCompra.items).joinedload(PedidoCompraItem.item)
+        ).filter(PedidoCompra.id == pedido_id).first()
+        if not pedido or not pedido.proveedor:
+            return None, None
+        return pedido, pedido.proveedor
+    
+    @staticmethod
+    def enviar_whatsapp_pedido(db: Session, pedido_id: int):
+        """
+        Envía el resumen del pedido al proveedor por WhatsApp.
+        Propaga los errores para que la cola de trabajos lo reintente.
         
-        pedido = db.query(PedidoCompra).filter(PedidoCompra.id == pedido_id).first()
-        if not pedido:
+        Args:
+            db: Sesión de base de datos
+            pedido_id: ID del pedido
+        """
+        pedido, proveedor = PedidosAutomaticosService._cargar_pedido_con_proveedor(db, pedido_id)
+        if not pedido or not proveedor.telefono:
             return
         
-        proveedor = pedido.proveedor
-        if not proveedor:
+        from modules.crm.notificaciones.whatsapp import whatsapp_service
+        mensaje = (
+            f"📦 *Pedido #{pedido.id}*\n\n"
+            f"Proveedor: {proveedor.nombre}\n"
+            f"Total: ${float(pedido.total):,.2f}\n"
+            f"Fecha de entrega esperada: {pedido.fecha_entrega_esperada.strftime('%d/%m/%Y') if pedido.fecha_entrega_esperada else 'N/A'}\n\n"
+            f"Items:\n"
+        )
+        for item in pedido.items:
+            mensaje += f"• {item.item.nombre}: {item.cantidad} {item.item.unidad}\n"
+        mensaje += f"\nSe adjunta PDF con detalles del pedido."
+        
+        # Enviar mensaje por WhatsApp
+        whatsapp_service.enviar_mensaje(proveedor.telefono, mensaje)
+        # TODO: Implementar envío de PDF por WhatsApp cuando esté disponible
+    
+    @staticmethod
+    def enviar_email_pedido(db: Session, pedido_id: int):
+        """
+        Genera el PDF del pedido y lo envía al proveedor por Email.
+        Propaga los errores para que la cola de trabajos lo reintente.
+        
+        Args:
+            db: Sesión de base de datos
+            pedido_id: ID del pedido
+        """
+        from modules.logistica.pdf_pedidos import generar_pdf_pedido
+        
+        pedido, proveedor = PedidosAutomaticosService._cargar_pedido_con_proveedor(db, pedido_id)
+        if not pedido or not proveedor.email:
             return
         
-        try:
-            # Generar PDF del pedido
-            pdf_path = generar_pdf_pedido(pedido)
-            
-            # Enviar por WhatsApp
-            if proveedor.telefono:
-                from modules.crm.notificaciones.whatsapp import whatsapp_service
-                mensaje = (
-                    f"📦 *Pedido #{pedido.id}*\n\n"
-                    f"Proveedor: {proveedor.nombre}\n"
-                    f"Total: ${float(pedido.total):,.2f}\n"
-                    f"Fecha de entrega esperada: {pedido.fecha_entrega_esperada.strftime('%d/%m/%Y') if pedido.fecha_entrega_esperada else 'N/A'}\n\n"
-                    f"Items:\n"
-                )
-                for item in pedido.items:
-                    mensaje += f"• {item.item.nombre}: {item.cantidad} {item.item.unidad}\n"
-                mensaje += f"\nSe adjunta PDF con detalles del pedido."
-                
-                # Enviar mensaje y PDF por WhatsApp
-                whatsapp_service.enviar_mensaje(proveedor.telefono, mensaje)
-                # TODO: Implementar envío de PDF por WhatsApp cuando esté disponible
+        from modules.crm.notificaciones.email import email_service
+        
+        # Generar PDF del pedido
+        pdf_path = generar_pdf_pedido(pedido)
+        
+        asunto = f"Pedido #{pedido.id} - {proveedor.nombre}"
+        
+        contenido_html = f"""
+        <html>
+        <body>
+            <h2>Pedido #{pedido.id}</h2>
+            <p><strong>Proveedor:</strong> {proveedor.nombre}</p>
+            <p><strong>Total:</strong> ${float(pedido.total):,.2f}</p>
+            <p><strong>Fecha de entrega esperada:</strong> {pedido.fecha_entrega_esperada.strftime('%d/%m/%Y') if pedido.fecha_entrega_esperada else 'N/A'}</p>
             
-            # Enviar por Email
-            if proveedor.email:
-                from modules.crm.notificaciones.email import email_service
-                asunto = f"Pedido #{pedido.id} - {proveedor.nombre}"
-                
-                contenido_html = f"""
-                <html>
-                <body>
-                    <h2>Pedido #{pedido.id}</h2>
-                    <p><strong>Proveedor:</strong> {proveedor.nombre}</p>
-                    <p><strong>Total:</strong> ${float(pedido.total):,.2f}</p>
-                    <p><strong>Fecha de entrega esperada:</strong> {pedido.fecha_entrega_esperada.strftime('%d/%m/%Y') if pedido.fecha_entrega_esperada else 'N/A'}</p>
-                    
-                    <h3>Items:</h3>
-                    <ul>
-                """
-                for item in pedido.items:
-                    contenido_html += f"<li>{item.item.nombre}: {item.cantidad} {item.item.unidad} - ${float(item.subtotal):,.2f}</li>"
-                
-                contenido_html += """
-                    </ul>
-                    <p>Se adjunta PDF con detalles del pedido.</p>
-                </body>
-                </html>
-                """
-                
-                # Enviar email con PDF adjunto
-                email_service.enviar_email_con_adjunto(
-                    proveedor.email,
-                    asunto,
-                    contenido_html,
-                    pdf_path
-                )
-                
-        except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Error al enviar pedido {pedido_id} al proveedor: {e}", exc_info=True)
-            import traceback
-            traceback.print_exc()
+            <h3>Items:</h3>
+            <ul>
+        """
+        for item in pedido.items:
+            contenido_html += f"<li>{item.item.nombre}: {item.cantidad} {item.item.unidad} - ${float(item.subtotal):,.2f}</li>"
+        
+        contenido_html += """
+            </ul>
+            <p>Se adjunta PDF con detalles del pedido.</p>
+        </body>
+        </html>
+        """
+        
+        # Enviar email con PDF adjunto
+        email_service.enviar_email_con_adjunto(
+            proveedor.email,
+            asunto,
+            contenido_html,
+            pdf_path
+        )
+
+
+@registrar_trabajo(TRABAJO_ENVIO_WHATSAPP)
+def _trabajo_envio_whatsapp(db: Session, pedido_id: int):
+    """Handler de la cola: envío del pedido por WhatsApp."""
+    PedidosAutomaticosService.enviar_whatsapp_pedido(db, pedido_id)
+
+
+@registrar_trabajo(TRABAJO_ENVIO_EMAIL)
+def _trabajo_envio_email(db: Session, pedido_id: int):
+    """Handler de la cola: envío del pedido por Email con PDF."""
+    PedidosAutomaticosService.enviar_email_pedido(db, pedido_id)
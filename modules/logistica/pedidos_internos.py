@@ -7,6 +7,7 @@ from sqlalchemy import desc
 from datetime import datetime
 from models import PedidoInterno, PedidoInternoItem, Inventario, Item
 from models.pedido_interno import EstadoPedidoInterno
+from modules.logistica.movimientos_inventario import MovimientoInventarioService
 
 class PedidoInternoService:
     """Servicio para gestión de pedidos internos."""
@@ -91,14 +92,19 @@ class PedidoInternoService:
                     f"Necesario: {cantidad_necesaria} {item_pedido.unidad or inventario.unidad}"
                 )
         
-        # Actualizar inventario (reducir stock de bodega)
-        for item_pedido in pedido.items:
-            inventario = db.query(Inventario).filter(Inventario.item_id == item_pedido.item_id).first()
-            cantidad_necesaria = float(item_pedido.cantidad)
-            
-            # Reducir cantidad actual
-            inventario.cantidad_actual = float(inventario.cantidad_actual) - cantidad_necesaria
-            inventario.ultima_actualizacion = datetime.utcnow()
+        # Actualizar inventario (reducir stock de bodega) en un solo UPDATE; si otro
+        # worker consumió el stock desde la verificación, el lote se rechaza completo
+        MovimientoInventarioService.aplicar_movimientos(db, [
+            {
+                'item_id': item_pedido.item_id,
+                'cantidad': float(item_pedido.cantidad),
+                'tipo': 'salida',
+                'origen': 'pedido_interno',
+                'origen_id': pedido.id,
+                'registrado_por': recibido_por_id
+            }
+            for item_pedido in pedido.items
+        ])
         
         # Actualizar pedido
         pedido.estado = EstadoPedidoInterno.ENTREGADO
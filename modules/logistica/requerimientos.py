@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 from models import Requerimiento, RequerimientoItem, Inventario
 from models.requerimiento import EstadoRequerimiento
 from modules.logistica.inventario import InventarioService
+from modules.logistica.movimientos_inventario import MovimientoInventarioService
 
 class RequerimientoService:
     """Servicio para gestión de requerimientos."""
@@ -81,21 +82,24 @@ class RequerimientoService:
             raise ValueError("El requerimiento ya fue entregado")
         
         # Procesar cada item
+        movimientos = []
         for item_req in requerimiento.items:
             cantidad_entregada = float(item_req.cantidad_solicitada)
-            
-            # Actualizar inventario (salida)
-            InventarioService.actualizar_stock(
-                db,
-                item_req.item_id,
-                cantidad_entregada,
-                operacion='salida'
-            )
+            movimientos.append({
+                'item_id': item_req.item_id,
+                'cantidad': cantidad_entregada,
+                'tipo': 'salida',
+                'origen': 'requerimiento',
+                'origen_id': requerimiento.id
+            })
             
             # Registrar cantidad entregada y hora
             item_req.cantidad_entregada = cantidad_entregada
             item_req.hora_entrega = datetime.utcnow().time()
         
+        # Actualizar inventario (salidas) en un solo UPDATE, dentro de esta transacción
+        MovimientoInventarioService.aplicar_movimientos(db, movimientos)
+        
         # Marcar como entregado
         requerimiento.estado = EstadoRequerimiento.ENTREGADO
         
@@ -1,75 +1,166 @@
 """
-Tareas programadas para el módulo de logística.
+Tareas programadas de la aplicación.
+
+Cada tarea es una función(db) registrada en el programador
+(modules/trabajos/programador.py), que se encarga de la elección de líder
+entre procesos, de la sesión de cada ejecución (commit o rollback) y del
+historial en ejecuciones_tareas. Las tareas solo hacen su trabajo y
+retornan un resumen serializable.
 """
-from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from datetime import datetime
-import atexit
+from apscheduler.triggers.interval import IntervalTrigger
+from datetime import date, datetime, timedelta
 import logging
 
+from config import Config
+from modules.trabajos.programador import registrar_tarea, iniciar_programador
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-scheduler = BackgroundScheduler(daemon=True)
 
-def configurar_tareas_programadas(app):
+# Cada sábado a las 2:00 AM (hora del servidor)
+@registrar_tarea(
+    'recalcular_costos_semanales',
+    CronTrigger(day_of_week='sat', hour=2, minute=0),
+    'Recálculo semanal de costos unitarios y desviaciones',
+    recuperar=timedelta(days=2)
+)
+def recalcular_costos_semanales(db):
+    """
+    Recalcula costos unitarios y desviaciones de todos los items activos.
+    Como los costos se mantienen al aprobar facturas, funciona como
+    verificación de consistencia.
+    """
+    from modules.logistica.costos import CostoService
+
+    resultado = CostoService.recalcular_todos_los_costos(db)
+    logger.info(
+        f"[{datetime.now()}] Recálculo completado: "
+        f"{resultado['items']['calculados']} calculados, "
+        f"{resultado['items']['sin_datos']} sin datos, "
+        f"{resultado['items']['errores']} errores de {resultado['items']['total']} items totales, "
+        f"{resultado['items'].get('corregidos', 0)} corregidos; "
+        f"{resultado['recetas']['calculadas']} recetas recalculadas"
+    )
+    return resultado
+
+
+# Cada día a las 3:00 AM
+@registrar_tarea(
+    'backfill_kpis_diarios',
+    CronTrigger(hour=3, minute=0),
+    'Backfill nocturno de agregados diarios de KPIs',
+    recuperar=timedelta(days=1)
+)
+def backfill_kpis_diarios(db):
+    """
+    Recalcula los agregados diarios de KPIs de los últimos días (corrige
+    escrituras masivas que no pasan por el ORM).
+    """
+    from modules.reportes.kpi_diario import KpiDiarioService
+
+    resultado = KpiDiarioService.backfill(db)
+    logger.info(
+        f"[{datetime.now()}] KPIs diarios recalculados del {resultado['desde']} "
+        f"al {resultado['hasta']}: {resultado['filas']} filas"
+    )
+    return resultado
+
+
+@registrar_tarea(
+    'verificar_tickets_automaticos',
+    IntervalTrigger(minutes=Config.TICKETS_VERIFICACION_INTERVALO_MINUTOS),
+    'Reglas de tickets automáticos (charolas, mermas, inventario, programación, reportes)'
+)
+def verificar_tickets_automaticos(db):
+    """
+    Evalúa las reglas de tickets automáticos desde TICKETS_VERIFICACION_DIAS
+    días atrás hasta hoy (los tickets ya generados se descartan por su clave
+    de deduplicación).
+    """
+    from modules.crm.reglas_tickets import ReglasTicketsService
+
+    hasta = date.today()
+    desde = hasta - timedelta(days=Config.TICKETS_VERIFICACION_DIAS)
+    resultado = ReglasTicketsService.evaluar(db, desde, hasta)
+    if resultado['total']:
+        logger.info(
+            f"[{datetime.now()}] Tickets automáticos del {desde} al {hasta}: "
+            f"{resultado['total']} generados, {resultado['duplicados']} ya existentes"
+        )
+    return resultado
+
+
+@registrar_tarea(
+    'alertas_stock',
+    IntervalTrigger(minutes=Config.STOCK_ALERTAS_INTERVALO_MINUTOS),
+    'Alertas de stock bajo el mínimo'
+)
+def alertas_stock(db):
+    """
+    Evalúa solo la regla de inventario, con más frecuencia que el resto de
+    reglas: un ticket por item bajo el mínimo y día.
     """
-    Configura las tareas programadas de la aplicación.
-    
+    from modules.crm.reglas_tickets import ReglasTicketsService
+
+    hoy = date.today()
+    resultado = ReglasTicketsService.evaluar(db, hoy, hoy, reglas=['inventario'])
+    if resultado['total']:
+        logger.info(f"[{datetime.now()}] Alertas de stock: {resultado['total']} tickets generados")
+    return resultado
+
+
+# Tareas de alta frecuencia: sin historial (su propio estado ya queda en trabajos/ingestas)
+@registrar_tarea(
+    'procesar_cola_trabajos',
+    IntervalTrigger(seconds=Config.TRABAJOS_INTERVALO_SEGUNDOS),
+    'Worker de la cola de trabajos en segundo plano',
+    historial=False
+)
+def procesar_cola_trabajos(db):
+    """
+    Un ciclo del worker de la cola persistente de trabajos. Los trabajos
+    locales (ingestas de facturas) los ejecuta el servicio web.
+    """
+    from modules.trabajos.cola import ColaTrabajosService
+
+    resultado = ColaTrabajosService.procesar_pendientes(db)
+    if resultado['procesados']:
+        logger.info(
+            f"[{datetime.now()}] Cola de trabajos: "
+            f"{resultado['completados']} completados, "
+            f"{resultado['fallidos']} con error de {resultado['procesados']} procesados"
+        )
+    return resultado
+
+
+@registrar_tarea(
+    'purgar_historial_tareas',
+    CronTrigger(hour=4, minute=0),
+    'Purga del historial de ejecuciones de tareas'
+)
+def purgar_historial_tareas(db):
+    """Elimina ejecuciones más antiguas que PROGRAMADOR_HISTORIAL_DIAS."""
+    from modules.trabajos.programador import HistorialTareasService
+
+    return {'eliminadas': HistorialTareasService.purgar(db)}
+
+
+def configurar_tareas_programadas(app, bloquear: bool = False):
+    """
+    Inicia el programador de tareas en este proceso.
+
     Args:
         app: Instancia de Flask
+        bloquear: True en el proceso dedicado (programador.py); no retorna
     """
-    with app.app_context():
-        from models import db
-        from modules.logistica.costos import CostoService
-        
-        def recalcular_costos_semanales():
-            """
-            Tarea programada: Recalcula costos unitarios y desviaciones cada sábado.
-            Ejecuta el recálculo para todos los items activos.
-            """
-            try:
-                logger.info(f"[{datetime.now()}] Iniciando recálculo semanal de costos...")
-                
-                # Crear sesión de base de datos
-                session = db.session
-                
-                # Recalcular todos los costos
-                resultado = CostoService.recalcular_todos_los_costos(session)
-                
-                logger.info(
-                    f"[{datetime.now()}] Recálculo completado: "
-                    f"{resultado['calculados']} calculados, "
-                    f"{resultado['sin_datos']} sin datos, "
-                    f"{resultado['errores']} errores de {resultado['total']} items totales"
-                )
-                
-                # Commit de los cambios
-                session.commit()
-                
-            except Exception as e:
-                logger.error(f"[{datetime.now()}] Error en recálculo semanal de costos: {e}")
-                import traceback
-                traceback.print_exc()
-                if 'session' in locals():
-                    session.rollback()
-        
-        # Programar tarea: Cada sábado a las 2:00 AM (hora del servidor)
-        # CronTrigger: day_of_week='sat' (0=lunes, 6=domingo, pero 'sat' es sábado)
-        scheduler.add_job(
-            func=recalcular_costos_semanales,
-            trigger=CronTrigger(day_of_week='sat', hour=2, minute=0),
-            id='recalcular_costos_semanales',
-            name='Recálculo semanal de costos unitarios y desviaciones',
-            replace_existing=True
-        )
-        
-        logger.info("Tareas programadas configuradas:")
-        logger.info("  - Recálculo de costos: Cada sábado a las 2:00 AM")
-        
-        # Iniciar el scheduler
-        scheduler.start()
-        
-        # Registrar shutdown al cerrar la aplicación
-        atexit.register(lambda: scheduler.shutdown())
+    logger.info("Tareas programadas configuradas:")
+    logger.info("  - Recálculo de costos: Cada sábado a las 2:00 AM")
+    logger.info("  - Backfill de KPIs diarios: Cada día a las 3:00 AM")
+    logger.info(f"  - Cola de trabajos: Cada {Config.TRABAJOS_INTERVALO_SEGUNDOS} segundos")
+    logger.info(f"  - Tickets automáticos: Cada {Config.TICKETS_VERIFICACION_INTERVALO_MINUTOS} minutos")
+    logger.info(f"  - Alertas de stock: Cada {Config.STOCK_ALERTAS_INTERVALO_MINUTOS} minutos")
+    logger.info("  - Purga del historial de tareas: Cada día a las 4:00 AM")
+    return iniciar_programador(app, bloquear=bloquear)
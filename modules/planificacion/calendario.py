@@ -0,0 +1,198 @@
+"""
+Calendario de menús: matriz fecha × ubicación × tiempo de comida.
+
+Se arma con tres consultas planas, sin recorrer relaciones:
+1. programacion_menu: programaciones que se solapan con el rango
+2. programacion_menu_items: porciones por (programación, receta)
+3. recetas: totales por porción ya persistidos (rollups de rollup_recetas)
+
+Cada programación ocupa todas las fechas de su rango recortadas al rango
+pedido; el costo y las calorías de una celda son costo_por_porcion y
+calorias_por_porcion × porciones, igual que calcular_totales_servicio.
+
+La respuesta lleva una huella (ETag) del contenido: si el cliente ya tiene la
+misma semana no se reenvía (304). Como los rollups guardan version_totales,
+un cambio de costo de un ingrediente cambia la huella de las semanas que usan
+la receta.
+"""
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+import hashlib
+import json
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import ProgramacionMenu, ProgramacionMenuItem, Receta
+from models.programacion import TiempoComida
+
+MAX_DIAS_CALENDARIO = 92  # Un trimestre por solicitud
+
+
+def _tiempo_comida(valor: str) -> TiempoComida:
+    """Resuelve un tiempo de comida por valor ('almuerzo') o nombre ('ALMUERZO')."""
+    texto = (valor or '').strip()
+    for tiempo in TiempoComida:
+        if tiempo.value == texto.lower() or tiempo.name == texto.upper():
+            return tiempo
+    raise ValueError(
+        f"Tiempo de comida inválido: '{valor}'. Valores válidos: {[t.value for t in TiempoComida]}"
+    )
+
+
+def _valor(enumerado) -> Optional[str]:
+    return getattr(enumerado, 'value', enumerado)
+
+
+def _flotante(valor) -> float:
+    return float(valor) if valor else 0.0
+
+
+class CalendarioMenuService:
+    """Servicio de lectura del calendario de menús."""
+
+    @staticmethod
+    def obtener_calendario(
+        db: Session,
+        fecha_desde: date,
+        fecha_hasta: date,
+        ubicacion: Optional[str] = None,
+        tiempo_comida: Optional[str] = None
+    ) -> Dict:
+        """
+        Matriz del calendario de menús para un rango de fechas.
+
+        Args:
+            db: Sesión de base de datos
+            fecha_desde: Primer día del rango (incluido)
+            fecha_hasta: Último día del rango (incluido)
+            ubicacion: Filtrar por ubicación
+            tiempo_comida: Filtrar por tiempo de comida (desayuno, almuerzo, cena)
+
+        Returns:
+            Diccionario con los ejes (fechas, ubicaciones, tiempos_comida), el
+            diccionario de recetas usadas y `matriz[fecha][ubicacion][tiempo]`,
+            donde cada celda es None o {programaciones, recetas, totales}.
+        """
+        if fecha_hasta < fecha_desde:
+            raise ValueError("fecha_hasta debe ser mayor o igual a fecha_desde")
+        dias = (fecha_hasta - fecha_desde).days + 1
+        if dias > MAX_DIAS_CALENDARIO:
+            raise ValueError(f"El rango no puede superar {MAX_DIAS_CALENDARIO} días (solicitado: {dias})")
+
+        filtros = [
+            ProgramacionMenu.fecha_desde <= fecha_hasta,
+            ProgramacionMenu.fecha_hasta >= fecha_desde,
+        ]
+        if ubicacion:
+            filtros.append(ProgramacionMenu.ubicacion == ubicacion)
+        tiempos = list(TiempoComida)
+        if tiempo_comida:
+            tiempo = _tiempo_comida(tiempo_comida)
+            filtros.append(ProgramacionMenu.tiempo_comida == tiempo.name)
+            tiempos = [tiempo]
+
+        # 1. Programaciones del rango
+        programaciones = db.query(
+            ProgramacionMenu.id,
+            ProgramacionMenu.fecha_desde,
+            ProgramacionMenu.fecha_hasta,
+            ProgramacionMenu.tiempo_comida,
+            ProgramacionMenu.ubicacion,
+            ProgramacionMenu.personas_estimadas,
+            ProgramacionMenu.charolas_planificadas
+        ).filter(*filtros).order_by(ProgramacionMenu.id).all()
+
+        # 2. Porciones por (programación, receta), con los mismos filtros
+        porciones_por_programacion: Dict[int, List] = {}
+        for programacion_id, receta_id, porciones in db.query(
+            ProgramacionMenuItem.programacion_id,
+            ProgramacionMenuItem.receta_id,
+            func.sum(ProgramacionMenuItem.cantidad_porciones)
+        ).join(
+            ProgramacionMenu, ProgramacionMenu.id == ProgramacionMenuItem.programacion_id
+        ).filter(*filtros).group_by(
+            ProgramacionMenuItem.programacion_id, ProgramacionMenuItem.receta_id
+        ).order_by(ProgramacionMenuItem.programacion_id, ProgramacionMenuItem.receta_id):
+            porciones_por_programacion.setdefault(programacion_id, []).append((receta_id, int(porciones or 0)))
+
+        # 3. Totales por porción de las recetas usadas
+        receta_ids = sorted({r for filas in porciones_por_programacion.values() for r, _ in filas})
+        recetas = {}
+        if receta_ids:
+            for receta_id, nombre, tipo, costo, calorias, version in db.query(
+                Receta.id,
+                Receta.nombre,
+                Receta.tipo,
+                Receta.costo_por_porcion,
+                Receta.calorias_por_porcion,
+                Receta.version_totales
+            ).filter(Receta.id.in_(receta_ids)):
+                recetas[receta_id] = {
+                    'nombre': nombre,
+                    'tipo': _valor(tipo),
+                    'costo_por_porcion': _flotante(costo),
+                    'calorias_por_porcion': _flotante(calorias),
+                    'version_totales': version,
+                }
+
+        # Servicio de cada programación (igual para todos los días de su rango)
+        fechas = [fecha_desde + timedelta(days=i) for i in range(dias)]
+        ubicaciones = sorted({p.ubicacion for p in programaciones})
+        indice_ubicacion = {u: i for i, u in enumerate(ubicaciones)}
+        indice_tiempo = {t: i for i, t in enumerate(tiempos)}
+        matriz = [[[None] * len(tiempos) for _ in ubicaciones] for _ in fechas]
+
+        for p in programaciones:
+            servicio = []
+            for receta_id, porciones in porciones_por_programacion.get(p.id, ()):
+                receta = recetas.get(receta_id)
+                if receta is None:
+                    continue
+                servicio.append({
+                    'receta_id': receta_id,
+                    'porciones': porciones,
+                    'costo': round(receta['costo_por_porcion'] * porciones, 2),
+                    'calorias': round(receta['calorias_por_porcion'] * porciones, 2),
+                })
+
+            tiempo = p.tiempo_comida if isinstance(p.tiempo_comida, TiempoComida) else _tiempo_comida(p.tiempo_comida)
+            j, k = indice_ubicacion[p.ubicacion], indice_tiempo[tiempo]
+            inicio = max(p.fecha_desde, fecha_desde)
+            fin = min(p.fecha_hasta, fecha_hasta)
+            for i in range((inicio - fecha_desde).days, (fin - fecha_desde).days + 1):
+                celda = matriz[i][j][k]
+                if celda is None:
+                    celda = matriz[i][j][k] = {
+                        'programaciones': [],
+                        'recetas': [],
+                        'personas_estimadas': 0,
+                        'charolas_planificadas': 0,
+                        'total_porciones': 0,
+                        'costo_total': 0.0,
+                        'calorias_totales': 0.0,
+                    }
+                celda['programaciones'].append(p.id)
+                celda['recetas'].extend(servicio)
+                celda['personas_estimadas'] += p.personas_estimadas or 0
+                celda['charolas_planificadas'] += p.charolas_planificadas or 0
+                for linea in servicio:
+                    celda['total_porciones'] += linea['porciones']
+                    celda['costo_total'] = round(celda['costo_total'] + linea['costo'], 2)
+                    celda['calorias_totales'] = round(celda['calorias_totales'] + linea['calorias'], 2)
+
+        return {
+            'fecha_desde': fecha_desde.isoformat(),
+            'fecha_hasta': fecha_hasta.isoformat(),
+            'fechas': [f.isoformat() for f in fechas],
+            'ubicaciones': ubicaciones,
+            'tiempos_comida': [t.value for t in tiempos],
+            'recetas': {str(receta_id): datos for receta_id, datos in recetas.items()},
+            'matriz': matriz,
+        }
+
+    @staticmethod
+    def calcular_etag(calendario: Dict) -> str:
+        """Huella estable del contenido del calendario (serialización canónica)."""
+        contenido = json.dumps(calendario, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(contenido.encode('utf-8')).hexdigest()[:32]
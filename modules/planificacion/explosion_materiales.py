@@ -0,0 +1,155 @@
+"""
+Explosión de materiales (BOM) para programaciones de menú.
+
+Convierte programaciones → recetas → ingredientes en necesidades por item sin
+recorrer relaciones lazy. Se cargan dos arreglos planos:
+    (programación, receta, porciones)  y  (receta, item, cantidad, unidad)
+y las necesidades se obtienen como un producto matricial disperso agrupado
+(join por receta + suma por grupo e item). Las cantidades de ingredientes se
+normalizan a la unidad estándar de cada item con conversor_unidades.
+"""
+from typing import Dict, Iterable, Optional
+from datetime import date
+import logging
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import ProgramacionMenu, ProgramacionMenuItem, RecetaIngrediente, Item
+from modules.logistica.conversor_unidades import registro_unidades
+
+logger = logging.getLogger(__name__)
+
+AGRUPACIONES_VALIDAS = ('programacion', 'ubicacion')
+
+
+class ExplosionMaterialesService:
+    """Servicio para calcular necesidades de items a partir de programaciones."""
+
+    @staticmethod
+    def calcular_necesidades(
+        db: Session,
+        programacion_ids: Optional[Iterable[int]] = None,
+        fecha_desde: Optional[date] = None,
+        fecha_hasta: Optional[date] = None,
+        ubicacion: Optional[str] = None,
+        agrupar_por: Optional[str] = None
+    ) -> Dict:
+        """
+        Calcula las necesidades de items de una o varias programaciones.
+
+        Args:
+            db: Sesión de base de datos
+            programacion_ids: Limitar a estas programaciones
+            fecha_desde: Programaciones que terminan en o después de esta fecha
+            fecha_hasta: Programaciones que empiezan en o antes de esta fecha
+            ubicacion: Filtrar por ubicación (None = todas las ubicaciones)
+            agrupar_por: None para totales globales, 'programacion' o 'ubicacion'
+
+        Returns:
+            {item_id: cantidad} en la unidad estándar del item, o
+            {clave_grupo: {item_id: cantidad}} si se indica agrupar_por
+        """
+        if agrupar_por is not None and agrupar_por not in AGRUPACIONES_VALIDAS:
+            raise ValueError(f"agrupar_por inválido: {agrupar_por}. Valores válidos: {', '.join(AGRUPACIONES_VALIDAS)}")
+
+        porciones = ExplosionMaterialesService._cargar_porciones(
+            db, programacion_ids, fecha_desde, fecha_hasta, ubicacion
+        )
+        if porciones.empty:
+            return {}
+
+        ingredientes = ExplosionMaterialesService._cargar_ingredientes(db, porciones['receta_id'].unique().tolist())
+        if ingredientes.empty:
+            return {}
+
+        clave = agrupar_por or 'total'
+        porciones['total'] = 0
+
+        # Producto disperso P (grupo × receta) · R (receta × item) en formato COO
+        producto = porciones[[clave, 'receta_id', 'porciones']].merge(ingredientes, on='receta_id')
+        producto['cantidad'] = producto['porciones'] * producto['cantidad_normalizada']
+        totales = producto.groupby([clave, 'item_id'], sort=False)['cantidad'].sum()
+
+        resultado: Dict = {}
+        for (grupo, item_id), cantidad in totales.items():
+            grupo = grupo.item() if isinstance(grupo, np.generic) else grupo
+            resultado.setdefault(grupo, {})[int(item_id)] = float(cantidad)
+
+        if agrupar_por is None:
+            return resultado.get(0, {})
+        return resultado
+
+    @staticmethod
+    def _cargar_porciones(
+        db: Session,
+        programacion_ids: Optional[Iterable[int]],
+        fecha_desde: Optional[date],
+        fecha_hasta: Optional[date],
+        ubicacion: Optional[str]
+    ) -> pd.DataFrame:
+        """Arreglo plano (programación, ubicación, receta, porciones) en una consulta."""
+        query = db.query(
+            ProgramacionMenuItem.programacion_id,
+            ProgramacionMenu.ubicacion,
+            ProgramacionMenuItem.receta_id,
+            func.sum(ProgramacionMenuItem.cantidad_porciones)
+        ).join(ProgramacionMenu, ProgramacionMenu.id == ProgramacionMenuItem.programacion_id)
+
+        if programacion_ids is not None:
+            query = query.filter(ProgramacionMenuItem.programacion_id.in_(list(programacion_ids)))
+        if fecha_desde:
+            query = query.filter(ProgramacionMenu.fecha_hasta >= fecha_desde)
+        if fecha_hasta:
+            query = query.filter(ProgramacionMenu.fecha_desde <= fecha_hasta)
+        if ubicacion:
+            query = query.filter(ProgramacionMenu.ubicacion == ubicacion)
+
+        filas = query.group_by(
+            ProgramacionMenuItem.programacion_id,
+            ProgramacionMenu.ubicacion,
+            ProgramacionMenuItem.receta_id
+        ).all()
+        df = pd.DataFrame(filas, columns=['programacion', 'ubicacion', 'receta_id', 'porciones'])
+        df['porciones'] = df['porciones'].astype(float)
+        return df
+
+    @staticmethod
+    def _cargar_ingredientes(db: Session, receta_ids) -> pd.DataFrame:
+        """
+        Arreglo plano (receta, item, cantidad) con la cantidad normalizada a la
+        unidad estándar del item.
+        """
+        filas = db.query(
+            RecetaIngrediente.receta_id,
+            RecetaIngrediente.item_id,
+            RecetaIngrediente.cantidad,
+            RecetaIngrediente.unidad,
+            Item.unidad,
+            Item.densidad
+        ).join(Item, Item.id == RecetaIngrediente.item_id).filter(
+            RecetaIngrediente.receta_id.in_(receta_ids)
+        ).all()
+        df = pd.DataFrame(filas, columns=['receta_id', 'item_id', 'cantidad', 'unidad', 'unidad_item', 'densidad'])
+        if df.empty:
+            return df
+
+        sin_unidad = df['unidad'].isna() | (df['unidad'] == '')
+        df.loc[sin_unidad, 'unidad'] = df.loc[sin_unidad, 'unidad_item']
+        misma_unidad = (df['unidad'].str.lower() == df['unidad_item'].str.lower()).to_numpy()
+
+        factores = registro_unidades.factores(df['unidad'], df['unidad_item'], df['densidad'].astype(float))
+        factores[misma_unidad] = 1.0
+        incompatibles = np.isnan(factores)
+        if incompatibles.any():
+            # Sin conversión posible se conserva la cantidad tal cual (comportamiento previo)
+            logger.debug(
+                f"{int(incompatibles.sum())} ingredientes con unidad no convertible a la unidad del item; "
+                f"se usan sin convertir"
+            )
+            factores[incompatibles] = 1.0
+
+        df['cantidad_normalizada'] = df['cantidad'].astype(float).to_numpy() * factores
+        return df[['receta_id', 'item_id', 'cantidad_normalizada']]
@@ -3,11 +3,13 @@ Lógica de negocio para programación de menús.
 """
 from typing import List, Optional, Dict
 from datetime import date, datetime
+import numpy as np
 from sqlalchemy.orm import Session
 from models import ProgramacionMenu, ProgramacionMenuItem, Receta, Inventario
 from modules.logistica.inventario import InventarioService
 from modules.logistica.pedidos import PedidoCompraService
 from config import Config
+from utils.cache_respuestas import invalidar_tags_post_commit
 
 class ProgramacionMenuService:
     """Servicio para gestión de programación de menús."""
@@ -67,6 +69,7 @@ class ProgramacionMenuService:
             )
             db.add(programacion_item)
         
+        invalidar_tags_post_commit(db, 'programacion')
         db.commit()
         db.refresh(programacion)
         return programacion
@@ -138,6 +141,7 @@ class ProgramacionMenuService:
                 )
                 db.add(programacion_item)
         
+        invalidar_tags_post_commit(db, 'programacion')
         db.commit()
         db.refresh(programacion)
         return programacion
@@ -163,30 +167,15 @@ class ProgramacionMenuService:
         
         necesidades = programacion.calcular_necesidades_items()
         
-        # Verificar disponibilidad en inventario
-        items_faltantes = []
-        items_suficientes = []
+        # Verificar disponibilidad en inventario (una consulta para todos los items)
+        disponibilidad = InventarioService.verificar_disponibilidad_lote(db, necesidades)
+        items_info = disponibilidad.reset_index()[[
+            'item_id', 'nombre', 'cantidad_necesaria', 'cantidad_disponible',
+            'cantidad_actual', 'cantidad_faltante', 'unidad'
+        ]]
         
-        for item_id, cantidad_necesaria in necesidades.items():
-            disponibilidad = InventarioService.verificar_disponibilidad(db, item_id, cantidad_necesaria)
-            
-            from models import Item as ItemModel
-            item = db.query(ItemModel).filter(ItemModel.id == item_id).first()
-            
-            item_info = {
-                'item_id': item_id,
-                'nombre': item.nombre if item else 'N/A',
-                'cantidad_necesaria': cantidad_necesaria,
-                'cantidad_disponible': disponibilidad['cantidad_disponible'],
-                'cantidad_actual': disponibilidad['cantidad_actual'],
-                'cantidad_faltante': disponibilidad['cantidad_faltante'],
-                'unidad': item.unidad if item else 'N/A'
-            }
-            
-            if disponibilidad['suficiente']:
-                items_suficientes.append(item_info)
-            else:
-                items_faltantes.append(item_info)
+        items_suficientes = items_info[disponibilidad['suficiente'].to_numpy()].to_dict('records')
+        items_faltantes = items_info[~disponibilidad['suficiente'].to_numpy()].to_dict('records')
         
         return {
             'programacion_id': programacion_id,
@@ -341,10 +330,6 @@ class ProgramacionMenuService:
         Returns:
             Diccionario con información de los pedidos generados
         """
-        from models import Item as ItemModel, Inventario
-        from modules.logistica.pedidos import PedidoCompraService
-        from config import Config
-        
         programacion = db.query(ProgramacionMenu).filter(
             ProgramacionMenu.id == programacion_id
         ).first()
@@ -355,41 +340,38 @@ class ProgramacionMenuService:
         # Calcular necesidades de la programación
         necesidades_programacion = programacion.calcular_necesidades_items()
         
-        # FASE 1: Items faltantes para la programación
+        # FASE 1: Items faltantes para la programación (una consulta para todos los items)
+        disponibilidad = InventarioService.verificar_disponibilidad_lote(db, necesidades_programacion)
+        disponibilidad = disponibilidad[disponibilidad['existe']]
+        faltantes = np.maximum(0.0, disponibilidad['cantidad_necesaria'] - disponibilidad['cantidad_actual'])
+        
         items_para_programacion = []
         items_suficientes_programacion = []
         
-        for item_id, cantidad_necesaria in necesidades_programacion.items():
-            inventario = db.query(Inventario).filter(Inventario.item_id == item_id).first()
-            item = db.query(ItemModel).filter(ItemModel.id == item_id).first()
-            
-            if not item:
-                continue
-            
-            cantidad_disponible = float(inventario.cantidad_actual) if inventario else 0.0
-            cantidad_faltante = max(0, cantidad_necesaria - cantidad_disponible)
-            
+        for item_id, fila, cantidad_faltante in zip(
+            disponibilidad.index.tolist(), disponibilidad.itertuples(index=False), faltantes.tolist()
+        ):
             if cantidad_faltante > 0:
                 # Agregar amortiguador del 10% para la programación
-                cantidad_con_amortiguador = cantidad_faltante * 1.1
                 items_para_programacion.append({
                     'item_id': item_id,
-                    'cantidad': cantidad_con_amortiguador,
+                    'cantidad': cantidad_faltante * 1.1,
                     'motivo': 'programacion',
-                    'cantidad_necesaria': cantidad_necesaria,
-                    'cantidad_disponible': cantidad_disponible,
+                    'cantidad_necesaria': fila.cantidad_necesaria,
+                    'cantidad_disponible': fila.cantidad_actual,
                     'cantidad_faltante': cantidad_faltante,
                 })
             else:
                 items_suficientes_programacion.append({
                     'item_id': item_id,
-                    'nombre': item.nombre,
-                    'cantidad_necesaria': cantidad_necesaria,
-                    'cantidad_disponible': cantidad_disponible,
+                    'nombre': fila.nombre,
+                    'cantidad_necesaria': fila.cantidad_necesaria,
+                    'cantidad_disponible': fila.cantidad_actual,
                 })
         
         # FASE 2: Items por debajo del stock mínimo (inventario de emergencia/base)
         items_para_stock_minimo = []
+        ids_en_programacion = {item['item_id'] for item in items_para_programacion}
         
         # Obtener todos los items que están por debajo del stock mínimo
         items_bajo_stock = InventarioService.obtener_stock_bajo(db)
@@ -402,12 +384,8 @@ class ProgramacionMenuService:
             # Calcular cuánto falta para llegar al stock mínimo
             cantidad_faltante_stock = cantidad_minima - cantidad_actual
             
-            # Verificar si este item ya está en la lista de programación
-            ya_incluido = any(item['item_id'] == item_id for item in items_para_programacion)
-            
-            if cantidad_faltante_stock > 0 and not ya_incluido:
+            if cantidad_faltante_stock > 0 and item_id not in ids_en_programacion:
                 # Agregar amortiguador para stock mínimo
-                from config import Config
                 cantidad_con_amortiguador = cantidad_faltante_stock * (1 + Config.STOCK_MINIMUM_THRESHOLD_PERCENTAGE)
                 items_para_stock_minimo.append({
                     'item_id': item_id,
@@ -4,9 +4,10 @@ Calcula qué items se necesitan considerando recetas programadas e inventario ac
 """
 from typing import List, Dict
 from datetime import datetime, timedelta, date
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, func
 from models import ProgramacionMenu, Receta, RecetaIngrediente, Inventario, Item, Proveedor
+from modules.planificacion.explosion_materiales import ExplosionMaterialesService
 
 class RequerimientosService:
     """Servicio para cálculo de requerimientos de items."""
@@ -31,35 +32,34 @@ class RequerimientosService:
         if fecha_fin is None:
             fecha_fin = fecha_inicio + timedelta(days=15)
         
-        # Obtener todas las programaciones que se solapan con el período
-        programaciones = db.query(ProgramacionMenu).filter(
+        # Contar programaciones que se solapan con el período
+        total_programaciones = db.query(func.count(ProgramacionMenu.id)).filter(
             and_(
                 ProgramacionMenu.fecha_hasta >= fecha_inicio,
                 ProgramacionMenu.fecha_desde <= fecha_fin
             )
-        ).all()
+        ).scalar() or 0
         
-        # Calcular necesidades totales de items
-        necesidades_totales = {}  # {item_id: cantidad_necesaria}
+        # Necesidades totales de items del período en una sola explosión de materiales
+        necesidades_totales = ExplosionMaterialesService.calcular_necesidades(
+            db,
+            fecha_desde=fecha_inicio,
+            fecha_hasta=fecha_fin
+        )  # {item_id: cantidad_necesaria}
         
-        for programacion in programaciones:
-            necesidades = programacion.calcular_necesidades_items()
-            for item_id, cantidad in necesidades.items():
-                if item_id in necesidades_totales:
-                    necesidades_totales[item_id] += cantidad
-                else:
-                    necesidades_totales[item_id] = cantidad
-        
-        # Obtener inventario actual y calcular faltantes
+        # Obtener items e inventario de todos los items necesarios en una consulta
         requerimientos = []
+        filas = []
+        if necesidades_totales:
+            filas = db.query(Item, Inventario).outerjoin(
+                Inventario, Inventario.item_id == Item.id
+            ).options(joinedload(Item.proveedor_autorizado)).filter(
+                Item.id.in_(list(necesidades_totales.keys())),
+                Item.activo == True
+            ).all()
         
-        for item_id, cantidad_necesaria in necesidades_totales.items():
-            item = db.query(Item).filter(Item.id == item_id).first()
-            if not item or not item.activo:
-                continue
-            
-            # Obtener inventario del item
-            inventario = db.query(Inventario).filter(Inventario.item_id == item_id).first()
+        for item, inventario in filas:
+            cantidad_necesaria = necesidades_totales[item.id]
             cantidad_actual = float(inventario.cantidad_actual) if inventario else 0
             cantidad_minima = float(inventario.cantidad_minima) if inventario else 0
             
@@ -70,7 +70,7 @@ class RequerimientosService:
             # Solo agregar si realmente se necesita pedir
             if cantidad_a_pedir > 0:
                 requerimientos.append({
-                    'item_id': item_id,
+                    'item_id': item.id,
                     'item': item,
                     'cantidad_necesaria': cantidad_necesaria,
                     'cantidad_actual': cantidad_actual,
@@ -84,7 +84,7 @@ class RequerimientosService:
         return {
             'fecha_inicio': fecha_inicio.isoformat(),
             'fecha_fin': fecha_fin.isoformat(),
-            'total_programaciones': len(programaciones),
+            'total_programaciones': total_programaciones,
             'requerimientos': requerimientos,
             'total_items_necesarios': len(requerimientos)
         }
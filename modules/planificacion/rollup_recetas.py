@@ -0,0 +1,257 @@
+"""
+Rollups de recetas (calorías, costo y peso) con seguimiento de dependencias.
+
+Persistencia (tabla recetas):
+- calorias_totales, costo_total, porcion_gramos y *_por_porcion: rollup vigente
+- version_totales: se incrementa en cada recálculo
+- versiones_items: {item_id: Item.version_costo} de los items usados en el cálculo
+
+Invalidación:
+- Un listener de sesión sube Item.version_costo cuando cambia alguno de
+  CAMPOS_DEPENDENCIA y anota el item.
+- Antes del commit, el índice inverso de ingredientes (receta_ingredientes.item_id)
+  da las recetas que usan esos items y se recalculan en lote solo las que se
+  derivaron de una versión anterior, dentro de un savepoint: un fallo aquí
+  nunca impide guardar el item (el recálculo semanal lo corrige).
+- Las escrituras masivas de costos_lote suben la versión en SQL y recalculan
+  sus recetas ellas mismas.
+
+Lectura:
+- Los endpoints de listado leen los rollups persistidos y nunca recalculan.
+- cache_rollups (LRU del proceso) guarda cada rollup con su version_totales y
+  los conteos de ingredientes; una entrada solo se usa si su versión coincide
+  con la de la fila. Su índice inverso item -> recetas desaloja exactamente las
+  recetas afectadas después del commit.
+"""
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+import logging
+import threading
+
+from sqlalchemy import event, func, case, inspect
+from sqlalchemy.orm import Session
+
+from config import Config
+from models import Item, Receta, RecetaIngrediente
+from modules.crm.notificaciones.cola_post_commit import encolar_post_commit
+from modules.logistica.costos_lote import recalcular_recetas
+
+logger = logging.getLogger(__name__)
+
+# Columnas de Item de las que depende el rollup de una receta
+CAMPOS_DEPENDENCIA = ('costo_unitario_actual', 'calorias_por_unidad', 'unidad', 'densidad')
+
+_CLAVE_ITEMS_MODIFICADOS = 'rollup_recetas_items_modificados'
+
+
+class CacheRollups:
+    """LRU en memoria: receta_id -> rollup, con índice inverso item_id -> recetas."""
+
+    def __init__(self, max_entradas: int):
+        self.max_entradas = max_entradas
+        self._entradas: 'OrderedDict[int, Dict]' = OrderedDict()
+        self._por_item: Dict[int, Set[int]] = {}
+        self._lock = threading.Lock()
+        self._contadores = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def obtener(self, receta_id: int, version_totales: int) -> Optional[Dict]:
+        """Rollup cacheado si corresponde a la versión indicada."""
+        with self._lock:
+            rollup = self._entradas.get(receta_id)
+            if rollup is None or rollup['version_totales'] != version_totales:
+                self._contadores['misses'] += 1
+                return None
+            self._entradas.move_to_end(receta_id)
+            self._contadores['hits'] += 1
+            return rollup
+
+    def guardar(self, rollup: Dict) -> None:
+        receta_id = rollup['receta_id']
+        with self._lock:
+            if receta_id in self._entradas:
+                self._quitar(receta_id)
+            self._entradas[receta_id] = rollup
+            for item_id in rollup['versiones_items']:
+                self._por_item.setdefault(int(item_id), set()).add(receta_id)
+            while len(self._entradas) > self.max_entradas:
+                self._quitar(next(iter(self._entradas)))
+                self._contadores['evictions'] += 1
+
+    def invalidar_items(self, item_ids: Iterable[int]) -> int:
+        """Desaloja los rollups que dependen de alguno de los items."""
+        eliminadas = 0
+        with self._lock:
+            for item_id in item_ids:
+                for receta_id in list(self._por_item.get(item_id, ())):
+                    if receta_id in self._entradas:
+                        self._quitar(receta_id)
+                        eliminadas += 1
+            self._contadores['invalidations'] += eliminadas
+        return eliminadas
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+            self._por_item.clear()
+
+    def estadisticas(self) -> Dict:
+        with self._lock:
+            return {'entradas': len(self._entradas), 'max_entradas': self.max_entradas, **self._contadores}
+
+    def _quitar(self, receta_id: int) -> None:
+        """Elimina una receta y sus referencias en el índice inverso (con el lock tomado)."""
+        rollup = self._entradas.pop(receta_id)
+        for item_id in rollup['versiones_items']:
+            recetas = self._por_item.get(int(item_id))
+            if recetas is not None:
+                recetas.discard(receta_id)
+                if not recetas:
+                    del self._por_item[int(item_id)]
+
+
+cache_rollups = CacheRollups(Config.ROLLUP_RECETAS_MAX_ENTRADAS)
+
+
+def _flotante(valor) -> Optional[float]:
+    return float(valor) if valor else None
+
+
+class RollupRecetaService:
+    """Servicio de lectura y mantenimiento de rollups de recetas."""
+
+    @staticmethod
+    def obtener_rollups(db: Session, recetas: List[Receta]) -> Dict[int, Dict]:
+        """
+        Rollups de las recetas ya cargadas, sin recalcular ni recorrer ingredientes.
+
+        Los que no están en caché (o cambiaron de versión) se arman desde las
+        columnas persistidas; los conteos de ingredientes salen de una sola
+        consulta agrupada para todas las recetas faltantes.
+
+        Args:
+            db: Sesión de base de datos
+            recetas: Recetas (filas de la página que se está listando)
+
+        Returns:
+            Diccionario receta_id -> rollup
+        """
+        rollups = {}
+        faltantes = []
+        for receta in recetas:
+            rollup = cache_rollups.obtener(receta.id, receta.version_totales)
+            if rollup is None:
+                faltantes.append(receta)
+            else:
+                rollups[receta.id] = rollup
+        if not faltantes:
+            return rollups
+
+        conteos = {
+            receta_id: (total, con_costo)
+            for receta_id, total, con_costo in db.query(
+                RecetaIngrediente.receta_id,
+                func.count(RecetaIngrediente.id),
+                func.count(case((Item.costo_unitario_actual > 0, 1)))
+            ).outerjoin(Item, Item.id == RecetaIngrediente.item_id).filter(
+                RecetaIngrediente.receta_id.in_([r.id for r in faltantes])
+            ).group_by(RecetaIngrediente.receta_id)
+        }
+        for receta in faltantes:
+            total, con_costo = conteos.get(receta.id, (0, 0))
+            rollup = {
+                'receta_id': receta.id,
+                'version_totales': receta.version_totales,
+                'versiones_items': dict(receta.versiones_items or {}),
+                'costo_total': _flotante(receta.costo_total),
+                'costo_por_porcion': _flotante(receta.costo_por_porcion),
+                'calorias_totales': _flotante(receta.calorias_totales),
+                'calorias_por_porcion': _flotante(receta.calorias_por_porcion),
+                'porciones': receta.porciones,
+                'porcion_gramos': _flotante(receta.porcion_gramos),
+                'ingredientes_con_costo': con_costo,
+                'total_ingredientes': total,
+            }
+            cache_rollups.guardar(rollup)
+            rollups[receta.id] = rollup
+        return rollups
+
+    @staticmethod
+    def recetas_desactualizadas(db: Session, item_ids: Iterable[int]) -> Set[int]:
+        """
+        Recetas activas que usan alguno de los items y cuyo rollup se derivó de
+        una versión de costo distinta de la actual (una consulta sobre el índice
+        inverso idx_receta_ingredientes_item).
+        """
+        item_ids = list(item_ids)
+        if not item_ids:
+            return set()
+        filas = db.query(
+            RecetaIngrediente.receta_id,
+            RecetaIngrediente.item_id,
+            Receta.versiones_items,
+            Item.version_costo
+        ).join(Receta, Receta.id == RecetaIngrediente.receta_id).join(
+            Item, Item.id == RecetaIngrediente.item_id
+        ).filter(
+            RecetaIngrediente.item_id.in_(item_ids),
+            Receta.activa == True
+        )
+        return {
+            receta_id
+            for receta_id, item_id, versiones_items, version in filas
+            if (versiones_items or {}).get(str(item_id)) != version
+        }
+
+    @staticmethod
+    def actualizar_por_items(db: Session, item_ids: Iterable[int]) -> Set[int]:
+        """
+        Recalcula en lote las recetas afectadas por cambios en los items. No hace commit.
+
+        Returns:
+            IDs de las recetas recalculadas
+        """
+        receta_ids = RollupRecetaService.recetas_desactualizadas(db, item_ids)
+        if receta_ids:
+            recalcular_recetas(db, receta_ids)
+        return receta_ids
+
+
+# ========== MANTENIMIENTO INCREMENTAL ==========
+
+@event.listens_for(Session, 'before_flush')
+def _versionar_items_modificados(session: Session, flush_context, instances) -> None:
+    """Sube Item.version_costo (en el UPDATE) si cambió alguna columna de la que dependen los rollups."""
+    for objeto in session.dirty:
+        if not isinstance(objeto, Item):
+            continue
+        atributos = inspect(objeto).attrs
+        if any(atributos[campo].history.has_changes() for campo in CAMPOS_DEPENDENCIA):
+            # Incremento en SQL: dos transacciones concurrentes sobre el mismo item
+            # no pueden escribir la misma versión (la segunda espera el lock de la fila)
+            objeto.version_costo = Item.version_costo + 1
+            session.info.setdefault(_CLAVE_ITEMS_MODIFICADOS, set()).add(objeto.id)
+
+
+@event.listens_for(Session, 'before_commit')
+def _recalcular_recetas_afectadas(session: Session) -> None:
+    """Recalcula solo las recetas que usan los items modificados, justo antes del commit."""
+    if session.in_nested_transaction():
+        return
+
+    session.flush()
+    item_ids = session.info.pop(_CLAVE_ITEMS_MODIFICADOS, None)
+    if not item_ids:
+        return
+
+    try:
+        with session.begin_nested():
+            receta_ids = RollupRecetaService.actualizar_por_items(session, item_ids)
+        if receta_ids:
+            logger.debug(f"Rollups recalculados para {len(receta_ids)} recetas por cambios en {len(item_ids)} items")
+    except Exception as e:
+        logger.warning(
+            f"No se pudieron recalcular las recetas de los items {sorted(item_ids)} ({e}); "
+            f"se corregirán en el recálculo semanal",
+            exc_info=True
+        )
+    encolar_post_commit(session, cache_rollups.invalidar_items, sorted(item_ids))
@@ -3,9 +3,11 @@ Lógica de negocio para gestión de charolas (reportes de servicio).
 """
 from typing import List, Optional, Dict
 from datetime import datetime, date
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, Query
 from sqlalchemy import and_, func
 from models import Charola, CharolaItem, Item, Receta
+from utils.helpers import filtro_rango_fechas
+from utils.cache_respuestas import invalidar_tags_post_commit
 
 class CharolaService:
     """Servicio para gestión de charolas."""
@@ -58,6 +60,7 @@ class CharolaService:
             )
             db.add(charola_item)
         
+        invalidar_tags_post_commit(db, 'charolas')
         db.commit()
         db.refresh(charola)
         return charola
@@ -92,13 +95,42 @@ class CharolaService:
         Returns:
             Lista de charolas
         """
+        return CharolaService.consulta_charolas(
+            db,
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_fin,
+            ubicacion=ubicacion,
+            tiempo_comida=tiempo_comida
+        ).offset(skip).limit(limit).all()
+    
+    @staticmethod
+    def consulta_charolas(
+        db: Session,
+        fecha_inicio: Optional[date] = None,
+        fecha_fin: Optional[date] = None,
+        ubicacion: Optional[str] = None,
+        tiempo_comida: Optional[str] = None
+    ) -> Query:
+        """
+        Consulta filtrada y ordenada de charolas (sin paginar), para listar o proyectar.
+        
+        Args:
+            db: Sesión de base de datos
+            fecha_inicio: Fecha de inicio del rango
+            fecha_fin: Fecha de fin del rango
+            ubicacion: Filtrar por ubicación
+            tiempo_comida: Filtrar por tiempo de comida
+            
+        Returns:
+            Query de Charola ordenada por fecha descendente
+        """
         query = db.query(Charola)
         
         if fecha_inicio:
-            query = query.filter(Charola.fecha_servicio >= datetime.combine(fecha_inicio, datetime.min.time()))
+            query = query.filter(filtro_rango_fechas(Charola.fecha_servicio, desde=fecha_inicio))
         
         if fecha_fin:
-            query = query.filter(Charola.fecha_servicio <= datetime.combine(fecha_fin, datetime.max.time()))
+            query = query.filter(filtro_rango_fechas(Charola.fecha_servicio, hasta=fecha_fin))
         
         if ubicacion:
             query = query.filter(Charola.ubicacion.ilike(f'%{ubicacion}%'))
@@ -106,7 +138,7 @@ class CharolaService:
         if tiempo_comida:
             query = query.filter(Charola.tiempo_comida == tiempo_comida)
         
-        return query.order_by(Charola.fecha_servicio.desc()).offset(skip).limit(limit).all()
+        return query.order_by(Charola.fecha_servicio.desc(), Charola.id.desc())
     
     @staticmethod
     def obtener_resumen_periodo(
@@ -128,8 +160,7 @@ class CharolaService:
             Diccionario con resumen
         """
         query = db.query(Charola).filter(
-            Charola.fecha_servicio >= datetime.combine(fecha_inicio, datetime.min.time()),
-            Charola.fecha_servicio <= datetime.combine(fecha_fin, datetime.max.time())
+            filtro_rango_fechas(Charola.fecha_servicio, fecha_inicio, fecha_fin)
         )
         
         if ubicacion:
@@ -0,0 +1,333 @@
+"""
+Agregados diarios para el dashboard de KPIs (tabla kpi_diario).
+
+Cada familia (facturas, pedidos, tickets, charolas, mermas) se resume por
+día, ubicación y estado/tipo. Los endpoints de KPIs leen estos agregados en
+una consulta indexada en lugar de recorrer las tablas transaccionales.
+
+Mantenimiento:
+- Incremental: un listener de sesión anota los días tocados en cada flush y,
+  antes del commit, recalcula solo esos días (dentro de un savepoint: un fallo
+  aquí nunca impide guardar la operación de negocio).
+- Nocturno: tareas_programadas recalcula los últimos KPI_BACKFILL_DIAS días,
+  lo que cubre escrituras masivas (bulk_*, query.update) que no pasan por el ORM.
+  Si la tabla está vacía se reconstruye todo el histórico.
+"""
+from typing import Dict, Iterable, List, Optional
+from datetime import date, datetime, timedelta
+from itertools import chain
+import enum
+import logging
+
+from sqlalchemy import event, func, case, and_, or_, literal, inspect
+from sqlalchemy.orm import Session
+
+from config import Config
+from models import Factura, PedidoCompra, Ticket, Charola, Merma
+from models.kpi_diario import KpiDiario
+from utils.helpers import filtro_rango_fechas
+
+logger = logging.getLogger(__name__)
+
+# metrica -> (modelo, atributo de fecha, ubicación, dimensión, monto a sumar, cantidad a sumar)
+FAMILIAS = {
+    'facturas': (Factura, 'fecha_recepcion', None, Factura.estado, Factura.total, None),
+    'pedidos': (PedidoCompra, 'fecha_pedido', None, PedidoCompra.estado, PedidoCompra.total, None),
+    'tickets': (Ticket, 'fecha_creacion', None, Ticket.estado, None, None),
+    'charolas': (Charola, 'fecha_servicio', Charola.ubicacion, Charola.tiempo_comida,
+                 Charola.total_ventas, Charola.personas_servidas),
+    'mermas': (Merma, 'fecha_merma', func.coalesce(Merma.ubicacion, ''), Merma.tipo,
+               Merma.cantidad * Merma.costo_unitario, Merma.cantidad),
+}
+
+# Estados que el dashboard muestra como foto actual (sin filtro de fechas)
+DIMENSIONES_ACUMULADAS = (('facturas', 'pendiente'), ('tickets', 'abierto'))
+
+_MODELOS = {definicion[0]: (metrica, definicion[1]) for metrica, definicion in FAMILIAS.items()}
+_CLAVE_PENDIENTES = 'kpi_diario_pendientes'
+
+
+def _a_fecha(valor) -> date:
+    """Normaliza el resultado de func.date() (date en PostgreSQL, str en SQLite)."""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, str):
+        return date.fromisoformat(valor[:10])
+    return valor
+
+
+def _a_dimension(valor) -> str:
+    """Normaliza estados/tipos (enum o string) a su valor en minúsculas."""
+    if valor is None:
+        return ''
+    if isinstance(valor, enum.Enum):
+        return str(valor.value)
+    return str(valor).lower()
+
+
+class KpiDiarioService:
+    """Servicio para mantener y consultar los agregados diarios de KPIs."""
+
+    @staticmethod
+    def recalcular_rango(
+        db: Session,
+        desde: date,
+        hasta: date,
+        metricas: Optional[Iterable[str]] = None
+    ) -> int:
+        """
+        Recalcula los agregados de [desde, hasta] a partir de las tablas de origen.
+        No hace commit.
+
+        Args:
+            db: Sesión de base de datos
+            desde: Primer día (inclusive)
+            hasta: Último día (inclusive)
+            metricas: Familias a recalcular (por defecto, todas)
+
+        Returns:
+            Número de filas de kpi_diario escritas
+        """
+        metricas = list(metricas or FAMILIAS)
+
+        db.query(KpiDiario).filter(
+            KpiDiario.metrica.in_(metricas),
+            KpiDiario.fecha >= desde,
+            KpiDiario.fecha <= hasta
+        ).delete(synchronize_session=False)
+
+        ahora = datetime.utcnow()
+        filas = []
+        for metrica in metricas:
+            acumulado = {}
+            for fila in KpiDiarioService._agregar(db, metrica, desde, hasta):
+                clave = (_a_fecha(fila.fecha), fila.ubicacion or '', _a_dimension(fila.dimension))
+                previo = acumulado.get(clave)
+                if previo:
+                    previo['conteo'] += int(fila.conteo)
+                    previo['total'] += float(fila.total or 0)
+                    previo['cantidad'] += float(fila.cantidad or 0)
+                else:
+                    acumulado[clave] = {
+                        'fecha': clave[0],
+                        'ubicacion': clave[1],
+                        'metrica': metrica,
+                        'dimension': clave[2],
+                        'conteo': int(fila.conteo),
+                        'total': float(fila.total or 0),
+                        'cantidad': float(fila.cantidad or 0),
+                        'fecha_actualizacion': ahora,
+                    }
+            filas.extend(acumulado.values())
+
+        if filas:
+            db.bulk_insert_mappings(KpiDiario, filas)
+        return len(filas)
+
+    @staticmethod
+    def _agregar(db: Session, metrica: str, desde: date, hasta: date) -> List:
+        """Una consulta GROUP BY día/ubicación/dimensión sobre la tabla de origen."""
+        modelo, atributo_fecha, ubicacion, dimension, monto, cantidad = FAMILIAS[metrica]
+        columna_fecha = getattr(modelo, atributo_fecha)
+        dia = func.date(columna_fecha)
+
+        agrupacion = [dia, dimension] + ([ubicacion] if ubicacion is not None else [])
+        return db.query(
+            dia.label('fecha'),
+            (ubicacion if ubicacion is not None else literal('')).label('ubicacion'),
+            dimension.label('dimension'),
+            func.count().label('conteo'),
+            (func.coalesce(func.sum(monto), 0) if monto is not None else literal(0)).label('total'),
+            (func.coalesce(func.sum(cantidad), 0) if cantidad is not None else literal(0)).label('cantidad')
+        ).filter(
+            filtro_rango_fechas(columna_fecha, desde, hasta)
+        ).group_by(*agrupacion).all()
+
+    @staticmethod
+    def marcar_dia_modificado(db: Session, metrica: str, fecha) -> None:
+        """
+        Anota un día a recalcular en el próximo commit. Para escrituras masivas
+        (bulk_insert_mappings) que no disparan los eventos de flush del ORM.
+        """
+        db.info.setdefault(_CLAVE_PENDIENTES, {}).setdefault(metrica, set()).add(_a_fecha(fecha))
+
+    @staticmethod
+    def backfill(db: Session, dias: Optional[int] = None) -> Dict:
+        """
+        Recalcula los últimos `dias` días (o todo el histórico si kpi_diario está vacía).
+        No hace commit.
+
+        Returns:
+            Diccionario con el rango recalculado y las filas escritas
+        """
+        hasta = date.today()
+        if db.query(KpiDiario.id).first() is None:
+            primeras = [
+                db.query(func.min(getattr(modelo, atributo_fecha))).scalar()
+                for modelo, atributo_fecha, *_ in FAMILIAS.values()
+            ]
+            primeras = [_a_fecha(p) for p in primeras if p is not None]
+            desde = min(primeras) if primeras else hasta
+        else:
+            desde = hasta - timedelta(days=dias if dias is not None else Config.KPI_BACKFILL_DIAS)
+
+        filas = KpiDiarioService.recalcular_rango(db, desde, hasta)
+        return {'desde': desde.isoformat(), 'hasta': hasta.isoformat(), 'filas': filas}
+
+    @staticmethod
+    def obtener_totales(db: Session, desde: date, hasta: date) -> Dict[str, Dict[str, Dict]]:
+        """
+        Totales del período por métrica y dimensión, en una sola consulta.
+
+        Para DIMENSIONES_ACUMULADAS también se devuelve 'conteo_historico'
+        (ej. facturas pendientes sin importar la fecha).
+
+        Returns:
+            {metrica: {dimension: {'conteo', 'total', 'cantidad', 'conteo_historico'}}}
+        """
+        en_rango = and_(KpiDiario.fecha >= desde, KpiDiario.fecha <= hasta)
+        acumuladas = or_(*[
+            and_(KpiDiario.metrica == metrica, KpiDiario.dimension == dimension)
+            for metrica, dimension in DIMENSIONES_ACUMULADAS
+        ])
+
+        filas = db.query(
+            KpiDiario.metrica,
+            KpiDiario.dimension,
+            func.sum(case((en_rango, KpiDiario.conteo), else_=0)).label('conteo'),
+            func.sum(case((en_rango, KpiDiario.total), else_=0)).label('total'),
+            func.sum(case((en_rango, KpiDiario.cantidad), else_=0)).label('cantidad'),
+            func.sum(KpiDiario.conteo).label('conteo_historico')
+        ).filter(or_(en_rango, acumuladas)).group_by(KpiDiario.metrica, KpiDiario.dimension).all()
+
+        resultado: Dict[str, Dict[str, Dict]] = {metrica: {} for metrica in FAMILIAS}
+        for fila in filas:
+            resultado.setdefault(fila.metrica, {})[fila.dimension] = {
+                'conteo': int(fila.conteo or 0),
+                'total': float(fila.total or 0),
+                'cantidad': float(fila.cantidad or 0),
+                'conteo_historico': int(fila.conteo_historico or 0),
+            }
+        return resultado
+
+    @staticmethod
+    def obtener_series(db: Session, metrica: str, desde: date, hasta: date) -> List[Dict]:
+        """
+        Serie diaria de una métrica por dimensión (todas las ubicaciones sumadas).
+
+        Returns:
+            Lista ordenada por fecha de {'fecha', 'dimension', 'conteo', 'total', 'cantidad'}
+        """
+        filas = db.query(
+            KpiDiario.fecha,
+            KpiDiario.dimension,
+            func.sum(KpiDiario.conteo).label('conteo'),
+            func.sum(KpiDiario.total).label('total'),
+            func.sum(KpiDiario.cantidad).label('cantidad')
+        ).filter(
+            KpiDiario.metrica == metrica,
+            KpiDiario.fecha >= desde,
+            KpiDiario.fecha <= hasta
+        ).group_by(KpiDiario.fecha, KpiDiario.dimension).order_by(KpiDiario.fecha).all()
+
+        return [
+            {
+                'fecha': fila.fecha,
+                'dimension': fila.dimension,
+                'conteo': int(fila.conteo or 0),
+                'total': float(fila.total or 0),
+                'cantidad': float(fila.cantidad or 0),
+            }
+            for fila in filas
+        ]
+
+
+    @staticmethod
+    def obtener_grafico(
+        db: Session,
+        metrica: str,
+        desde: date,
+        hasta: date,
+        dimensiones_serie: Optional[Iterable[str]] = None
+    ) -> Dict[str, List[Dict]]:
+        """
+        Datos de gráfico de una métrica con una sola consulta: serie diaria y
+        totales del período por dimensión (estado/tipo).
+
+        Args:
+            db: Sesión de base de datos
+            metrica: Familia ('facturas', 'pedidos', 'tickets', 'mermas'...)
+            desde: Primer día (inclusive)
+            hasta: Último día (inclusive)
+            dimensiones_serie: Limitar la serie diaria a estas dimensiones (ej. solo 'aprobada')
+
+        Returns:
+            {'series': [{'fecha', 'conteo', 'total', 'cantidad'}],
+             'por_dimension': [{'dimension', 'conteo', 'total', 'cantidad'}]}
+        """
+        filtro = set(dimensiones_serie) if dimensiones_serie is not None else None
+        por_fecha: Dict[date, Dict] = {}
+        por_dimension: Dict[str, Dict] = {}
+
+        for fila in KpiDiarioService.obtener_series(db, metrica, desde, hasta):
+            acumulados = [por_dimension.setdefault(fila['dimension'], {
+                'dimension': fila['dimension'], 'conteo': 0, 'total': 0.0, 'cantidad': 0.0
+            })]
+            if filtro is None or fila['dimension'] in filtro:
+                acumulados.append(por_fecha.setdefault(fila['fecha'], {
+                    'fecha': fila['fecha'], 'conteo': 0, 'total': 0.0, 'cantidad': 0.0
+                }))
+            for acumulado in acumulados:
+                acumulado['conteo'] += fila['conteo']
+                acumulado['total'] += fila['total']
+                acumulado['cantidad'] += fila['cantidad']
+
+        return {
+            'series': [por_fecha[fecha] for fecha in sorted(por_fecha)],
+            'por_dimension': list(por_dimension.values()),
+        }
+
+
+# ========== MANTENIMIENTO INCREMENTAL ==========
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_dias_modificados(session: Session, flush_context) -> None:
+    """Anota (métrica, día) de cada factura/pedido/ticket/charola/merma escrita."""
+    for objeto in chain(session.new, session.dirty, session.deleted):
+        definicion = _MODELOS.get(type(objeto))
+        if definicion is None:
+            continue
+        metrica, atributo_fecha = definicion
+
+        # Fecha anterior y nueva (un cambio de fecha afecta a ambos días)
+        historia = inspect(objeto).attrs[atributo_fecha].history
+        fechas = [f for f in chain(historia.added, historia.unchanged, historia.deleted) if f]
+        if not fechas and objeto in session.new:
+            fechas = [datetime.utcnow()]
+
+        pendientes = session.info.setdefault(_CLAVE_PENDIENTES, {})
+        for fecha in fechas:
+            pendientes.setdefault(metrica, set()).add(_a_fecha(fecha))
+
+
+@event.listens_for(Session, 'before_commit')
+def _actualizar_dias_modificados(session: Session) -> None:
+    """Recalcula los días anotados justo antes del commit de la transacción externa."""
+    if session.in_nested_transaction():
+        return
+
+    session.flush()
+    pendientes = session.info.pop(_CLAVE_PENDIENTES, None)
+    if not pendientes:
+        return
+
+    try:
+        with session.begin_nested():
+            for metrica, dias in pendientes.items():
+                for dia in sorted(dias):
+                    KpiDiarioService.recalcular_rango(session, dia, dia, [metrica])
+    except Exception as e:
+        logger.warning(
+            f"No se pudieron actualizar los KPIs diarios ({e}); se corregirán en el backfill nocturno",
+            exc_info=True
+        )
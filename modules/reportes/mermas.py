@@ -3,10 +3,12 @@ Lógica de negocio para gestión de mermas (pérdidas/desperdicios).
 """
 from typing import List, Optional, Dict
 from datetime import datetime, date
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, Query
 from sqlalchemy import and_, func
 from models import Merma, Item
 from models.merma import TipoMerma
+from utils.helpers import filtro_rango_fechas
+from utils.cache_respuestas import invalidar_tags_post_commit
 
 class MermaService:
     """Servicio para gestión de mermas."""
@@ -51,6 +53,7 @@ class MermaService:
         )
         
         db.add(merma)
+        invalidar_tags_post_commit(db, 'mermas')
         db.commit()
         db.refresh(merma)
         return merma
@@ -87,13 +90,45 @@ class MermaService:
         Returns:
             Lista de mermas
         """
+        return MermaService.consulta_mermas(
+            db,
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_fin,
+            item_id=item_id,
+            tipo=tipo,
+            ubicacion=ubicacion
+        ).offset(skip).limit(limit).all()
+    
+    @staticmethod
+    def consulta_mermas(
+        db: Session,
+        fecha_inicio: Optional[date] = None,
+        fecha_fin: Optional[date] = None,
+        item_id: Optional[int] = None,
+        tipo: Optional[str] = None,
+        ubicacion: Optional[str] = None
+    ) -> Query:
+        """
+        Consulta filtrada y ordenada de mermas (sin paginar), para listar o proyectar.
+        
+        Args:
+            db: Sesión de base de datos
+            fecha_inicio: Fecha de inicio del rango
+            fecha_fin: Fecha de fin del rango
+            item_id: Filtrar por item
+            tipo: Filtrar por tipo de merma
+            ubicacion: Filtrar por ubicación
+            
+        Returns:
+            Query de Merma ordenada por fecha descendente
+        """
         query = db.query(Merma)
         
         if fecha_inicio:
-            query = query.filter(Merma.fecha_merma >= datetime.combine(fecha_inicio, datetime.min.time()))
+            query = query.filter(filtro_rango_fechas(Merma.fecha_merma, desde=fecha_inicio))
         
         if fecha_fin:
-            query = query.filter(Merma.fecha_merma <= datetime.combine(fecha_fin, datetime.max.time()))
+            query = query.filter(filtro_rango_fechas(Merma.fecha_merma, hasta=fecha_fin))
         
         if item_id:
             query = query.filter(Merma.item_id == item_id)
@@ -106,7 +141,7 @@ class MermaService:
         if ubicacion:
             query = query.filter(Merma.ubicacion.ilike(f'%{ubicacion}%'))
         
-        return query.order_by(Merma.fecha_merma.desc()).offset(skip).limit(limit).all()
+        return query.order_by(Merma.fecha_merma.desc(), Merma.id.desc())
     
     @staticmethod
     def obtener_resumen_periodo(
@@ -128,8 +163,7 @@ class MermaService:
             Diccionario con resumen
         """
         query = db.query(Merma).filter(
-            Merma.fecha_merma >= datetime.combine(fecha_inicio, datetime.min.time()),
-            Merma.fecha_merma <= datetime.combine(fecha_fin, datetime.max.time())
+            filtro_rango_fechas(Merma.fecha_merma, fecha_inicio, fecha_fin)
         )
         
         if ubicacion:
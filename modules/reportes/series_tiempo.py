@@ -0,0 +1,118 @@
+"""
+Agregación de series de tiempo para los reportes de mermas y charolas.
+
+Cada función resuelve un rango completo con UNA consulta agrupada por día (y
+opcionalmente por categoría/servicio). Los reportes combinan las series y
+calculan porcentajes en memoria, de modo que el número de consultas no
+depende de la longitud del rango ni de la cantidad de categorías.
+"""
+from typing import Dict, Iterable, Optional, Tuple
+from datetime import date, datetime
+
+from sqlalchemy import func, literal_column
+from sqlalchemy.orm import Session
+
+from models import Merma, Charola, Item
+from utils.helpers import filtro_rango_fechas
+
+# Clave de las series: (fecha ISO, grupo) — grupo es None si no se agrupa
+ClaveSerie = Tuple[str, Optional[str]]
+
+
+def _fecha_iso(valor) -> str:
+    """func.date() devuelve date en PostgreSQL y str en SQLite."""
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()[:10]
+    return str(valor)[:10]
+
+
+def serie_diaria(
+    db: Session,
+    columna_fecha,
+    valores: Dict[str, object],
+    desde: date,
+    hasta: date,
+    agrupar_por=None,
+    joins: Iterable = (),
+    filtros: Iterable = ()
+) -> Dict[ClaveSerie, Dict[str, float]]:
+    """
+    Suma expresiones por día (y grupo opcional) en una sola consulta.
+
+    Args:
+        db: Sesión de base de datos
+        columna_fecha: Columna DateTime que define el día
+        valores: {nombre: expresión a sumar}
+        desde: Primer día (inclusive)
+        hasta: Último día (inclusive)
+        agrupar_por: Columna de agrupación adicional (categoría, servicio...)
+        joins: Pares (modelo, condición) a unir
+        filtros: Condiciones adicionales
+
+    Returns:
+        {(fecha ISO, grupo): {nombre: total}}
+    """
+    dia = func.date(columna_fecha)
+
+    columnas = [dia.label('fecha')]
+    if agrupar_por is not None:
+        columnas.append(agrupar_por.label('grupo'))
+    columnas += [func.coalesce(func.sum(expresion), 0).label(nombre) for nombre, expresion in valores.items()]
+
+    query = db.query(*columnas)
+    for modelo, condicion in joins:
+        query = query.join(modelo, condicion)
+    query = query.filter(filtro_rango_fechas(columna_fecha, desde, hasta), *filtros)
+    query = query.group_by(dia, agrupar_por) if agrupar_por is not None else query.group_by(dia)
+
+    resultado: Dict[ClaveSerie, Dict[str, float]] = {}
+    for fila in query.all():
+        if fila.fecha is None:
+            continue
+        grupo = fila.grupo if agrupar_por is not None else None
+        clave = (_fecha_iso(fila.fecha), grupo)
+        acumulado = resultado.setdefault(clave, {nombre: 0.0 for nombre in valores})
+        for nombre in valores:
+            acumulado[nombre] += float(getattr(fila, nombre) or 0)
+    return resultado
+
+
+def mermas_por_dia(
+    db: Session,
+    desde: date,
+    hasta: date,
+    por_categoria: bool = False
+) -> Dict[ClaveSerie, Dict[str, float]]:
+    """
+    Mermas por día: {'cantidad' (registros), 'costo' ($), 'peso' (cantidad física)}.
+
+    Con por_categoria=True agrupa también por categoría del item, normalizada
+    a minúsculas (PostgreSQL guarda algunas categorías por NOMBRE).
+    """
+    valores = {
+        'cantidad': literal_column('1'),
+        'costo': Merma.cantidad * Merma.costo_unitario,
+        'peso': Merma.cantidad,
+    }
+    if not por_categoria:
+        return serie_diaria(db, Merma.fecha_merma, valores, desde, hasta)
+
+    return serie_diaria(
+        db, Merma.fecha_merma, valores, desde, hasta,
+        agrupar_por=func.lower(Item.categoria),
+        joins=[(Item, Merma.item_id == Item.id)]
+    )
+
+
+def costo_charolas_por_dia(
+    db: Session,
+    desde: date,
+    hasta: date,
+    por_servicio: bool = False
+) -> Dict[ClaveSerie, float]:
+    """Costo total de charolas por día (y por tiempo de comida si por_servicio=True)."""
+    serie = serie_diaria(
+        db, Charola.fecha_servicio, {'costo': Charola.costo_total}, desde, hasta,
+        agrupar_por=Charola.tiempo_comida if por_servicio else None
+    )
+    return {clave: valores['costo'] for clave, valores in serie.items()}
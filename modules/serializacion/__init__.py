@@ -0,0 +1,5 @@
+"""
+Módulo de Serialización.
+Incluye: Proyecciones declarativas por forma ('list', 'detail', 'embed') que
+leen columnas directamente sin hidratar objetos ORM completos.
+"""
@@ -0,0 +1,267 @@
+"""
+Formas de serialización de los modelos usados por los endpoints de listado.
+
+Convención de nombres:
+- embed: referencia compacta dentro de otro recurso (sin relaciones)
+- list: fila de un listado; embebe relaciones a uno por JOIN y colecciones por SELECTIN
+- detail: recurso completo para vistas de detalle
+
+Las claves de salida coinciden con las de los to_dict() de cada modelo. Las
+formas embed conservan todas las columnas y omiten solo las relaciones
+profundas, que son las que disparaban las cargas perezosas:
+- item embebido: sin 'labels'
+- programación embebida: sin totales calculados ni sus items
+"""
+from typing import Dict
+
+from models import (
+    Item, Proveedor, Inventario, PedidoCompra, PedidoCompraItem,
+    Charola, CharolaItem, Merma, Ticket, Factura, FacturaItem, ProgramacionMenu
+)
+from models.item import CategoriaItem
+from modules.serializacion.proyeccion import (
+    Forma, Campo, Anidado, fecha_iso, flotante, flotante_o_cero, valor_enum
+)
+
+
+def categoria_item(valor):
+    """Normaliza Item.categoria (nombres en mayúsculas o valores) al valor Python en minúsculas."""
+    if valor is None or valor == '':
+        return None
+    if isinstance(valor, CategoriaItem):
+        return valor.value
+    return str(valor).lower()
+
+
+def bandera_texto(valor) -> bool:
+    """Columnas String 'true'/'false' -> bool."""
+    return valor == 'true'
+
+
+# ---------- Items y proveedores ----------
+
+ITEM_EMBED = Forma(Item, {
+    'id': Item.id,
+    'codigo': Item.codigo,
+    'nombre': Item.nombre,
+    'descripcion': Item.descripcion,
+    'categoria': Campo(Item.categoria, categoria_item),
+    'unidad': Item.unidad,
+    'calorias_por_unidad': Campo(Item.calorias_por_unidad, flotante),
+    'densidad': Campo(Item.densidad, flotante),
+    'proveedor_autorizado_id': Item.proveedor_autorizado_id,
+    'tiempo_entrega_dias': Item.tiempo_entrega_dias,
+    'costo_unitario_actual': Campo(Item.costo_unitario_actual, flotante),
+    'activo': Item.activo,
+    'fecha_creacion': Campo(Item.fecha_creacion, fecha_iso),
+})
+
+# Proveedor no tiene relaciones en su to_dict(): el embed y el listado son la misma forma
+PROVEEDOR_LIST = Forma(Proveedor, {
+    'id': Proveedor.id,
+    'nombre': Proveedor.nombre,
+    'ruc': Proveedor.ruc,
+    'telefono': Proveedor.telefono,
+    'email': Proveedor.email,
+    'direccion': Proveedor.direccion,
+    'nombre_contacto': Proveedor.nombre_contacto,
+    'productos_que_provee': Proveedor.productos_que_provee,
+    'activo': Proveedor.activo,
+    'fecha_registro': Campo(Proveedor.fecha_registro, fecha_iso),
+})
+
+PROVEEDOR_EMBED = PROVEEDOR_LIST
+
+# ---------- Inventario ----------
+
+INVENTARIO_LIST = Forma(Inventario, {
+    'id': Inventario.id,
+    'item_id': Inventario.item_id,
+    'ubicacion': Inventario.ubicacion,
+    'cantidad_actual': Campo(Inventario.cantidad_actual, flotante),
+    'cantidad_minima': Campo(Inventario.cantidad_minima, flotante),
+    'unidad': Inventario.unidad,
+    'ultima_actualizacion': Campo(Inventario.ultima_actualizacion, fecha_iso),
+    'ultimo_costo_unitario': Campo(Inventario.ultimo_costo_unitario, flotante),
+}, anidados={
+    'item': Anidado(Inventario.item, ITEM_EMBED, estrategia='join'),
+})
+
+# ---------- Pedidos de compra ----------
+
+PEDIDO_COMPRA_ITEM_LIST = Forma(PedidoCompraItem, {
+    'id': PedidoCompraItem.id,
+    'pedido_id': PedidoCompraItem.pedido_id,
+    'item_id': PedidoCompraItem.item_id,
+    'cantidad': Campo(PedidoCompraItem.cantidad, flotante),
+    'precio_unitario': Campo(PedidoCompraItem.precio_unitario, flotante),
+    'subtotal': Campo(PedidoCompraItem.subtotal, flotante),
+}, anidados={
+    'item': Anidado(PedidoCompraItem.item, ITEM_EMBED, estrategia='join'),
+})
+
+PEDIDO_COMPRA_LIST = Forma(PedidoCompra, {
+    'id': PedidoCompra.id,
+    'proveedor_id': PedidoCompra.proveedor_id,
+    'fecha_pedido': Campo(PedidoCompra.fecha_pedido, fecha_iso),
+    'fecha_entrega_esperada': Campo(PedidoCompra.fecha_entrega_esperada, fecha_iso),
+    'estado': PedidoCompra.estado,
+    'total': Campo(PedidoCompra.total, flotante),
+    'creado_por': PedidoCompra.creado_por,
+    'observaciones': PedidoCompra.observaciones,
+}, anidados={
+    'proveedor': Anidado(PedidoCompra.proveedor, PROVEEDOR_EMBED, estrategia='join'),
+    'items': Anidado(PedidoCompra.items, PEDIDO_COMPRA_ITEM_LIST, orden=PedidoCompraItem.id),
+})
+
+PEDIDO_COMPRA_DETAIL = PEDIDO_COMPRA_LIST
+
+# ---------- Facturas ----------
+
+FACTURA_ITEM_LIST = Forma(FacturaItem, {
+    'id': FacturaItem.id,
+    'factura_id': FacturaItem.factura_id,
+    'item_id': FacturaItem.item_id,
+    'cantidad_facturada': Campo(FacturaItem.cantidad_facturada, flotante),
+    'cantidad_aprobada': Campo(FacturaItem.cantidad_aprobada, flotante),
+    'precio_unitario': Campo(FacturaItem.precio_unitario, flotante),
+    'subtotal': Campo(FacturaItem.subtotal, flotante),
+    'unidad': FacturaItem.unidad,
+    'descripcion': FacturaItem.descripcion,
+})
+
+FACTURA_LIST = Forma(Factura, {
+    'id': Factura.id,
+    'numero_factura': Factura.numero_factura,
+    'tipo': Campo(Factura.tipo, valor_enum),
+    'cliente_id': Factura.cliente_id,
+    'proveedor_id': Factura.proveedor_id,
+    'fecha_emision': Campo(Factura.fecha_emision, fecha_iso),
+    'fecha_recepcion': Campo(Factura.fecha_recepcion, fecha_iso),
+    'subtotal': Campo(Factura.subtotal, flotante),
+    'iva': Campo(Factura.iva, flotante),
+    'total': Campo(Factura.total, flotante),
+    'estado': Campo(Factura.estado, valor_enum),
+    'imagen_url': Factura.imagen_url,
+    'items_json': Factura.items_json,
+    'aprobado_por': Factura.aprobado_por,
+    'fecha_aprobacion': Campo(Factura.fecha_aprobacion, fecha_iso),
+    'observaciones': Factura.observaciones,
+    'remitente_nombre': Factura.remitente_nombre,
+    'remitente_telefono': Factura.remitente_telefono,
+    'recibida_por_whatsapp': Factura.recibida_por_whatsapp,
+    'whatsapp_message_id': Factura.whatsapp_message_id,
+}, anidados={
+    'items': Anidado(Factura.items, FACTURA_ITEM_LIST, orden=FacturaItem.id),
+})
+
+# ---------- Charolas ----------
+
+PROGRAMACION_EMBED = Forma(ProgramacionMenu, {
+    'id': ProgramacionMenu.id,
+    'fecha_desde': Campo(ProgramacionMenu.fecha_desde, fecha_iso),
+    'fecha_hasta': Campo(ProgramacionMenu.fecha_hasta, fecha_iso),
+    'fecha': Campo(ProgramacionMenu.fecha_desde, fecha_iso),  # Compatibilidad hacia atrás
+    'tiempo_comida': Campo(ProgramacionMenu.tiempo_comida, valor_enum),
+    'ubicacion': ProgramacionMenu.ubicacion,
+    'personas_estimadas': ProgramacionMenu.personas_estimadas,
+    'charolas_planificadas': ProgramacionMenu.charolas_planificadas,
+    'charolas_producidas': ProgramacionMenu.charolas_producidas,
+})
+
+CHAROLA_ITEM_LIST = Forma(CharolaItem, {
+    'id': CharolaItem.id,
+    'charola_id': CharolaItem.charola_id,
+    'item_id': CharolaItem.item_id,
+    'receta_id': CharolaItem.receta_id,
+    'nombre_item': CharolaItem.nombre_item,
+    'cantidad': Campo(CharolaItem.cantidad, flotante_o_cero),
+    'precio_unitario': Campo(CharolaItem.precio_unitario, flotante_o_cero),
+    'costo_unitario': Campo(CharolaItem.costo_unitario, flotante_o_cero),
+    'subtotal': Campo(CharolaItem.subtotal, flotante_o_cero),
+    'costo_subtotal': Campo(CharolaItem.costo_subtotal, flotante_o_cero),
+})
+
+CHAROLA_LIST = Forma(Charola, {
+    'id': Charola.id,
+    'numero_charola': Charola.numero_charola,
+    'fecha_servicio': Campo(Charola.fecha_servicio, fecha_iso),
+    'ubicacion': Charola.ubicacion,
+    'tiempo_comida': Charola.tiempo_comida,
+    'personas_servidas': Charola.personas_servidas,
+    'total_ventas': Campo(Charola.total_ventas, flotante_o_cero),
+    'costo_total': Campo(Charola.costo_total, flotante_o_cero),
+    'ganancia': Campo(Charola.ganancia, flotante_o_cero),
+    'observaciones': Charola.observaciones,
+    'fecha_registro': Campo(Charola.fecha_registro, fecha_iso),
+    'programacion_id': Charola.programacion_id,
+}, anidados={
+    'programacion': Anidado(Charola.programacion, PROGRAMACION_EMBED, estrategia='join'),
+    'items': Anidado(Charola.items_charola, CHAROLA_ITEM_LIST, orden=CharolaItem.id),
+})
+
+# ---------- Mermas ----------
+
+MERMA_LIST = Forma(Merma, {
+    'id': Merma.id,
+    'item_id': Merma.item_id,
+    'fecha_merma': Campo(Merma.fecha_merma, fecha_iso),
+    'tipo': Campo(Merma.tipo, valor_enum),
+    'cantidad': Campo(Merma.cantidad, flotante_o_cero),
+    'unidad': Merma.unidad,
+    'costo_unitario': Campo(Merma.costo_unitario, flotante_o_cero),
+    'costo_total': Campo(Merma.costo_total, flotante_o_cero),
+    'motivo': Merma.motivo,
+    'ubicacion': Merma.ubicacion,
+    'registrado_por': Merma.registrado_por,
+    'fecha_registro': Campo(Merma.fecha_registro, fecha_iso),
+}, anidados={
+    'item': Anidado(Merma.item, ITEM_EMBED, estrategia='join'),
+})
+
+# ---------- Tickets ----------
+
+TICKET_LIST = Forma(Ticket, {
+    'id': Ticket.id,
+    'cliente_id': Ticket.cliente_id,
+    'tipo': Campo(Ticket.tipo, valor_enum),
+    'asunto': Ticket.asunto,
+    'descripcion': Ticket.descripcion,
+    'estado': Campo(Ticket.estado, valor_enum),
+    'prioridad': Campo(Ticket.prioridad, valor_enum),
+    'asignado_a': Ticket.asignado_a,
+    'fecha_creacion': Campo(Ticket.fecha_creacion, fecha_iso),
+    'fecha_resolucion': Campo(Ticket.fecha_resolucion, fecha_iso),
+    'respuesta': Ticket.respuesta,
+    'proveedor_id': Ticket.proveedor_id,
+    'pedido_id': Ticket.pedido_id,
+    'programacion_id': Ticket.programacion_id,
+    'charola_id': Ticket.charola_id,
+    'merma_id': Ticket.merma_id,
+    'inventario_id': Ticket.inventario_id,
+    'origen_modulo': Ticket.origen_modulo,
+    'auto_generado': Campo(Ticket.auto_generado, bandera_texto),
+}, anidados={
+    'proveedor': Anidado(Ticket.proveedor, PROVEEDOR_EMBED, estrategia='join'),
+})
+
+# Registro por recurso y nombre de forma
+FORMAS: Dict[str, Dict[str, Forma]] = {
+    'item': {'embed': ITEM_EMBED},
+    'proveedor': {'embed': PROVEEDOR_EMBED, 'list': PROVEEDOR_LIST, 'detail': PROVEEDOR_LIST},
+    'inventario': {'list': INVENTARIO_LIST, 'detail': INVENTARIO_LIST},
+    'pedido_compra': {'list': PEDIDO_COMPRA_LIST, 'detail': PEDIDO_COMPRA_DETAIL},
+    'factura': {'list': FACTURA_LIST, 'detail': FACTURA_LIST},
+    'programacion': {'embed': PROGRAMACION_EMBED},
+    'charola': {'list': CHAROLA_LIST, 'detail': CHAROLA_LIST},
+    'merma': {'list': MERMA_LIST, 'detail': MERMA_LIST},
+    'ticket': {'list': TICKET_LIST, 'detail': TICKET_LIST},
+}
+
+
+def obtener_forma(recurso: str, nombre: str = 'list') -> Forma:
+    """Retorna la forma registrada para un recurso (ValueError si no existe)."""
+    try:
+        return FORMAS[recurso][nombre]
+    except KeyError:
+        raise ValueError(f"Forma '{nombre}' no definida para '{recurso}'")
@@ -0,0 +1,205 @@
+"""
+Serializadores por proyección.
+
+Una Forma declara qué columnas de un modelo se devuelven y cómo se cargan sus
+relaciones. Serializar una consulta reemplaza sus entidades por esas columnas
+(with_entities conserva filtros, orden, offset y limit) y arma los diccionarios
+directamente desde las tuplas, sin hidratar objetos ORM ni disparar cargas
+perezosas.
+
+Estrategias de carga de relaciones (Anidado):
+- 'join': LEFT OUTER JOIN en la misma consulta (equivalente a contains_eager).
+  Solo para relaciones a uno; la forma anidada no puede tener anidados propios.
+- 'selectin': una consulta IN adicional por relación y nivel (equivalente a
+  selectinload). Sirve para relaciones a uno y a muchos.
+"""
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from sqlalchemy.orm import Query, aliased
+
+# Tamaño de los lotes de claves en las consultas IN de 'selectin'
+TAMANO_LOTE_IN = 500
+
+
+# ---------- Conversores de valores ----------
+
+def fecha_iso(valor):
+    """date/datetime -> ISO 8601 (None se conserva)."""
+    return valor.isoformat() if valor else None
+
+
+def flotante(valor):
+    """Numeric -> float; None y 0 -> None (igual que los to_dict existentes)."""
+    return float(valor) if valor else None
+
+
+def flotante_o_cero(valor):
+    """Numeric -> float; None -> 0."""
+    return float(valor) if valor else 0
+
+
+def valor_enum(valor):
+    """Enum -> su valor (minúsculas)."""
+    return valor.value if valor else None
+
+
+class Campo:
+    """Columna proyectada con un conversor opcional."""
+
+    __slots__ = ('columna', 'convertir')
+
+    def __init__(self, columna, convertir: Optional[Callable] = None):
+        self.columna = columna
+        self.convertir = convertir
+
+
+class Anidado:
+    """Relación embebida con su forma y estrategia de carga."""
+
+    __slots__ = ('relacion', 'forma', 'estrategia', 'orden')
+
+    def __init__(self, relacion, forma: 'Forma', estrategia: str = 'selectin', orden=None):
+        prop = relacion.property
+        if prop.secondary is not None:
+            raise ValueError(f"Relación muchos-a-muchos no soportada: {relacion}")
+        if estrategia not in ('selectin', 'join'):
+            raise ValueError(f"Estrategia inválida: {estrategia}")
+        if estrategia == 'join' and (prop.uselist or forma.anidados):
+            raise ValueError(f"La estrategia 'join' solo aplica a relaciones a uno sin anidados: {relacion}")
+        self.relacion = relacion
+        self.forma = forma
+        self.estrategia = estrategia
+        self.orden = orden
+
+    @property
+    def es_lista(self) -> bool:
+        return self.relacion.property.uselist
+
+    @property
+    def columnas_par(self) -> Tuple:
+        """(columna local en el padre, columna remota en el hijo) de la relación."""
+        pares = self.relacion.property.local_remote_pairs
+        if len(pares) != 1:
+            raise ValueError(f"Relación con clave compuesta no soportada: {self.relacion}")
+        return pares[0]
+
+
+class Forma:
+    """
+    Forma de serialización de un modelo.
+
+    Args:
+        modelo: Clase del modelo
+        campos: {nombre en la salida: columna o Campo}
+        anidados: {nombre en la salida: Anidado}
+    """
+
+    def __init__(self, modelo, campos: Dict[str, Union[Campo, object]], anidados: Optional[Dict[str, Anidado]] = None):
+        self.modelo = modelo
+        self.campos = {
+            nombre: campo if isinstance(campo, Campo) else Campo(campo)
+            for nombre, campo in campos.items()
+        }
+        self.anidados = anidados or {}
+
+    def serializar(self, query: Query) -> List[Dict]:
+        """Serializa todas las filas de una consulta sobre el modelo de la forma."""
+        return [fila for _, fila in self._serializar(query)]
+
+    def serializar_uno(self, query: Query) -> Optional[Dict]:
+        """Serializa la primera fila de la consulta (None si no hay)."""
+        filas = self.serializar(query.limit(1))
+        return filas[0] if filas else None
+
+    def _serializar(self, query: Query, columnas_extra: Sequence = ()) -> List[Tuple[tuple, Dict]]:
+        """
+        Ejecuta la proyección y retorna [(valores de columnas_extra, diccionario)].
+
+        columnas_extra permite al padre agrupar los hijos de 'selectin' por su clave.
+        """
+        columnas = list(columnas_extra)
+        lectores: List[Tuple[str, int, Optional[Callable]]] = []
+        for nombre, campo in self.campos.items():
+            lectores.append((nombre, len(columnas), campo.convertir))
+            columnas.append(campo.columna)
+
+        # Relaciones por JOIN: columnas del alias en la misma consulta
+        joins = []
+        lectores_join: List[Tuple[str, int, List[Tuple[str, int, Optional[Callable]]]]] = []
+        for nombre, anidado in self.anidados.items():
+            if anidado.estrategia != 'join':
+                continue
+            alias = aliased(anidado.relacion.property.mapper.class_)
+            joins.append((alias, anidado.relacion.of_type(alias)))
+            _, remota = anidado.columnas_par
+            indice_clave = len(columnas)
+            columnas.append(getattr(alias, remota.key))
+            sub_lectores = []
+            for sub_nombre, campo in anidado.forma.campos.items():
+                sub_lectores.append((sub_nombre, len(columnas), campo.convertir))
+                columnas.append(getattr(alias, campo.columna.key))
+            lectores_join.append((nombre, indice_clave, sub_lectores))
+
+        # Relaciones por SELECTIN: se selecciona la clave local para la consulta IN
+        selectin = []
+        for nombre, anidado in self.anidados.items():
+            if anidado.estrategia != 'selectin':
+                continue
+            local, _ = anidado.columnas_par
+            selectin.append((nombre, anidado, len(columnas)))
+            columnas.append(local)
+
+        consulta = query.with_entities(*columnas)
+        if joins:
+            # Un LEFT JOIN a uno no cambia la cantidad de filas, así que puede
+            # agregarse aunque la consulta ya tenga offset/limit
+            consulta = consulta.enable_assertions(False)
+        for alias, condicion in joins:
+            consulta = consulta.outerjoin(alias, condicion)
+        filas = consulta.all()
+
+        n_extra = len(columnas_extra)
+        resultado = []
+        for fila in filas:
+            datos = {}
+            for nombre, indice, convertir in lectores:
+                valor = fila[indice]
+                datos[nombre] = convertir(valor) if convertir else valor
+            for nombre, indice_clave, sub_lectores in lectores_join:
+                if fila[indice_clave] is None:
+                    datos[nombre] = None
+                    continue
+                datos[nombre] = {
+                    sub_nombre: (convertir(fila[indice]) if convertir else fila[indice])
+                    for sub_nombre, indice, convertir in sub_lectores
+                }
+            resultado.append((tuple(fila[:n_extra]), datos))
+
+        for nombre, anidado, indice in selectin:
+            claves = {fila[indice] for fila in filas if fila[indice] is not None}
+            hijos = self._cargar_selectin(query.session, anidado, claves)
+            for fila, (_, datos) in zip(filas, resultado):
+                clave = fila[indice]
+                if anidado.es_lista:
+                    datos[nombre] = hijos.get(clave, [])
+                else:
+                    encontrados = hijos.get(clave)
+                    datos[nombre] = encontrados[0] if encontrados else None
+
+        return resultado
+
+    @staticmethod
+    def _cargar_selectin(sesion, anidado: Anidado, claves: set) -> Dict[object, List[Dict]]:
+        """Carga los hijos de una relación con consultas IN por lotes, agrupados por clave."""
+        _, remota = anidado.columnas_par
+        forma = anidado.forma
+        agrupados: Dict[object, List[Dict]] = {}
+        claves = list(claves)
+        for inicio in range(0, len(claves), TAMANO_LOTE_IN):
+            lote = claves[inicio:inicio + TAMANO_LOTE_IN]
+            query = sesion.query(forma.modelo).filter(remota.in_(lote))
+            if anidado.orden is not None:
+                query = query.order_by(anidado.orden)
+            for (clave,), datos in forma._serializar(query, columnas_extra=(remota,)):
+                agrupados.setdefault(clave, []).append(datos)
+        return agrupados
@@ -0,0 +1,4 @@
+"""
+Módulo de Trabajos en segundo plano.
+Incluye: Cola persistente de trabajos, registro de handlers y worker.
+"""
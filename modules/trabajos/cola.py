@@ -0,0 +1,274 @@
+"""
+Cola persistente de trabajos en segundo plano.
+
+Los trabajos se guardan en la tabla `trabajos` dentro de la misma transacción
+que los origina, por lo que sobreviven a reinicios de workers de Gunicorn. Un
+worker periódico (ver tareas_programadas) los toma con SELECT ... FOR UPDATE
+SKIP LOCKED, los ejecuta con su propia sesión y reintenta los fallidos con
+backoff exponencial.
+
+Los trabajos registrados con local=True dependen de archivos del servicio web
+(imágenes de facturas en UPLOAD_FOLDER): el worker general no los toma y los
+ejecuta el propio servicio web pidiéndolos por tipo.
+
+Uso:
+    @registrar_trabajo('mi_tipo')
+    def mi_handler(db, **payload): ...
+
+    ColaTrabajosService.encolar(db, 'mi_tipo', {'pedido_id': 1}, ejecutar_en=...)
+"""
+from typing import Callable, Dict, List, Optional, Set
+from datetime import datetime, timedelta
+import logging
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from config import Config
+from models.trabajo import Trabajo, EstadoTrabajo
+
+logger = logging.getLogger(__name__)
+
+# Registro de handlers: tipo -> función(db, **payload)
+_HANDLERS: Dict[str, Callable] = {}
+
+# Tipos que solo se ejecutan en el proceso que los pide por tipo
+_LOCALES: Set[str] = set()
+
+
+def registrar_trabajo(tipo: str, local: bool = False) -> Callable:
+    """
+    Decorador que registra una función como handler de un tipo de trabajo.
+
+    Args:
+        tipo: Nombre del tipo de trabajo
+        local: El worker general no lo toma (ver procesar_pendientes con `tipos`)
+    """
+    def decorador(funcion: Callable) -> Callable:
+        _HANDLERS[tipo] = funcion
+        if local:
+            _LOCALES.add(tipo)
+        return funcion
+    return decorador
+
+
+def calcular_backoff(intentos: int) -> timedelta:
+    """Espera antes del siguiente intento: base * 2^(intentos-1), con tope."""
+    segundos = Config.TRABAJOS_BACKOFF_BASE_SEGUNDOS * (2 ** max(intentos - 1, 0))
+    return timedelta(seconds=min(segundos, Config.TRABAJOS_BACKOFF_MAX_SEGUNDOS))
+
+
+class ColaTrabajosService:
+    """Servicio para encolar, ejecutar y consultar trabajos en segundo plano."""
+
+    @staticmethod
+    def encolar(
+        db: Session,
+        tipo: str,
+        payload: Optional[Dict] = None,
+        ejecutar_en: Optional[datetime] = None,
+        max_intentos: Optional[int] = None
+    ) -> Trabajo:
+        """
+        Encola un trabajo. No hace commit: el trabajo se persiste junto con la
+        transacción del llamador.
+
+        Args:
+            db: Sesión de base de datos
+            tipo: Tipo de trabajo (debe tener un handler registrado)
+            payload: Argumentos del handler (serializables a JSON)
+            ejecutar_en: Fecha mínima de ejecución (UTC). Por defecto, inmediata
+            max_intentos: Intentos antes de marcar el trabajo como fallido
+
+        Returns:
+            Trabajo creado
+        """
+        if tipo not in _HANDLERS:
+            raise ValueError(f"Tipo de trabajo no registrado: {tipo}")
+
+        trabajo = Trabajo(
+            tipo=tipo,
+            payload=payload or {},
+            estado=EstadoTrabajo.PENDIENTE,
+            ejecutar_en=ejecutar_en or datetime.utcnow(),
+            max_intentos=max_intentos or Config.TRABAJOS_MAX_INTENTOS
+        )
+        db.add(trabajo)
+        db.flush()
+        return trabajo
+
+    @staticmethod
+    def reclamar_trabajos(db: Session, limite: int, tipos: Optional[List[str]] = None) -> List[int]:
+        """
+        Toma hasta `limite` trabajos vencidos y los marca como EJECUTANDO.
+
+        Los trabajos que quedaron en EJECUTANDO más allá del timeout (worker
+        caído a mitad de ejecución) vuelven a PENDIENTE antes de reclamar.
+
+        Args:
+            tipos: Solo estos tipos. Por defecto, todos menos los locales
+
+        Returns:
+            IDs de los trabajos reclamados
+        """
+        ahora = datetime.utcnow()
+
+        abandonados = db.query(Trabajo).filter(
+            Trabajo.estado == EstadoTrabajo.EJECUTANDO,
+            Trabajo.iniciado_en < ahora - timedelta(seconds=Config.TRABAJOS_TIMEOUT_SEGUNDOS)
+        ).update({Trabajo.estado: EstadoTrabajo.PENDIENTE}, synchronize_session=False)
+        if abandonados:
+            logger.warning(f"{abandonados} trabajos abandonados devueltos a la cola")
+
+        query = db.query(Trabajo).filter(
+            Trabajo.estado == EstadoTrabajo.PENDIENTE,
+            Trabajo.ejecutar_en <= ahora
+        )
+        if tipos is not None:
+            query = query.filter(Trabajo.tipo.in_(tipos))
+        elif _LOCALES:
+            query = query.filter(Trabajo.tipo.notin_(sorted(_LOCALES)))
+
+        trabajos = query.order_by(
+            Trabajo.ejecutar_en, Trabajo.id
+        ).limit(limite).with_for_update(skip_locked=True).all()
+
+        for trabajo in trabajos:
+            trabajo.estado = EstadoTrabajo.EJECUTANDO
+            trabajo.iniciado_en = ahora
+            trabajo.intentos += 1
+
+        db.commit()
+        return [trabajo.id for trabajo in trabajos]
+
+    @staticmethod
+    def ejecutar_trabajo(db: Session, trabajo_id: int) -> bool:
+        """
+        Ejecuta un trabajo reclamado y registra el resultado.
+
+        Si el handler falla se revierte su transacción; el trabajo vuelve a
+        PENDIENTE con backoff o pasa a FALLIDO al agotar los intentos.
+
+        Returns:
+            True si el trabajo se completó
+        """
+        trabajo = db.query(Trabajo).filter(Trabajo.id == trabajo_id).first()
+        if not trabajo:
+            return False
+
+        tipo = trabajo.tipo
+        payload = dict(trabajo.payload or {})
+
+        try:
+            handler = _HANDLERS.get(tipo)
+            if handler is None:
+                raise ValueError(f"Tipo de trabajo no registrado: {tipo}")
+
+            handler(db, **payload)
+
+            trabajo.estado = EstadoTrabajo.COMPLETADO
+            trabajo.finalizado_en = datetime.utcnow()
+            trabajo.ultimo_error = None
+            db.commit()
+            return True
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Trabajo {trabajo_id} ({tipo}) falló: {e}", exc_info=True)
+
+            trabajo = db.query(Trabajo).filter(Trabajo.id == trabajo_id).first()
+            trabajo.ultimo_error = str(e)[:2000]
+            if trabajo.intentos >= trabajo.max_intentos:
+                trabajo.estado = EstadoTrabajo.FALLIDO
+                trabajo.finalizado_en = datetime.utcnow()
+                logger.error(f"Trabajo {trabajo_id} ({tipo}) marcado como fallido tras {trabajo.intentos} intentos")
+            else:
+                trabajo.estado = EstadoTrabajo.PENDIENTE
+                trabajo.ejecutar_en = datetime.utcnow() + calcular_backoff(trabajo.intentos)
+            db.commit()
+            return False
+
+    @staticmethod
+    def procesar_pendientes(db: Session, limite: Optional[int] = None, tipos: Optional[List[str]] = None) -> Dict:
+        """
+        Un ciclo del worker: reclama trabajos vencidos y los ejecuta uno a uno.
+
+        Args:
+            limite: Trabajos tomados (por defecto TRABAJOS_LOTE)
+            tipos: Solo estos tipos. Por defecto, todos menos los locales
+
+        Returns:
+            Diccionario con contadores {'procesados', 'completados', 'fallidos'}
+        """
+        trabajo_ids = ColaTrabajosService.reclamar_trabajos(db, limite or Config.TRABAJOS_LOTE, tipos)
+        completados = sum(
+            1 for trabajo_id in trabajo_ids
+            if ColaTrabajosService.ejecutar_trabajo(db, trabajo_id)
+        )
+        return {
+            'procesados': len(trabajo_ids),
+            'completados': completados,
+            'fallidos': len(trabajo_ids) - completados
+        }
+
+    @staticmethod
+    def reintentar(db: Session, trabajo_id: int) -> Trabajo:
+        """
+        Devuelve a la cola un trabajo FALLIDO, con un intento adicional.
+
+        Returns:
+            Trabajo reencolado
+        """
+        trabajo = db.query(Trabajo).filter(Trabajo.id == trabajo_id).first()
+        if not trabajo:
+            raise ValueError("Trabajo no encontrado")
+
+        if trabajo.estado != EstadoTrabajo.FALLIDO:
+            raise ValueError("Solo se pueden reintentar trabajos en estado FALLIDO")
+
+        trabajo.estado = EstadoTrabajo.PENDIENTE
+        trabajo.ejecutar_en = datetime.utcnow()
+        trabajo.max_intentos = trabajo.intentos + 1
+        trabajo.finalizado_en = None
+        db.commit()
+        return trabajo
+
+    @staticmethod
+    def listar_trabajos(
+        db: Session,
+        estado: Optional[str] = None,
+        tipo: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[Trabajo]:
+        """
+        Lista trabajos con filtros opcionales (más recientes primero).
+
+        Args:
+            db: Sesión de base de datos
+            estado: Filtrar por estado
+            tipo: Filtrar por tipo de trabajo
+            skip: Número de registros a saltar
+            limit: Límite de registros
+
+        Returns:
+            Lista de trabajos
+        """
+        query = db.query(Trabajo)
+
+        if estado:
+            query = query.filter(Trabajo.estado == EstadoTrabajo.validar(estado))
+
+        if tipo:
+            query = query.filter(Trabajo.tipo == tipo)
+
+        return query.order_by(Trabajo.id.desc()).offset(skip).limit(limit).all()
+
+    @staticmethod
+    def resumen_por_estado(db: Session) -> Dict[str, int]:
+        """Cantidad de trabajos por estado, en una consulta."""
+        conteos = dict(
+            db.query(Trabajo.estado, func.count(Trabajo.id)).group_by(Trabajo.estado).all()
+        )
+        return {estado: conteos.get(estado, 0) for estado in (
+            EstadoTrabajo.PENDIENTE, EstadoTrabajo.EJECUTANDO, EstadoTrabajo.COMPLETADO, EstadoTrabajo.FALLIDO
+        )}
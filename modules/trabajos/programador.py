@@ -0,0 +1,398 @@
+"""
+Programador de tareas periódicas, seguro con varios workers de Gunicorn.
+
+Liderazgo:
+- Cada proceso que inicia el programador intenta tomar pg_try_advisory_lock
+  sobre una conexión dedicada cada PROGRAMADOR_INTERVALO_LIDER_SEGUNDOS. Solo
+  el que lo obtiene (el líder) ejecuta tareas; los demás solo reintentan.
+- Si el líder muere o pierde la conexión, PostgreSQL libera el lock y otro
+  proceso toma el relevo en el siguiente intento. Con otros motores (SQLite
+  en desarrollo) el proceso es líder sin lock.
+
+Ejecución:
+- Cada ejecución abre su propio contexto de aplicación y sesión
+  (alcance_sesion): commit al terminar, rollback si falla y la sesión se
+  libera siempre. La sesión de un request nunca cruza al hilo del programador.
+- Historial en ejecuciones_tareas: disparo al que corresponde, inicio, fin,
+  duración, resultado o error y proceso que la ejecutó.
+
+Recuperación de disparos perdidos:
+- Al asumir el liderazgo, cada tarea cron con ventana `recuperar` busca su
+  último disparo dentro de la ventana; si no está en el historial (no había
+  líder a esa hora) se ejecuta una vez, marcada como recuperada.
+
+Uso:
+    @registrar_tarea('mi_tarea', CronTrigger(hour=3), 'Descripción', recuperar=timedelta(days=1))
+    def mi_tarea(db): ...
+
+    python programador.py              # proceso dedicado (recomendado)
+    ENABLE_SCHEDULER=true              # o embebido en los workers web
+"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+import atexit
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from config import Config
+from models import db
+from models.ejecucion_tarea import EjecucionTarea, EstadoEjecucion
+
+logger = logging.getLogger(__name__)
+
+# Clave de pg_advisory_lock del líder (única en la base de datos)
+CLAVE_LOCK_LIDER = 720_314_001
+
+# Registro de tareas: nombre -> {'funcion', 'trigger', 'descripcion', 'recuperar', 'historial'}
+_TAREAS: Dict[str, Dict] = {}
+
+
+def registrar_tarea(
+    nombre: str,
+    trigger,
+    descripcion: str,
+    recuperar: Optional[timedelta] = None,
+    historial: bool = True
+) -> Callable:
+    """
+    Decorador que registra una función(db) como tarea periódica.
+
+    Args:
+        nombre: Identificador de la tarea (id del job y del historial)
+        trigger: Trigger de APScheduler (CronTrigger o IntervalTrigger)
+        descripcion: Descripción legible
+        recuperar: Ventana para recuperar un disparo perdido (solo tareas cron)
+        historial: Registrar cada ejecución en ejecuciones_tareas
+    """
+    def decorador(funcion: Callable) -> Callable:
+        _TAREAS[nombre] = {
+            'funcion': funcion,
+            'trigger': trigger,
+            'descripcion': descripcion,
+            'recuperar': recuperar,
+            'historial': historial,
+        }
+        return funcion
+    return decorador
+
+
+def tareas_registradas() -> Dict[str, Dict]:
+    return dict(_TAREAS)
+
+
+@contextmanager
+def alcance_sesion(app):
+    """Contexto de aplicación y sesión propios para una ejecución (commit o rollback)."""
+    with app.app_context():
+        try:
+            yield db.session
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+
+def ultimo_disparo(trigger, ahora: datetime, desde: datetime) -> Optional[datetime]:
+    """Último disparo del trigger en [desde, ahora] (None si no hubo)."""
+    ultimo = None
+    siguiente = trigger.get_next_fire_time(None, desde)
+    while siguiente is not None and siguiente <= ahora:
+        ultimo = siguiente
+        siguiente = trigger.get_next_fire_time(ultimo, ultimo + timedelta(seconds=1))
+    return ultimo
+
+
+def _a_utc(momento: datetime) -> datetime:
+    """Datetime con zona horaria -> UTC sin zona (como el resto de columnas DateTime)."""
+    return momento.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _serializable(resultado):
+    if resultado is None:
+        return None
+    return json.loads(json.dumps(resultado, default=str))
+
+
+class ProgramadorTareas:
+    """Scheduler de APScheduler con elección de líder e historial de ejecuciones."""
+
+    def __init__(self, app, bloquear: bool = False):
+        self.app = app
+        self.bloquear = bloquear
+        self.proceso = f'{socket.gethostname()}:{os.getpid()}'
+        self.es_lider = False
+        self._conexion = None
+        self._lock = threading.Lock()
+        self.scheduler = BlockingScheduler() if bloquear else BackgroundScheduler(daemon=True)
+
+    def iniciar(self) -> None:
+        """Programa las tareas registradas y el intento de liderazgo, e inicia el scheduler."""
+        for nombre, tarea in _TAREAS.items():
+            self.scheduler.add_job(
+                func=self._ejecutar_programada,
+                args=[nombre],
+                trigger=tarea['trigger'],
+                id=nombre,
+                name=tarea['descripcion'],
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+        self.scheduler.add_job(
+            func=self.verificar_liderazgo,
+            trigger=IntervalTrigger(seconds=Config.PROGRAMADOR_INTERVALO_LIDER_SEGUNDOS),
+            id='liderazgo_programador',
+            name='Elección de líder del programador',
+            next_run_time=datetime.now(),
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+        atexit.register(self.detener)
+        logger.info(f"Programador de tareas iniciado en {self.proceso} con {len(_TAREAS)} tareas")
+        self.scheduler.start()
+
+    def detener(self) -> None:
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        self._liberar()
+
+    def verificar_liderazgo(self) -> bool:
+        """Confirma el liderazgo o intenta tomarlo; al asumirlo recupera disparos perdidos."""
+        with self._lock:
+            if self.es_lider:
+                if self._conexion is None:
+                    return True
+                try:
+                    self._conexion.execute(text('SELECT 1'))
+                    return True
+                except Exception as e:
+                    logger.warning(f"El líder {self.proceso} perdió su conexión ({e}); cede el liderazgo")
+                    self._liberar()
+
+            if not self._adquirir():
+                return False
+            logger.info(f"{self.proceso} es el líder del programador de tareas")
+
+        try:
+            self.recuperar_perdidas()
+        except Exception as e:
+            logger.error(f"Error al recuperar disparos perdidos: {e}", exc_info=True)
+        return True
+
+    def _adquirir(self) -> bool:
+        with self.app.app_context():
+            engine = db.engine
+        if engine.dialect.name != 'postgresql':
+            # Un solo proceso en desarrollo: sin lock
+            self.es_lider = True
+            return True
+
+        conexion = engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        try:
+            obtenido = conexion.execute(
+                text('SELECT pg_try_advisory_lock(:clave)'), {'clave': CLAVE_LOCK_LIDER}
+            ).scalar()
+        except Exception:
+            conexion.close()
+            raise
+        if not obtenido:
+            conexion.close()
+            return False
+        self._conexion = conexion
+        self.es_lider = True
+        return True
+
+    def _liberar(self) -> None:
+        self.es_lider = False
+        if self._conexion is not None:
+            try:
+                self._conexion.execute(text('SELECT pg_advisory_unlock(:clave)'), {'clave': CLAVE_LOCK_LIDER})
+            except Exception:
+                pass  # Si la conexión se perdió, PostgreSQL ya liberó el lock
+            try:
+                self._conexion.close()
+            except Exception:
+                pass
+            self._conexion = None
+
+    def recuperar_perdidas(self) -> List[str]:
+        """
+        Programa una ejecución inmediata de cada tarea cron cuyo último disparo
+        (dentro de su ventana de recuperación) no figura en el historial.
+
+        Returns:
+            Nombres de las tareas recuperadas
+        """
+        ahora = datetime.now(timezone.utc)
+        recuperadas = []
+        for nombre, tarea in _TAREAS.items():
+            if not tarea['recuperar'] or not isinstance(tarea['trigger'], CronTrigger):
+                continue
+            disparo = ultimo_disparo(tarea['trigger'], ahora, ahora - tarea['recuperar'])
+            if disparo is None:
+                continue
+            programada_para = _a_utc(disparo)
+            with alcance_sesion(self.app) as sesion:
+                registrada = sesion.query(EjecucionTarea.id).filter(
+                    EjecucionTarea.tarea == nombre,
+                    EjecucionTarea.programada_para >= programada_para
+                ).first()
+            if registrada:
+                continue
+
+            logger.info(f"Recuperando disparo perdido de '{nombre}' ({programada_para.isoformat()} UTC)")
+            self.scheduler.add_job(
+                func=self.ejecutar,
+                args=[nombre, programada_para, True],
+                id=f'recuperar_{nombre}',
+                name=f"Recuperación: {tarea['descripcion']}",
+                replace_existing=True
+            )
+            recuperadas.append(nombre)
+        return recuperadas
+
+    def _ejecutar_programada(self, nombre: str) -> None:
+        """Job de APScheduler: solo el líder ejecuta."""
+        if not self.es_lider:
+            return
+        trigger = _TAREAS[nombre]['trigger']
+        ahora = datetime.now(timezone.utc)
+        disparo = None
+        if isinstance(trigger, CronTrigger):
+            disparo = ultimo_disparo(trigger, ahora, ahora - timedelta(days=1))
+        self.ejecutar(nombre, _a_utc(disparo or ahora))
+
+    def ejecutar(self, nombre: str, programada_para: Optional[datetime] = None, recuperada: bool = False) -> Dict:
+        """
+        Ejecuta una tarea con su propia sesión y registra la ejecución en el historial.
+
+        Returns:
+            Diccionario con estado, duración, resultado y error
+        """
+        tarea = _TAREAS[nombre]
+        programada_para = programada_para or datetime.utcnow()
+        inicio = time.perf_counter()
+
+        ejecucion_id = None
+        if tarea['historial']:
+            with alcance_sesion(self.app) as sesion:
+                ejecucion = EjecucionTarea(
+                    tarea=nombre,
+                    programada_para=programada_para,
+                    recuperada='true' if recuperada else 'false',
+                    estado=EstadoEjecucion.EJECUTANDO,
+                    iniciada_en=datetime.utcnow(),
+                    proceso=self.proceso
+                )
+                sesion.add(ejecucion)
+                sesion.flush()
+                ejecucion_id = ejecucion.id
+
+        estado, resultado, error = EstadoEjecucion.COMPLETADA, None, None
+        try:
+            with alcance_sesion(self.app) as sesion:
+                resultado = _serializable(tarea['funcion'](sesion))
+        except Exception as e:
+            estado, error = EstadoEjecucion.FALLIDA, str(e)[:2000]
+            logger.error(f"[{datetime.now()}] Error en la tarea '{nombre}': {e}", exc_info=True)
+        duracion_ms = int((time.perf_counter() - inicio) * 1000)
+
+        if ejecucion_id is not None:
+            try:
+                with alcance_sesion(self.app) as sesion:
+                    sesion.query(EjecucionTarea).filter(EjecucionTarea.id == ejecucion_id).update({
+                        EjecucionTarea.estado: estado,
+                        EjecucionTarea.finalizada_en: datetime.utcnow(),
+                        EjecucionTarea.duracion_ms: duracion_ms,
+                        EjecucionTarea.resultado: resultado,
+                        EjecucionTarea.error: error,
+                    }, synchronize_session=False)
+            except Exception as e:
+                logger.warning(f"No se pudo registrar el fin de la ejecución {ejecucion_id} de '{nombre}': {e}")
+
+        return {'tarea': nombre, 'estado': estado, 'duracion_ms': duracion_ms, 'resultado': resultado, 'error': error}
+
+    def estado(self) -> Dict:
+        """Rol del proceso y próximos disparos de cada tarea."""
+        trabajos = {job.id: job for job in self.scheduler.get_jobs()} if self.scheduler.running else {}
+        return {
+            'proceso': self.proceso,
+            'es_lider': self.es_lider,
+            'tareas': [{
+                'nombre': nombre,
+                'descripcion': tarea['descripcion'],
+                'trigger': str(tarea['trigger']),
+                'proximo_disparo': (
+                    trabajos[nombre].next_run_time.isoformat()
+                    if nombre in trabajos and trabajos[nombre].next_run_time else None
+                ),
+            } for nombre, tarea in _TAREAS.items()],
+        }
+
+
+# Instancia del proceso (None si este proceso no inicia el programador)
+programador: Optional[ProgramadorTareas] = None
+
+
+def iniciar_programador(app, bloquear: bool = False) -> ProgramadorTareas:
+    """
+    Inicia el programador en este proceso. Con bloquear=True (proceso dedicado)
+    no retorna hasta que el proceso termina.
+    """
+    global programador
+    programador = ProgramadorTareas(app, bloquear=bloquear)
+    programador.iniciar()
+    return programador
+
+
+class HistorialTareasService:
+    """Consultas y mantenimiento del historial de ejecuciones."""
+
+    @staticmethod
+    def listar(
+        db: Session,
+        tarea: Optional[str] = None,
+        estado: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[EjecucionTarea]:
+        query = db.query(EjecucionTarea)
+        if tarea:
+            query = query.filter(EjecucionTarea.tarea == tarea)
+        if estado:
+            query = query.filter(EjecucionTarea.estado == EstadoEjecucion.validar(estado))
+        return query.order_by(EjecucionTarea.id.desc()).offset(skip).limit(limit).all()
+
+    @staticmethod
+    def ultimas_por_tarea(db: Session) -> Dict[str, Dict]:
+        """Última ejecución de cada tarea, en una consulta."""
+        ultimas = db.query(
+            func.max(EjecucionTarea.id).label('id')
+        ).group_by(EjecucionTarea.tarea).subquery()
+        return {
+            ejecucion.tarea: ejecucion.to_dict()
+            for ejecucion in db.query(EjecucionTarea).join(ultimas, ultimas.c.id == EjecucionTarea.id)
+        }
+
+    @staticmethod
+    def purgar(db: Session, dias: Optional[int] = None) -> int:
+        """Elimina ejecuciones más antiguas que `dias` días. No hace commit."""
+        limite = datetime.utcnow() - timedelta(days=dias if dias is not None else Config.PROGRAMADOR_HISTORIAL_DIAS)
+        return db.query(EjecucionTarea).filter(
+            EjecucionTarea.iniciada_en < limite
+        ).delete(synchronize_session=False)
@@ -0,0 +1,15 @@
+"""
+Proceso dedicado del programador de tareas.
+
+Uso:
+    python programador.py
+
+Inicia el programador con un scheduler bloqueante. Si se lanzan varias
+instancias (o los workers web tienen ENABLE_SCHEDULER=true), solo la que
+tiene el advisory lock de PostgreSQL ejecuta las tareas.
+"""
+from app import app
+from modules.logistica.tareas_programadas import configurar_tareas_programadas
+
+if __name__ == '__main__':
+    configurar_tareas_programadas(app, bloquear=True)
@@ -1,8 +1,11 @@
 """
 Rutas API para módulo de Chat AI.
 """
+import json
 import logging
-from flask import Blueprint, request, jsonify
+import threading
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from config import Config
 from models import db
 from modules.chat.chat_service import chat_service
 from utils.route_helpers import (
@@ -147,6 +150,86 @@ def enviar_mensaje(conversacion_id):
         logging.error(f"Error en enviar_mensaje para conversación {conversacion_id}: {str(e)}", exc_info=True)
         return error_response(f'Error al enviar mensaje: {str(e)}', 500, 'INTERNAL_ERROR')
 
+# Streams simultáneos por proceso: cada uno ocupa un hilo de gunicorn (gthread) mientras dura;
+# debe quedar por debajo de --threads para que el resto de las rutas siga atendiéndose
+_streams_disponibles = threading.BoundedSemaphore(Config.CHAT_STREAM_MAX_CONCURRENTES)
+
+def _evento_sse(evento: str, datos: dict) -> str:
+    """Formatea un evento Server-Sent Events."""
+    return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+
+@bp.route('/conversaciones/<int:conversacion_id>/mensajes/stream', methods=['POST'])
+def enviar_mensaje_stream(conversacion_id):
+    """
+    Envía un mensaje y transmite la respuesta del AI como Server-Sent Events
+    (inicio, delta, consulta, fin). La respuesta se guarda al cerrar el stream.
+    """
+    try:
+        validate_positive_int(conversacion_id, 'conversacion_id')
+        datos = request.get_json()
+        if not datos:
+            return error_response('Datos JSON requeridos', 400, 'VALIDATION_ERROR')
+        
+        contenido = datos.get('contenido', '').strip()
+        if not contenido:
+            return error_response('El contenido del mensaje no puede estar vacío', 400, 'VALIDATION_ERROR')
+    except ValueError as e:
+        return error_response(str(e), 400, 'VALIDATION_ERROR')
+    
+    if not _streams_disponibles.acquire(blocking=False):
+        return error_response(
+            'Demasiadas respuestas en curso, intenta nuevamente en unos segundos',
+            503, 'SERVICE_UNAVAILABLE'
+        )
+    
+    try:
+        eventos = chat_service.enviar_mensaje_stream(
+            db.session,
+            conversacion_id,
+            contenido,
+            usuario_id=datos.get('usuario_id')
+        )
+    except ValueError as e:
+        _streams_disponibles.release()
+        db.session.rollback()
+        return error_response(str(e), 400, 'VALIDATION_ERROR')
+    except Exception as e:
+        _streams_disponibles.release()
+        db.session.rollback()
+        logging.error(f"Error en enviar_mensaje_stream para conversación {conversacion_id}: {str(e)}", exc_info=True)
+        return error_response(f'Error al enviar mensaje: {str(e)}', 500, 'INTERNAL_ERROR')
+    
+    cerrado = []
+    
+    def cerrar():
+        # Se llama al terminar el generador y al cerrar la respuesta; libera una sola vez
+        if cerrado:
+            return
+        cerrado.append(True)
+        try:
+            eventos.close()
+        finally:
+            _streams_disponibles.release()
+    
+    def generar():
+        try:
+            for evento, datos_evento in eventos:
+                yield _evento_sse(evento, datos_evento)
+        finally:
+            cerrar()
+    
+    respuesta = Response(
+        stream_with_context(generar()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Sin buffer en proxies (nginx)
+        }
+    )
+    # Si el cliente se desconecta antes de la primera iteración, el finally de generar() no corre
+    respuesta.call_on_close(cerrar)
+    return respuesta
+
 @bp.route('/conversaciones/<int:conversacion_id>/mensajes', methods=['GET'])
 def listar_mensajes(conversacion_id):
     """Lista los mensajes de una conversación."""
@@ -169,6 +252,8 @@ def chat_health_check():
     try:
         from utils.db_helpers import verify_db_connection, get_pool_stats
         from modules.configuracion.ai import AIConfigService
+        from modules.chat.prompts import PromptRegistro
+        from modules.chat.consultas_sql import ejecutor_consultas
         
         # Verificar conexión BD
         db_info = verify_db_connection()
@@ -220,10 +305,13 @@ def chat_health_check():
             'ai': {
                 'configured': ai_config['api_key_configured'],
                 'model': AIConfigService.obtener_modelo() if ai_config['model_configured'] else None,
-                'base_url': 'configured' if ai_config['base_url_configured'] else 'not_configured'
+                'base_url': 'configured' if ai_config['base_url_configured'] else 'not_configured',
+                'prompt_cache': Config.CHAT_PROMPT_CACHE,
+                'prompts': PromptRegistro.descripcion()
             },
             'integration': ai_bd_integracion,
-            'test_query': prueba_consulta
+            'test_query': prueba_consulta,
+            'consultas_sql': ejecutor_consultas.estadisticas()
         }
         
         if response_data['status'] == 'ok':
@@ -13,6 +13,9 @@ from modules.crm.conversaciones import conversacion_service
 from models.conversacion_contacto import TipoMensajeContacto
 from modules.crm.notificaciones.whatsapp import whatsapp_service
 from modules.crm.notificaciones.email import email_service
+from modules.serializacion.formas import (
+    PROVEEDOR_LIST, FACTURA_LIST, PEDIDO_COMPRA_LIST, TICKET_LIST
+)
 from datetime import datetime
 from utils.route_helpers import (
     handle_db_transaction, parse_date, require_field,
@@ -39,52 +42,23 @@ def listar_proveedores():
         
         activo_bool = None if activo is None else activo.lower() == 'true'
         
-        proveedores = ProveedorService.listar_proveedores(
-            db.session,
-            activo=activo_bool,
-            busqueda=busqueda,
-            label_id=label_id,
-            skip=skip,
-            limit=limit
+        proveedores = PROVEEDOR_LIST.serializar(
+            ProveedorService.consulta_proveedores(
+                db.session,
+                activo=activo_bool,
+                busqueda=busqueda,
+                label_id=label_id
+            ).offset(skip).limit(limit)
         )
         
-        # Incluir información de items y labels para cada proveedor
-        resultado = []
-        for p in proveedores:
-            try:
-                # Obtener items del proveedor con eager loading de labels
-                from sqlalchemy.orm import selectinload
-                from models import Item
-                
-                items = db.session.query(Item).options(
-                    selectinload(Item.labels)
-                ).filter(
-                    Item.proveedor_autorizado_id == p.id,
-                    Item.activo == True
-                ).all()
-                
-                # Contar labels únicos
-                labels_set = set()
-                for item in items:
-                    for label in item.labels:
-                        if label.activo:
-                            labels_set.add(label.id)
-                
-                prov_dict = p.to_dict(include_items=False)
-                prov_dict['total_items'] = len(items)
-                prov_dict['total_labels'] = len(labels_set)
-                
-                resultado.append(prov_dict)
-            except Exception as e:
-                import logging
-                logging.error(f"Error procesando proveedor {p.id}: {str(e)}", exc_info=True)
-                # Si falla, agregar sin items
-                prov_dict = p.to_dict(include_items=False)
-                prov_dict['total_items'] = 0
-                prov_dict['total_labels'] = 0
-                resultado.append(prov_dict)
-        
-        return paginated_response(resultado, skip=skip, limit=limit)
+        # Totales de items y labels de la página en dos consultas agrupadas
+        conteos = ProveedorService.contar_items_y_labels(
+            db.session, [p['id'] for p in proveedores]
+        )
+        for prov_dict in proveedores:
+            prov_dict.update(conteos[prov_dict['id']])
+        
+        return paginated_response(proveedores, skip=skip, limit=limit)
     except ValueError as e:
         return error_response(str(e), 400, 'VALIDATION_ERROR')
     except Exception as e:
@@ -152,8 +126,10 @@ def obtener_facturas_proveedor(proveedor_id):
     """Obtiene el historial de facturas de un proveedor."""
     try:
         validate_positive_int(proveedor_id, 'proveedor_id')
-        facturas = ProveedorService.obtener_historial_facturas(db.session, proveedor_id)
-        return success_response([f.to_dict() for f in facturas])
+        facturas = FACTURA_LIST.serializar(
+            ProveedorService.consulta_historial_facturas(db.session, proveedor_id)
+        )
+        return success_response(facturas)
     except ValueError as e:
         return error_response(str(e), 400, 'VALIDATION_ERROR')
     except Exception as e:
@@ -164,8 +140,10 @@ def obtener_pedidos_proveedor(proveedor_id):
     """Obtiene el historial de pedidos de un proveedor."""
     try:
         validate_positive_int(proveedor_id, 'proveedor_id')
-        pedidos = ProveedorService.obtener_historial_pedidos(db.session, proveedor_id)
-        return success_response([p.to_dict() for p in pedidos])
+        pedidos = PEDIDO_COMPRA_LIST.serializar(
+            ProveedorService.consulta_historial_pedidos(db.session, proveedor_id)
+        )
+        return success_response(pedidos)
     except ValueError as e:
         return error_response(str(e), 400, 'VALIDATION_ERROR')
     except Exception as e:
@@ -433,27 +411,20 @@ def listar_tickets():
         if asignado_a:
             validate_positive_int(asignado_a, 'asignado_a')
         
-        tickets = TicketService.listar_tickets(
-            db.session,
-            cliente_id=cliente_id,
-            estado=estado,
-            tipo=tipo,
-            asignado_a=asignado_a,
-            skip=skip,
-            limit=limit
-        )
-        
-        # Aplicar filtros adicionales si es necesario
-        if prioridad:
-            tickets = [t for t in tickets if t.prioridad and t.prioridad.value.lower() == prioridad.lower()]
+        def consultar_tickets():
+            return TICKET_LIST.serializar(
+                TicketService.consulta_tickets(
+                    db.session,
+                    cliente_id=cliente_id,
+                    estado=estado,
+                    tipo=tipo,
+                    asignado_a=asignado_a,
+                    prioridad=prioridad,
+                    busqueda=busqueda
+                ).offset(skip).limit(limit)
+            )
         
-        if busqueda:
-            busqueda_lower = busqueda.lower()
-            tickets = [
-                t for t in tickets 
-                if (t.asunto and busqueda_lower in t.asunto.lower()) or 
-                   (t.descripcion and busqueda_lower in t.descripcion.lower())
-            ]
+        tickets = consultar_tickets()
         
         # Si no hay tickets y no hay filtros específicos, generar datos mock
         if not tickets and not estado and not tipo and not prioridad and not busqueda and not cliente_id:
@@ -462,42 +433,12 @@ def listar_tickets():
                 logging.info("No hay tickets, generando datos mock...")
                 generar_tickets_mock()
                 # Volver a consultar después de crear los mock
-                tickets = TicketService.listar_tickets(
-                    db.session,
-                    cliente_id=cliente_id,
-                    estado=estado,
-                    tipo=tipo,
-                    asignado_a=asignado_a,
-                    skip=skip,
-                    limit=limit
-                )
-                
-                # Aplicar filtros nuevamente
-                if prioridad:
-                    tickets = [t for t in tickets if t.prioridad and t.prioridad.value.lower() == prioridad.lower()]
-                
-                if busqueda:
-                    busqueda_lower = busqueda.lower()
-                    tickets = [
-                        t for t in tickets 
-                        if (t.asunto and busqueda_lower in t.asunto.lower()) or 
-                           (t.descripcion and busqueda_lower in t.descripcion.lower())
-                    ]
+                tickets = consultar_tickets()
             except Exception as mock_error:
                 logging.warning(f"Error generando tickets mock: {str(mock_error)}")
                 # Continuar con lista vacía si falla la generación mock
         
-        # Serializar tickets con manejo de errores
-        tickets_dict = []
-        for t in tickets:
-            try:
-                tickets_dict.append(t.to_dict())
-            except Exception as e:
-                logging.error(f"Error serializando ticket {t.id}: {str(e)}")
-                # Continuar con el siguiente ticket
-                continue
-        
-        return paginated_response(tickets_dict, skip=skip, limit=limit)
+        return paginated_response(tickets, skip=skip, limit=limit)
     except ValueError as e:
         return error_response(str(e), 400, 'VALIDATION_ERROR')
     except Exception as e:
@@ -583,16 +524,23 @@ def resolver_ticket(ticket_id):
 @bp.route('/tickets/verificar-automaticos', methods=['POST'])
 @handle_db_transaction
 def verificar_tickets_automaticos():
-    """Ejecuta todas las verificaciones automáticas y genera tickets."""
+    """
+    Ejecuta todas las verificaciones automáticas y genera tickets.
+    
+    Body: fecha (un día) o fecha_desde/fecha_hasta (rango); por defecto hoy.
+    """
     try:
         datos = request.get_json() or {}
-        fecha_str = datos.get('fecha')
+        fecha_str = datos.get('fecha_desde') or datos.get('fecha')
+        fecha_hasta_str = datos.get('fecha_hasta')
         
         fecha = parse_date(fecha_str) if fecha_str else None
+        fecha_hasta = parse_date(fecha_hasta_str) if fecha_hasta_str else None
         
         resultado = TicketsAutomaticosService.ejecutar_verificaciones_completas(
             db.session,
-            fecha=fecha
+            fecha=fecha,
+            fecha_hasta=fecha_hasta
         )
         db.session.commit()
         
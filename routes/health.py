@@ -6,6 +6,11 @@ from models import db
 from sqlalchemy import text
 from utils.route_helpers import success_response, error_response
 from utils.db_helpers import verify_db_connection, verify_foreign_keys, get_pool_stats
+from utils.cache_respuestas import estadisticas_cache
+from utils.http_cliente import cliente_http
+from modules.planificacion.rollup_recetas import cache_rollups
+from modules.trabajos import programador as programador_tareas
+from modules.trabajos.programador import HistorialTareasService
 
 bp = Blueprint('health', __name__)
 
@@ -60,6 +65,30 @@ def api_health_check():
             except Exception:
                 pass  # No crítico
         
+        # Contadores de la caché de respuestas (hits/misses/evictions)
+        try:
+            response_data['cache'] = estadisticas_cache()
+            response_data['cache']['rollups_recetas'] = cache_rollups.estadisticas()
+        except Exception:
+            pass  # No crítico
+        
+        # Programador de tareas: rol de este proceso y última ejecución de cada tarea
+        if db_info['connected']:
+            try:
+                response_data['programador'] = {
+                    'proceso': programador_tareas.programador.estado()['proceso'] if programador_tareas.programador else None,
+                    'es_lider': bool(programador_tareas.programador and programador_tareas.programador.es_lider),
+                    'ultimas_ejecuciones': {
+                        tarea: {k: ejecucion[k] for k in ('estado', 'iniciada_en', 'duracion_ms', 'proceso')}
+                        for tarea, ejecucion in HistorialTareasService.ultimas_por_tarea(db.session).items()
+                    },
+                }
+            except Exception:
+                db.session.rollback()  # No crítico (p. ej. migración pendiente)
+        
+        # Integraciones salientes: latencias, reintentos y circuito por upstream (este proceso)
+        response_data['http_salientes'] = cliente_http.estadisticas()
+        
         if db_info['connected']:
             return success_response(response_data)
         else:
@@ -7,6 +7,7 @@ from werkzeug.utils import secure_filename
 import os
 from sqlalchemy import and_, exists
 from models import db
+from utils.cache_respuestas import cachear_respuesta, no_cachear_respuesta
 from utils.route_helpers import (
     handle_db_transaction, parse_date, parse_datetime, require_field,
     validate_positive_int, validate_file_upload, success_response,
@@ -14,18 +15,26 @@ from utils.route_helpers import (
 )
 from modules.logistica.items import ItemService
 from modules.logistica.inventario import InventarioService
+from modules.logistica.movimientos_inventario import MovimientoInventarioService
+from modules.logistica.emparejador_items import EmparejadorItems
 from modules.logistica.requerimientos import RequerimientoService
 from modules.logistica.facturas import FacturaService
+from modules.logistica.ingesta_facturas import IngestaFacturaService
 from modules.logistica.pedidos import PedidoCompraService
 from modules.logistica.pedidos_internos import PedidoInternoService
 from modules.logistica.compras_stats import ComprasStatsService
 from modules.logistica.costos import CostoService
-from models import ItemLabel, Factura, FacturaItem, Receta, Proveedor
+from modules.planificacion.rollup_recetas import RollupRecetaService
+from modules.serializacion.formas import INVENTARIO_LIST, PEDIDO_COMPRA_LIST
+from models import ItemLabel, Factura, FacturaItem, Receta, RecetaIngrediente, Proveedor
 from models.item import Item
 from models.factura import EstadoFactura, TipoFactura
 from models.requerimiento import EstadoRequerimiento
 from models.receta import TipoReceta
 from modules.logistica.pedidos_automaticos import PedidosAutomaticosService
+from modules.trabajos.cola import ColaTrabajosService
+from modules.trabajos import programador as programador_tareas
+from modules.trabajos.programador import HistorialTareasService
 from modules.planificacion.requerimientos import RequerimientosService
 from config import Config
 from datetime import datetime
@@ -348,6 +357,31 @@ def toggle_activo_item(item_id):
     estado = 'activado' if item.activo else 'desactivado'
     return success_response(item.to_dict(), message=f'Item {estado} correctamente')
 
+@bp.route('/items/emparejar', methods=['POST'])
+def emparejar_items():
+    """Empareja un lote de descripciones (líneas de factura) con items del catálogo."""
+    try:
+        datos = request.get_json()
+        if not datos:
+            return error_response('Datos JSON requeridos', 400, 'VALIDATION_ERROR')
+        
+        lineas = require_field(datos, 'lineas', list)
+        if not isinstance(lineas, list):
+            raise ValueError('Campo lineas debe ser una lista')
+        proveedor_id = datos.get('proveedor_id')
+        if proveedor_id:
+            proveedor_id = validate_positive_int(proveedor_id, 'proveedor_id')
+        
+        emparejados = EmparejadorItems.emparejar_lineas(db.session, [str(l or '') for l in lineas], proveedor_id=proveedor_id)
+        return success_response([
+            {'linea': linea, 'item_id': item_id, 'puntaje': puntaje}
+            for linea, (item_id, puntaje) in zip(lineas, emparejados)
+        ])
+    except ValueError as e:
+        return error_response(str(e), 400, 'VALIDATION_ERROR')
+    except Exception as e:
+        return error_response(str(e), 500, 'INTERNAL_ERROR')
+
 # ========== RUTAS DE LABELS ==========
 
 @bp.route('/labels', methods=['GET'])
@@ -454,6 +488,79 @@ def aprobar_pedido(pedido_id):
         message='Pedido aprobado. Se enviará automáticamente en 1 hora.'
     )
 
+# ========== RUTAS DE COLA DE TRABAJOS ==========
+
+@bp.route('/trabajos', methods=['GET'])
+def listar_trabajos():
+    """Lista trabajos en segundo plano (pendientes, ejecutando, fallidos...) con resumen por estado."""
+    try:
+        estado = request.args.get('estado')
+        tipo = request.args.get('tipo')
+        skip = validate_positive_int(request.args.get('skip', 0), 'skip')
+        limit = validate_positive_int(request.args.get('limit', 100), 'limit')
+        
+        trabajos = ColaTrabajosService.listar_trabajos(
+            db.session,
+            estado=estado,
+            tipo=tipo,
+            skip=skip,
+            limit=limit
+        )
+        
+        return success_response({
+            'resumen': ColaTrabajosService.resumen_por_estado(db.session),
+            'trabajos': [t.to_dict() for t in trabajos],
+        })
+    except ValueError as e:
+        return error_response(str(e), 400, 'VALIDATION_ERROR')
+    except Exception as e:
+        return error_response(str(e), 500, 'INTERNAL_ERROR')
+
+@bp.route('/trabajos/<int:trabajo_id>/reintentar', methods=['POST'])
+@handle_db_transaction
+def reintentar_trabajo(trabajo_id):
+    """Vuelve a encolar un trabajo fallido."""
+    validate_positive_int(trabajo_id, 'trabajo_id')
+    trabajo = ColaTrabajosService.reintentar(db.session, trabajo_id)
+    return success_response(trabajo.to_dict(), message='Trabajo reencolado correctamente')
+
+@bp.route('/trabajos/programadas', methods=['GET'])
+def listar_tareas_programadas():
+    """Tareas programadas registradas, su última ejecución e historial reciente."""
+    try:
+        # Registra las tareas aunque este proceso no ejecute el programador
+        import modules.logistica.tareas_programadas  # noqa: F401
+        
+        tarea = request.args.get('tarea')
+        estado = request.args.get('estado')
+        skip = validate_positive_int(request.args.get('skip', 0), 'skip')
+        limit = validate_positive_int(request.args.get('limit', 100), 'limit')
+        
+        ultimas = HistorialTareasService.ultimas_por_tarea(db.session)
+        ejecuciones = HistorialTareasService.listar(
+            db.session,
+            tarea=tarea,
+            estado=estado,
+            skip=skip,
+            limit=limit
+        )
+        
+        return success_response({
+            'programador': programador_tareas.programador.estado() if programador_tareas.programador else None,
+            'tareas': [{
+                'nombre': nombre,
+                'descripcion': datos['descripcion'],
+                'trigger': str(datos['trigger']),
+                'historial': datos['historial'],
+                'ultima_ejecucion': ultimas.get(nombre),
+            } for nombre, datos in programador_tareas.tareas_registradas().items()],
+            'ejecuciones': [e.to_dict() for e in ejecuciones],
+        })
+    except ValueError as e:
+        return error_response(str(e), 400, 'VALIDATION_ERROR')
+    except Exception as e:
+        return error_response(str(e), 500, 'INTERNAL_ERROR')
+
 @bp.route('/pedidos/requerimientos-quincenales', methods=['GET'])
 def calcular_requerimientos_quincenales():
     """Calcula requerimientos quincenales basados en programación."""
@@ -503,7 +610,9 @@ def listar_inventario():
         if item_id:
             validate_positive_int(item_id, 'item_id')
         
-        inventario = InventarioService.obtener_inventario(db.session, item_id=item_id)
+        inventario = INVENTARIO_LIST.serializar(
+            InventarioService.consulta_inventario(db.session, item_id=item_id)
+        )
         
         # Si no hay inventario y no hay filtro específico, generar datos mock
         if not inventario and not item_id:
@@ -512,11 +621,13 @@ def listar_inventario():
                 from scripts.init_inventario import init_inventario
                 init_inventario()
                 # Volver a consultar después de crear los mock
-                inventario = InventarioService.obtener_inventario(db.session, item_id=item_id)
+                inventario = INVENTARIO_LIST.serializar(
+                    InventarioService.consulta_inventario(db.session, item_id=item_id)
+                )
             except Exception as mock_error:
                 logging.warning(f"Error generando inventario mock: {str(mock_error)}")
         
-        return success_response([inv.to_dict() for inv in inventario])
+        return success_response(inventario)
     except ValueError as e:
         return error_response(str(e), 400, 'VALIDATION_ERROR')
     except Exception as e:
@@ -572,6 +683,36 @@ def verificar_disponibilidad(item_id):
     except Exception as e:
         return error_response(str(e), 500, 'INTERNAL_ERROR')
 
+@bp.route('/inventario/movimientos', methods=['GET'])
+def listar_movimientos_inventario():
+    """Lista el libro de movimientos de inventario con filtros opcionales."""
+    try:
+        item_id = request.args.get('item_id', type=int)
+        tipo = request.args.get('tipo')
+        origen = request.args.get('origen')
+        fecha_desde = request.args.get('fecha_desde')
+        fecha_hasta = request.args.get('fecha_hasta')
+        skip = validate_positive_int(request.args.get('skip', 0), 'skip')
+        limit = validate_positive_int(request.args.get('limit', 100), 'limit')
+        
+        if item_id:
+            validate_positive_int(item_id, 'item_id')
+        
+        movimientos = MovimientoInventarioService.consulta_movimientos(
+            db.session,
+            item_id=item_id,
+            tipo=tipo,
+            origen=origen,
+            fecha_desde=parse_date(fecha_desde) if fecha_desde else None,
+            fecha_hasta=parse_date(fecha_hasta) if fecha_hasta else None
+        ).offset(skip).limit(limit).all()
+        
+        return paginated_response([m.to_dict() for m in movimientos], skip=skip, limit=limit)
+    except ValueError as e:
+        return error_response(str(e), 400, 'VALIDATION_ERROR')
+    except Exception as e:
+        return error_response(str(e), 500, 'INTERNAL_ERROR')
+
 @bp.route('/inventario/completo', methods=['GET'])
 def obtener_inventario_completo():
     """Obtiene inventario completo con últimos movimientos."""
@@ -934,7 +1075,13 @@ def obtener_ultima_factura():
 @bp.route('/facturas/ingresar-imagen', methods=['POST'])
 @handle_db_transaction
 def ingresar_factura_imagen():
-    """Ingresa una factura desde una imagen usando OCR."""
+    """
+    Ingresa una factura desde una imagen usando OCR.
+    
+    El OCR y la creación de la factura corren en segundo plano: responde 202
+    con el ID de la ingesta, que se consulta en /facturas/ingestas/<id>.
+    Una imagen ya recibida retorna su ingesta existente (duplicada=true).
+    """
     if 'imagen' not in request.files:
         return error_response('No se proporcionó imagen', 400, 'VALIDATION_ERROR')
     
@@ -951,15 +1098,13 @@ def ingresar_factura_imagen():
         return error_response(str(e), 400, 'VALIDATION_ERROR')
     
     try:
-        # Procesar factura
-        factura = FacturaService.procesar_factura_desde_imagen(
-            db.session,
-            temp_path,
-            tipo=tipo
-        )
-        db.session.commit()
+        ingesta, creada = IngestaFacturaService.registrar_carga(db.session, temp_path, tipo=tipo)
         
-        return success_response(factura.to_dict(), 201, 'Factura procesada correctamente')
+        return success_response(
+            {**ingesta.to_dict(), 'ingesta_id': ingesta.id, 'duplicada': not creada},
+            202,
+            'Factura recibida, en procesamiento' if creada else 'Esta imagen ya fue recibida'
+        )
     finally:
         # Eliminar archivo temporal
         if os.path.exists(temp_path):
@@ -968,6 +1113,20 @@ def ingresar_factura_imagen():
             except Exception:
                 pass  # Ignorar errores al eliminar archivo temporal
 
+@bp.route('/facturas/ingestas/<int:ingesta_id>', methods=['GET'])
+def obtener_ingesta_factura(ingesta_id):
+    """Obtiene el estado de una ingesta de factura (etapa, errores y factura creada)."""
+    try:
+        validate_positive_int(ingesta_id, 'ingesta_id')
+        ingesta = IngestaFacturaService.obtener_ingesta(db.session, ingesta_id)
+        if not ingesta:
+            return error_response('Ingesta no encontrada', 404, 'NOT_FOUND')
+        return success_response(ingesta.to_dict())
+    except ValueError as e:
+        return error_response(str(e), 400, 'VALIDATION_ERROR')
+    except Exception as e:
+        return error_response(str(e), 500, 'INTERNAL_ERROR')
+
 @bp.route('/facturas/<int:factura_id>', methods=['GET'])
 def obtener_factura(factura_id):
     """Obtiene una factura por ID."""
@@ -1215,15 +1374,15 @@ def listar_pedidos():
             except Exception as mock_error:
                 logging.warning(f"Error generando pedidos mock: {str(mock_error)}")
         
-        pedidos = PedidoCompraService.listar_pedidos(
-            db.session,
-            proveedor_id=proveedor_id,
-            estado=estado,
-            skip=skip,
-            limit=limit
+        pedidos = PEDIDO_COMPRA_LIST.serializar(
+            PedidoCompraService.consulta_pedidos(
+                db.session,
+                proveedor_id=proveedor_id,
+                estado=estado
+            ).offset(skip).limit(limit)
         )
         
-        return paginated_response([p.to_dict() for p in pedidos], skip=skip, limit=limit)
+        return paginated_response(pedidos, skip=skip, limit=limit)
     except ValueError as e:
         return error_response(str(e), 400, 'VALIDATION_ERROR')
     except Exception as e:
@@ -1273,6 +1432,7 @@ def enviar_pedido(pedido_id):
 # ========== RUTAS DE ESTADÍSTICAS DE COMPRAS ==========
 
 @bp.route('/compras/resumen', methods=['GET'])
+@cachear_respuesta(tags=('pedidos', 'facturas'))
 def resumen_compras():
     """Obtiene resumen general de compras."""
     import logging
@@ -1333,6 +1493,7 @@ def resumen_compras():
     except ValueError as e:
         return error_response(str(e), 400, 'VALIDATION_ERROR')
     except Exception as e:
+        no_cachear_respuesta()
         import logging
         import traceback
         logging.error(f"Error en resumen_compras: {str(e)}")
@@ -1359,6 +1520,7 @@ def resumen_compras():
         return success_response(resumen_default)
 
 @bp.route('/compras/por-item', methods=['GET'])
+@cachear_respuesta(tags=('pedidos', 'facturas'))
 def compras_por_item():
     """Obtiene resumen de compras agrupado por item."""
     import logging
@@ -1404,12 +1566,14 @@ def compras_por_item():
     except ValueError as e:
         return error_response(str(e), 400, 'VALIDATION_ERROR')
     except Exception as e:
+        no_cachear_respuesta()
         logging.error(f"Error en compras_por_item: {str(e)}")
         logging.error(traceback.format_exc())
         # Retornar lista vacía en caso de error
         return success_response([])
 
 @bp.route('/compras/por-proveedor', methods=['GET'])
+@cachear_respuesta(tags=('pedidos', 'facturas'))
 def compras_por_proveedor():
     """Obtiene resumen de compras agrupado por proveedor."""
     import logging
@@ -1455,12 +1619,14 @@ def compras_por_proveedor():
     except ValueError as e:
         return error_response(str(e), 400, 'VALIDATION_ERROR')
     except Exception as e:
+        no_cachear_respuesta()
         logging.error(f"Error en compras_por_proveedor: {str(e)}")
         logging.error(traceback.format_exc())
         # Retornar lista vacía en caso de error
         return success_response([])
 
 @bp.route('/compras/por-proceso', methods=['GET'])
+@cachear_respuesta(tags=('pedidos', 'facturas', 'inventario', 'programacion'))
 def compras_por_proceso():
     """Obtiene estadísticas de compras relacionadas con procesos de inventario y programación."""
     import logging
@@ -1507,6 +1673,7 @@ def compras_por_proceso():
     except ValueError as e:
         return error_response(str(e), 400, 'VALIDATION_ERROR')
     except Exception as e:
+        no_cachear_respuesta()
         import traceback
         logging.error(f"Error en compras_por_proceso: {str(e)}")
         logging.error(traceback.format_exc())
@@ -1632,7 +1799,8 @@ def calcular_costo_item(item_id):
 @handle_db_transaction
 def recalcular_todos_costos():
     """Recalcula todos los costos estandarizados de items y recetas."""
-    estadisticas = CostoService.recalcular_todos_los_costos(db.session)
+    modo = request.args.get('modo', 'lote')
+    estadisticas = CostoService.recalcular_todos_los_costos(db.session, modo=modo)
     db.session.commit()
     return success_response(estadisticas, message='Recálculo completado')
 
@@ -1668,49 +1836,29 @@ def listar_costos_recetas():
         # Agregar eager loading para ingredientes e items relacionados
         from sqlalchemy.orm import selectinload, joinedload
         query = query.options(
-            selectinload(Receta.ingredientes).joinedload('item')
+            selectinload(Receta.ingredientes).joinedload(RecetaIngrediente.item)
         )
         
         recetas = query.order_by(Receta.nombre).offset(skip).limit(limit).all()
         
-        # Recalcular costos antes de retornar (por si acaso)
-        for receta in recetas:
-            try:
-                receta.calcular_totales()
-            except Exception as e:
-                import logging
-                logging.warning(f"Error calculando totales de receta {receta.id}: {str(e)}")
-        
-        # Intentar commit solo si hay cambios, con manejo de errores
-        try:
-            db.session.commit()
-        except Exception as commit_error:
-            import logging
-            logging.warning(f"Error en commit de recetas (continuando sin commit): {str(commit_error)}")
-            db.session.rollback()
+        # Los totales se leen de los rollups persistidos/cacheados: se mantienen al
+        # cambiar recetas o items (rollup_recetas), así el listado nunca recalcula
+        rollups = RollupRecetaService.obtener_rollups(db.session, recetas)
         
         resultado = []
         for receta in recetas:
             try:
                 receta_dict = receta.to_dict()
-                
-                # Contar ingredientes con costo
-                ingredientes_con_costo = 0
-                total_ingredientes = 0
-                if receta.ingredientes:
-                    for ing in receta.ingredientes:
-                        total_ingredientes += 1
-                        if ing.item and ing.item.costo_unitario_actual:
-                            ingredientes_con_costo += 1
+                rollup = rollups[receta.id]
                 
                 # Agregar información adicional de costos
                 receta_dict['costo_info'] = {
-                    'costo_total': float(receta.costo_total) if receta.costo_total else None,
-                    'costo_por_porcion': float(receta.costo_por_porcion) if receta.costo_por_porcion else None,
-                    'porciones': receta.porciones,
-                    'porcion_gramos': float(receta.porcion_gramos) if receta.porcion_gramos else None,
-                    'ingredientes_con_costo': ingredientes_con_costo,
-                    'total_ingredientes': total_ingredientes
+                    'costo_total': rollup['costo_total'],
+                    'costo_por_porcion': rollup['costo_por_porcion'],
+                    'porciones': rollup['porciones'],
+                    'porcion_gramos': rollup['porcion_gramos'],
+                    'ingredientes_con_costo': rollup['ingredientes_con_costo'],
+                    'total_ingredientes': rollup['total_ingredientes']
                 }
                 resultado.append(receta_dict)
             except Exception as e:
@@ -7,8 +7,11 @@ from models import db
 from models.programacion import ProgramacionMenu, ProgramacionMenuItem
 from modules.planificacion.recetas import RecetaService
 from modules.planificacion.programacion import ProgramacionMenuService
+from modules.planificacion.explosion_materiales import ExplosionMaterialesService
+from modules.planificacion.calendario import CalendarioMenuService
 from modules.crm.tickets_automaticos import TicketsAutomaticosService
 from modules.logistica.pedidos_automaticos import PedidosAutomaticosService
+from utils.cache_respuestas import invalidar_tags_post_commit
 from utils.route_helpers import (
     handle_db_transaction, parse_date, require_field,
     validate_positive_int, success_response,
@@ -445,10 +448,76 @@ def eliminar_programacion(programacion_id):
     
     # Eliminar la programación
     db.delete(programacion)
+    invalidar_tags_post_commit(db.session, 'programacion')
     db.session.commit()
     
     return success_response(None, message='Programación eliminada correctamente')
 
+@bp.route('/programacion/necesidades', methods=['GET'])
+def calcular_necesidades_rango():
+    """
+    Calcula las necesidades de items de todas las programaciones de un rango de fechas.
+    
+    Query params: fecha_desde, fecha_hasta, ubicacion (opcional, todas por defecto),
+    agrupar_por (opcional: 'programacion' o 'ubicacion').
+    """
+    try:
+        fecha_desde = parse_date(request.args.get('fecha_desde'))
+        fecha_hasta = parse_date(request.args.get('fecha_hasta'))
+        if not fecha_desde or not fecha_hasta:
+            return error_response('fecha_desde y fecha_hasta son requeridas', 400, 'VALIDATION_ERROR')
+        agrupar_por = request.args.get('agrupar_por')
+        
+        necesidades = ExplosionMaterialesService.calcular_necesidades(
+            db.session,
+            fecha_desde=fecha_desde,
+            fecha_hasta=fecha_hasta,
+            ubicacion=request.args.get('ubicacion'),
+            agrupar_por=agrupar_por
+        )
+        return success_response({
+            'fecha_desde': fecha_desde.isoformat(),
+            'fecha_hasta': fecha_hasta.isoformat(),
+            'agrupar_por': agrupar_por,
+            'necesidades': necesidades
+        })
+    except ValueError as e:
+        return error_response(str(e), 400, 'VALIDATION_ERROR')
+    except Exception as e:
+        return error_response(str(e), 500, 'INTERNAL_ERROR')
+
+@bp.route('/programacion/calendario', methods=['GET'])
+def obtener_calendario_programacion():
+    """
+    Calendario de menús (fecha × ubicación × tiempo de comida) de un rango de fechas.
+
+    Query params: fecha_desde, fecha_hasta (máximo MAX_DIAS_CALENDARIO días),
+    ubicacion y tiempo_comida opcionales.
+    Soporta If-None-Match: si el calendario no cambió responde 304 sin cuerpo.
+    """
+    try:
+        fecha_desde = parse_date(request.args.get('fecha_desde'))
+        fecha_hasta = parse_date(request.args.get('fecha_hasta'))
+        if not fecha_desde or not fecha_hasta:
+            return error_response('fecha_desde y fecha_hasta son requeridas', 400, 'VALIDATION_ERROR')
+
+        calendario = CalendarioMenuService.obtener_calendario(
+            db.session,
+            fecha_desde=fecha_desde,
+            fecha_hasta=fecha_hasta,
+            ubicacion=request.args.get('ubicacion'),
+            tiempo_comida=request.args.get('tiempo_comida')
+        )
+        response = success_response(calendario)
+        response.set_etag(CalendarioMenuService.calcular_etag(calendario))
+        # El cliente puede guardar la respuesta pero debe revalidarla con el ETag
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
+    except ValueError as e:
+        return error_response(str(e), 400, 'VALIDATION_ERROR')
+    except Exception as e:
+        return error_response(str(e), 500, 'INTERNAL_ERROR')
+
 @bp.route('/programacion/<int:programacion_id>/necesidades', methods=['GET'])
 def calcular_necesidades(programacion_id):
     """Calcula las necesidades de items para una programación."""
@@ -6,9 +6,6 @@ from flask import Blueprint, request, jsonify
 from datetime import datetime, timedelta
 from sqlalchemy import func, extract, and_, or_
 from models import db
-from models.factura import Factura, EstadoFactura
-from models.pedido import PedidoCompra
-from models.ticket import Ticket, EstadoTicket
 from models.inventario import Inventario
 from models.charola import Charola
 from models.merma import Merma
@@ -16,12 +13,17 @@ from models.programacion import ProgramacionMenu
 from models.item import Item, CategoriaItem
 from modules.reportes.charolas import CharolaService
 from modules.reportes.mermas import MermaService
+from modules.reportes.kpi_diario import KpiDiarioService
+from modules.reportes.series_tiempo import mermas_por_dia, costo_charolas_por_dia
 from modules.crm.tickets_automaticos import TicketsAutomaticosService
+from modules.serializacion.formas import CHAROLA_LIST, MERMA_LIST
+from utils.cache_respuestas import cachear_respuesta, no_cachear_respuesta
 from utils.route_helpers import (
     handle_db_transaction, parse_date, parse_datetime, require_field,
     validate_positive_int, success_response,
     error_response, paginated_response
 )
+from utils.helpers import filtro_rango_fechas, filtro_dia
 
 bp = Blueprint('reportes', __name__)
 
@@ -41,17 +43,17 @@ def listar_charolas():
         fecha_inicio_obj = parse_date(fecha_inicio) if fecha_inicio else None
         fecha_fin_obj = parse_date(fecha_fin) if fecha_fin else None
         
-        charolas = CharolaService.listar_charolas(
-            db.session,
-            fecha_inicio=fecha_inicio_obj,
-            fecha_fin=fecha_fin_obj,
-            ubicacion=ubicacion,
-            tiempo_comida=tiempo_comida,
-            skip=skip,
-            limit=limit
+        charolas = CHAROLA_LIST.serializar(
+            CharolaService.consulta_charolas(
+                db.session,
+                fecha_inicio=fecha_inicio_obj,
+                fecha_fin=fecha_fin_obj,
+                ubicacion=ubicacion,
+                tiempo_comida=tiempo_comida
+            ).offset(skip).limit(limit)
         )
         
-        return paginated_response([c.to_dict() for c in charolas], skip=skip, limit=limit)
+        return paginated_response(charolas, skip=skip, limit=limit)
     except ValueError as e:
         return error_response(str(e), 400, 'VALIDATION_ERROR')
     except Exception as e:
@@ -142,18 +144,18 @@ def listar_mermas():
         fecha_inicio_obj = parse_date(fecha_inicio) if fecha_inicio else None
         fecha_fin_obj = parse_date(fecha_fin) if fecha_fin else None
         
-        mermas = MermaService.listar_mermas(
-            db.session,
-            fecha_inicio=fecha_inicio_obj,
-            fecha_fin=fecha_fin_obj,
-            item_id=item_id,
-            tipo=tipo,
-            ubicacion=ubicacion,
-            skip=skip,
-            limit=limit
+        mermas = MERMA_LIST.serializar(
+            MermaService.consulta_mermas(
+                db.session,
+                fecha_inicio=fecha_inicio_obj,
+                fecha_fin=fecha_fin_obj,
+                item_id=item_id,
+                tipo=tipo,
+                ubicacion=ubicacion
+            ).offset(skip).limit(limit)
         )
         
-        return paginated_response([m.to_dict() for m in mermas], skip=skip, limit=limit)
+        return paginated_response(mermas, skip=skip, limit=limit)
     except ValueError as e:
         return error_response(str(e), 400, 'VALIDATION_ERROR')
     except Exception as e:
@@ -227,6 +229,7 @@ def obtener_resumen_mermas():
 # ========== RUTAS DE KPIs Y ESTADÍSTICAS ==========
 
 @bp.route('/kpis', methods=['GET'])
+@cachear_respuesta(tags=('facturas', 'pedidos', 'tickets', 'charolas', 'mermas', 'inventario'))
 def obtener_kpis():
     """Obtiene KPIs principales del dashboard."""
     import logging
@@ -260,95 +263,45 @@ def obtener_kpis():
         else:
             fecha_fin_date = fecha_fin
         
-        fecha_inicio_dt = datetime.combine(fecha_inicio_date, datetime.min.time())
-        fecha_fin_dt = datetime.combine(fecha_fin_date, datetime.max.time())
-        
         # KPIs principales
         kpis = {}
         
-        # 1. Facturas
-        try:
-            facturas_totales = db.session.query(func.count(Factura.id)).filter(
-                Factura.fecha_recepcion >= fecha_inicio_dt,
-                Factura.fecha_recepcion <= fecha_fin_dt
-            ).scalar() or 0
-            
-            facturas_pendientes = db.session.query(func.count(Factura.id)).filter(
-                Factura.estado == EstadoFactura.PENDIENTE
-            ).scalar() or 0
-            
-            facturas_aprobadas = db.session.query(func.count(Factura.id)).filter(
-                Factura.estado == EstadoFactura.APROBADA,
-                Factura.fecha_recepcion >= fecha_inicio_dt,
-                Factura.fecha_recepcion <= fecha_fin_dt
-            ).scalar() or 0
-            
-            total_facturado = db.session.query(func.coalesce(func.sum(Factura.total), 0)).filter(
-                Factura.estado == EstadoFactura.APROBADA,
-                Factura.fecha_recepcion >= fecha_inicio_dt,
-                Factura.fecha_recepcion <= fecha_fin_dt
-            ).scalar() or 0
-        except Exception as facturas_error:
-            logging.warning(f"Error en consulta de facturas: {str(facturas_error)}")
-            facturas_totales = 0
-            facturas_pendientes = 0
-            facturas_aprobadas = 0
-            total_facturado = 0.0
-        
-        # 2. Pedidos
-        pedidos_totales = db.session.query(func.count(PedidoCompra.id)).filter(
-            PedidoCompra.fecha_pedido >= fecha_inicio_dt,
-            PedidoCompra.fecha_pedido <= fecha_fin_dt
-        ).scalar() or 0
-        
-        pedidos_pendientes = db.session.query(func.count(PedidoCompra.id)).filter(
-            PedidoCompra.estado.in_(['borrador', 'enviado']),
-            PedidoCompra.fecha_pedido >= fecha_inicio_dt,
-            PedidoCompra.fecha_pedido <= fecha_fin_dt
-        ).scalar() or 0
+        # Agregados diarios: una consulta sobre kpi_diario en lugar de una por métrica
+        totales = KpiDiarioService.obtener_totales(db.session, fecha_inicio_date, fecha_fin_date)
         
-        total_pedidos = db.session.query(func.coalesce(func.sum(PedidoCompra.total), 0)).filter(
-            PedidoCompra.fecha_pedido >= fecha_inicio_dt,
-            PedidoCompra.fecha_pedido <= fecha_fin_dt
-        ).scalar() or 0
+        def sumar(metrica, campo='conteo', dimensiones=None):
+            return sum(
+                valores[campo] for dimension, valores in totales.get(metrica, {}).items()
+                if dimensiones is None or dimension in dimensiones
+            )
         
-        # 3. Tickets
-        tickets_abiertos = db.session.query(func.count(Ticket.id)).filter(
-            Ticket.estado == EstadoTicket.ABIERTO
-        ).scalar() or 0
+        # 1. Facturas (pendientes: todas, sin importar la fecha)
+        facturas_totales = sumar('facturas')
+        facturas_pendientes = sumar('facturas', 'conteo_historico', ('pendiente',))
+        facturas_aprobadas = sumar('facturas', dimensiones=('aprobada',))
+        total_facturado = sumar('facturas', 'total', ('aprobada',))
         
-        tickets_totales = db.session.query(func.count(Ticket.id)).filter(
-            Ticket.fecha_creacion >= fecha_inicio_dt,
-            Ticket.fecha_creacion <= fecha_fin_dt
-        ).scalar() or 0
+        # 2. Pedidos
+        pedidos_totales = sumar('pedidos')
+        pedidos_pendientes = sumar('pedidos', dimensiones=('borrador', 'enviado'))
+        total_pedidos = sumar('pedidos', 'total')
         
-        tickets_resueltos = db.session.query(func.count(Ticket.id)).filter(
-            Ticket.estado == EstadoTicket.RESUELTO,
-            Ticket.fecha_creacion >= fecha_inicio_dt,
-            Ticket.fecha_creacion <= fecha_fin_dt
-        ).scalar() or 0
+        # 3. Tickets (abiertos: todos, sin importar la fecha)
+        tickets_abiertos = sumar('tickets', 'conteo_historico', ('abierto',))
+        tickets_totales = sumar('tickets')
+        tickets_resueltos = sumar('tickets', dimensiones=('resuelto',))
         
-        # 4. Inventario
+        # 4. Inventario (foto actual, no es una serie diaria)
         items_stock_bajo = db.session.query(func.count(Inventario.id)).filter(
             Inventario.cantidad_actual <= Inventario.cantidad_minima
         ).scalar() or 0
         
         # 5. Charolas
-        charolas_totales = db.session.query(func.count(Charola.id)).filter(
-            func.date(Charola.fecha_servicio) >= fecha_inicio_date,
-            func.date(Charola.fecha_servicio) <= fecha_fin_date
-        ).scalar() or 0
+        charolas_totales = sumar('charolas')
         
         # 6. Mermas
-        mermas_totales = db.session.query(func.count(Merma.id)).filter(
-            func.date(Merma.fecha_merma) >= fecha_inicio_date,
-            func.date(Merma.fecha_merma) <= fecha_fin_date
-        ).scalar() or 0
-        
-        total_mermas = db.session.query(func.coalesce(func.sum(Merma.cantidad * Merma.costo_unitario), 0)).filter(
-            func.date(Merma.fecha_merma) >= fecha_inicio_date,
-            func.date(Merma.fecha_merma) <= fecha_fin_date
-        ).scalar() or 0
+        mermas_totales = sumar('mermas')
+        total_mermas = sumar('mermas', 'total')
         
         # Siempre generar datos mock si los valores son muy bajos o cero
         # Esto asegura que siempre haya datos visibles en el dashboard
@@ -362,6 +315,7 @@ def obtener_kpis():
         )
         
         if not tiene_datos_suficientes:
+            no_cachear_respuesta()
             # Generar datos mock realistas
             # Facturas mock
             facturas_totales = random.randint(25, 55)
@@ -391,6 +345,7 @@ def obtener_kpis():
         
         # Asegurar valores mínimos incluso si hay algunos datos reales pero muy pocos
         if facturas_totales == 0 or facturas_totales < 5:
+            no_cachear_respuesta()
             facturas_totales = random.randint(20, 50)
             facturas_pendientes = random.randint(2, 8)
             facturas_aprobadas = facturas_totales - facturas_pendientes
@@ -398,23 +353,28 @@ def obtener_kpis():
                 total_facturado = random.uniform(60000, 160000)
         
         if pedidos_totales == 0 or pedidos_totales < 5:
+            no_cachear_respuesta()
             pedidos_totales = random.randint(15, 35)
             pedidos_pendientes = random.randint(2, 7)
             if total_pedidos == 0 or total_pedidos < 1000:
                 total_pedidos = random.uniform(35000, 95000)
         
         if tickets_totales == 0 or tickets_totales < 5:
+            no_cachear_respuesta()
             tickets_abiertos = random.randint(4, 14)
             tickets_totales = random.randint(25, 60)
             tickets_resueltos = tickets_totales - tickets_abiertos
         
         if items_stock_bajo == 0:
+            no_cachear_respuesta()
             items_stock_bajo = random.randint(2, 9)
         
         if charolas_totales == 0 or charolas_totales < 10:
+            no_cachear_respuesta()
             charolas_totales = dias_periodo * random.randint(40, 65)
         
         if mermas_totales == 0 or mermas_totales < 5:
+            no_cachear_respuesta()
             mermas_totales = random.randint(20, 65)
             if total_mermas == 0 or total_mermas < 500:
                 total_mermas = random.uniform(2500, 7000)
@@ -457,6 +417,7 @@ def obtener_kpis():
         logging.error(f"Error de validación en obtener_kpis: {str(e)}")
         return error_response(str(e), 400, 'VALIDATION_ERROR')
     except Exception as e:
+        no_cachear_respuesta()
         error_trace = traceback.format_exc()
         logging.error(f"Error en obtener_kpis: {str(e)}")
         logging.error(error_trace)
@@ -481,6 +442,7 @@ def obtener_kpis():
             return error_response(f'Error crítico: {str(e)}', 500, 'INTERNAL_ERROR')
 
 @bp.route('/kpis/graficos', methods=['GET'])
+@cachear_respuesta(tags=('facturas', 'pedidos', 'tickets', 'mermas'))
 def obtener_datos_graficos():
     """Obtiene datos para gráficos del dashboard."""
     import logging
@@ -512,76 +474,40 @@ def obtener_datos_graficos():
         else:
             fecha_fin_date = fecha_fin
         
-        fecha_inicio_dt = datetime.combine(fecha_inicio_date, datetime.min.time())
-        fecha_fin_dt = datetime.combine(fecha_fin_date, datetime.max.time())
-        
         datos = {}
         
         if tipo_grafico == 'facturas':
-            # Gráfico de facturas por día
+            # Gráfico de facturas por día (aprobadas) y por estado, desde kpi_diario
             try:
-                facturas_diarias = db.session.query(
-                    func.date(Factura.fecha_recepcion).label('fecha'),
-                    func.count(Factura.id).label('cantidad'),
-                    func.coalesce(func.sum(Factura.total), 0).label('total')
-                ).filter(
-                    Factura.fecha_recepcion >= fecha_inicio_dt,
-                    Factura.fecha_recepcion <= fecha_fin_dt,
-                    Factura.estado == EstadoFactura.APROBADA
-                ).group_by(func.date(Factura.fecha_recepcion)).order_by('fecha').all()
+                grafico = KpiDiarioService.obtener_grafico(
+                    db.session, 'facturas', fecha_inicio_date, fecha_fin_date, dimensiones_serie=('aprobada',)
+                )
             except Exception as query_error:
+                no_cachear_respuesta()
                 logging.warning(f"Error en consulta de facturas diarias: {str(query_error)}")
-                facturas_diarias = []
+                grafico = {'series': [], 'por_dimension': []}
             
             datos['series'] = [
                 {
-                    'fecha': row.fecha.isoformat() if row.fecha else None,
-                    'cantidad': row.cantidad,
-                    'total': float(row.total)
+                    'fecha': fila['fecha'].isoformat(),
+                    'cantidad': fila['conteo'],
+                    'total': fila['total']
                 }
-                for row in facturas_diarias
+                for fila in grafico['series']
             ]
             
-            # Facturas por estado
-            try:
-                facturas_por_estado = db.session.query(
-                    Factura.estado,
-                    func.count(Factura.id).label('cantidad')
-                ).filter(
-                    Factura.fecha_recepcion >= fecha_inicio_dt,
-                    Factura.fecha_recepcion <= fecha_fin_dt
-                ).group_by(Factura.estado).all()
-            except Exception as query_error:
-                logging.warning(f"Error en consulta de facturas por estado: {str(query_error)}")
-                facturas_por_estado = []
-            
-            datos['por_estado'] = []
-            for row in facturas_por_estado:
-                try:
-                    estado_value = None
-                    if row.estado:
-                        if hasattr(row.estado, 'value'):
-                            estado_value = row.estado.value
-                        elif hasattr(row.estado, 'name'):
-                            estado_value = row.estado.name.lower()
-                        else:
-                            estado_value = str(row.estado)
-                    else:
-                        estado_value = 'desconocido'
-                    
-                    datos['por_estado'].append({
-                        'estado': estado_value,
-                        'cantidad': int(row.cantidad) if row.cantidad else 0
-                    })
-                except Exception as e:
-                    import logging
-                    logging.warning(f"Error procesando estado de factura: {str(e)}")
-                    continue
+            datos['por_estado'] = [
+                {
+                    'estado': fila['dimension'] or 'desconocido',
+                    'cantidad': fila['conteo']
+                }
+                for fila in grafico['por_dimension']
+            ]
             
             # Si no hay datos suficientes, generar datos mock
             if len(datos['series']) < 3:
+                no_cachear_respuesta()
                 import random
-                import math
                 base_date = fecha_inicio_date
                 current_date = base_date
                 cantidad_base = 2
@@ -624,6 +550,7 @@ def obtener_datos_graficos():
             
             # Si no hay datos por estado, generar mock
             if len(datos['por_estado']) == 0:
+                no_cachear_respuesta()
                 import random
                 total_facturas = sum(item['cantidad'] for item in datos['series'])
                 datos['por_estado'] = [
@@ -634,54 +561,35 @@ def obtener_datos_graficos():
                 ]
             
         elif tipo_grafico == 'pedidos':
-            # Gráfico de pedidos por día
+            # Gráfico de pedidos por día y por estado, desde kpi_diario
             try:
-                pedidos_diarios = db.session.query(
-                    func.date(PedidoCompra.fecha_pedido).label('fecha'),
-                    func.count(PedidoCompra.id).label('cantidad'),
-                    func.coalesce(func.sum(PedidoCompra.total), 0).label('total')
-                ).filter(
-                    PedidoCompra.fecha_pedido >= fecha_inicio_dt,
-                    PedidoCompra.fecha_pedido <= fecha_fin_dt
-                ).group_by(func.date(PedidoCompra.fecha_pedido)).order_by('fecha').all()
+                grafico = KpiDiarioService.obtener_grafico(db.session, 'pedidos', fecha_inicio_date, fecha_fin_date)
             except Exception as query_error:
+                no_cachear_respuesta()
                 logging.warning(f"Error en consulta de pedidos diarios: {str(query_error)}")
-                pedidos_diarios = []
+                grafico = {'series': [], 'por_dimension': []}
             
             datos['series'] = [
                 {
-                    'fecha': row.fecha.isoformat() if row.fecha else None,
-                    'cantidad': row.cantidad,
-                    'total': float(row.total)
+                    'fecha': fila['fecha'].isoformat(),
+                    'cantidad': fila['conteo'],
+                    'total': fila['total']
                 }
-                for row in pedidos_diarios
+                for fila in grafico['series']
             ]
             
-            # Pedidos por estado
-            try:
-                pedidos_por_estado = db.session.query(
-                    PedidoCompra.estado,
-                    func.count(PedidoCompra.id).label('cantidad')
-                ).filter(
-                    PedidoCompra.fecha_pedido >= fecha_inicio_dt,
-                    PedidoCompra.fecha_pedido <= fecha_fin_dt
-                ).group_by(PedidoCompra.estado).all()
-            except Exception as query_error:
-                logging.warning(f"Error en consulta de pedidos por estado: {str(query_error)}")
-                pedidos_por_estado = []
-            
             datos['por_estado'] = [
                 {
-                    'estado': row.estado,
-                    'cantidad': row.cantidad
+                    'estado': fila['dimension'],
+                    'cantidad': fila['conteo']
                 }
-                for row in pedidos_por_estado
+                for fila in grafico['por_dimension']
             ]
             
             # Si no hay datos suficientes, generar datos mock
             if len(datos['series']) < 3:
+                no_cachear_respuesta()
                 import random
-                import math
                 base_date = fecha_inicio_date
                 current_date = base_date
                 cantidad_base = 1
@@ -724,6 +632,7 @@ def obtener_datos_graficos():
             
             # Si no hay datos por estado, generar mock
             if len(datos['por_estado']) == 0:
+                no_cachear_respuesta()
                 import random
                 total_pedidos = sum(item['cantidad'] for item in datos['series'])
                 datos['por_estado'] = [
@@ -734,52 +643,34 @@ def obtener_datos_graficos():
                 ]
             
         elif tipo_grafico == 'tickets':
-            # Gráfico de tickets por día
+            # Gráfico de tickets por día y por estado, desde kpi_diario
             try:
-                tickets_diarios = db.session.query(
-                    func.date(Ticket.fecha_creacion).label('fecha'),
-                    func.count(Ticket.id).label('cantidad')
-                ).filter(
-                    Ticket.fecha_creacion >= fecha_inicio_dt,
-                    Ticket.fecha_creacion <= fecha_fin_dt
-                ).group_by(func.date(Ticket.fecha_creacion)).order_by('fecha').all()
+                grafico = KpiDiarioService.obtener_grafico(db.session, 'tickets', fecha_inicio_date, fecha_fin_date)
             except Exception as query_error:
+                no_cachear_respuesta()
                 logging.warning(f"Error en consulta de tickets diarios: {str(query_error)}")
-                tickets_diarios = []
+                grafico = {'series': [], 'por_dimension': []}
             
             datos['series'] = [
                 {
-                    'fecha': row.fecha.isoformat() if row.fecha else None,
-                    'cantidad': row.cantidad
+                    'fecha': fila['fecha'].isoformat(),
+                    'cantidad': fila['conteo']
                 }
-                for row in tickets_diarios
+                for fila in grafico['series']
             ]
             
-            # Tickets por estado
-            try:
-                tickets_por_estado = db.session.query(
-                    Ticket.estado,
-                    func.count(Ticket.id).label('cantidad')
-                ).filter(
-                    Ticket.fecha_creacion >= fecha_inicio_dt,
-                    Ticket.fecha_creacion <= fecha_fin_dt
-                ).group_by(Ticket.estado).all()
-            except Exception as query_error:
-                logging.warning(f"Error en consulta de tickets por estado: {str(query_error)}")
-                tickets_por_estado = []
-            
             datos['por_estado'] = [
                 {
-                    'estado': row.estado.value if hasattr(row.estado, 'value') else str(row.estado),
-                    'cantidad': row.cantidad
+                    'estado': fila['dimension'],
+                    'cantidad': fila['conteo']
                 }
-                for row in tickets_por_estado
+                for fila in grafico['por_dimension']
             ]
             
             # Si no hay datos suficientes, generar datos mock
             if len(datos['series']) < 3:
+                no_cachear_respuesta()
                 import random
-                import math
                 base_date = fecha_inicio_date
                 current_date = base_date
                 cantidad_base = 3
@@ -819,6 +710,7 @@ def obtener_datos_graficos():
             
             # Si no hay datos por estado, generar mock
             if len(datos['por_estado']) == 0:
+                no_cachear_respuesta()
                 import random
                 total_tickets = sum(item['cantidad'] for item in datos['series'])
                 datos['por_estado'] = [
@@ -829,56 +721,36 @@ def obtener_datos_graficos():
                 ]
             
         elif tipo_grafico == 'mermas':
-            # Gráfico de mermas por día
+            # Gráfico de mermas por día y por tipo, desde kpi_diario
             try:
-                mermas_diarias = db.session.query(
-                    func.date(Merma.fecha_merma).label('fecha'),
-                    func.coalesce(func.sum(Merma.cantidad), 0).label('peso'),  # Sumar cantidad como peso (kg)
-                    func.coalesce(func.sum(Merma.cantidad * Merma.costo_unitario), 0).label('total_costo')
-                ).filter(
-                    func.date(Merma.fecha_merma) >= fecha_inicio_date,
-                    func.date(Merma.fecha_merma) <= fecha_fin_date
-                ).group_by(func.date(Merma.fecha_merma)).order_by('fecha').all()
+                grafico = KpiDiarioService.obtener_grafico(db.session, 'mermas', fecha_inicio_date, fecha_fin_date)
             except Exception as query_error:
+                no_cachear_respuesta()
                 logging.warning(f"Error en consulta de mermas diarias: {str(query_error)}")
-                mermas_diarias = []
+                grafico = {'series': [], 'por_dimension': []}
             
             datos['series'] = [
                 {
-                    'fecha': row.fecha.isoformat() if row.fecha else None,
-                    'peso': float(row.peso or 0),  # Peso en kg
-                    'total_costo': float(row.total_costo)
+                    'fecha': fila['fecha'].isoformat(),
+                    'peso': fila['cantidad'],  # Peso en kg
+                    'total_costo': fila['total']
                 }
-                for row in mermas_diarias
+                for fila in grafico['series']
             ]
             
-            # Mermas por tipo
-            try:
-                mermas_por_tipo = db.session.query(
-                    Merma.tipo,
-                    func.coalesce(func.sum(Merma.cantidad), 0).label('peso'),  # Sumar cantidad como peso
-                    func.coalesce(func.sum(Merma.cantidad * Merma.costo_unitario), 0).label('total_costo')
-                ).filter(
-                    func.date(Merma.fecha_merma) >= fecha_inicio_date,
-                    func.date(Merma.fecha_merma) <= fecha_fin_date
-                ).group_by(Merma.tipo).all()
-            except Exception as query_error:
-                logging.warning(f"Error en consulta de mermas por tipo: {str(query_error)}")
-                mermas_por_tipo = []
-            
             datos['por_tipo'] = [
                 {
-                    'tipo': row.tipo.value if hasattr(row.tipo, 'value') else str(row.tipo),
-                    'peso': float(row.peso or 0),  # Peso en kg
-                    'total_costo': float(row.total_costo)
+                    'tipo': fila['dimension'],
+                    'peso': fila['cantidad'],  # Peso en kg
+                    'total_costo': fila['total']
                 }
-                for row in mermas_por_tipo
+                for fila in grafico['por_dimension']
             ]
             
             # Si no hay datos suficientes, generar datos mock
             if len(datos['series']) < 3:
+                no_cachear_respuesta()
                 import random
-                import math
                 base_date = fecha_inicio_date
                 current_date = base_date
                 peso_base = 12.5  # Peso base en kg
@@ -922,6 +794,7 @@ def obtener_datos_graficos():
             
             # Si no hay datos por tipo, generar mock
             if len(datos['por_tipo']) == 0:
+                no_cachear_respuesta()
                 import random
                 total_peso = sum(item['peso'] for item in datos['series'])
                 total_costo_mermas = sum(item['total_costo'] for item in datos['series'])
@@ -950,6 +823,7 @@ def obtener_datos_graficos():
         return success_response(datos_fallback)
 
 @bp.route('/kpis/charolas-comparacion', methods=['GET'])
+@cachear_respuesta(tags=('charolas', 'programacion'))
 def obtener_comparacion_charolas():
     """Obtiene comparación de charolas programadas vs servidas."""
     import logging
@@ -989,6 +863,7 @@ def obtener_comparacion_charolas():
                 ProgramacionMenu.fecha_desde <= fecha_fin_date
             ).group_by(func.date(ProgramacionMenu.fecha_desde)).order_by('fecha').all()
         except Exception as query_error:
+            no_cachear_respuesta()
             logging.warning(f"Error en consulta de charolas programadas: {str(query_error)}")
             charolas_programadas = []
         
@@ -998,10 +873,10 @@ def obtener_comparacion_charolas():
                 func.date(Charola.fecha_servicio).label('fecha'),
                 func.count(Charola.id).label('servidas')
             ).filter(
-                func.date(Charola.fecha_servicio) >= fecha_inicio_date,
-                func.date(Charola.fecha_servicio) <= fecha_fin_date
+                filtro_rango_fechas(Charola.fecha_servicio, fecha_inicio_date, fecha_fin_date)
             ).group_by(func.date(Charola.fecha_servicio)).order_by('fecha').all()
         except Exception as query_error:
+            no_cachear_respuesta()
             logging.warning(f"Error en consulta de charolas servidas: {str(query_error)}")
             charolas_servidas = []
         
@@ -1030,6 +905,7 @@ def obtener_comparacion_charolas():
         # Siempre generar datos mock para todos los días del período si hay menos de 7 días con datos o si está vacío
         # Esto asegura que siempre haya datos visibles en días anteriores
         if len(series) < 7 or len(series) == 0:
+            no_cachear_respuesta()
             # Si hay datos reales, crear diccionario para reemplazar después
             datos_reales_dict = {item['fecha']: item for item in series}
             # Limpiar series para generar datos mock completos
@@ -1120,6 +996,7 @@ def obtener_comparacion_charolas():
         
         # Asegurar que siempre haya datos: si después de todo el procesamiento no hay datos, generar mock completo
         if len(series) == 0:
+            no_cachear_respuesta()
             import random
             import math
             base_date = fecha_inicio_date
@@ -1233,6 +1110,7 @@ def obtener_comparacion_charolas():
         return error_response(f'{str(e)}\n{error_trace}', 500, 'INTERNAL_ERROR')
 
 @bp.route('/kpis/mermas-detalle', methods=['GET'])
+@cachear_respuesta(tags=('mermas',))
 def obtener_mermas_detalle():
     """Obtiene datos detallados de mermas con datos mock si es necesario."""
     try:
@@ -1267,10 +1145,10 @@ def obtener_mermas_detalle():
                 func.coalesce(func.sum(Merma.cantidad), 0).label('peso'),  # Sumar cantidad como peso (kg)
                 func.coalesce(func.sum(Merma.cantidad * Merma.costo_unitario), 0).label('total_costo')
             ).filter(
-                func.date(Merma.fecha_merma) >= fecha_inicio_date,
-                func.date(Merma.fecha_merma) <= fecha_fin_date
+                filtro_rango_fechas(Merma.fecha_merma, fecha_inicio_date, fecha_fin_date)
             ).group_by(func.date(Merma.fecha_merma)).order_by('fecha').all()
         except Exception as query_error:
+            no_cachear_respuesta()
             logging.warning(f"Error en consulta de mermas diarias: {str(query_error)}")
             mermas_diarias = []
         
@@ -1286,8 +1164,8 @@ def obtener_mermas_detalle():
         
         # Si no hay datos o muy pocos datos, generar datos mock con una secuencia interesante
         if len(series) < 3:
+            no_cachear_respuesta()
             import random
-            import math
             base_date = fecha_inicio_date
             current_date = base_date
             peso_base = 12.5  # Peso base en kg
@@ -1346,10 +1224,10 @@ def obtener_mermas_detalle():
                 func.coalesce(func.sum(Merma.cantidad), 0).label('peso'),  # Sumar cantidad como peso
                 func.coalesce(func.sum(Merma.cantidad * Merma.costo_unitario), 0).label('total_costo')
             ).filter(
-                func.date(Merma.fecha_merma) >= fecha_inicio_date,
-                func.date(Merma.fecha_merma) <= fecha_fin_date
+                filtro_rango_fechas(Merma.fecha_merma, fecha_inicio_date, fecha_fin_date)
             ).group_by(Merma.tipo).all()
         except Exception as query_error:
+            no_cachear_respuesta()
             logging.warning(f"Error en consulta de mermas por tipo: {str(query_error)}")
             mermas_por_tipo = []
         
@@ -1364,6 +1242,7 @@ def obtener_mermas_detalle():
         
         # Si no hay datos por tipo, generar datos mock
         if len(por_tipo) == 0:
+            no_cachear_respuesta()
             tipos_mock = [
                 {'tipo': 'vencimiento', 'peso': 0, 'total_costo': 0},
                 {'tipo': 'deterioro', 'peso': 0, 'total_costo': 0},
@@ -1416,6 +1295,7 @@ def obtener_mermas_detalle():
         return error_response(f'{str(e)}\n{traceback.format_exc()}', 500, 'INTERNAL_ERROR')
 
 @bp.route('/kpis/costo-charola-servicio', methods=['GET'])
+@cachear_respuesta(tags=('charolas',))
 def obtener_costo_charola_por_servicio():
     """Obtiene costo por charola por servicio (desayuno, almuerzo, cena) con costo ideal."""
     try:
@@ -1451,8 +1331,7 @@ def obtener_costo_charola_por_servicio():
             func.sum(Charola.costo_total).label('costo_total'),
             func.avg(Charola.personas_servidas).label('personas_promedio')
         ).filter(
-            func.date(Charola.fecha_servicio) >= fecha_inicio_date,
-            func.date(Charola.fecha_servicio) <= fecha_fin_date
+            filtro_rango_fechas(Charola.fecha_servicio, fecha_inicio_date, fecha_fin_date)
         ).group_by(Charola.tiempo_comida).all()
         
         # Procesar datos reales
@@ -1479,8 +1358,8 @@ def obtener_costo_charola_por_servicio():
         tiene_datos_suficientes = len(datos_por_servicio) >= 2
         
         if not tiene_datos_suficientes:
+            no_cachear_respuesta()
             import random
-            import math
             
             # Costos base ideales por servicio (en pesos/dólares)
             costos_base_ideales = {
@@ -1563,8 +1442,10 @@ def obtener_costo_charola_por_servicio():
         return error_response(f'{str(e)}\n{traceback.format_exc()}', 500, 'INTERNAL_ERROR')
 
 @bp.route('/kpis/mermas-por-dia-tolerable', methods=['GET'])
+@cachear_respuesta(tags=('mermas', 'charolas'))
 def obtener_mermas_por_dia_tolerable():
     """Obtiene mermas por día con porcentaje tolerable como referencia."""
+    import logging
     try:
         fecha_inicio_str = request.args.get('fecha_inicio')
         fecha_fin_str = request.args.get('fecha_fin')
@@ -1592,68 +1473,47 @@ def obtener_mermas_por_dia_tolerable():
         else:
             fecha_fin_date = fecha_fin
         
-        # Obtener mermas por día
+        # Mermas y costo de charolas por día: dos consultas agrupadas para todo el rango
         try:
-            mermas_diarias = db.session.query(
-                func.date(Merma.fecha_merma).label('fecha'),
-                func.count(Merma.id).label('cantidad'),
-                func.coalesce(func.sum(Merma.cantidad * Merma.costo_unitario), 0).label('total_costo')
-            ).filter(
-                func.date(Merma.fecha_merma) >= fecha_inicio_date,
-                func.date(Merma.fecha_merma) <= fecha_fin_date
-            ).group_by(func.date(Merma.fecha_merma)).order_by('fecha').all()
+            mermas_diarias = mermas_por_dia(db.session, fecha_inicio_date, fecha_fin_date)
         except Exception as mermas_error:
+            no_cachear_respuesta()
             logging.warning(f"Error en consulta de mermas diarias: {str(mermas_error)}")
-            mermas_diarias = []
+            mermas_diarias = {}
         
-        # Obtener costo total de charolas en el mismo período para calcular porcentaje
         try:
-            costo_total_charolas = db.session.query(
-                func.coalesce(func.sum(Charola.costo_total), 0)
-            ).filter(
-                func.date(Charola.fecha_servicio) >= fecha_inicio_date,
-                func.date(Charola.fecha_servicio) <= fecha_fin_date
-            ).scalar() or 0
+            costo_charolas_diario = costo_charolas_por_dia(db.session, fecha_inicio_date, fecha_fin_date)
         except Exception as charolas_error:
-            logging.warning(f"Error en consulta de costo total charolas: {str(charolas_error)}")
-            costo_total_charolas = 0
+            no_cachear_respuesta()
+            logging.warning(f"Error en consulta de costo de charolas por día: {str(charolas_error)}")
+            costo_charolas_diario = {}
+        costo_total_charolas = sum(costo_charolas_diario.values())
         
         # Procesar datos reales
         datos_reales_por_fecha = {}
         costo_total_periodo = 0
         
-        for row in mermas_diarias:
-            if row.fecha:
-                fecha_key = row.fecha.isoformat()
-                costo_dia = float(row.total_costo or 0)
-                costo_total_periodo += costo_dia
-                
-                # Obtener costo de charolas del día para calcular porcentaje
-                try:
-                    costo_charolas_dia = db.session.query(
-                        func.coalesce(func.sum(Charola.costo_total), 0)
-                    ).filter(
-                        func.date(Charola.fecha_servicio) == row.fecha
-                    ).scalar() or 0
-                except Exception as charolas_dia_error:
-                    logging.warning(f"Error en consulta de costo charolas día {row.fecha}: {str(charolas_dia_error)}")
-                    costo_charolas_dia = 0
-                
-                porcentaje_dia = (costo_dia / costo_charolas_dia * 100) if costo_charolas_dia > 0 else 0
-                
-                datos_reales_por_fecha[fecha_key] = {
-                    'fecha': fecha_key,
-                    'cantidad': int(row.cantidad or 0),
-                    'total_costo': round(costo_dia, 2),
-                    'porcentaje': round(porcentaje_dia, 2),
-                    'costo_charolas_dia': round(float(costo_charolas_dia), 2)
-                }
+        for (fecha_key, _), valores in mermas_diarias.items():
+            costo_dia = valores['costo']
+            costo_total_periodo += costo_dia
+            
+            # Costo de charolas del día para calcular porcentaje
+            costo_charolas_dia = costo_charolas_diario.get((fecha_key, None), 0)
+            porcentaje_dia = (costo_dia / costo_charolas_dia * 100) if costo_charolas_dia > 0 else 0
+            
+            datos_reales_por_fecha[fecha_key] = {
+                'fecha': fecha_key,
+                'cantidad': int(valores['cantidad']),
+                'total_costo': round(costo_dia, 2),
+                'porcentaje': round(porcentaje_dia, 2),
+                'costo_charolas_dia': round(float(costo_charolas_dia), 2)
+            }
         
         # Siempre generar datos mock si no hay suficientes datos
         # Esto asegura que siempre haya datos visibles en el gráfico
         if len(datos_reales_por_fecha) < 3:
+            no_cachear_respuesta()
             import random
-            import math
             base_date = fecha_inicio_date
             current_date = base_date
             cantidad_base = 8
@@ -1725,7 +1585,6 @@ def obtener_mermas_por_dia_tolerable():
         # Asegurar que siempre haya datos para todos los días del período
         if len(series) == 0:
             import random
-            import math
             base_date = fecha_inicio_date
             current_date = base_date
             cantidad_base = 8
@@ -1795,6 +1654,13 @@ def obtener_mermas_por_dia_tolerable():
         # Encontrar día con más mermas
         dia_max = max(series, key=lambda x: x['total_costo']) if series else None
         
+        def obtener_costo_charolas_dia(fecha_dia):
+            """Costo de charolas de un día: de la serie si está en el rango, si no una consulta."""
+            if fecha_inicio_date <= fecha_dia <= fecha_fin_date:
+                return costo_charolas_diario.get((fecha_dia.isoformat(), None), 0)
+            serie = costo_charolas_por_dia(db.session, fecha_dia, fecha_dia)
+            return serie.get((fecha_dia.isoformat(), None), 0)
+        
         # Si se solicita datos de productos para una fecha específica
         productos_por_fecha = {}
         if fecha_seleccionada:
@@ -1812,17 +1678,14 @@ def obtener_mermas_por_dia_tolerable():
                 ).join(
                     Item, Merma.item_id == Item.id
                 ).filter(
-                    func.date(Merma.fecha_merma) == fecha_seleccionada_date
+                    filtro_dia(Merma.fecha_merma, fecha_seleccionada_date)
                 ).group_by(Merma.item_id, Item.nombre).all()
                 
                 # Obtener costo de charolas del día para calcular porcentaje
                 try:
-                    costo_charolas_dia = db.session.query(
-                        func.coalesce(func.sum(Charola.costo_total), 0)
-                    ).filter(
-                        func.date(Charola.fecha_servicio) == fecha_seleccionada_date
-                    ).scalar() or 0
+                    costo_charolas_dia = obtener_costo_charolas_dia(fecha_seleccionada_date)
                 except Exception:
+                    no_cachear_respuesta()
                     costo_charolas_dia = 800.0  # Valor mock por defecto
                 
                 productos = []
@@ -1844,11 +1707,13 @@ def obtener_mermas_por_dia_tolerable():
                 
                 productos_por_fecha[fecha_seleccionada] = productos
             except Exception as productos_error:
+                no_cachear_respuesta()
                 logging.warning(f"Error obteniendo productos por fecha: {str(productos_error)}")
                 productos_por_fecha[fecha_seleccionada] = []
         
         # Si no hay productos reales o se necesita mock data, generarlos
         if fecha_seleccionada and (not productos_por_fecha.get(fecha_seleccionada) or len(productos_por_fecha[fecha_seleccionada]) == 0):
+            no_cachear_respuesta()
             import random
             # Generar productos mock con el porcentaje específico del filtro
             nombres_productos = [
@@ -1864,11 +1729,7 @@ def obtener_mermas_por_dia_tolerable():
                 if isinstance(fecha_seleccionada_date, datetime):
                     fecha_seleccionada_date = fecha_seleccionada_date.date()
                 
-                costo_charolas_dia = db.session.query(
-                    func.coalesce(func.sum(Charola.costo_total), 0)
-                ).filter(
-                    func.date(Charola.fecha_servicio) == fecha_seleccionada_date
-                ).scalar() or 0
+                costo_charolas_dia = obtener_costo_charolas_dia(fecha_seleccionada_date)
             except Exception:
                 costo_charolas_dia = 800.0  # Valor mock por defecto
             
@@ -1971,6 +1832,7 @@ def obtener_mermas_por_dia_tolerable():
         return error_response(f'{str(e)}\n{error_trace}', 500, 'INTERNAL_ERROR')
 
 @bp.route('/kpis/mermas-tendencia-categoria', methods=['GET'])
+@cachear_respuesta(tags=('mermas', 'charolas'))
 def obtener_mermas_tendencia_por_categoria():
     """Obtiene tendencia de mermas por categoría de items con límite del 5%."""
     import logging
@@ -2002,73 +1864,52 @@ def obtener_mermas_tendencia_por_categoria():
         else:
             fecha_fin_date = fecha_fin
         
-        # Obtener mermas por día y categoría
+        # Obtener mermas por día y categoría, y costo de charolas por día (dos consultas)
         series_por_categoria = {}
         categorias = [cat.value for cat in CategoriaItem]
         
+        try:
+            mermas_diarias = mermas_por_dia(db.session, fecha_inicio_date, fecha_fin_date, por_categoria=True)
+            costo_charolas_diario = costo_charolas_por_dia(db.session, fecha_inicio_date, fecha_fin_date)
+        except Exception as query_error:
+            no_cachear_respuesta()
+            logging.warning(f"Error obteniendo mermas por categoría: {str(query_error)}")
+            mermas_diarias = {}
+            costo_charolas_diario = {}
+        
         for categoria in categorias:
-            try:
-                # Obtener mermas por categoría
-                mermas_por_categoria = db.session.query(
-                    func.date(Merma.fecha_merma).label('fecha'),
-                    func.coalesce(func.sum(Merma.cantidad * Merma.costo_unitario), 0).label('costo_total_mermas')
-                ).join(
-                    Item, Merma.item_id == Item.id
-                ).filter(
-                    func.date(Merma.fecha_merma) >= fecha_inicio_date,
-                    func.date(Merma.fecha_merma) <= fecha_fin_date,
-                    Item.categoria == categoria
-                ).group_by(func.date(Merma.fecha_merma)).all()
-                
-                # Obtener costo total de charolas para calcular porcentaje
-                costo_total_charolas = db.session.query(
-                    func.coalesce(func.sum(Charola.costo_total), 0)
-                ).filter(
-                    func.date(Charola.fecha_servicio) >= fecha_inicio_date,
-                    func.date(Charola.fecha_servicio) <= fecha_fin_date
-                ).scalar() or 0
-                
-                # Procesar mermas y calcular porcentaje por categoría
-                datos_categoria = []
-                for merma_row in mermas_por_categoria:
-                    if merma_row.fecha:
-                        fecha_key = merma_row.fecha.isoformat()
-                        costo_mermas = float(merma_row.costo_total_mermas or 0)
-                        
-                        # Obtener costo de charolas del día
-                        try:
-                            costo_charolas_dia = db.session.query(
-                                func.coalesce(func.sum(Charola.costo_total), 0)
-                            ).filter(
-                                func.date(Charola.fecha_servicio) == merma_row.fecha
-                            ).scalar() or 0
-                        except Exception:
-                            costo_charolas_dia = costo_total_charolas / max(1, (fecha_fin_date - fecha_inicio_date).days) if costo_total_charolas > 0 else 800.0
-                        
-                        if costo_charolas_dia == 0:
-                            costo_charolas_dia = 800.0  # Valor base mock
-                        
-                        porcentaje = (costo_mermas / costo_charolas_dia * 100) if costo_charolas_dia > 0 else 0
-                        merma_maxima_aceptada = costo_charolas_dia * limite_porcentaje / 100
-                        
-                        datos_categoria.append({
-                            'fecha': fecha_key,
-                            'merma_real': round(costo_mermas, 2),
-                            'merma_maxima_aceptada': round(merma_maxima_aceptada, 2),
-                            'porcentaje': round(porcentaje, 2),
-                            'costo_charolas': round(costo_charolas_dia, 2),
-                            'excede_limite': porcentaje > limite_porcentaje
-                        })
-                
-                series_por_categoria[categoria] = sorted(datos_categoria, key=lambda x: x['fecha'])
-            except Exception as query_error:
-                logging.warning(f"Error obteniendo datos para categoría {categoria}: {str(query_error)}")
-                series_por_categoria[categoria] = []
+            series_por_categoria[categoria] = []
+        
+        # Procesar mermas y calcular porcentaje por categoría
+        for (fecha_key, categoria), valores in mermas_diarias.items():
+            if categoria not in series_por_categoria:
+                continue
+            costo_mermas = valores['costo']
+            
+            costo_charolas_dia = costo_charolas_diario.get((fecha_key, None), 0)
+            if costo_charolas_dia == 0:
+                costo_charolas_dia = 800.0  # Valor base mock
+            
+            porcentaje = (costo_mermas / costo_charolas_dia * 100) if costo_charolas_dia > 0 else 0
+            merma_maxima_aceptada = costo_charolas_dia * limite_porcentaje / 100
+            
+            series_por_categoria[categoria].append({
+                'fecha': fecha_key,
+                'merma_real': round(costo_mermas, 2),
+                'merma_maxima_aceptada': round(merma_maxima_aceptada, 2),
+                'porcentaje': round(porcentaje, 2),
+                'costo_charolas': round(costo_charolas_dia, 2),
+                'excede_limite': porcentaje > limite_porcentaje
+            })
+        
+        for categoria in categorias:
+            series_por_categoria[categoria].sort(key=lambda x: x['fecha'])
         
         # Si no hay datos suficientes, generar mock data
         tiene_datos_suficientes = any(len(series) >= 3 for series in series_por_categoria.values())
         
         if not tiene_datos_suficientes:
+            no_cachear_respuesta()
             import random
             base_date = fecha_inicio_date
             current_date = base_date
@@ -2161,6 +2002,7 @@ def obtener_mermas_tendencia_por_categoria():
         return error_response(f'{str(e)}\n{error_trace}', 500, 'INTERNAL_ERROR')
 
 @bp.route('/kpis/servicios-distribucion', methods=['GET'])
+@cachear_respuesta(tags=('charolas',))
 def obtener_distribucion_servicios():
     """Obtiene distribución de servicios (desayuno, almuerzo, merienda) para gráfico de pastel."""
     try:
@@ -2196,10 +2038,10 @@ def obtener_distribucion_servicios():
                 func.sum(Charola.costo_total).label('costo_total'),
                 func.sum(Charola.personas_servidas).label('personas_servidas')
             ).filter(
-                func.date(Charola.fecha_servicio) >= fecha_inicio_date,
-                func.date(Charola.fecha_servicio) <= fecha_fin_date
+                filtro_rango_fechas(Charola.fecha_servicio, fecha_inicio_date, fecha_fin_date)
             ).group_by(Charola.tiempo_comida).all()
         except Exception as query_error:
+            no_cachear_respuesta()
             logging.warning(f"Error en consulta de distribución de servicios: {str(query_error)}")
             servicios_distribucion = []
         
@@ -2225,6 +2067,7 @@ def obtener_distribucion_servicios():
         tiene_datos_suficientes = len(datos_por_servicio) >= 2
         
         if not tiene_datos_suficientes:
+            no_cachear_respuesta()
             import random
             # Generar datos mock para los tres servicios
             for servicio in servicios_requeridos:
@@ -2285,6 +2128,7 @@ def obtener_distribucion_servicios():
         return error_response(f'{str(e)}\n{traceback.format_exc()}', 500, 'INTERNAL_ERROR')
 
 @bp.route('/kpis/categorias-alimentos-distribucion', methods=['GET'])
+@cachear_respuesta(tags=('mermas', 'charolas'))
 def obtener_distribucion_categorias_alimentos():
     """Obtiene distribución por categorías de alimentos (lácteos, carnes, frutas, etc.) para gráfico de pastel."""
     try:
@@ -2339,8 +2183,7 @@ def obtener_distribucion_categorias_alimentos():
             ).join(
                 Item, Merma.item_id == Item.id
             ).filter(
-                func.date(Merma.fecha_merma) >= fecha_inicio_date,
-                func.date(Merma.fecha_merma) <= fecha_fin_date
+                filtro_rango_fechas(Merma.fecha_merma, fecha_inicio_date, fecha_fin_date)
             ).group_by(Item.categoria).all()
             
             # Mapear categorías genéricas a categorías específicas de alimentos
@@ -2367,12 +2210,14 @@ def obtener_distribucion_categorias_alimentos():
                 datos_por_categoria[categoria_especifica]['cantidad'] += int(row.cantidad or 0)
                 datos_por_categoria[categoria_especifica]['costo_total'] += float(row.costo_total or 0)
         except Exception as query_error:
+            no_cachear_respuesta()
             logging.warning(f"Error en consulta de categorías de alimentos: {str(query_error)}")
         
         # Generar datos mock para todas las categorías si no hay datos suficientes
         tiene_datos_suficientes = len(datos_por_categoria) >= 3
         
         if not tiene_datos_suficientes:
+            no_cachear_respuesta()
             import random
             
             # Valores base por categoría (cantidad y costo unitario)
@@ -2454,6 +2299,7 @@ def obtener_distribucion_categorias_alimentos():
         return error_response(f'{str(e)}\n{traceback.format_exc()}', 500, 'INTERNAL_ERROR')
 
 @bp.route('/kpis/costo-charola-tendencia', methods=['GET'])
+@cachear_respuesta(tags=('charolas',))
 def obtener_tendencia_costo_charola():
     """Obtiene tendencia de costo promedio por charola (estándar vs real) por día."""
     try:
@@ -2489,10 +2335,10 @@ def obtener_tendencia_costo_charola():
                 func.avg(Charola.costo_total).label('costo_promedio_real'),
                 func.sum(Charola.costo_total).label('costo_total_dia')
             ).filter(
-                func.date(Charola.fecha_servicio) >= fecha_inicio_date,
-                func.date(Charola.fecha_servicio) <= fecha_fin_date
+                filtro_rango_fechas(Charola.fecha_servicio, fecha_inicio_date, fecha_fin_date)
             ).group_by(func.date(Charola.fecha_servicio)).order_by('fecha').all()
         except Exception as query_error:
+            no_cachear_respuesta()
             logging.warning(f"Error en consulta de costos diarios: {str(query_error)}")
             costos_diarios = []
         
@@ -2516,8 +2362,8 @@ def obtener_tendencia_costo_charola():
         tiene_datos_suficientes = len(datos_reales_por_fecha) >= 3
         
         if not tiene_datos_suficientes:
+            no_cachear_respuesta()
             import random
-            import math
             
             # Costo estándar base (objetivo)
             costo_estandar_base = 12.0  # Costo objetivo por charola
@@ -2614,6 +2460,7 @@ def obtener_tendencia_costo_charola():
         return error_response(f'{str(e)}\n{traceback.format_exc()}', 500, 'INTERNAL_ERROR')
 
 @bp.route('/kpis/inventario-silos', methods=['GET'])
+@cachear_respuesta(tags=('inventario',))
 def obtener_inventario_silos():
     """Obtiene datos de inventario formateados para visualización tipo silos."""
     import logging
@@ -2632,6 +2479,7 @@ def obtener_inventario_silos():
                 Item.activo == True
             ).limit(20).all()
         except Exception as query_error:
+            no_cachear_respuesta()
             logging.warning(f"Error en consulta de inventario: {str(query_error)}")
             inventarios = []
         
@@ -2673,6 +2521,7 @@ def obtener_inventario_silos():
         # Si hay menos de 4 items o no hay datos, generar datos mock para completar
         # Siempre generar 4 items con estados variados y realistas como en una bodega real
         if len(silos) < 4:
+            no_cachear_respuesta()
             import random
             nombres_mock = [
                 {'nombre': 'Trigo', 'categoria': 'MATERIA_PRIMA', 'unidad': 'kg', 'capacidad_base': (800, 1500)},
@@ -2762,6 +2611,7 @@ def obtener_inventario_silos():
         
         # Si no hay datos reales, asegurar que siempre tengamos exactamente 4 items mock
         if len(silos) == 0:
+            no_cachear_respuesta()
             import random
             nombres_mock_completos = [
                 {'nombre': 'Trigo', 'categoria': 'MATERIA_PRIMA', 'unidad': 'kg', 'capacidad_base': (800, 1500)},
@@ -2862,6 +2712,7 @@ def obtener_inventario_silos():
         
         # Asegurar que siempre tengamos exactamente 4 silos
         if len(silos) == 0:
+            no_cachear_respuesta()
             import random
             nombres_mock_completos = [
                 {'nombre': 'Trigo', 'categoria': 'MATERIA_PRIMA', 'unidad': 'kg', 'capacidad_base': (800, 1500)},
@@ -2946,6 +2797,7 @@ def obtener_inventario_silos():
         return error_response(f'{str(e)}\n{error_trace}', 500, 'INTERNAL_ERROR')
 
 @bp.route('/kpis/mermas-tendencia-servicio', methods=['GET'])
+@cachear_respuesta(tags=('mermas', 'charolas'))
 def obtener_mermas_tendencia_por_servicio():
     """Obtiene tendencia de mermas por servicio (desayuno, almuerzo, cena) con límite del 5%."""
     import logging
@@ -2987,79 +2839,60 @@ def obtener_mermas_tendencia_por_servicio():
         series_por_servicio = {}
         servicios = ['desayuno', 'almuerzo', 'merienda']
         
+        # Costo de charolas por día y servicio, y mermas por día (dos consultas para todo el rango)
+        try:
+            costo_charolas_diario = costo_charolas_por_dia(db.session, fecha_inicio_date, fecha_fin_date, por_servicio=True)
+            mermas_diarias = mermas_por_dia(db.session, fecha_inicio_date, fecha_fin_date)
+        except Exception as query_error:
+            no_cachear_respuesta()
+            logging.warning(f"Error obteniendo mermas por servicio: {str(query_error)}")
+            costo_charolas_diario = {}
+            mermas_diarias = {}
+        
+        # Distribuir mermas proporcionalmente según el servicio
+        # Desayuno: 30%, Almuerzo: 45%, Merienda: 25% (aproximado)
+        factores_distribucion = {
+            'desayuno': 0.30,
+            'almuerzo': 0.45,
+            'merienda': 0.25
+        }
+        
         for servicio in servicios:
-            try:
-                # Obtener charolas del servicio para calcular costo base
-                charolas_servicio = db.session.query(
-                    func.date(Charola.fecha_servicio).label('fecha'),
-                    func.coalesce(func.sum(Charola.costo_total), 0).label('costo_total_charolas')
-                ).filter(
-                    func.date(Charola.fecha_servicio) >= fecha_inicio_date,
-                    func.date(Charola.fecha_servicio) <= fecha_fin_date,
-                    Charola.tiempo_comida == servicio
-                ).group_by(func.date(Charola.fecha_servicio)).all()
-                
-                # Obtener mermas del día (no podemos relacionar directamente con servicio, usamos mermas generales)
-                mermas_diarias = db.session.query(
-                    func.date(Merma.fecha_merma).label('fecha'),
-                    func.coalesce(func.sum(Merma.cantidad * Merma.costo_unitario), 0).label('costo_total_mermas'),
-                    func.coalesce(func.sum(Merma.cantidad), 0).label('peso_total_mermas')
-                ).filter(
-                    func.date(Merma.fecha_merma) >= fecha_inicio_date,
-                    func.date(Merma.fecha_merma) <= fecha_fin_date
-                ).group_by(func.date(Merma.fecha_merma)).all()
-                
-                # Crear diccionario de costos de charolas por fecha
-                costo_charolas_por_fecha = {row.fecha.isoformat(): float(row.costo_total_charolas or 0) for row in charolas_servicio}
-                
-                # Procesar mermas y calcular porcentaje por servicio
-                datos_servicio = []
-                for merma_row in mermas_diarias:
-                    if merma_row.fecha:
-                        fecha_key = merma_row.fecha.isoformat()
-                        costo_mermas = float(merma_row.costo_total_mermas or 0)
-                        peso_mermas = float(merma_row.peso_total_mermas or 0)
-                        costo_charolas = costo_charolas_por_fecha.get(fecha_key, 0)
-                        
-                        # Si no hay costo de charolas para este servicio, usar un valor base
-                        if costo_charolas == 0:
-                            costo_charolas = 800.0  # Valor base mock
-                        
-                        # Distribuir mermas proporcionalmente según el servicio
-                        # Desayuno: 30%, Almuerzo: 45%, Merienda: 25% (aproximado)
-                        factores_distribucion = {
-                            'desayuno': 0.30,
-                            'almuerzo': 0.45,
-                            'merienda': 0.25
-                        }
-                        factor = factores_distribucion.get(servicio, 0.33)
-                        costo_mermas_servicio = costo_mermas * factor
-                        peso_mermas_servicio = peso_mermas * factor
-                        
-                        porcentaje = (costo_mermas_servicio / costo_charolas * 100) if costo_charolas > 0 else 0
-                        merma_maxima_aceptada = costo_charolas * limite_porcentaje / 100
-                        
-                        datos_servicio.append({
-                            'fecha': fecha_key,
-                            'merma_real': round(costo_mermas_servicio, 2),
-                            'peso_merma': round(peso_mermas_servicio, 2),
-                            'merma_maxima_aceptada': round(merma_maxima_aceptada, 2),
-                            'porcentaje': round(porcentaje, 2),
-                            'costo_charolas': round(costo_charolas, 2),
-                            'excede_limite': porcentaje > limite_porcentaje
-                        })
+            # Procesar mermas y calcular porcentaje por servicio
+            # (no podemos relacionar mermas directamente con servicio, usamos mermas generales)
+            datos_servicio = []
+            factor = factores_distribucion.get(servicio, 0.33)
+            for (fecha_key, _), valores in mermas_diarias.items():
+                costo_charolas = costo_charolas_diario.get((fecha_key, servicio), 0)
                 
-                series_por_servicio[servicio] = sorted(datos_servicio, key=lambda x: x['fecha'])
-            except Exception as query_error:
-                logging.warning(f"Error obteniendo datos para servicio {servicio}: {str(query_error)}")
-                series_por_servicio[servicio] = []
+                # Si no hay costo de charolas para este servicio, usar un valor base
+                if costo_charolas == 0:
+                    costo_charolas = 800.0  # Valor base mock
+                
+                costo_mermas_servicio = valores['costo'] * factor
+                peso_mermas_servicio = valores['peso'] * factor
+                
+                porcentaje = (costo_mermas_servicio / costo_charolas * 100) if costo_charolas > 0 else 0
+                merma_maxima_aceptada = costo_charolas * limite_porcentaje / 100
+                
+                datos_servicio.append({
+                    'fecha': fecha_key,
+                    'merma_real': round(costo_mermas_servicio, 2),
+                    'peso_merma': round(peso_mermas_servicio, 2),
+                    'merma_maxima_aceptada': round(merma_maxima_aceptada, 2),
+                    'porcentaje': round(porcentaje, 2),
+                    'costo_charolas': round(costo_charolas, 2),
+                    'excede_limite': porcentaje > limite_porcentaje
+                })
+            
+            series_por_servicio[servicio] = sorted(datos_servicio, key=lambda x: x['fecha'])
         
         # Si no hay datos suficientes, generar mock data
         tiene_datos_suficientes = any(len(series) >= 3 for series in series_por_servicio.values())
         
         if not tiene_datos_suficientes:
+            no_cachear_respuesta()
             import random
-            import math
             base_date = fecha_inicio_date
             current_date = base_date
             
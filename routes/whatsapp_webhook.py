@@ -7,9 +7,7 @@ import os
 import requests
 from models import db
 from config import Config
-from modules.logistica.facturas import FacturaService
-from modules.logistica.facturas_whatsapp import FacturasWhatsAppService
-from modules.crm.notificaciones.whatsapp import whatsapp_service
+from modules.logistica.ingesta_facturas import IngestaFacturaService
 from modules.configuracion.whatsapp import WhatsAppConfigService
 
 bp = Blueprint('whatsapp', __name__)
@@ -40,6 +38,7 @@ def receive_message():
         if 'entry' not in data:
             return jsonify({'status': 'ok'}), 200
         
+        ingestas = []
         for entry in data['entry']:
             if 'messaging' not in entry:
                 continue
@@ -56,20 +55,26 @@ def receive_message():
                 # Obtener nombre del remitente si está disponible
                 sender_name = message.get('profile', {}).get('name')
                 
+                ingesta_id = None
+                
                 # Si el mensaje tiene imagen (factura)
                 if 'image' in msg:
-                    handle_image_message(sender_id, msg['image'], sender_name)
+                    ingesta_id = handle_image_message(sender_id, msg['image'], sender_name)
                 
                 # Si el mensaje tiene documento (PDF, etc.)
                 elif 'document' in msg:
                     # Tratar documentos como imágenes para OCR
-                    handle_image_message(sender_id, msg['document'], sender_name)
+                    ingesta_id = handle_image_message(sender_id, msg['document'], sender_name)
                 
                 # Si el mensaje es texto
                 elif 'text' in msg:
                     handle_text_message(sender_id, msg['text'])
+                
+                if ingesta_id:
+                    ingestas.append(ingesta_id)
         
-        return jsonify({'status': 'ok'}), 200
+        # Meta espera 200; las facturas se procesan en segundo plano
+        return jsonify({'status': 'ok', 'ingestas': ingestas}), 200
     
     except Exception as e:
         print(f"Error al procesar webhook: {e}")
@@ -79,57 +84,26 @@ def handle_image_message(sender_id: str, image_data: dict, sender_name: str = No
     """
     Maneja mensajes con imágenes (facturas).
     
+    Solo registra la ingesta: la descarga, el OCR y la respuesta al remitente
+    corren en el pipeline de ingesta, así el webhook responde enseguida y
+    Meta no lo reintenta. Los reintentos (mismo ID de imagen) no se procesan de nuevo.
+    
     Args:
         sender_id: ID del remitente (teléfono)
         image_data: Datos de la imagen del mensaje
         sender_name: Nombre del remitente (opcional)
-    """
-    try:
-        # Obtener ID de la imagen
-        image_id = image_data.get('id')
-        
-        if not image_id:
-            return
-        
-        # Procesar factura desde WhatsApp
-        resultado = FacturasWhatsAppService.procesar_factura_desde_whatsapp(
-            db.session,
-            image_id,
-            sender_id,
-            sender_name
-        )
         
-        if resultado.get('exito'):
-            # Enviar confirmación al remitente
-            mensaje = (
-                f"✅ Factura recibida y procesada\n\n"
-                f"Número: {resultado.get('numero_factura', 'N/A')}\n"
-                f"Proveedor: {resultado.get('proveedor', 'No identificado')}\n"
-                f"Total: ${resultado.get('total', 0):,.2f}\n"
-                f"Items detectados: {resultado.get('items', 0)}\n\n"
-                f"La factura está pendiente de confirmación en el sistema."
-            )
-            whatsapp_service.enviar_mensaje(sender_id, mensaje)
-        else:
-            # Enviar mensaje de error
-            whatsapp_service.enviar_mensaje(
-                sender_id,
-                f"❌ Error al procesar la factura: {resultado.get('mensaje', 'Error desconocido')}\n\n"
-                f"Por favor, verifica que la imagen sea clara y contenga información de factura."
-            )
-        
-    except Exception as e:
-        print(f"Error al procesar imagen: {e}")
-        import traceback
-        traceback.print_exc()
-        # Enviar mensaje de error al usuario
-        try:
-            whatsapp_service.enviar_mensaje(
-                sender_id,
-                "❌ Error al procesar la factura. Por favor, intente nuevamente."
-            )
-        except:
-            pass
+    Returns:
+        ID de la ingesta o None
+    """
+    # Obtener ID de la imagen
+    image_id = image_data.get('id')
+    
+    if not image_id:
+        return None
+    
+    ingesta, _ = IngestaFacturaService.registrar_whatsapp(db.session, image_id, sender_id, sender_name)
+    return ingesta.id
 
 def handle_text_message(sender_id: str, text: str):
     """
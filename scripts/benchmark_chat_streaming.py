@@ -0,0 +1,161 @@
+"""
+Benchmark: tiempo hasta el primer fragmento del chat AI, con y sin streaming.
+
+Levanta un servidor local que imita /chat/completions de OpenAI (respuestas
+normales y en streaming SSE, con un retardo por token) y apunta el chat a él.
+Cada pregunta pasa por una ronda con [QUERY_DB] (consulta real a la base de
+datos) y una ronda con la respuesta final, igual que el flujo del asistente:
+- bloqueante: ChatService.enviar_mensaje (la ruta de siempre)
+- streaming: ChatService.enviar_mensaje_stream (ruta /mensajes/stream)
+
+Mide el tiempo hasta el primer texto visible y el tiempo total de cada modo,
+y verifica que ambos guarden la misma respuesta. La conversación de prueba se
+elimina al terminar. Termina con código 1 si las respuestas difieren.
+
+Uso:
+    python scripts/benchmark_chat_streaming.py
+    BENCH_TOKENS=400 BENCH_RETARDO_MS=20 python scripts/benchmark_chat_streaming.py
+"""
+import sys
+import os
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from models import db, Conversacion, Mensaje
+from modules.chat.chat_service import chat_service, MARCADOR_CONSULTA
+from modules.configuracion.ai import AIConfigService
+
+BENCH_TOKENS = int(os.getenv('BENCH_TOKENS', '200'))
+BENCH_RETARDO_MS = float(os.getenv('BENCH_RETARDO_MS', '10'))
+BENCH_REPETICIONES = int(os.getenv('BENCH_REPETICIONES', '3'))
+
+CONSULTA = f"{MARCADOR_CONSULTA} SELECT COUNT(*) AS total FROM items;"
+RESPUESTA = ' '.join(f'palabra{i}' for i in range(BENCH_TOKENS))
+
+
+class LLMLocal(BaseHTTPRequestHandler):
+    """Imita /chat/completions: primero pide una consulta, luego responde."""
+
+    # HTTP/1.1 con Transfer-Encoding: chunked, como las APIs reales en streaming
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _escribir_chunk(self, datos: bytes):
+        self.wfile.write(f"{len(datos):X}\r\n".encode('ascii') + datos + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        cuerpo = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        ultimo = cuerpo['messages'][-1]['content']
+        texto = RESPUESTA if ultimo.startswith('Resultado de la consulta') else CONSULTA
+        fragmentos = [t + ' ' for t in texto.split(' ')]
+        fragmentos[-1] = fragmentos[-1].rstrip()
+
+        self.send_response(200)
+        if cuerpo.get('stream'):
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self._escribir_chunk(b': LOCAL PROCESSING\n\n')
+            for fragmento in fragmentos:
+                time.sleep(BENCH_RETARDO_MS / 1000)
+                evento = {'choices': [{'index': 0, 'delta': {'content': fragmento}}]}
+                self._escribir_chunk(f"data: {json.dumps(evento)}\n\n".encode('utf-8'))
+            uso = {'choices': [], 'usage': {'total_tokens': len(fragmentos)}}
+            self._escribir_chunk(f"data: {json.dumps(uso)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+            self._escribir_chunk(b'')
+        else:
+            time.sleep(BENCH_RETARDO_MS * len(fragmentos) / 1000)
+            respuesta = {
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': ''.join(fragmentos)}}],
+                'usage': {'total_tokens': len(fragmentos)},
+            }
+            cuerpo_respuesta = json.dumps(respuesta).encode('utf-8')
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(cuerpo_respuesta)))
+            self.end_headers()
+            self.wfile.write(cuerpo_respuesta)
+
+
+def medir_bloqueante(conversacion_id: int):
+    """Retorna (primer texto, total, contenido guardado): sin streaming ambos tiempos coinciden."""
+    inicio = time.perf_counter()
+    resultado = chat_service.enviar_mensaje(db.session, conversacion_id, 'Cuántos items hay?')
+    db.session.commit()
+    total = time.perf_counter() - inicio
+    return total, total, resultado['mensaje_asistente']['contenido']
+
+
+def medir_streaming(conversacion_id: int):
+    """Retorna (primer texto, total, contenido guardado)."""
+    inicio = time.perf_counter()
+    primero = None
+    contenido = None
+    for evento, datos in chat_service.enviar_mensaje_stream(db.session, conversacion_id, 'Cuántos items hay?'):
+        if evento == 'delta' and primero is None:
+            primero = time.perf_counter() - inicio
+        elif evento == 'fin':
+            contenido = datos['mensaje_asistente']['contenido']
+    return primero, time.perf_counter() - inicio, contenido
+
+
+def main() -> bool:
+    print("=" * 60)
+    print("BENCHMARK: CHAT AI CON Y SIN STREAMING")
+    print("=" * 60)
+    print(f"Tokens por respuesta: {BENCH_TOKENS} | Retardo por token: {BENCH_RETARDO_MS} ms | Repeticiones: {BENCH_REPETICIONES}")
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), LLMLocal)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    configuracion_original = (
+        AIConfigService._token_en_memoria,
+        AIConfigService._base_url_en_memoria,
+    )
+    AIConfigService._token_en_memoria = 'sk-benchmark-local'
+    AIConfigService._base_url_en_memoria = f'http://127.0.0.1:{servidor.server_address[1]}'
+
+    conversacion = chat_service.crear_conversacion(db.session, titulo='Benchmark streaming')
+    correcto = True
+    try:
+        contenidos = {}
+        for modo, medir in (('bloqueante', medir_bloqueante), ('streaming', medir_streaming)):
+            primeros, totales = [], []
+            for _ in range(BENCH_REPETICIONES):
+                primero, total, contenido = medir(conversacion.id)
+                primeros.append(primero)
+                totales.append(total)
+                contenidos[modo] = contenido
+            print(
+                f"  {modo:10s}: primer texto {statistics.median(primeros) * 1000:8.1f} ms | "
+                f"total {statistics.median(totales) * 1000:8.1f} ms"
+            )
+
+        if contenidos['bloqueante'] != contenidos['streaming']:
+            print("  ✗ Los modos guardan respuestas distintas")
+            correcto = False
+        else:
+            print("  ✓ Ambos modos guardan la misma respuesta")
+    finally:
+        db.session.rollback()
+        db.session.query(Mensaje).filter(Mensaje.conversacion_id == conversacion.id).delete(synchronize_session=False)
+        db.session.query(Conversacion).filter(Conversacion.id == conversacion.id).delete(synchronize_session=False)
+        db.session.commit()
+        AIConfigService._token_en_memoria, AIConfigService._base_url_en_memoria = configuracion_original
+        servidor.shutdown()
+        print("\n✓ Conversación de prueba eliminada")
+    return correcto
+
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        exito = main()
+    sys.exit(0 if exito else 1)
@@ -0,0 +1,113 @@
+"""
+Benchmark: consultas SQL del chat AI con y sin la caché de resultados.
+
+Ejecuta un conjunto de consultas típicas del asistente ([QUERY_DB] de
+charolas, inventario, facturas...) BENCH_REPETICIONES veces por el ejecutor
+de modules/chat/consultas_sql.py: la primera pasada va a la base de datos
+(EXPLAIN + consulta) y las siguientes salen de la caché. Las consultas se
+repiten con otro formato (mayúsculas, espacios, comentarios) para comprobar
+que caen en la misma entrada normalizada. La caché solo se usa con
+PostgreSQL; con SQLite se informan únicamente los tiempos sin caché.
+
+También verifica que se rechacen escrituras, varias sentencias, SELECT INTO,
+FOR UPDATE, pg_sleep (también con el nombre entre comillas) y advisory locks.
+Termina con código 1 si alguna se acepta o si una consulta repetida no sale de
+la caché.
+
+Uso:
+    python scripts/benchmark_consultas_chat.py
+    BENCH_REPETICIONES=20 python scripts/benchmark_consultas_chat.py
+"""
+import sys
+import os
+import statistics
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from models import db
+from modules.chat.consultas_sql import ejecutor_consultas, SQLGLOT_AVAILABLE
+
+BENCH_REPETICIONES = int(os.getenv('BENCH_REPETICIONES', '10'))
+
+CONSULTAS = [
+    "SELECT COUNT(*) AS total FROM charolas WHERE DATE(fecha_servicio) = CURRENT_DATE - INTERVAL '1 day'",
+    "SELECT i.nombre, inv.cantidad_actual, inv.cantidad_minima FROM inventario inv JOIN items i ON i.id = inv.item_id WHERE inv.cantidad_actual < inv.cantidad_minima",
+    "SELECT numero_factura, total, estado FROM facturas ORDER BY fecha_emision DESC LIMIT 5",
+    "SELECT p.nombre, COUNT(f.id) AS facturas FROM proveedores p LEFT JOIN facturas f ON f.proveedor_id = p.id GROUP BY p.nombre",
+]
+
+# La misma consulta con otro formato: debe resolverse desde la caché
+VARIANTES = [
+    "select count(*) as total\n  from charolas\n where date(fecha_servicio) = current_date - interval '1 day' -- ayer",
+]
+
+RECHAZADAS = [
+    "DELETE FROM items",
+    "SELECT 1; DROP TABLE items",
+    "WITH x AS (DELETE FROM items RETURNING *) SELECT * FROM x",
+    "SELECT * INTO copia_items FROM items",
+    "SELECT * FROM items FOR UPDATE",
+    "SELECT pg_sleep(30)",
+    'SELECT "pg_sleep"(30)',
+    "SELECT pg_advisory_lock_shared(1)",
+]
+
+
+def main() -> bool:
+    print("=" * 60)
+    print("BENCHMARK: CONSULTAS SQL DEL CHAT AI")
+    print("=" * 60)
+    print(f"Analizador: {'sqlglot' if SQLGLOT_AVAILABLE else 'tokenizador'} | Repeticiones: {BENCH_REPETICIONES}")
+
+    correcto = True
+    ejecutor_consultas.cache.limpiar()
+
+    frias, calientes = [], []
+    for consulta in CONSULTAS:
+        for repeticion in range(BENCH_REPETICIONES):
+            inicio = time.perf_counter()
+            resultado = ejecutor_consultas.ejecutar(db.session, consulta)
+            duracion = time.perf_counter() - inicio
+            if resultado['error']:
+                print(f"  ✗ {consulta[:60]}...: {resultado['error']}")
+                correcto = False
+                break
+            (frias if repeticion == 0 else calientes).append(duracion)
+
+    cache_activa = ejecutor_consultas.estadisticas()['cache_activa']
+    if not cache_activa:
+        # Sin PostgreSQL las consultas leen la transacción de la petición y no se cachean
+        print("\n  Sin PostgreSQL: la caché no se usa, todas las pasadas van a la base de datos")
+        frias, calientes = frias + calientes, []
+
+    if frias:
+        print(f"\n  sin caché: mediana {statistics.median(frias) * 1000:8.2f} ms ({len(frias)} consultas)")
+    if calientes:
+        print(f"  con caché: mediana {statistics.median(calientes) * 1000:8.2f} ms ({len(calientes)} consultas)")
+
+    for variante in VARIANTES if cache_activa else []:
+        resultado = ejecutor_consultas.ejecutar(db.session, variante)
+        if not (resultado.get('info_optimizacion') or {}).get('desde_cache'):
+            print(f"  ✗ Variante de formato no salió de la caché: {variante[:60]}...")
+            correcto = False
+
+    print("\nConsultas rechazadas:")
+    for consulta in RECHAZADAS:
+        motivo = ejecutor_consultas.validar(consulta)
+        print(f"  {'✓' if motivo else '✗'} {consulta[:50]:50s} {motivo or 'ACEPTADA'}")
+        correcto = correcto and bool(motivo)
+
+    estadisticas = ejecutor_consultas.estadisticas()
+    print(f"\nCaché: {estadisticas['cache']['hits']} hits, {estadisticas['cache']['misses']} misses; "
+          f"rechazadas por plan: {estadisticas['rechazadas_plan']}")
+    db.session.rollback()
+    return correcto
+
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        exito = main()
+    sys.exit(0 if exito else 1)
@@ -0,0 +1,155 @@
+"""
+Benchmark: número de consultas SQL de los reportes de tendencia de mermas.
+
+Crea mermas y charolas sintéticas para 90 días, llama a los endpoints de
+tendencia con rangos de 7, 30 y 90 días y cuenta las sentencias SQL que
+emite cada llamada. El número de consultas debe ser constante sin importar
+la longitud del rango; si crece, el script termina con código 1.
+
+Uso:
+    python scripts/benchmark_consultas_reportes.py
+    BENCH_DIAS=180 python scripts/benchmark_consultas_reportes.py
+"""
+import sys
+import os
+import time
+from datetime import datetime, date, timedelta
+from random import Random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from app import create_app
+from models import db
+from models.item import Item
+from models.merma import Merma, TipoMerma
+from models.charola import Charola
+
+BENCH_DIAS = int(os.getenv('BENCH_DIAS', '90'))
+BENCH_MERMAS_POR_DIA = int(os.getenv('BENCH_MERMAS_POR_DIA', '20'))
+RANGOS = [7, 30, BENCH_DIAS]
+PREFIJO = 'BENCH-REP-'
+
+ENDPOINTS = [
+    '/api/reportes/kpis/mermas-por-dia-tolerable',
+    '/api/reportes/kpis/mermas-tendencia-categoria?categoria=insumo',
+    '/api/reportes/kpis/mermas-tendencia-servicio',
+]
+SERVICIOS = ['desayuno', 'almuerzo', 'merienda']
+
+
+def crear_datos_sinteticos(rng: Random):
+    """Crea items, mermas y charolas sintéticas con inserciones masivas."""
+    db.session.bulk_insert_mappings(Item, [{
+        'codigo': f'{PREFIJO}{i:04d}',
+        'nombre': f'Item sintético {i}',
+        'categoria': categoria,
+        'unidad': 'kg',
+        'activo': True,
+        'fecha_creacion': datetime.utcnow(),
+    } for i, categoria in enumerate(['INSUMO', 'MATERIA_PRIMA', 'bebida', 'limpieza'] * 5)])
+    item_ids = [i for (i,) in db.session.query(Item.id).filter(Item.codigo.like(f'{PREFIJO}%'))]
+
+    ahora = datetime.utcnow()
+    mermas = []
+    charolas = []
+    for dia in range(BENCH_DIAS):
+        fecha = ahora - timedelta(days=dia)
+        for m in range(BENCH_MERMAS_POR_DIA):
+            cantidad = rng.choice([0.5, 1, 2, 5])
+            costo = round(rng.uniform(1, 15), 2)
+            mermas.append({
+                'item_id': rng.choice(item_ids),
+                'fecha_merma': fecha - timedelta(minutes=m),
+                'tipo': TipoMerma.VENCIMIENTO,
+                'cantidad': cantidad,
+                'unidad': 'kg',
+                'costo_unitario': costo,
+                'costo_total': round(cantidad * costo, 2),
+                'ubicacion': f'{PREFIJO}Cocina',
+                'fecha_registro': ahora,
+            })
+        for servicio in SERVICIOS:
+            charolas.append({
+                'numero_charola': f'{PREFIJO}{dia:04d}-{servicio}',
+                'fecha_servicio': fecha,
+                'ubicacion': f'{PREFIJO}Cocina',
+                'tiempo_comida': servicio,
+                'personas_servidas': 100,
+                'total_ventas': 1500,
+                'costo_total': round(rng.uniform(600, 1200), 2),
+                'ganancia': 0,
+                'fecha_registro': ahora,
+            })
+    db.session.bulk_insert_mappings(Merma, mermas)
+    db.session.bulk_insert_mappings(Charola, charolas)
+    db.session.commit()
+    return item_ids
+
+
+def limpiar(item_ids):
+    """Elimina todos los datos sintéticos del benchmark."""
+    db.session.rollback()
+    db.session.query(Merma).filter(Merma.item_id.in_(item_ids)).delete(synchronize_session=False)
+    db.session.query(Charola).filter(Charola.numero_charola.like(f'{PREFIJO}%')).delete(synchronize_session=False)
+    db.session.query(Item).filter(Item.id.in_(item_ids)).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def medir(cliente, url: str, dias: int):
+    """Llama al endpoint con un rango de `dias` días y retorna (status, consultas, segundos)."""
+    contador = {'consultas': 0}
+
+    def contar(*args):
+        contador['consultas'] += 1
+
+    hasta = date.today()
+    desde = hasta - timedelta(days=dias - 1)
+    separador = '&' if '?' in url else '?'
+    event.listen(db.engine, 'before_cursor_execute', contar)
+    try:
+        inicio = time.perf_counter()
+        respuesta = cliente.get(f'{url}{separador}fecha_inicio={desde.isoformat()}&fecha_fin={hasta.isoformat()}')
+        segundos = time.perf_counter() - inicio
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', contar)
+    return respuesta.status_code, contador['consultas'], segundos
+
+
+def main(app) -> bool:
+    print("=" * 60)
+    print("BENCHMARK: CONSULTAS DE REPORTES DE TENDENCIA DE MERMAS")
+    print("=" * 60)
+    print(f"Días: {BENCH_DIAS} | Mermas por día: {BENCH_MERMAS_POR_DIA} | Rangos: {RANGOS}")
+
+    rng = Random(42)
+    item_ids = crear_datos_sinteticos(rng)
+    cliente = app.test_client()
+    correcto = True
+    try:
+        for url in ENDPOINTS:
+            print(f"\n{url}")
+            conteos = set()
+            for dias in RANGOS:
+                status, consultas, segundos = medir(cliente, url, dias)
+                conteos.add(consultas)
+                print(f"  {dias:4d} días: HTTP {status} | {consultas:3d} consultas | {segundos * 1000:8.1f} ms")
+                if status != 200:
+                    correcto = False
+            if len(conteos) != 1:
+                print("  ✗ El número de consultas depende de la longitud del rango")
+                correcto = False
+            else:
+                print("  ✓ Número de consultas constante")
+    finally:
+        limpiar(item_ids)
+        print("\n✓ Datos sintéticos eliminados")
+    return correcto
+
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        exito = main(app)
+    sys.exit(0 if exito else 1)
@@ -0,0 +1,148 @@
+"""
+Benchmark: ráfaga de notificaciones de WhatsApp con requests.post directo y
+con el cliente HTTP compartido (utils/http_cliente.py).
+
+Levanta un servidor local que imita /{phone_number_id}/messages de WhatsApp
+Business API y apunta WhatsAppService a él. Cada conexión nueva espera
+BENCH_HANDSHAKE_MS antes de atenderse, que emula el costo de abrir TCP+TLS
+contra graph.facebook.com (en loopback sería casi cero). Compara:
+- directo: requests.post por mensaje (una conexión nueva cada vez, como antes)
+- compartido: WhatsAppService.enviar_mensaje, que usa el pool keep-alive
+
+Cada modo envía BENCH_MENSAJES mensajes, en secuencia y desde BENCH_HILOS
+hilos a la vez, y muestra tiempo total, latencia mediana y conexiones
+abiertas. No usa la base de datos. Termina con código 1 si algún envío falla.
+
+Uso:
+    python scripts/benchmark_http_cliente.py
+    BENCH_MENSAJES=500 BENCH_HANDSHAKE_MS=80 python scripts/benchmark_http_cliente.py
+"""
+import sys
+import os
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from config import Config
+from modules.crm.notificaciones.whatsapp import WhatsAppService
+from utils.http_cliente import cliente_http
+
+BENCH_MENSAJES = int(os.getenv('BENCH_MENSAJES', '200'))
+BENCH_HILOS = int(os.getenv('BENCH_HILOS', '8'))
+BENCH_HANDSHAKE_MS = float(os.getenv('BENCH_HANDSHAKE_MS', '40'))
+
+PHONE_NUMBER_ID = '000000000000'
+
+
+class WhatsAppLocal(BaseHTTPRequestHandler):
+    """Imita el envío de mensajes de WhatsApp Business API con keep-alive."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    conexiones = 0
+    _lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with WhatsAppLocal._lock:
+            WhatsAppLocal.conexiones += 1
+        time.sleep(BENCH_HANDSHAKE_MS / 1000)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        cuerpo = json.dumps({'messaging_product': 'whatsapp', 'messages': [{'id': 'wamid.local'}]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+
+def enviar_directo(servicio: WhatsAppService, mensaje: str):
+    """Envío como era antes: requests.post sin sesión."""
+    response = requests.post(
+        f"{servicio.api_url}/{servicio.phone_number_id}/messages",
+        json={"messaging_product": "whatsapp", "to": "593999999999", "type": "text", "text": {"body": mensaje}},
+        headers={"Authorization": f"Bearer {servicio.access_token}", "Content-Type": "application/json"},
+        timeout=30
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def enviar_compartido(servicio: WhatsAppService, mensaje: str):
+    return servicio.enviar_mensaje('593999999999', mensaje)
+
+
+def medir(enviar, servicio: WhatsAppService, hilos: int):
+    """Retorna (total, latencia mediana, conexiones abiertas, errores)."""
+    latencias, errores = [], []
+
+    def uno(i):
+        inicio = time.perf_counter()
+        try:
+            enviar(servicio, f'Notificación {i}')
+            latencias.append(time.perf_counter() - inicio)
+        except Exception as e:
+            errores.append(e)
+
+    conexiones_antes = WhatsAppLocal.conexiones
+    inicio = time.perf_counter()
+    if hilos == 1:
+        for i in range(BENCH_MENSAJES):
+            uno(i)
+    else:
+        with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+            list(ejecutor.map(uno, range(BENCH_MENSAJES)))
+    total = time.perf_counter() - inicio
+    mediana = statistics.median(latencias) if latencias else 0
+    return total, mediana, WhatsAppLocal.conexiones - conexiones_antes, errores
+
+
+def main() -> bool:
+    print("=" * 60)
+    print("BENCHMARK: NOTIFICACIONES WHATSAPP, requests.post VS CLIENTE COMPARTIDO")
+    print("=" * 60)
+    print(f"Mensajes: {BENCH_MENSAJES} | Hilos: {BENCH_HILOS} | Apertura de conexión: {BENCH_HANDSHAKE_MS} ms")
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), WhatsAppLocal)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    Config.WHATSAPP_API_URL = f'http://127.0.0.1:{servidor.server_address[1]}'
+    Config.WHATSAPP_ACCESS_TOKEN = 'token-benchmark-local'
+    Config.WHATSAPP_PHONE_NUMBER_ID = PHONE_NUMBER_ID
+    servicio = WhatsAppService()
+
+    correcto = True
+    try:
+        for hilos in (1, BENCH_HILOS):
+            print(f"\n{'Secuencial' if hilos == 1 else f'{hilos} hilos'}:")
+            for modo, enviar in (('directo', enviar_directo), ('compartido', enviar_compartido)):
+                total, mediana, conexiones, errores = medir(enviar, servicio, hilos)
+                print(
+                    f"  {modo:10s}: total {total * 1000:8.1f} ms | "
+                    f"mediana {mediana * 1000:6.1f} ms | conexiones {conexiones:4d}"
+                )
+                if errores:
+                    print(f"  ✗ {len(errores)} envíos fallaron: {errores[0]}")
+                    correcto = False
+
+        upstream = cliente_http.estadisticas().get(Config.WHATSAPP_API_URL, {})
+        print(f"\nCliente compartido: {upstream.get('solicitudes', 0)} solicitudes, "
+              f"p95 {upstream.get('latencia', {}).get('p95_ms')} ms, circuito {upstream.get('circuito', {}).get('estado')}")
+    finally:
+        servidor.shutdown()
+    return correcto
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
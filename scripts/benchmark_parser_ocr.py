@@ -0,0 +1,280 @@
+"""
+Benchmark: rendimiento y precisión del parser de texto OCR de facturas.
+
+Genera un corpus sintético de facturas (con su resultado esperado) que imita
+la salida de Google Vision: encabezados con RUC en distintos formatos, montos
+con coma o punto decimal, unidades en la cantidad o en la descripción, ruido
+y documentos de varias páginas con el encabezado repetido. Mide facturas por
+segundo y precisión por campo del parser actual (utils/parser_factura.py) y
+de la implementación anterior, que se conserva aquí como referencia.
+
+Termina con código 1 si algún campo es menos preciso que con la referencia.
+
+Uso:
+    python scripts/benchmark_parser_ocr.py
+    BENCH_FACTURAS=5000 BENCH_SEMILLA=7 python scripts/benchmark_parser_ocr.py
+    BENCH_CORPUS_DIR=/tmp/corpus python scripts/benchmark_parser_ocr.py   # guarda .txt y .json
+"""
+import sys
+import os
+import re
+import json
+import time
+from pathlib import Path
+from random import Random
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.parser_factura import parsear_texto_factura
+
+BENCH_FACTURAS = int(os.getenv('BENCH_FACTURAS', '2000'))
+BENCH_SEMILLA = int(os.getenv('BENCH_SEMILLA', '42'))
+BENCH_REPETICIONES = int(os.getenv('BENCH_REPETICIONES', '3'))
+BENCH_CORPUS_DIR = os.getenv('BENCH_CORPUS_DIR', '')
+
+PROVEEDORES = [
+    'Distribuidora Andina S.A.', 'Comercial El Granero Cia. Ltda.', 'Lácteos del Valle',
+    'Frigorífico La Pradera', 'Importadora Costa Azul', 'Mercado Mayorista Quitumbe',
+]
+PRODUCTOS = [
+    'Tomate riñón', 'Cebolla paiteña', 'Arroz blanco', 'Aceite de girasol', 'Leche entera',
+    'Queso fresco', 'Pechuga de pollo', 'Papa chola', 'Azúcar blanca', 'Sal en grano',
+    'Harina de trigo', 'Huevos AA', 'Carne molida', 'Fréjol canario', 'Detergente industrial',
+]
+UNIDADES = ['kg', 'lb', 'l', 'unidad', 'caja', 'paquete', 'qq', 'arroba']
+RUIDO = [
+    'Gracias por su compra', 'Forma de pago: EFECTIVO', 'Dirección: Av. Amazonas N34-12 y Colón',
+    'Telf: 02-2345678', 'CANT DESCRIPCION P.UNIT TOTAL', 'Contribuyente especial',
+]
+
+
+# --- Corpus sintético ---------------------------------------------------------
+
+def _monto(valor: float, coma: bool, miles: bool = False) -> str:
+    texto = f'{valor:,.2f}' if miles else f'{valor:.2f}'
+    if coma:
+        texto = texto.replace(',', '_').replace('.', ',').replace('_', '.')
+    return texto
+
+
+def generar_factura(rng: Random) -> Tuple[str, Dict]:
+    """Genera el texto OCR de una factura y los datos que se deberían extraer."""
+    coma = rng.random() < 0.3
+    proveedor = rng.choice(PROVEEDORES)
+    ruc = f'17{rng.randint(10_000_000, 99_999_999)}001'
+    establecimiento, punto, secuencial = rng.randint(1, 9), rng.randint(1, 9), rng.randint(1, 999_999)
+    numero = f'{establecimiento:03d}-{punto:03d}-{secuencial:09d}'
+    dia, mes = rng.randint(1, 28), rng.randint(1, 12)
+    fecha = rng.choice([f'{dia:02d}/{mes:02d}/2026', f'2026-{mes:02d}-{dia:02d}', f'{dia}-{mes}-2026'])
+
+    encabezado = [
+        proveedor,
+        rng.choice([f'RUC: {ruc}', f'R.U.C. {ruc}', f'RUC {ruc}']),
+        rng.choice([f'FACTURA No. {numero}', f'FACTURA {numero}', f'Factura N° {numero}']),
+    ]
+    cabecera_fecha = rng.choice([f'Fecha de emisión: {fecha}', f'Fecha: {fecha}'])
+
+    items = []
+    lineas_items = []
+    for _ in range(rng.randint(2, 25)):
+        descripcion = rng.choice(PRODUCTOS)
+        unidad = rng.choice(UNIDADES + [None])
+        cantidad = rng.choice([1, 2, 3, 5, 10, 12, 2.5, 0.5])
+        precio = round(rng.uniform(0.25, 60), 2)
+        total = round(cantidad * precio, 2)
+        cantidad_txt = (f'{cantidad}'.replace('.', ',') if coma else f'{cantidad}') if cantidad % 1 else str(int(cantidad))
+        moneda = '$' if rng.random() < 0.2 else ''
+        if unidad and rng.random() < 0.5:
+            texto = f'{cantidad_txt} {unidad} {descripcion}'
+        elif unidad:
+            texto = f'{cantidad_txt} {descripcion} {unidad}'
+        else:
+            texto = f'{cantidad_txt} {descripcion}'
+        lineas_items.append(f'{texto} {moneda}{_monto(precio, coma)} {moneda}{_monto(total, coma)}')
+        items.append({
+            'descripcion': descripcion,
+            'cantidad': float(cantidad),
+            'precio': precio,
+            'total': total,
+            'unidad': unidad,
+        })
+
+    subtotal = round(sum(i['total'] for i in items), 2)
+    iva = round(subtotal * 0.15, 2)
+    total = round(subtotal + iva, 2)
+    miles = total >= 1000 and rng.random() < 0.5
+    resumen = [
+        rng.choice([f'SUBTOTAL 15% {_monto(subtotal, coma, miles)}', f'SUBTOTAL: {_monto(subtotal, coma, miles)}']),
+        f'IVA 15% {_monto(iva, coma, miles)}',
+        rng.choice([f'TOTAL A PAGAR $ {_monto(total, coma, miles)}', f'VALOR TOTAL {_monto(total, coma, miles)}']),
+        rng.choice(RUIDO),
+    ]
+
+    # 20% de documentos en varias páginas, con el encabezado repetido
+    paginas = 1 if rng.random() < 0.8 or len(lineas_items) < 6 else rng.randint(2, 3)
+    tamano = -(-len(lineas_items) // paginas)
+    bloques = []
+    for pagina in range(paginas):
+        bloque = list(encabezado)
+        if pagina == 0:
+            bloque += [cabecera_fecha, rng.choice(RUIDO)]
+        bloque += lineas_items[pagina * tamano:(pagina + 1) * tamano]
+        if paginas > 1:
+            bloque.append(f'Página {pagina + 1} de {paginas}')
+        bloques.append('\n'.join(bloque))
+    texto = '\f'.join(bloques) + '\n' + '\n'.join(resumen)
+
+    esperado = {
+        'numero_factura': numero,
+        'proveedor': proveedor,
+        'ruc': ruc,
+        'fecha': fecha,
+        'subtotal': subtotal,
+        'iva': iva,
+        'total': total,
+        'items': items,
+    }
+    return texto, esperado
+
+
+# --- Implementación anterior (referencia) ------------------------------------
+
+def parser_referencia(texto: str) -> Dict:
+    """OCRProcessor._parse_invoice_text antes del parser precompilado (con `re` importado)."""
+    datos = {
+        'numero_factura': None, 'proveedor': None, 'ruc': None, 'fecha': None,
+        'items': [], 'subtotal': None, 'iva': None, 'total': None,
+    }
+    lineas = texto.split('\n')
+    for linea in lineas:
+        linea_lower = linea.lower()
+        if 'factura' in linea_lower or 'invoice' in linea_lower:
+            numeros = re.findall(r'\d+', linea)
+            if numeros:
+                datos['numero_factura'] = '-'.join(numeros[:3]) if len(numeros) >= 3 else numeros[0]
+        if 'ruc' in linea_lower:
+            ruc_match = re.search(r'\d{10,13}', linea)
+            if ruc_match:
+                datos['ruc'] = ruc_match.group()
+        fecha_match = re.search(r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}', linea)
+        if fecha_match:
+            datos['fecha'] = fecha_match.group()
+        if 'total' in linea_lower or 'suma' in linea_lower:
+            total_match = re.search(r'\d+\.?\d*', linea)
+            if total_match:
+                datos['total'] = float(total_match.group())
+    for linea in lineas[:10]:
+        if len(linea.strip()) > 5 and not any(char.isdigit() for char in linea[:5]):
+            datos['proveedor'] = linea.strip()
+            break
+    unidades_comunes = ['kg', 'g', 'qq', 'quintal', 'quintales', 'l', 'ml', 'litro', 'litros',
+                        'unidad', 'unidades', 'caja', 'cajas', 'paquete', 'paquetes',
+                        'lb', 'libras', 'arroba', 'arrobas']
+    for linea in lineas:
+        item_match = re.match(r'(\d+\.?\d*)\s+(.+?)\s+(\d+\.?\d*)\s+(\d+\.?\d*)', linea)
+        if item_match:
+            cantidad, descripcion, precio, total_item = item_match.groups()
+            unidad_extraida = None
+            descripcion_limpia = descripcion.strip()
+            for unidad in unidades_comunes:
+                patron_unidad = rf'\b{unidad}\b'
+                if re.search(patron_unidad, descripcion_limpia, re.IGNORECASE):
+                    unidad_extraida = unidad.lower()
+                    descripcion_limpia = re.sub(patron_unidad, '', descripcion_limpia, flags=re.IGNORECASE).strip()
+                    break
+            datos['items'].append({
+                'descripcion': descripcion_limpia,
+                'cantidad': float(cantidad),
+                'precio': float(precio),
+                'total': float(total_item),
+                'unidad': unidad_extraida,
+            })
+    return datos
+
+
+# --- Medición ------------------------------------------------------------------
+
+CAMPOS = ['numero_factura', 'proveedor', 'ruc', 'fecha', 'subtotal', 'iva', 'total', 'items']
+
+
+def _igual(campo: str, obtenido, esperado) -> bool:
+    if campo == 'items':
+        if len(obtenido) != len(esperado):
+            return False
+        return all(
+            re.sub(r'\s+', ' ', o['descripcion'] or '').strip().lower() == e['descripcion'].lower()
+            and o['unidad'] == e['unidad']
+            and all(abs((o[k] or 0) - e[k]) < 0.005 for k in ('cantidad', 'precio', 'total'))
+            for o, e in zip(obtenido, esperado)
+        )
+    if isinstance(esperado, float):
+        return obtenido is not None and abs(obtenido - esperado) < 0.005
+    return obtenido == esperado
+
+
+def medir(nombre: str, parser, corpus: List[Tuple[str, Dict]]) -> Dict:
+    """Facturas por segundo (mejor de BENCH_REPETICIONES) y precisión por campo."""
+    mejor = None
+    for _ in range(BENCH_REPETICIONES):
+        inicio = time.perf_counter()
+        resultados = [parser(texto) for texto, _ in corpus]
+        duracion = time.perf_counter() - inicio
+        mejor = duracion if mejor is None else min(mejor, duracion)
+
+    aciertos = {campo: 0 for campo in CAMPOS}
+    completas = 0
+    for resultado, (_, esperado) in zip(resultados, corpus):
+        correctos = [_igual(campo, resultado[campo], esperado[campo]) for campo in CAMPOS]
+        for campo, correcto in zip(CAMPOS, correctos):
+            aciertos[campo] += correcto
+        completas += all(correctos)
+
+    total = len(corpus)
+    return {
+        'nombre': nombre,
+        'facturas_por_segundo': total / mejor,
+        'precision': {campo: aciertos[campo] / total for campo in CAMPOS},
+        'completas': completas / total,
+    }
+
+
+def guardar_corpus(corpus: List[Tuple[str, Dict]], directorio: str):
+    """Guarda cada factura como .txt con su resultado esperado en .json."""
+    destino = Path(directorio)
+    destino.mkdir(parents=True, exist_ok=True)
+    for indice, (texto, esperado) in enumerate(corpus):
+        (destino / f'factura_{indice:05d}.txt').write_text(texto, encoding='utf-8')
+        (destino / f'factura_{indice:05d}.json').write_text(
+            json.dumps(esperado, ensure_ascii=False, indent=2), encoding='utf-8'
+        )
+
+
+def main():
+    rng = Random(BENCH_SEMILLA)
+    corpus = [generar_factura(rng) for _ in range(BENCH_FACTURAS)]
+    paginas = sum(texto.count('\f') + 1 for texto, _ in corpus)
+    print(f"Corpus: {len(corpus)} facturas, {paginas} páginas (semilla {BENCH_SEMILLA})")
+    if BENCH_CORPUS_DIR:
+        guardar_corpus(corpus, BENCH_CORPUS_DIR)
+        print(f"Corpus guardado en {BENCH_CORPUS_DIR}")
+
+    referencia = medir('anterior', parser_referencia, corpus)
+    actual = medir('precompilado', parsear_texto_factura, corpus)
+
+    print(f"\n{'campo':<16}{'anterior':>12}{'precompilado':>14}")
+    for campo in CAMPOS:
+        print(f"{campo:<16}{referencia['precision'][campo]:>11.1%}{actual['precision'][campo]:>14.1%}")
+    print(f"{'factura completa':<16}{referencia['completas']:>11.1%}{actual['completas']:>14.1%}")
+    print(f"{'facturas/seg':<16}{referencia['facturas_por_segundo']:>12.0f}{actual['facturas_por_segundo']:>14.0f}")
+    print(f"\nAceleración: {actual['facturas_por_segundo'] / referencia['facturas_por_segundo']:.1f}x")
+
+    peores = [c for c in CAMPOS if actual['precision'][c] < referencia['precision'][c]]
+    if peores:
+        print(f"\n❌ Precisión menor que la referencia en: {', '.join(peores)}")
+        sys.exit(1)
+    print("\n✅ Precisión igual o mejor que la referencia en todos los campos")
+
+
+if __name__ == '__main__':
+    main()
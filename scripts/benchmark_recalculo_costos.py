@@ -0,0 +1,174 @@
+"""
+Benchmark: recálculo de costos por item vs. recálculo en lote.
+
+Crea un catálogo sintético (10.000 items por defecto) con facturas aprobadas
+y recetas, ejecuta ambos modos de CostoService.recalcular_todos_los_costos,
+compara tiempos y resultados, y elimina los datos sintéticos al final.
+
+Uso:
+    python scripts/benchmark_recalculo_costos.py
+    BENCH_ITEMS=2000 python scripts/benchmark_recalculo_costos.py
+"""
+import sys
+import os
+import time
+from datetime import datetime, timedelta
+from random import Random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from models import db
+from models.item import Item
+from models.proveedor import Proveedor
+from models.factura import Factura, FacturaItem, EstadoFactura, TipoFactura
+from models.receta import Receta, RecetaIngrediente
+from models.costo_item import CostoItem
+from modules.logistica.costos import CostoService
+
+BENCH_ITEMS = int(os.getenv('BENCH_ITEMS', '10000'))
+BENCH_FACTURAS = int(os.getenv('BENCH_FACTURAS', str(max(BENCH_ITEMS // 10, 1))))
+BENCH_LINEAS_POR_FACTURA = 40
+BENCH_RECETAS = int(os.getenv('BENCH_RECETAS', str(max(BENCH_ITEMS // 20, 1))))
+PREFIJO = 'BENCH-COSTO-'
+
+UNIDADES = ['kg', 'g', 'lb', 'l', 'ml', 'unidad', 'caja']
+
+
+def crear_catalogo_sintetico(rng: Random):
+    """Crea items, facturas aprobadas y recetas sintéticas con inserciones masivas."""
+    proveedor = Proveedor(nombre=f'{PREFIJO}Proveedor', activo=True)
+    db.session.add(proveedor)
+    db.session.flush()
+
+    db.session.bulk_insert_mappings(Item, [{
+        'codigo': f'{PREFIJO}{i:06d}',
+        'nombre': f'Item sintético {i}',
+        'categoria': 'INSUMO',
+        'unidad': rng.choice(UNIDADES),
+        'calorias_por_unidad': rng.choice([None, 50, 120, 300]),
+        'tiempo_entrega_dias': 7,
+        'activo': True,
+        'fecha_creacion': datetime.utcnow(),
+    } for i in range(BENCH_ITEMS)])
+    item_ids = [i for (i,) in db.session.query(Item.id).filter(Item.codigo.like(f'{PREFIJO}%'))]
+
+    ahora = datetime.utcnow()
+    db.session.bulk_insert_mappings(Factura, [{
+        'numero_factura': f'{PREFIJO}{f:06d}',
+        'tipo': TipoFactura.PROVEEDOR,
+        'proveedor_id': proveedor.id,
+        'fecha_emision': ahora - timedelta(days=f % 90),
+        'fecha_recepcion': ahora - timedelta(days=f % 90),
+        'fecha_aprobacion': ahora - timedelta(days=f % 90, minutes=f),
+        'subtotal': 0,
+        'iva': 0,
+        'total': 0,
+        'estado': EstadoFactura.APROBADA,
+        'recibida_por_whatsapp': False,
+    } for f in range(BENCH_FACTURAS)])
+    factura_ids = [f for (f,) in db.session.query(Factura.id).filter(Factura.numero_factura.like(f'{PREFIJO}%'))]
+
+    lineas = []
+    for factura_id in factura_ids:
+        for item_id in rng.sample(item_ids, min(BENCH_LINEAS_POR_FACTURA, len(item_ids))):
+            cantidad = rng.choice([1, 2, 5, 10, 25])
+            precio = round(rng.uniform(0.5, 20), 2)
+            lineas.append({
+                'factura_id': factura_id,
+                'item_id': item_id,
+                'cantidad_facturada': cantidad,
+                'cantidad_aprobada': cantidad,
+                'precio_unitario': precio,
+                'subtotal': round(cantidad * precio, 2),
+                'unidad': rng.choice(UNIDADES + [None]),
+            })
+    db.session.bulk_insert_mappings(FacturaItem, lineas)
+
+    db.session.bulk_insert_mappings(Receta, [{
+        'nombre': f'{PREFIJO}Receta {r}',
+        'tipo': 'almuerzo',
+        'porciones': rng.choice([1, 4, 10]),
+        'activa': True,
+        'fecha_creacion': ahora,
+    } for r in range(BENCH_RECETAS)])
+    receta_ids = [r for (r,) in db.session.query(Receta.id).filter(Receta.nombre.like(f'{PREFIJO}%'))]
+    db.session.bulk_insert_mappings(RecetaIngrediente, [{
+        'receta_id': receta_id,
+        'item_id': item_id,
+        'cantidad': rng.choice([0.1, 0.25, 0.5, 1, 2]),
+        'unidad': rng.choice(UNIDADES),
+    } for receta_id in receta_ids for item_id in rng.sample(item_ids, 6)])
+
+    db.session.commit()
+    return item_ids, receta_ids
+
+
+def capturar_costos(item_ids):
+    """Devuelve {item_id: (promedio, variación %, facturas usadas)} para comparar modos."""
+    return {
+        item_id: (float(promedio), float(variacion or 0), usadas)
+        for item_id, promedio, variacion, usadas in db.session.query(
+            CostoItem.item_id, CostoItem.costo_unitario_promedio,
+            CostoItem.variacion_porcentaje, CostoItem.cantidad_facturas_usadas
+        ).filter(CostoItem.item_id.in_(item_ids))
+    }
+
+
+def limpiar(item_ids, receta_ids):
+    """Elimina todos los datos sintéticos del benchmark."""
+    db.session.rollback()
+    db.session.query(RecetaIngrediente).filter(RecetaIngrediente.receta_id.in_(receta_ids)).delete(synchronize_session=False)
+    db.session.query(Receta).filter(Receta.id.in_(receta_ids)).delete(synchronize_session=False)
+    db.session.query(CostoItem).filter(CostoItem.item_id.in_(item_ids)).delete(synchronize_session=False)
+    factura_ids = db.session.query(Factura.id).filter(Factura.numero_factura.like(f'{PREFIJO}%'))
+    db.session.query(FacturaItem).filter(FacturaItem.factura_id.in_(factura_ids)).delete(synchronize_session=False)
+    db.session.query(Factura).filter(Factura.numero_factura.like(f'{PREFIJO}%')).delete(synchronize_session=False)
+    db.session.query(Item).filter(Item.id.in_(item_ids)).delete(synchronize_session=False)
+    db.session.query(Proveedor).filter(Proveedor.nombre.like(f'{PREFIJO}%')).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def medir(modo: str):
+    """Ejecuta un modo de recálculo y retorna (segundos, estadísticas)."""
+    inicio = time.perf_counter()
+    estadisticas = CostoService.recalcular_todos_los_costos(db.session, modo=modo)
+    db.session.commit()
+    return time.perf_counter() - inicio, estadisticas
+
+
+def main():
+    print("=" * 60)
+    print("BENCHMARK: RECÁLCULO DE COSTOS (POR ITEM vs. LOTE)")
+    print("=" * 60)
+    print(f"Items: {BENCH_ITEMS} | Facturas: {BENCH_FACTURAS} x {BENCH_LINEAS_POR_FACTURA} líneas | Recetas: {BENCH_RECETAS}")
+
+    rng = Random(42)
+    item_ids, receta_ids = crear_catalogo_sintetico(rng)
+    try:
+        tiempo_item, stats_item = medir('por_item')
+        costos_item = capturar_costos(item_ids)
+
+        tiempo_lote, stats_lote = medir('lote')
+        costos_lote = capturar_costos(item_ids)
+
+        diferencias = [
+            item_id for item_id, valores in costos_item.items()
+            if item_id not in costos_lote
+            or abs(valores[0] - costos_lote[item_id][0]) > 0.0001
+            or valores[2] != costos_lote[item_id][2]
+        ]
+
+        print(f"\nPor item: {tiempo_item:8.2f} s  {stats_item}")
+        print(f"Lote:     {tiempo_lote:8.2f} s  {stats_lote}")
+        print(f"Aceleración: {tiempo_item / tiempo_lote:.1f}x" if tiempo_lote > 0 else "")
+        print(f"Items con resultados distintos: {len(diferencias)}")
+    finally:
+        limpiar(item_ids, receta_ids)
+        print("\n✓ Datos sintéticos eliminados")
+
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        main()
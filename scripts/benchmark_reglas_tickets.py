@@ -0,0 +1,213 @@
+"""
+Benchmark: motor de reglas de tickets automáticos sobre un año sintético.
+
+Crea un año de programaciones, charolas y mermas sintéticas y evalúa las
+reglas de modules/crm/reglas_tickets.py de dos formas:
+- por_dia: una evaluación por día (como las verificaciones bajo demanda)
+- rango: una sola evaluación para todo el año
+
+Mide tiempo y sentencias SQL de cada modo y verifica que ambos generen
+exactamente los mismos tickets (mismas claves de deduplicación). Cada modo
+corre en una transacción que se revierte al terminar. Termina con código 1
+si los tickets difieren.
+
+Uso:
+    python scripts/benchmark_reglas_tickets.py
+    BENCH_DIAS=90 BENCH_CHAROLAS_POR_SERVICIO=10 python scripts/benchmark_reglas_tickets.py
+"""
+import sys
+import os
+import time
+from datetime import datetime, date, timedelta
+from random import Random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from app import create_app
+from models import db
+from models.item import Item
+from models.inventario import Inventario
+from models.merma import Merma, TipoMerma
+from models.charola import Charola
+from models.programacion import ProgramacionMenu, TiempoComida
+from models.ticket import Ticket
+from modules.crm.reglas_tickets import ReglasTicketsService
+
+BENCH_DIAS = int(os.getenv('BENCH_DIAS', '365'))
+BENCH_UBICACIONES = int(os.getenv('BENCH_UBICACIONES', '3'))
+BENCH_CHAROLAS_POR_SERVICIO = int(os.getenv('BENCH_CHAROLAS_POR_SERVICIO', '20'))
+BENCH_MERMAS_POR_DIA = int(os.getenv('BENCH_MERMAS_POR_DIA', '30'))
+BENCH_ITEMS = int(os.getenv('BENCH_ITEMS', '50'))
+PREFIJO = 'BENCH-TKT-'
+
+
+def crear_datos_sinteticos(rng: Random, desde: date):
+    """Crea items con inventario, programaciones semanales, charolas y mermas con inserciones masivas."""
+    ahora = datetime.utcnow()
+    db.session.bulk_insert_mappings(Item, [{
+        'codigo': f'{PREFIJO}{i:04d}',
+        'nombre': f'Item sintético {i}',
+        'categoria': 'INSUMO',
+        'unidad': 'kg',
+        'activo': True,
+        'fecha_creacion': ahora,
+    } for i in range(BENCH_ITEMS)])
+    item_ids = [i for (i,) in db.session.query(Item.id).filter(Item.codigo.like(f'{PREFIJO}%'))]
+    db.session.bulk_insert_mappings(Inventario, [{
+        'item_id': item_id,
+        'ubicacion': f'{PREFIJO}Bodega',
+        'cantidad_actual': rng.choice([0, 5, 50, 200]),
+        'cantidad_minima': rng.choice([10, 40]),
+        'unidad': 'kg',
+        'ultima_actualizacion': ahora,
+    } for item_id in item_ids])
+
+    ubicaciones = [f'{PREFIJO}Cocina{u}' for u in range(BENCH_UBICACIONES)]
+    programaciones = []
+    charolas = []
+    mermas = []
+    for semana in range(0, BENCH_DIAS, 7):
+        inicio = desde + timedelta(days=semana)
+        fin = min(inicio + timedelta(days=6), desde + timedelta(days=BENCH_DIAS - 1))
+        for ubicacion in ubicaciones:
+            for tiempo in TiempoComida:
+                # Algunas semanas quedan sin programar
+                if rng.random() < 0.05:
+                    continue
+                programaciones.append({
+                    'fecha_desde': inicio,
+                    'fecha_hasta': fin,
+                    'tiempo_comida': tiempo,
+                    'ubicacion': ubicacion,
+                    'personas_estimadas': BENCH_CHAROLAS_POR_SERVICIO,
+                    'charolas_planificadas': BENCH_CHAROLAS_POR_SERVICIO,
+                    'charolas_producidas': 0,
+                    'fecha_creacion': ahora,
+                })
+    for dia in range(BENCH_DIAS):
+        fecha = datetime.combine(desde + timedelta(days=dia), datetime.min.time())
+        for ubicacion in ubicaciones:
+            for tiempo in TiempoComida:
+                # Servicios sin reporte, con desviación o normales
+                sorteo = rng.random()
+                servidas = 0 if sorteo < 0.03 else (
+                    BENCH_CHAROLAS_POR_SERVICIO // 2 if sorteo < 0.10 else BENCH_CHAROLAS_POR_SERVICIO
+                )
+                for c in range(servidas):
+                    charolas.append({
+                        'numero_charola': f'{PREFIJO}{len(charolas):08d}',
+                        'fecha_servicio': fecha + timedelta(hours=12, minutes=c),
+                        'ubicacion': ubicacion,
+                        'tiempo_comida': tiempo.value,
+                        'personas_servidas': 1,
+                        'total_ventas': 5,
+                        'costo_total': 3,
+                        'ganancia': 2,
+                        'fecha_registro': ahora,
+                    })
+        for m in range(BENCH_MERMAS_POR_DIA):
+            cantidad = rng.choice([0.5, 1, 2, 5])
+            mermas.append({
+                'item_id': rng.choice(item_ids),
+                'fecha_merma': fecha + timedelta(hours=8, minutes=m),
+                'tipo': TipoMerma.VENCIMIENTO,
+                'cantidad': cantidad,
+                'unidad': 'kg',
+                'costo_unitario': 2,
+                'costo_total': cantidad * 2,
+                'ubicacion': ubicaciones[m % len(ubicaciones)],
+                'fecha_registro': ahora,
+            })
+    db.session.bulk_insert_mappings(ProgramacionMenu, programaciones)
+    db.session.bulk_insert_mappings(Charola, charolas)
+    db.session.bulk_insert_mappings(Merma, mermas)
+    db.session.commit()
+    print(f"Datos: {len(programaciones)} programaciones, {len(charolas)} charolas, {len(mermas)} mermas")
+    return item_ids
+
+
+def limpiar(item_ids):
+    """Elimina todos los datos sintéticos del benchmark."""
+    db.session.rollback()
+    db.session.query(Merma).filter(Merma.item_id.in_(item_ids)).delete(synchronize_session=False)
+    db.session.query(Charola).filter(Charola.numero_charola.like(f'{PREFIJO}%')).delete(synchronize_session=False)
+    db.session.query(ProgramacionMenu).filter(ProgramacionMenu.ubicacion.like(f'{PREFIJO}%')).delete(synchronize_session=False)
+    db.session.query(Inventario).filter(Inventario.item_id.in_(item_ids)).delete(synchronize_session=False)
+    db.session.query(Item).filter(Item.id.in_(item_ids)).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def medir(modo: str, desde: date, hasta: date, ahora: datetime):
+    """Evalúa las reglas en el modo indicado y revierte. Retorna (claves, consultas, segundos)."""
+    contador = {'consultas': 0}
+
+    def contar(*args):
+        contador['consultas'] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', contar)
+    try:
+        inicio = time.perf_counter()
+        if modo == 'por_dia':
+            dia = desde
+            while dia <= hasta:
+                ReglasTicketsService.evaluar(db.session, dia, dia, ahora=ahora)
+                dia += timedelta(days=1)
+        else:
+            ReglasTicketsService.evaluar(db.session, desde, hasta, ahora=ahora)
+        segundos = time.perf_counter() - inicio
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', contar)
+
+    claves = {
+        clave for (clave,) in db.session.query(Ticket.clave_deduplicacion).filter(
+            Ticket.clave_deduplicacion.isnot(None), Ticket.fecha_creacion >= ahora - timedelta(days=1)
+        )
+    }
+    db.session.rollback()
+    return claves, contador['consultas'], segundos
+
+
+def main() -> bool:
+    print("=" * 60)
+    print("BENCHMARK: MOTOR DE REGLAS DE TICKETS AUTOMÁTICOS")
+    print("=" * 60)
+    print(
+        f"Días: {BENCH_DIAS} | Ubicaciones: {BENCH_UBICACIONES} | "
+        f"Charolas por servicio: {BENCH_CHAROLAS_POR_SERVICIO} | Mermas por día: {BENCH_MERMAS_POR_DIA}"
+    )
+
+    rng = Random(42)
+    hasta = date.today() - timedelta(days=1)
+    desde = hasta - timedelta(days=BENCH_DIAS - 1)
+    ahora = datetime.now()
+    item_ids = crear_datos_sinteticos(rng, desde)
+    correcto = True
+    try:
+        resultados = {}
+        for modo in ('por_dia', 'rango'):
+            claves, consultas, segundos = medir(modo, desde, hasta, ahora)
+            resultados[modo] = claves
+            print(f"  {modo:8s}: {len(claves):6d} tickets | {consultas:6d} consultas | {segundos:8.2f} s")
+
+        if resultados['por_dia'] != resultados['rango']:
+            print(f"  ✗ Los modos generan tickets distintos ({len(resultados['por_dia'] ^ resultados['rango'])} diferencias)")
+            correcto = False
+        else:
+            print("  ✓ Ambos modos generan los mismos tickets")
+
+        # Las consultas del modo rango solo crecen con los lotes del INSERT masivo
+        _, consultas_semana, _ = medir('rango', hasta - timedelta(days=6), hasta, ahora)
+        print(f"  Consultas del modo rango: {consultas_semana} (7 días)")
+    finally:
+        limpiar(item_ids)
+        print("\n✓ Datos sintéticos eliminados")
+    return correcto
+
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        exito = main()
+    sys.exit(0 if exito else 1)
@@ -0,0 +1,309 @@
+"""
+Caché de respuestas para endpoints GET de solo lectura (dashboards y reportes).
+
+Las respuestas se guardan por endpoint + argumentos de la query normalizados y
+se etiquetan con los dominios de datos que leen ('facturas', 'mermas'...).
+Las escrituras del service layer invalidan por etiqueta al confirmar la
+transacción (ver invalidar_tags_post_commit).
+
+Backends:
+- 'memoria' (por defecto): TTL + LRU dentro del proceso
+- 'redis': compartido entre workers de gunicorn (requiere el paquete redis)
+- 'ninguno': desactiva la caché
+"""
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Dict, Iterable, Optional, Tuple
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from flask import g, request, make_response
+
+from config import Config
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Entrada almacenada: (cuerpo, status, mimetype)
+EntradaCache = Tuple[bytes, int, str]
+
+
+class _Contadores:
+    """Contadores de aciertos/fallos/desalojos (por proceso)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.valores = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def sumar(self, nombre: str, cantidad: int = 1) -> None:
+        with self._lock:
+            self.valores[nombre] += cantidad
+
+    def copia(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.valores)
+
+
+class CacheMemoria:
+    """Caché TTL + LRU en memoria del proceso, con índice etiqueta -> claves."""
+
+    backend = 'memoria'
+
+    def __init__(self, max_entradas: int, ttl_segundos: int):
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self.contadores = _Contadores()
+        self._entradas: 'OrderedDict[str, Tuple[float, EntradaCache, Tuple[str, ...]]]' = OrderedDict()
+        self._por_tag: Dict[str, set] = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: str) -> Optional[EntradaCache]:
+        with self._lock:
+            registro = self._entradas.get(clave)
+            if registro is None:
+                self.contadores.sumar('misses')
+                return None
+            expira_en, entrada, _ = registro
+            if expira_en <= time.monotonic():
+                self._quitar(clave)
+                self.contadores.sumar('expirations')
+                self.contadores.sumar('misses')
+                return None
+            self._entradas.move_to_end(clave)
+            self.contadores.sumar('hits')
+            return entrada
+
+    def guardar(self, clave: str, entrada: EntradaCache, tags: Iterable[str], ttl: Optional[int] = None) -> None:
+        tags = tuple(tags)
+        with self._lock:
+            if clave in self._entradas:
+                self._quitar(clave)
+            self._entradas[clave] = (time.monotonic() + (ttl or self.ttl_segundos), entrada, tags)
+            for tag in tags:
+                self._por_tag.setdefault(tag, set()).add(clave)
+            while len(self._entradas) > self.max_entradas:
+                clave_antigua = next(iter(self._entradas))
+                self._quitar(clave_antigua)
+                self.contadores.sumar('evictions')
+
+    def invalidar(self, tags: Iterable[str]) -> int:
+        eliminadas = 0
+        with self._lock:
+            for tag in tags:
+                for clave in list(self._por_tag.get(tag, ())):
+                    if clave in self._entradas:
+                        self._quitar(clave)
+                        eliminadas += 1
+                self._por_tag.pop(tag, None)
+        self.contadores.sumar('invalidations', eliminadas)
+        return eliminadas
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+            self._por_tag.clear()
+
+    def estadisticas(self) -> Dict:
+        with self._lock:
+            entradas = len(self._entradas)
+        return {'backend': self.backend, 'entradas': entradas, 'max_entradas': self.max_entradas,
+                'ttl_segundos': self.ttl_segundos, **self.contadores.copia()}
+
+    def _quitar(self, clave: str) -> None:
+        """Elimina una clave y su referencia en el índice de etiquetas (con el lock tomado)."""
+        _, _, tags = self._entradas.pop(clave)
+        for tag in tags:
+            claves = self._por_tag.get(tag)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self._por_tag[tag]
+
+
+class CacheRedis:
+    """
+    Caché compartida en Redis: TTL nativo por clave y un SET por etiqueta.
+
+    El LRU lo aplica Redis según su maxmemory-policy (allkeys-lru recomendado).
+    Los contadores son del proceso que atiende la petición.
+    """
+
+    backend = 'redis'
+
+    def __init__(self, url: str, ttl_segundos: int, prefijo: str = 'cache_respuestas:'):
+        self.cliente = redis.Redis.from_url(url)
+        self.ttl_segundos = ttl_segundos
+        self.prefijo = prefijo
+        self.contadores = _Contadores()
+
+    def obtener(self, clave: str) -> Optional[EntradaCache]:
+        try:
+            valor = self.cliente.get(self.prefijo + clave)
+        except Exception as e:
+            logger.warning(f"Caché Redis no disponible al leer: {str(e)}")
+            valor = None
+        if valor is None:
+            self.contadores.sumar('misses')
+            return None
+        self.contadores.sumar('hits')
+        datos = json.loads(valor)
+        return datos['cuerpo'].encode('utf-8'), datos['status'], datos['mimetype']
+
+    def guardar(self, clave: str, entrada: EntradaCache, tags: Iterable[str], ttl: Optional[int] = None) -> None:
+        cuerpo, status, mimetype = entrada
+        ttl = ttl or self.ttl_segundos
+        try:
+            pipe = self.cliente.pipeline()
+            pipe.set(self.prefijo + clave, json.dumps({
+                'cuerpo': cuerpo.decode('utf-8'), 'status': status, 'mimetype': mimetype
+            }), ex=ttl)
+            for tag in tags:
+                pipe.sadd(f'{self.prefijo}tag:{tag}', clave)
+                pipe.expire(f'{self.prefijo}tag:{tag}', ttl * 2)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Caché Redis no disponible al escribir: {str(e)}")
+
+    def invalidar(self, tags: Iterable[str]) -> int:
+        eliminadas = 0
+        try:
+            for tag in tags:
+                clave_tag = f'{self.prefijo}tag:{tag}'
+                claves = [self.prefijo + c.decode('utf-8') for c in self.cliente.smembers(clave_tag)]
+                if claves:
+                    eliminadas += self.cliente.delete(*claves)
+                self.cliente.delete(clave_tag)
+        except Exception as e:
+            logger.warning(f"Caché Redis no disponible al invalidar: {str(e)}")
+        self.contadores.sumar('invalidations', eliminadas)
+        return eliminadas
+
+    def limpiar(self) -> None:
+        for clave in self.cliente.scan_iter(f'{self.prefijo}*'):
+            self.cliente.delete(clave)
+
+    def estadisticas(self) -> Dict:
+        return {'backend': self.backend, 'ttl_segundos': self.ttl_segundos, **self.contadores.copia()}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def obtener_cache():
+    """Retorna la caché del proceso según Config.CACHE_BACKEND (None si está desactivada)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = _crear_cache()
+    return _cache or None
+
+
+def _crear_cache():
+    backend = (Config.CACHE_BACKEND or 'memoria').lower()
+    if backend == 'ninguno':
+        return False
+    if backend == 'redis':
+        if REDIS_AVAILABLE and Config.CACHE_REDIS_URL:
+            return CacheRedis(Config.CACHE_REDIS_URL, Config.CACHE_TTL_SEGUNDOS)
+        logger.warning("CACHE_BACKEND=redis sin paquete redis o CACHE_REDIS_URL; usando caché en memoria")
+    return CacheMemoria(Config.CACHE_MAX_ENTRADAS, Config.CACHE_TTL_SEGUNDOS)
+
+
+def clave_peticion() -> str:
+    """Clave de caché: endpoint + argumentos de la query ordenados y sin valores vacíos."""
+    argumentos = sorted(
+        (nombre, valor)
+        for nombre in request.args
+        for valor in sorted(request.args.getlist(nombre))
+        if valor != ''
+    )
+    firma = hashlib.sha256(json.dumps(argumentos).encode('utf-8')).hexdigest()[:32]
+    return f'{request.endpoint}:{firma}'
+
+
+def cachear_respuesta(tags: Iterable[str], ttl: Optional[int] = None) -> Callable:
+    """
+    Decorador para GET de solo lectura: sirve la respuesta desde caché si existe.
+
+    Solo se guardan respuestas 200 que no se marcaron con no_cachear_respuesta()
+    (datos mock o de respaldo). Agrega el header X-Cache (HIT/MISS).
+
+    Usage:
+        @bp.route('/kpis', methods=['GET'])
+        @cachear_respuesta(tags=('facturas', 'pedidos'))
+        def obtener_kpis():
+            ...
+    """
+    tags = tuple(tags)
+
+    def decorador(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = obtener_cache()
+            if cache is None or request.method != 'GET':
+                return func(*args, **kwargs)
+
+            clave = clave_peticion()
+            entrada = cache.obtener(clave)
+            if entrada is not None:
+                cuerpo, status, mimetype = entrada
+                respuesta = make_response(cuerpo, status)
+                respuesta.mimetype = mimetype
+                respuesta.headers['X-Cache'] = 'HIT'
+                return respuesta
+
+            # g se comparte entre peticiones si ya hay un app context activo (tests, CLI)
+            g.pop('no_cachear_respuesta', None)
+            respuesta = make_response(func(*args, **kwargs))
+            if respuesta.status_code == 200 and not respuesta.is_streamed and not g.pop('no_cachear_respuesta', False):
+                cache.guardar(clave, (respuesta.get_data(), respuesta.status_code, respuesta.mimetype), tags, ttl)
+            respuesta.headers['X-Cache'] = 'MISS'
+            return respuesta
+        return wrapper
+    return decorador
+
+
+def no_cachear_respuesta() -> None:
+    """
+    Marca la respuesta de la petición actual para que cachear_respuesta no la guarde.
+
+    Los endpoints la llaman cuando responden con datos mock o con la estructura
+    de respaldo tras un error de la base de datos: esa respuesta no debe
+    seguir sirviéndose cuando haya datos reales.
+    """
+    g.no_cachear_respuesta = True
+
+
+def invalidar_tags(*tags: str) -> int:
+    """Elimina de la caché todas las respuestas etiquetadas con alguno de los tags."""
+    cache = obtener_cache()
+    if cache is None:
+        return 0
+    eliminadas = cache.invalidar(tags)
+    if eliminadas:
+        logger.debug(f"Caché invalidada para {tags}: {eliminadas} entradas")
+    return eliminadas
+
+
+def invalidar_tags_post_commit(db, *tags: str) -> None:
+    """Programa la invalidación para cuando se confirme la transacción actual de la sesión."""
+    from modules.crm.notificaciones.cola_post_commit import encolar_post_commit
+    encolar_post_commit(db, invalidar_tags, *tags)
+
+
+def estadisticas_cache() -> Dict:
+    """Contadores de la caché para /api/health."""
+    cache = obtener_cache()
+    if cache is None:
+        return {'backend': 'ninguno'}
+    return cache.estadisticas()
@@ -1,9 +1,10 @@
 """
 Funciones auxiliares del sistema ERP.
 """
-from datetime import datetime, timedelta
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
+from sqlalchemy import and_, true
 from sqlalchemy.orm import Session
 
 def calcular_iva(subtotal: float, porcentaje_iva: float = 0.15) -> float:
@@ -44,6 +45,51 @@ def formatear_moneda(valor: float) -> str:
     """
     return f"${valor:,.2f}"
 
+def filtro_rango_fechas(
+    columna,
+    desde: Optional[Union[date, datetime]] = None,
+    hasta: Optional[Union[date, datetime]] = None
+):
+    """
+    Filtra una columna DateTime por días completos sin envolverla en func.date().
+    
+    Genera `columna >= inicio AND columna < fin`, que puede usar los índices
+    b-tree sobre la columna (func.date(columna) obliga a un recorrido secuencial).
+    
+    Args:
+        columna: Columna DateTime a filtrar
+        desde: Primer día incluido (None = sin límite inferior)
+        hasta: Último día incluido (None = sin límite superior)
+        
+    Returns:
+        Condición SQLAlchemy para usar en filter() o and_()
+    """
+    condiciones = []
+    if desde is not None:
+        condiciones.append(columna >= _inicio_dia(desde))
+    if hasta is not None:
+        condiciones.append(columna < _inicio_dia(hasta) + timedelta(days=1))
+    return and_(*condiciones) if condiciones else true()
+
+def filtro_dia(columna, fecha: Union[date, datetime]):
+    """
+    Filtra una columna DateTime por un día completo (equivale a func.date(columna) == fecha).
+    
+    Args:
+        columna: Columna DateTime a filtrar
+        fecha: Día a filtrar
+        
+    Returns:
+        Condición SQLAlchemy para usar en filter() o and_()
+    """
+    return filtro_rango_fechas(columna, fecha, fecha)
+
+def _inicio_dia(valor: Union[date, datetime]) -> datetime:
+    """Retorna las 00:00 del día de una fecha o datetime."""
+    if isinstance(valor, datetime):
+        valor = valor.date()
+    return datetime.combine(valor, time.min)
+
 def obtener_fecha_entrega_esperada(dias_entrega: int, fecha_base: Optional[datetime] = None) -> datetime:
     """
     Calcula la fecha de entrega esperada sumando días hábiles.
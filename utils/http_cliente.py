@@ -0,0 +1,324 @@
+"""
+Cliente HTTP saliente compartido por las integraciones (OpenAI/OpenRouter,
+WhatsApp Business API).
+
+Por cada upstream (esquema + host) mantiene, dentro del proceso:
+- una requests.Session con pool de conexiones keep-alive, para que las
+  ráfagas de notificaciones y los turnos del chat reutilicen la conexión
+  TCP+TLS en lugar de abrir una nueva por llamada
+- un circuito: tras HTTP_CIRCUITO_FALLOS fallos seguidos (error de red o 5xx)
+  se abre y las llamadas fallan de inmediato durante
+  HTTP_CIRCUITO_ESPERA_SEGUNDOS; luego deja pasar una sola llamada de prueba
+- un histograma de latencias y contadores, expuestos en /api/health
+
+Todas las llamadas tienen timeout de conexión y de lectura. Las respuestas
+429/5xx y los errores de conexión se reintentan con backoff exponencial con
+jitter (respetando Retry-After). Los métodos no idempotentes (POST) solo se
+reintentan cuando la solicitud no llegó a procesarse: conexión no
+establecida, 429 o 503.
+"""
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+METODOS_IDEMPOTENTES = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+# Estados que se reintentan según el método
+ESTADOS_REINTENTABLES = frozenset([429, 500, 502, 503, 504])
+ESTADOS_REINTENTABLES_NO_IDEMPOTENTE = frozenset([429, 503])
+
+# Límites superiores (ms) de los buckets del histograma de latencias
+BUCKETS_LATENCIA_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class CircuitoAbiertoError(requests.exceptions.ConnectionError):
+    """El circuito del upstream está abierto: la llamada se rechaza sin enviarse."""
+
+    def __init__(self, upstream: str, reintentar_en: float):
+        super().__init__(
+            f"Circuito abierto para {upstream}: demasiados fallos seguidos, "
+            f"se reintentará en {reintentar_en:.0f} s"
+        )
+        self.upstream = upstream
+        self.reintentar_en = reintentar_en
+
+
+class Circuito:
+    """Circuit breaker de un upstream (cerrado → abierto → semiabierto)."""
+
+    CERRADO = 'cerrado'
+    ABIERTO = 'abierto'
+    SEMIABIERTO = 'semiabierto'
+
+    def __init__(self, upstream: str, umbral_fallos: int, espera_segundos: float):
+        self.upstream = upstream
+        self.umbral_fallos = umbral_fallos
+        self.espera_segundos = espera_segundos
+        self.estado = self.CERRADO
+        self.fallos_seguidos = 0
+        self.aperturas = 0
+        self._abierto_hasta = 0.0
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    def permitir(self) -> None:
+        """Deja pasar la llamada o lanza CircuitoAbiertoError."""
+        with self._lock:
+            if self.estado == self.CERRADO:
+                return
+            ahora = time.monotonic()
+            if self.estado == self.ABIERTO and ahora >= self._abierto_hasta:
+                self.estado = self.SEMIABIERTO
+            if self.estado == self.SEMIABIERTO and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return
+            raise CircuitoAbiertoError(self.upstream, max(self._abierto_hasta - ahora, 0.0))
+
+    def abierto(self) -> bool:
+        with self._lock:
+            return self.estado == self.ABIERTO
+
+    def registrar_exito(self) -> None:
+        with self._lock:
+            self.estado = self.CERRADO
+            self.fallos_seguidos = 0
+            self._prueba_en_curso = False
+
+    def registrar_fallo(self) -> None:
+        with self._lock:
+            self.fallos_seguidos += 1
+            if self.estado == self.SEMIABIERTO or self.fallos_seguidos >= self.umbral_fallos:
+                if self.estado != self.ABIERTO:
+                    self.aperturas += 1
+                    logger.warning(f"Circuito abierto para {self.upstream} tras {self.fallos_seguidos} fallos seguidos")
+                self.estado = self.ABIERTO
+                self._abierto_hasta = time.monotonic() + self.espera_segundos
+                self._prueba_en_curso = False
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                'estado': self.estado,
+                'fallos_seguidos': self.fallos_seguidos,
+                'aperturas': self.aperturas,
+                'reintentar_en_segundos': (
+                    round(max(self._abierto_hasta - time.monotonic(), 0.0), 1) if self.estado == self.ABIERTO else None
+                ),
+            }
+
+
+class HistogramaLatencia:
+    """Histograma de latencias por buckets fijos (percentiles aproximados al límite del bucket)."""
+
+    def __init__(self):
+        self.conteos = [0] * (len(BUCKETS_LATENCIA_MS) + 1)
+        self.total = 0
+        self.suma_ms = 0.0
+        self.maximo_ms = 0.0
+
+    def registrar(self, latencia_ms: float) -> None:
+        indice = next((i for i, limite in enumerate(BUCKETS_LATENCIA_MS) if latencia_ms <= limite), len(BUCKETS_LATENCIA_MS))
+        self.conteos[indice] += 1
+        self.total += 1
+        self.suma_ms += latencia_ms
+        self.maximo_ms = max(self.maximo_ms, latencia_ms)
+
+    def percentil(self, fraccion: float) -> Optional[float]:
+        if not self.total:
+            return None
+        objetivo = fraccion * self.total
+        acumulado = 0
+        for i, conteo in enumerate(self.conteos):
+            acumulado += conteo
+            if acumulado >= objetivo:
+                return float(BUCKETS_LATENCIA_MS[i]) if i < len(BUCKETS_LATENCIA_MS) else round(self.maximo_ms, 1)
+        return round(self.maximo_ms, 1)
+
+    def to_dict(self) -> Dict:
+        etiquetas = [f"<={limite}" for limite in BUCKETS_LATENCIA_MS] + [f">{BUCKETS_LATENCIA_MS[-1]}"]
+        return {
+            'total': self.total,
+            'promedio_ms': round(self.suma_ms / self.total, 1) if self.total else None,
+            'p50_ms': self.percentil(0.5),
+            'p95_ms': self.percentil(0.95),
+            'p99_ms': self.percentil(0.99),
+            'maximo_ms': round(self.maximo_ms, 1),
+            'buckets_ms': dict(zip(etiquetas, self.conteos)),
+        }
+
+
+class Upstream:
+    """Sesión con pool keep-alive, circuito y métricas de un esquema + host."""
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self.session = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=Config.HTTP_POOL_MAXIMO)
+        self.session.mount('http://', adaptador)
+        self.session.mount('https://', adaptador)
+        self.circuito = Circuito(nombre, Config.HTTP_CIRCUITO_FALLOS, Config.HTTP_CIRCUITO_ESPERA_SEGUNDOS)
+        self.histograma = HistogramaLatencia()
+        self.contadores = {'solicitudes': 0, 'errores_red': 0, 'respuestas_5xx': 0, 'respuestas_429': 0, 'reintentos': 0, 'rechazadas': 0}
+        self._lock = threading.Lock()
+
+    def sumar(self, nombre: str) -> None:
+        with self._lock:
+            self.contadores[nombre] += 1
+
+    def registrar(self, latencia_ms: float, status: Optional[int]) -> None:
+        with self._lock:
+            self.contadores['solicitudes'] += 1
+            self.histograma.registrar(latencia_ms)
+            if status is None:
+                self.contadores['errores_red'] += 1
+            elif status == 429:
+                self.contadores['respuestas_429'] += 1
+            elif status >= 500:
+                self.contadores['respuestas_5xx'] += 1
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            datos = dict(self.contadores)
+            datos['latencia'] = self.histograma.to_dict()
+        datos['circuito'] = self.circuito.to_dict()
+        return datos
+
+
+def _sin_enviar(error: requests.exceptions.RequestException) -> bool:
+    """True si la solicitud no llegó al servidor (seguro reintentar incluso un POST)."""
+    if isinstance(error, (requests.exceptions.ConnectTimeout, CircuitoAbiertoError)):
+        return True
+    causa = error.args[0] if error.args else None
+    return isinstance(getattr(causa, 'reason', causa), NewConnectionError)
+
+
+def _espera_reintento(intento: int, response: Optional[requests.Response]) -> float:
+    """Backoff exponencial con jitter completo; Retry-After (en segundos) si el servidor lo indica."""
+    if response is not None:
+        retry_after = response.headers.get('Retry-After')
+        if retry_after and retry_after.strip().isdigit():
+            return min(float(retry_after), Config.HTTP_BACKOFF_MAX_SEGUNDOS)
+    return random.uniform(0, min(Config.HTTP_BACKOFF_MAX_SEGUNDOS, Config.HTTP_BACKOFF_BASE_SEGUNDOS * (2 ** intento)))
+
+
+class ClienteHTTP:
+    """Cliente HTTP del proceso: un Upstream por esquema + host, creado en el primer uso."""
+
+    def __init__(self):
+        self._upstreams: Dict[str, Upstream] = {}
+        self._lock = threading.Lock()
+
+    def _upstream(self, url: str) -> Upstream:
+        partes = urlsplit(url)
+        nombre = f"{partes.scheme}://{partes.netloc}".lower()
+        upstream = self._upstreams.get(nombre)
+        if upstream is None:
+            with self._lock:
+                upstream = self._upstreams.setdefault(nombre, Upstream(nombre))
+        return upstream
+
+    def solicitar(
+        self,
+        metodo: str,
+        url: str,
+        timeout: Union[None, float, Tuple[float, float]] = None,
+        reintentos: Optional[int] = None,
+        **kwargs
+    ) -> requests.Response:
+        """
+        Envía la solicitud por la sesión del upstream, con reintentos y circuito.
+
+        Args:
+            metodo: Método HTTP
+            url: URL completa
+            timeout: (conexión, lectura) o solo lectura en segundos; por defecto
+                HTTP_TIMEOUT_CONEXION / HTTP_TIMEOUT_LECTURA
+            reintentos: Reintentos máximos (por defecto HTTP_REINTENTOS)
+            **kwargs: Argumentos de requests (headers, json, params, stream...)
+
+        Returns:
+            La última respuesta (también si es un error HTTP: el llamador
+            decide con status_code o raise_for_status)
+
+        Raises:
+            CircuitoAbiertoError: El upstream tiene el circuito abierto
+            requests.exceptions.RequestException: Error de red tras los reintentos
+        """
+        metodo = metodo.upper()
+        upstream = self._upstream(url)
+        if timeout is None:
+            timeout = (Config.HTTP_TIMEOUT_CONEXION, Config.HTTP_TIMEOUT_LECTURA)
+        elif not isinstance(timeout, tuple):
+            timeout = (min(Config.HTTP_TIMEOUT_CONEXION, timeout), timeout)
+        reintentos = Config.HTTP_REINTENTOS if reintentos is None else reintentos
+        idempotente = metodo in METODOS_IDEMPOTENTES
+        estados_reintentables = ESTADOS_REINTENTABLES if idempotente else ESTADOS_REINTENTABLES_NO_IDEMPOTENTE
+
+        try:
+            upstream.circuito.permitir()
+        except CircuitoAbiertoError:
+            upstream.sumar('rechazadas')
+            raise
+
+        intento = 0
+        while True:
+            inicio = time.perf_counter()
+            response, error = None, None
+            try:
+                # Con stream=True la latencia es hasta recibir los headers
+                response = upstream.session.request(metodo, url, timeout=timeout, **kwargs)
+            except requests.exceptions.RequestException as e:
+                error = e
+            upstream.registrar((time.perf_counter() - inicio) * 1000, response.status_code if response is not None else None)
+
+            if error is not None or response.status_code >= 500:
+                upstream.circuito.registrar_fallo()
+            else:
+                upstream.circuito.registrar_exito()
+
+            if error is not None:
+                reintentable = idempotente or _sin_enviar(error)
+            else:
+                reintentable = response.status_code in estados_reintentables
+            if not reintentable or intento >= reintentos or upstream.circuito.abierto():
+                if error is not None:
+                    raise error
+                return response
+
+            espera = _espera_reintento(intento, response)
+            logger.info(
+                f"Reintentando {metodo} {upstream.nombre} en {espera:.2f} s "
+                f"({error or f'HTTP {response.status_code}'}; intento {intento + 1} de {reintentos})"
+            )
+            if response is not None:
+                response.close()  # Devuelve la conexión al pool
+            upstream.sumar('reintentos')
+            time.sleep(espera)
+            intento += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.solicitar('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.solicitar('POST', url, **kwargs)
+
+    def estadisticas(self) -> Dict[str, Dict]:
+        """Métricas y estado del circuito de cada upstream usado por este proceso."""
+        with self._lock:
+            upstreams = list(self._upstreams.values())
+        return {upstream.nombre: upstream.to_dict() for upstream in upstreams}
+
+
+# Instancia global (por proceso)
+cliente_http = ClienteHTTP()
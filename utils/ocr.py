@@ -1,15 +1,70 @@
 """
-Integración con Google Cloud Vision API para OCR de facturas.
+OCR de facturas con backends intercambiables.
+
+- 'google_vision': Google Cloud Vision API (producción)
+- 'local': sin red ni credenciales, para desarrollo y pruebas
+
+El backend activo se elige con Config.OCR_BACKEND; `obtener_ocr()` retorna su
+instancia (una por proceso). Todos comparten el parseo de texto de
+utils/parser_factura.py.
 """
 import os
 import json
-from typing import Dict, List, Optional
-from google.cloud import vision
-from google.oauth2 import service_account
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional, Type
 from config import Config
+from utils.parser_factura import parsear_texto_factura
+
+try:
+    from google.cloud import vision
+    from google.oauth2 import service_account
+    VISION_AVAILABLE = True
+except ImportError:
+    VISION_AVAILABLE = False
+
+class BackendOCR(ABC):
+    """Base de los backends de OCR: extraen texto y comparten el parseo de facturas."""
+
+    nombre = None
+
+    @abstractmethod
+    def extract_text_from_image(self, image_path: str) -> str:
+        """Extrae el texto de una imagen."""
+
+    def extract_invoice_data(self, image_path: str) -> Dict:
+        """
+        Extrae datos estructurados de una factura desde una imagen.
+        
+        Args:
+            image_path: Ruta al archivo de imagen de la factura
+            
+        Returns:
+            Diccionario con datos extraídos de la factura
+        """
+        return self._parse_invoice_text(self.extract_text_from_image(image_path))
+
+    def parse_invoice_text(self, texto: str) -> Dict:
+        """Parsea texto ya extraído (el pipeline de ingesta separa OCR y parseo)."""
+        return self._parse_invoice_text(texto)
+
+    def _parse_invoice_text(self, texto: str) -> Dict:
+        """
+        Parsea el texto extraído para obtener datos estructurados de la factura.
+        
+        Args:
+            texto: Texto completo extraído de la factura
+            
+        Returns:
+            Diccionario con datos estructurados
+        """
+        return parsear_texto_factura(texto)
 
-class OCRProcessor:
-    """Procesador de OCR para facturas."""
+class OCRProcessor(BackendOCR):
+    """Procesador de OCR para facturas con Google Cloud Vision."""
+    
+    nombre = 'google_vision'
     
     def __init__(self):
         """Inicializa el cliente de Google Cloud Vision."""
@@ -18,9 +73,11 @@ class OCRProcessor:
     
     def _initialize_client(self):
         """Inicializa el cliente de Google Cloud Vision."""
+        if not VISION_AVAILABLE:
+            print("Advertencia: google-cloud-vision no está instalado; use OCR_BACKEND=local")
+            self.client = None
+            return
         try:
-            import json
-            
             # Prioridad 1: JSON desde variable de entorno (mejor para Render manual)
             if Config.GOOGLE_APPLICATION_CREDENTIALS_JSON:
                 credentials_info = json.loads(Config.GOOGLE_APPLICATION_CREDENTIALS_JSON)
@@ -89,117 +146,58 @@ class OCRProcessor:
         if texts:
             return texts[0].description
         return ""
-    
-    def extract_invoice_data(self, image_path: str) -> Dict:
-        """
-        Extrae datos estructurados de una factura desde una imagen.
-        
-        Args:
-            image_path: Ruta al archivo de imagen de la factura
-            
-        Returns:
-            Diccionario con datos extraídos de la factura
-        """
-        self._ensure_client()
-        
-        # Extraer texto completo
-        texto_completo = self.extract_text_from_image(image_path)
-        
-        # Procesar texto para extraer datos estructurados
-        datos = self._parse_invoice_text(texto_completo)
-        
-        return datos
-    
-    def _parse_invoice_text(self, texto: str) -> Dict:
-        """
-        Parsea el texto extraído para obtener datos estructurados de la factura.
-        
-        Args:
-            texto: Texto completo extraído de la factura
-            
-        Returns:
-            Diccionario con datos estructurados
-        """
-        datos = {
-            'numero_factura': None,
-            'proveedor': None,
-            'ruc': None,
-            'fecha': None,
-            'items': [],
-            'subtotal': None,
-            'iva': None,
-            'total': None,
-        }
-        
-        lineas = texto.split('\n')
-        
-        # Buscar número de factura (patrones comunes)
-        for linea in lineas:
-            linea_lower = linea.lower()
-            if 'factura' in linea_lower or 'invoice' in linea_lower:
-                # Intentar extraer número
-                import re
-                numeros = re.findall(r'\d+', linea)
-                if numeros:
-                    datos['numero_factura'] = '-'.join(numeros[:3]) if len(numeros) >= 3 else numeros[0]
-            
-            # Buscar RUC
-            if 'ruc' in linea_lower:
-                ruc_match = re.search(r'\d{10,13}', linea)
-                if ruc_match:
-                    datos['ruc'] = ruc_match.group()
-            
-            # Buscar fecha
-            fecha_match = re.search(r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}', linea)
-            if fecha_match:
-                datos['fecha'] = fecha_match.group()
-            
-            # Buscar totales
-            if 'total' in linea_lower or 'suma' in linea_lower:
-                total_match = re.search(r'\d+\.?\d*', linea)
-                if total_match:
-                    datos['total'] = float(total_match.group())
-        
-        # Buscar nombre del proveedor (generalmente en las primeras líneas)
-        for i, linea in enumerate(lineas[:10]):
-            if len(linea.strip()) > 5 and not any(char.isdigit() for char in linea[:5]):
-                datos['proveedor'] = linea.strip()
-                break
-        
-        # Buscar items (líneas con cantidades y precios)
-        unidades_comunes = ['kg', 'g', 'qq', 'quintal', 'quintales', 'l', 'ml', 'litro', 'litros', 
-                           'unidad', 'unidades', 'caja', 'cajas', 'paquete', 'paquetes', 
-                           'lb', 'libras', 'arroba', 'arrobas']
-        
-        for linea in lineas:
-            # Patrón: cantidad descripción precio total
-            item_match = re.match(r'(\d+\.?\d*)\s+(.+?)\s+(\d+\.?\d*)\s+(\d+\.?\d*)', linea)
-            if item_match:
-                cantidad, descripcion, precio, total_item = item_match.groups()
-                
-                # Intentar extraer unidad de la descripción
-                unidad_extraida = None
-                descripcion_limpia = descripcion.strip()
-                
-                # Buscar unidad al final de la descripción o después de la cantidad
-                for unidad in unidades_comunes:
-                    # Buscar unidad después de la cantidad o al final de la descripción
-                    patron_unidad = rf'\b{unidad}\b'
-                    if re.search(patron_unidad, descripcion_limpia, re.IGNORECASE):
-                        unidad_extraida = unidad.lower()
-                        # Limpiar la unidad de la descripción
-                        descripcion_limpia = re.sub(patron_unidad, '', descripcion_limpia, flags=re.IGNORECASE).strip()
-                        break
-                
-                datos['items'].append({
-                    'descripcion': descripcion_limpia,
-                    'cantidad': float(cantidad),
-                    'precio': float(precio),
-                    'total': float(total_item),
-                    'unidad': unidad_extraida,
-                })
-        
-        return datos
 
-# Instancia global
-ocr_processor = OCRProcessor()
+class OCRLocal(BackendOCR):
+    """
+    Backend sin red para desarrollo y pruebas: no reconoce imágenes.
+
+    Usa como texto el archivo .txt con el mismo nombre junto a la imagen o,
+    si no existe y la "imagen" es texto plano (fixture de prueba), su contenido.
+    """
+
+    nombre = 'local'
+
+    def extract_text_from_image(self, image_path: str) -> str:
+        """Retorna el texto de prueba asociado a la imagen ('' si no hay)."""
+        ruta = Path(image_path)
+        texto_adjunto = ruta.with_suffix('.txt')
+        if texto_adjunto.exists() and texto_adjunto != ruta:
+            return texto_adjunto.read_text(encoding='utf-8')
+        try:
+            return ruta.read_bytes().decode('utf-8')
+        except UnicodeDecodeError:
+            return ''
+
+# Registro de backends: nombre -> clase
+_BACKENDS: Dict[str, Type[BackendOCR]] = {
+    OCRProcessor.nombre: OCRProcessor,
+    OCRLocal.nombre: OCRLocal,
+}
+_instancias: Dict[str, BackendOCR] = {}
+_lock_instancias = threading.Lock()
+
+def registrar_backend_ocr(nombre: str, clase: Type[BackendOCR]) -> None:
+    """Registra (o reemplaza) un backend de OCR seleccionable con OCR_BACKEND."""
+    if getattr(clase, '__abstractmethods__', None):
+        raise TypeError(f"El backend de OCR {clase.__name__} no implementa: {', '.join(sorted(clase.__abstractmethods__))}")
+    with _lock_instancias:
+        _BACKENDS[nombre] = clase
+        _instancias.pop(nombre, None)
+
+def obtener_ocr(nombre: Optional[str] = None) -> BackendOCR:
+    """
+    Retorna la instancia del backend de OCR (creada una vez por proceso).
+
+    Args:
+        nombre: Backend a usar (por defecto Config.OCR_BACKEND)
+    """
+    nombre = nombre or Config.OCR_BACKEND
+    with _lock_instancias:
+        if nombre not in _instancias:
+            if nombre not in _BACKENDS:
+                raise ValueError(f"Backend de OCR desconocido: {nombre}. Disponibles: {list(_BACKENDS)}")
+            _instancias[nombre] = _BACKENDS[nombre]()
+        return _instancias[nombre]
+
+# Instancia global del backend configurado (se mantiene el nombre por compatibilidad)
+ocr_processor = obtener_ocr()
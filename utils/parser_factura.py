@@ -0,0 +1,218 @@
+"""
+Parser del texto OCR de facturas.
+
+Recorre el documento una sola vez, línea por línea (sirve para texto en
+memoria o un stream de varias páginas). Cada línea se clasifica con una única
+búsqueda de palabras clave precompilada (encabezado, RUC, fecha, subtotal,
+IVA, total); las líneas que empiezan con un número se prueban como items.
+
+Reglas:
+- Número, RUC, fecha y proveedor: gana el primero encontrado (los encabezados
+  se repiten en cada página). La fecha de una línea con "fecha" tiene prioridad.
+- Subtotal, IVA y total: gana el último (el resumen está al final) y se toma
+  el último número de la línea sin contar porcentajes ("IVA 15% 1,70" -> 1.70;
+  "IVA 12%" sin monto no asigna nada).
+- Montos con coma o punto decimal y separador de miles ("1.234,56", "1,234.56").
+"""
+import re
+from typing import Dict, Iterable, Optional
+
+UNIDADES_COMUNES = [
+    'kg', 'g', 'qq', 'quintal', 'quintales', 'l', 'ml', 'litro', 'litros',
+    'unidad', 'unidades', 'caja', 'cajas', 'paquete', 'paquetes',
+    'lb', 'libras', 'arroba', 'arrobas',
+]
+
+# Alternancia única de unidades (las más largas primero)
+_UNIDAD = '|'.join(sorted(UNIDADES_COMUNES, key=len, reverse=True))
+RE_UNIDAD = re.compile(rf'\b(?:{_UNIDAD})\b\.?', re.IGNORECASE)
+
+# Palabras clave de cada tipo de línea, en una sola pasada
+RE_CLAVES = re.compile(
+    r'(?P<subtotal>sub\s?-?\s?total|total\s+sin\s+impuestos|base\s+imponible)'
+    r'|(?P<iva>\bi\.?\s?v\.?\s?a\b)'
+    r'|(?P<total>\btotal\b|\bsuma\b)'
+    r'|(?P<factura>factura|invoice)'
+    r'|(?P<ruc>\br\.?\s?u\.?\s?c\b)'
+    r'|(?P<fecha>\bfecha\b)'
+    r'|(?P<pagina>\bp[aá]g(?:ina)?\.?\s*\d+\s*(?:de|/)\s*\d+)',
+    re.IGNORECASE
+)
+
+# Subcadenas que contiene toda línea con palabras clave (sobre el texto en
+# minúsculas): las demás líneas se descartan sin ejecutar RE_CLAVES
+RE_INDICIOS = re.compile(r'total|suma|base|i\.? ?v|factura|invoice|r\.? ?u|fecha|p[aá]g')
+
+RE_FECHA = re.compile(r'\b(?:\d{1,2}[/-]\d{1,2}[/-]\d{2,4}|\d{4}-\d{2}-\d{2})\b')
+RE_RUC = re.compile(r'(?<!\d)\d{10,13}(?!\d)')
+RE_ENTERO = re.compile(r'\d+')
+RE_MONTO = re.compile(r'\d[\d.,]*\d|\d')
+RE_PORCENTAJE = re.compile(r'\d+(?:[.,]\d+)?\s?%')
+_NUM = r'\d+(?:[.,]\d+)?'
+RE_ITEM = re.compile(
+    rf'^\s*(?P<cantidad>{_NUM})\s*(?:(?P<unidad>{_UNIDAD})\b\.?)?\s+(?P<descripcion>.+?)'
+    rf'\s+\$?\s?(?P<precio>{_NUM})\s+\$?\s?(?P<total>{_NUM})\s*$',
+    re.IGNORECASE
+)
+RE_ESPACIOS = re.compile(r'\s{2,}')
+
+LINEAS_ENCABEZADO_PROVEEDOR = 10  # El proveedor se busca en las primeras líneas
+
+
+def a_numero(texto: str) -> Optional[float]:
+    """Convierte un monto con coma o punto decimal (y separador de miles) a float."""
+    if ',' not in texto:
+        try:
+            return float(texto)
+        except ValueError:
+            return None
+    coma, punto = texto.rfind(','), texto.rfind('.')
+    if coma >= 0 and punto >= 0:
+        # El separador que aparece último es el decimal
+        if coma > punto:
+            texto = texto.replace('.', '').replace(',', '.')
+        else:
+            texto = texto.replace(',', '')
+    else:
+        # "13,00" es decimal; "1,234" es separador de miles
+        decimales = len(texto) - coma - 1
+        texto = texto.replace(',', '.') if decimales in (1, 2) and texto.count(',') == 1 else texto.replace(',', '')
+    try:
+        return float(texto)
+    except ValueError:
+        return None
+
+
+class ParserFactura:
+    """
+    Parser incremental: `alimentar(linea)` por cada línea y `resultado()` al final.
+
+    Uso:
+        parser = ParserFactura()
+        for linea in stream:
+            parser.alimentar(linea)
+        datos = parser.resultado()
+    """
+
+    def __init__(self):
+        self.datos: Dict = {
+            'numero_factura': None,
+            'proveedor': None,
+            'ruc': None,
+            'fecha': None,
+            'items': [],
+            'subtotal': None,
+            'iva': None,
+            'total': None,
+        }
+        self._lineas = 0
+        self._fecha_etiquetada = False
+
+    def alimentar(self, linea: str) -> None:
+        """Clasifica y procesa una línea del documento."""
+        indice = self._lineas
+        self._lineas += 1
+        texto = linea.strip()
+        if not texto:
+            return
+
+        # Las líneas de items (la mayoría) empiezan con la cantidad
+        if texto[0].isdigit() and self._procesar_item(texto):
+            return
+
+        claves = (
+            {m.lastgroup for m in RE_CLAVES.finditer(texto)}
+            if RE_INDICIOS.search(texto.lower()) else ()
+        )
+        if 'pagina' in claves:
+            return
+
+        if 'fecha' in claves or not self._fecha_etiquetada:
+            self._procesar_fecha(texto, 'fecha' in claves)
+
+        if 'ruc' in claves and self.datos['ruc'] is None:
+            ruc = RE_RUC.search(texto)
+            if ruc:
+                self.datos['ruc'] = ruc.group()
+
+        if 'factura' in claves and self.datos['numero_factura'] is None:
+            self._procesar_numero(texto, 'ruc' in claves)
+
+        if 'subtotal' in claves:
+            self._procesar_monto(texto, 'subtotal')
+        elif 'iva' in claves:
+            self._procesar_monto(texto, 'iva')
+        elif 'total' in claves:
+            self._procesar_monto(texto, 'total')
+
+        if (
+            not claves and self.datos['proveedor'] is None and indice < LINEAS_ENCABEZADO_PROVEEDOR
+            and len(texto) > 5 and not any(c.isdigit() for c in linea[:5])
+        ):
+            self.datos['proveedor'] = texto
+
+    def resultado(self) -> Dict:
+        """Datos extraídos hasta el momento."""
+        return self.datos
+
+    def _procesar_item(self, texto: str) -> bool:
+        """Línea 'cantidad [unidad] descripción precio total'. Retorna True si es un item."""
+        coincidencia = RE_ITEM.match(texto)
+        if not coincidencia:
+            return False
+
+        cantidad, unidad, descripcion, precio, total = coincidencia.groups()
+        if not unidad:
+            en_descripcion = RE_UNIDAD.search(descripcion)
+            if en_descripcion:
+                unidad = en_descripcion.group().rstrip('.')
+                descripcion = RE_ESPACIOS.sub(
+                    ' ', descripcion[:en_descripcion.start()] + descripcion[en_descripcion.end():]
+                ).strip()
+
+        self.datos['items'].append({
+            'descripcion': descripcion,
+            'cantidad': a_numero(cantidad),
+            'precio': a_numero(precio),
+            'total': a_numero(total),
+            'unidad': unidad.lower() if unidad else None,
+        })
+        return True
+
+    def _procesar_fecha(self, texto: str, etiquetada: bool) -> None:
+        if self.datos['fecha'] is not None and not (etiquetada and not self._fecha_etiquetada):
+            return
+        fecha = RE_FECHA.search(texto)
+        if fecha:
+            self.datos['fecha'] = fecha.group()
+            self._fecha_etiquetada = etiquetada
+
+    def _procesar_numero(self, texto: str, con_ruc: bool) -> None:
+        # Las fechas y el RUC de la misma línea no son parte del número
+        texto = RE_FECHA.sub(' ', texto)
+        if con_ruc:
+            texto = RE_RUC.sub(' ', texto)
+        numeros = RE_ENTERO.findall(texto)
+        if numeros:
+            self.datos['numero_factura'] = '-'.join(numeros[:3]) if len(numeros) >= 3 else numeros[0]
+
+    def _procesar_monto(self, texto: str, campo: str) -> None:
+        # La tasa ("IVA 12%") no es un monto
+        montos = RE_MONTO.findall(RE_PORCENTAJE.sub(' ', texto))
+        if montos:
+            valor = a_numero(montos[-1])
+            if valor is not None:
+                self.datos[campo] = valor
+
+
+def parsear_lineas(lineas: Iterable[str]) -> Dict:
+    """Parsea un documento recibido como iterable de líneas (p. ej. un archivo abierto)."""
+    parser = ParserFactura()
+    for linea in lineas:
+        parser.alimentar(linea)
+    return parser.resultado()
+
+
+def parsear_texto_factura(texto: str) -> Dict:
+    """Parsea el texto completo de una factura (los saltos de página cuentan como líneas)."""
+    return parsear_lineas((texto or '').splitlines())